@@ -0,0 +1,142 @@
+import time
+from typing import Optional, Tuple
+from unittest import mock
+
+import numpy as np
+import pytest
+import torch
+
+from vllm_ascend.eplb import policy
+
+
+def balanced_packing_reference(
+        weight: torch.Tensor,
+        num_packs: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Per-layer Python implementation from examples/eplb/eplb_deepseek.py"""
+    num_layers, num_groups = weight.shape
+    assert num_groups % num_packs == 0
+    groups_per_pack = num_groups // num_packs
+
+    if groups_per_pack == 1:
+        pack_index = torch.arange(weight.size(-1),
+                                  dtype=torch.int64,
+                                  device=weight.device).expand(weight.shape)
+        rank_in_pack = torch.zeros_like(weight, dtype=torch.int64)
+        return pack_index, rank_in_pack
+
+    indices = weight.float().sort(-1, descending=True).indices.cpu()
+    pack_index = torch.full_like(weight,
+                                 fill_value=-1,
+                                 dtype=torch.int64,
+                                 device='cpu')
+    rank_in_pack = torch.full_like(pack_index, fill_value=-1)
+    for i in range(num_layers):
+        pack_weights = [0] * num_packs
+        pack_items = [0] * num_packs
+        for group in indices[i]:
+            pack = min(
+                (i
+                 for i in range(num_packs) if pack_items[i] < groups_per_pack),
+                key=pack_weights.__getitem__)
+            pack_index[i, group] = pack
+            rank_in_pack[i, group] = pack_items[pack]
+            pack_weights[pack] += weight[i, group]
+            pack_items[pack] += 1
+    return pack_index, rank_in_pack
+
+
+def replicate_experts_reference(
+    weight: torch.Tensor,
+    num_phy: int,
+    max_replicas: Optional[int] = None
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Implementation from examples/eplb/eplb_deepseek.py, with the replica
+    limit of `policy.replicate_experts`"""
+    n, num_log = weight.shape
+    device = weight.device
+    phy2log = torch.arange(num_phy, dtype=torch.int64,
+                           device=device).repeat(n, 1)
+    rank = torch.zeros(n, num_phy, dtype=torch.int64, device=device)
+    logcnt = torch.ones(n, num_log, dtype=torch.int64, device=device)
+    arangen = torch.arange(n, dtype=torch.int64, device=device)
+    for i in range(num_log, num_phy):
+        load_per_replica = weight / logcnt
+        if max_replicas is not None:
+            load_per_replica[logcnt >= max_replicas] = -float("inf")
+        redundant_indices = load_per_replica.max(dim=-1).indices
+        phy2log[:, i] = redundant_indices
+        rank[:, i] = logcnt[arangen, redundant_indices]
+        logcnt[arangen, redundant_indices] += 1
+    return phy2log, rank, logcnt
+
+
+def rebalance_experts_reference(*args):
+    with mock.patch.object(policy, "balanced_packing",
+                           balanced_packing_reference), \
+         mock.patch.object(policy, "replicate_experts",
+                           replicate_experts_reference):
+        return policy.rebalance_experts(*args)
+
+
+def benchmark_cpu(fn, num_iterations=3, num_warmup_iterations=1):
+    """
+    Benchmark function for CPU operations
+
+    Args:
+        fn: Function to benchmark
+        num_iterations: Number of timing iterations
+        num_warmup_iterations: Number of warmup iterations
+
+    Returns:
+        float: Minimum elapsed time in seconds
+    """
+    times = np.zeros(num_iterations + num_warmup_iterations)
+    for i in range(num_warmup_iterations + num_iterations):
+        start = time.perf_counter()
+        fn()
+        times[i] = time.perf_counter() - start
+    return np.amin(times[num_warmup_iterations:])
+
+
+def max_rank_load(weight: torch.Tensor, phy2log: torch.Tensor,
+                  logcnt: torch.Tensor, num_gpus: int) -> torch.Tensor:
+    """Per-layer load of the busiest rank, splitting expert load evenly
+    across its replicas."""
+    load_per_replica = (weight / logcnt).gather(-1, phy2log)
+    return load_per_replica.view(weight.shape[0], num_gpus,
+                                 -1).sum(-1).max(-1).values
+
+
+@pytest.mark.parametrize(
+    "num_layers,num_experts,num_redundant,num_groups,num_nodes,num_gpus", [
+        (61, 256, 32, 8, 4, 32),
+        (61, 256, 64, 8, 8, 64),
+        (61, 256, 128, 8, 16, 128),
+        (61, 256, 64, 8, 3, 64),
+    ])
+def test_rebalance_experts(num_layers, num_experts, num_redundant, num_groups,
+                           num_nodes, num_gpus):
+    torch.manual_seed(0)
+    # Skewed expert load, like real routing statistics.
+    weight = torch.distributions.LogNormal(0, 1.5).sample(
+        (num_layers, num_experts)) * 1000
+    args = (weight, num_experts + num_redundant, num_groups, num_nodes,
+            num_gpus)
+
+    ref_phy2log, _, ref_logcnt = rebalance_experts_reference(*args)
+    phy2log, _, logcnt = policy.rebalance_experts(*args)
+    ref_max_load = max_rank_load(weight, ref_phy2log, ref_logcnt, num_gpus)
+    max_load = max_rank_load(weight, phy2log, logcnt, num_gpus)
+    assert torch.all(max_load <= ref_max_load * (1 + 1e-6))
+    identical = torch.equal(phy2log, ref_phy2log)
+
+    time_ref = benchmark_cpu(lambda: rebalance_experts_reference(*args),
+                             num_iterations=1)
+    time_new = benchmark_cpu(lambda: policy.rebalance_experts(*args))
+    print(f"\n[{num_layers} layers, {num_experts}+{num_redundant} experts, "
+          f"{num_nodes} nodes, {num_gpus} ranks] "
+          f"reference: {time_ref * 1000:.1f} ms, "
+          f"vectorized: {time_new * 1000:.1f} ms, "
+          f"speedup: {time_ref / time_new:.1f}x, "
+          f"identical placement: {identical}, "
+          f"mean max load: {ref_max_load.mean():.0f} -> {max_load.mean():.0f}")
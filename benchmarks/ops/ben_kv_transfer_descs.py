@@ -0,0 +1,108 @@
+import random
+import time
+
+import pytest
+
+from vllm_ascend.distributed.block_runs import (align_block_runs,
+                                                build_transfer_descs,
+                                                decode_block_runs,
+                                                encode_block_runs,
+                                                get_cache_block_lens)
+
+
+def _random_block_ids(rng: random.Random, num_blocks: int,
+                      fragmentation: float) -> list[int]:
+    """Block ids of a request, a new range starts with probability
+    ``fragmentation`` at every block."""
+    block_ids = []
+    next_id = rng.randrange(1 << 16)
+    for _ in range(num_blocks):
+        if rng.random() < fragmentation:
+            next_id = rng.randrange(1 << 16)
+        block_ids.append(next_id)
+        next_id += 1
+    return block_ids
+
+
+def _loop_transfer_descs(local_block_ids, remote_block_ids, local_base_addrs,
+                         remote_base_addrs, block_lens):
+    """The per group Python loop the connector used before."""
+    groups = []
+    for i, (local_id, remote_id) in enumerate(
+            zip(local_block_ids, remote_block_ids)):
+        if i and local_id == local_block_ids[i - 1] + 1 and \
+                remote_id == remote_block_ids[i - 1] + 1:
+            groups[-1][2] += 1
+        else:
+            groups.append([local_id, remote_id, 1])
+    src_list, dst_list, length_list = [], [], []
+    for local_base_addr, remote_base_addr, block_len in zip(
+            local_base_addrs, remote_base_addrs, block_lens):
+        for local_start, remote_start, num_blocks in groups:
+            src_list.append(local_base_addr + local_start * block_len)
+            dst_list.append(remote_base_addr + remote_start * block_len)
+            length_list.append(num_blocks * block_len)
+    return [src_list, dst_list, length_list]
+
+
+def _vectorized_transfer_descs(local_block_runs, remote_block_runs,
+                               local_base_addrs, remote_base_addrs,
+                               block_lens):
+    return build_transfer_descs(
+        local_base_addrs, remote_base_addrs, block_lens,
+        *align_block_runs(local_block_runs, remote_block_runs))
+
+
+def _vectorized_transfer_lists(*args):
+    # The engine takes lists of ints.
+    return _vectorized_transfer_descs(*args).reshape(3, -1).tolist()
+
+
+def _best_time_ms(fn, *args, num_iterations=5):
+    times = []
+    for _ in range(num_iterations):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+@pytest.mark.parametrize("num_layers,use_mla", [(61, True), (61, False),
+                                                (94, False)])
+@pytest.mark.parametrize("num_blocks", [64, 1024, 4096])
+@pytest.mark.parametrize("fragmentation", [0.01, 0.2, 1.0])
+def test_kv_transfer_descs(num_layers, use_mla, num_blocks, fragmentation):
+    rng = random.Random(0)
+    local_block_ids = _random_block_ids(rng, num_blocks, fragmentation)
+    remote_block_ids = _random_block_ids(rng, num_blocks, fragmentation)
+    num_caches = 2 * num_layers
+    local_base_addrs = [
+        0x12c000000000 + k * (1 << 32) for k in range(num_caches)
+    ]
+    remote_base_addrs = [
+        0x13c000000000 + k * (1 << 32) for k in range(num_caches)
+    ]
+    block_lens = get_cache_block_lens([73728, 9216] if use_mla else [262144],
+                                      num_caches, use_mla)
+    local_block_runs = encode_block_runs(local_block_ids)
+    remote_block_runs = encode_block_runs(remote_block_ids)
+    assert decode_block_runs(local_block_runs).tolist() == local_block_ids
+
+    expected = _loop_transfer_descs(local_block_ids, remote_block_ids,
+                                    local_base_addrs, remote_base_addrs,
+                                    block_lens.tolist())
+    args = (local_block_runs, remote_block_runs, local_base_addrs,
+            remote_base_addrs, block_lens)
+    assert _vectorized_transfer_lists(*args) == expected
+
+    loop_ms = _best_time_ms(_loop_transfer_descs, local_block_ids,
+                            remote_block_ids, local_base_addrs,
+                            remote_base_addrs, block_lens.tolist())
+    arrays_ms = _best_time_ms(_vectorized_transfer_descs, *args)
+    vectorized_ms = _best_time_ms(_vectorized_transfer_lists, *args)
+    print(f"\n[{num_layers} layers{', MLA' if use_mla else ''}, "
+          f"{num_blocks} blocks, fragmentation {fragmentation}, "
+          f"{len(expected[0])} regions] loop {loop_ms:.2f} ms, "
+          f"vectorized {vectorized_ms:.2f} ms "
+          f"({arrays_ms:.2f} ms before the lists), "
+          f"speedup {loop_ms / vectorized_ms:.1f}x")
@@ -0,0 +1,50 @@
+import pytest
+import torch
+
+from vllm_ascend.eplb.policy import rebalance_deployment
+from vllm_ascend.eplb.simulator import (replica_load_variance,
+                                        simulate_replica_load)
+from vllm_ascend.ops.expert_load_balancer import (LOG2PHY_POLICIES,
+                                                  build_expert_placement_map,
+                                                  build_log2phy_table)
+
+
+@pytest.mark.parametrize(
+    "num_experts,num_redundant,num_ranks,num_nodes,num_tokens,top_k", [
+        (256, 32, 32, 1, 256, 8),
+        (256, 32, 32, 4, 256, 8),
+        (256, 64, 64, 8, 64, 8),
+    ])
+def test_log2phy_policy(num_experts, num_redundant, num_ranks, num_nodes,
+                        num_tokens, top_k):
+    torch.manual_seed(0)
+    # Skewed expert popularity, like real routing statistics.
+    popularity = torch.distributions.LogNormal(0, 1.5).sample((num_experts, ))
+    num_local_experts = (num_experts + num_redundant) // num_ranks
+    deployment = rebalance_deployment(popularity.unsqueeze(0), num_ranks,
+                                      num_local_experts, 1, 1)
+    placement = build_expert_placement_map(deployment, num_experts)
+    # Tokens of one step on every rank.
+    topk_ids = torch.multinomial(popularity.expand(num_ranks * num_tokens, -1),
+                                 top_k).view(num_ranks, num_tokens, top_k)
+
+    print(f"\n[{num_experts}+{num_redundant} experts, {num_ranks} ranks, "
+          f"{num_nodes} nodes, {num_tokens} tokens per rank]")
+    for policy in LOG2PHY_POLICIES:
+        log2phy = build_log2phy_table(deployment,
+                                      placement,
+                                      num_experts,
+                                      policy,
+                                      num_nodes,
+                                      expert_load=popularity.unsqueeze(0))[0]
+        replica_load = simulate_replica_load(log2phy, topk_ids,
+                                             num_ranks * num_local_experts)
+        expert_variance, rank_variance = replica_load_variance(
+            deployment[0], replica_load)
+        replicated = torch.bincount(deployment[0].flatten(),
+                                    minlength=num_experts) > 1
+        rank_load = replica_load.view(num_ranks, -1).sum(-1).double()
+        print(f"{policy:>13}: replica load variance "
+              f"{expert_variance[replicated].mean():.1f}, "
+              f"rank load std {rank_variance.sqrt():.1f}, "
+              f"max/mean rank load {rank_load.max() / rank_load.mean():.3f}")
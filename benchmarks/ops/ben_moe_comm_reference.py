@@ -0,0 +1,131 @@
+import socket
+import time
+from types import SimpleNamespace
+
+import pytest
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from vllm_ascend.distributed.moe_comm_reference import (
+    ReferenceAllGatherCommImpl, ReferenceAllToAllCommImpl,
+    dense_moe_reference, grouped_expert_mlp)
+
+STRATEGIES = {
+    "all_gather": ReferenceAllGatherCommImpl,
+    "all_to_all": ReferenceAllToAllCommImpl,
+}
+# (capacity_factor, pad_to_capacity)
+CAPACITY_MODES = [(None, False), (1.0, False), (1.25, False), (1.25, True)]
+
+
+def routing_popularity(distribution: str, num_experts: int) -> torch.Tensor:
+    """Expert popularity of a routing distribution."""
+    if distribution == "uniform":
+        return torch.ones(num_experts)
+    if distribution == "skewed":
+        # Skewed expert popularity, like real routing statistics.
+        return torch.distributions.LogNormal(0, 1.5).sample((num_experts, ))
+    if distribution == "hot":
+        # A few hot experts take a large share of the tokens.
+        popularity = torch.ones(num_experts)
+        popularity[torch.randperm(num_experts)[:num_experts // 16]] = 32
+        return popularity
+    raise ValueError(f"Unknown routing distribution {distribution}")
+
+
+def _get_open_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _benchmark_rank(rank, world_size, port, distribution, num_tokens,
+                    num_experts, top_k, hidden_size, num_iterations):
+    dist.init_process_group("gloo",
+                            init_method=f"tcp://127.0.0.1:{port}",
+                            rank=rank,
+                            world_size=world_size)
+    num_local_experts = num_experts // world_size
+    torch.manual_seed(0)
+    popularity = routing_popularity(distribution, num_experts)
+    expert_weights = torch.randn(num_experts, hidden_size,
+                                 hidden_size) / hidden_size**0.5
+    local_weights = expert_weights[rank * num_local_experts:(rank + 1) *
+                                   num_local_experts]
+    expert_map = torch.full((num_experts, ), -1, dtype=torch.int32)
+    expert_map[rank * num_local_experts:(rank + 1) * num_local_experts] = \
+        torch.arange(num_local_experts, dtype=torch.int32)
+    torch.manual_seed(rank + 1)
+    hidden_states = torch.randn(num_tokens, hidden_size)
+    topk_ids = torch.multinomial(popularity.expand(num_tokens, -1),
+                                 top_k).to(torch.int32)
+    topk_weights = torch.rand(num_tokens, top_k).softmax(-1)
+    expected = dense_moe_reference(hidden_states, topk_ids, topk_weights,
+                                   expert_weights)
+    hf_config = SimpleNamespace(num_experts_per_tok=top_k,
+                                n_routed_experts=num_experts)
+
+    if rank == 0:
+        print(f"\n[{distribution} routing, {world_size} ranks, "
+              f"{num_experts} experts, top {top_k}, "
+              f"{num_tokens} tokens per rank]")
+    for name, comm_cls in STRATEGIES.items():
+        for capacity_factor, pad_to_capacity in CAPACITY_MODES:
+            comm = comm_cls(torch.device("cpu"),
+                            torch.float32,
+                            hf_config,
+                            dist.group.WORLD,
+                            capacity_factor=capacity_factor,
+                            pad_to_capacity=pad_to_capacity)
+            output = torch.empty_like(hidden_states)
+            times = []
+            for _ in range(num_iterations + 1):
+                dist.barrier()
+                start = time.perf_counter()
+                permuted, expert_tokens, group_list_type = comm._pre_process(
+                    hidden_states, topk_ids, topk_weights, expert_map,
+                    num_local_experts)
+                mlp_output = grouped_expert_mlp(permuted, expert_tokens,
+                                                group_list_type, local_weights)
+                comm._post_process(mlp_output, output)
+                times.append(time.perf_counter() - start)
+            stats = torch.tensor([
+                min(times[1:]), comm.num_sent_tokens, comm.num_dropped_tokens,
+                comm.num_padded_tokens,
+                int(expert_tokens.sum()),
+                float((output - expected).abs().max())
+            ],
+                                 dtype=torch.float64)
+            gathered = [torch.empty_like(stats) for _ in range(world_size)]
+            dist.all_gather(gathered, stats)
+            if rank == 0:
+                stats = torch.stack(gathered)
+                total_pairs = num_tokens * top_k * world_size
+                mode = ("dropless" if capacity_factor is None else
+                        f"capacity {capacity_factor}" +
+                        (" padded" if pad_to_capacity else ""))
+                print(f"{name:>10} {mode:>20}: "
+                      f"{stats[:, 0].max() * 1000:.1f} ms, "
+                      f"sent tokens {int(stats[:, 1].sum())}, "
+                      f"dropped {stats[:, 2].sum() / total_pairs:.1%}, "
+                      f"padded {stats[:, 3].sum() / total_pairs:.1%}, "
+                      f"max/mean rank rows "
+                      f"{stats[:, 4].max() / stats[:, 4].mean():.2f}, "
+                      f"max error vs dropless {stats[:, 5].max():.2e}")
+    dist.destroy_process_group()
+
+
+@pytest.mark.parametrize("distribution", ["uniform", "skewed", "hot"])
+@pytest.mark.parametrize(
+    "world_size,num_tokens,num_experts,top_k,hidden_size", [
+        (4, 512, 64, 8, 256),
+        (8, 256, 256, 8, 128),
+    ])
+def test_moe_comm_reference(distribution, world_size, num_tokens, num_experts,
+                            top_k, hidden_size):
+    mp.start_processes(_benchmark_rank,
+                       args=(world_size, _get_open_port(), distribution,
+                             num_tokens, num_experts, top_k, hidden_size, 3),
+                       nprocs=world_size,
+                       start_method="fork")
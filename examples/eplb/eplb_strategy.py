@@ -100,46 +100,18 @@ def deepseek_deploy(workload, num_redundancy_expert, num_groups, num_nodes,
                                                 num_gpus)
 
     # Convert to global_deployment
-    workload = workload.cpu().numpy()
-    global_deployment = []
     layer_num = log2phy.shape[0]
-    num_physical_experts_local = (num_original_expert +
-                                  num_redundancy_expert) // num_gpus
-    for layer_idx in range(layer_num):
-        layer_deployment = []
-        for gpu_idx in range(num_gpus):
-            local_deployment = hy2log[layer_idx][gpu_idx *
-                                                 num_physical_experts_local:
-                                                 (gpu_idx + 1) *
-                                                 num_physical_experts_local]
-            local_deployment = local_deployment.flatten()
-            layer_deployment.append(local_deployment.tolist())
-        global_deployment.append(layer_deployment)
-
-    # Remap expert distribution according to log2phy
-    original_weights = []
-    max_weights = []
-    average_weights = []
-    y_list = []
-    for layer_idx in range(layer_num):
-        new_value = workload[layer_idx].reshape(num_gpus, -1)
-        row_sum = np.sum(new_value, axis=1)
-        original_weights.append(row_sum.max())
-        average_weights.append((np.sum(workload[layer_idx]) / num_gpus))
-
-        opt_workload = np.zeros((num_original_expert + num_redundancy_expert),
-                                dtype=np.float64)
-        for expert_idx in range(num_original_expert):
-            physical_expert_idxs = log2phy[layer_idx][expert_idx]
-            physical_expert_idxs = physical_expert_idxs.flatten()
-            physical_expert_idxs = physical_expert_idxs[
-                physical_expert_idxs != -1]
-            for physical_expert_idx in physical_expert_idxs:
-                opt_workload[physical_expert_idx] += workload[layer_idx][
-                    expert_idx] / len(physical_expert_idxs)
-        opt_workload = opt_workload.reshape(num_gpus, -1)
-        row_sum = np.sum(opt_workload, axis=1)
-        max_weights.append(row_sum.max())
+    global_deployment = hy2log.view(layer_num, num_gpus, -1).tolist()
+
+    # Remap expert distribution according to log2phy: every physical replica
+    # takes an equal share of its logical expert's load.
+    workload = workload.cpu().double()
+    original_weights = workload.view(layer_num, num_gpus,
+                                     -1).sum(-1).max(-1).values.tolist()
+    average_weights = (workload.sum(-1) / num_gpus).tolist()
+    opt_workload = (workload / logcnt).gather(-1, hy2log)
+    max_weights = opt_workload.view(layer_num, num_gpus,
+                                    -1).sum(-1).max(-1).values.tolist()
 
     y_list = [original_weights, max_weights, average_weights]
     return global_deployment, y_list
@@ -0,0 +1,100 @@
+# coding=utf-8
+# Copyright (c) Huawei Technologies Co., Ltd. 2025-2025. All rights reserved.
+"""
+Generates a topology-aware expert map for `expert_map_path`.
+
+Inputs are the expert load dumped by `expert_load_dump_path` and the expert
+co-activation dumped by `expert_coactivation_dump_path`, or a routing trace:
+a `[layer_num, num_tokens, top_k]` tensor of `topk_ids`. With a trace, the
+cross-node traffic of the default, load-balanced and topology-aware
+placements is estimated and printed.
+"""
+import argparse
+import os
+
+import torch
+
+from vllm_ascend.eplb.policy import rebalance_deployment
+from vllm_ascend.eplb.simulator import simulate_cross_node_bytes
+from vllm_ascend.eplb.topology_policy import (compute_coactivation,
+                                              node_load_imbalance,
+                                              rebalance_experts_topology_aware)
+from vllm_ascend.ops.expert_load_balancer import save_expert_map
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--exp_name", type=str, default="gsm8k_temp0.0")
+    parser.add_argument("--num_original_expert", type=int, default=256)
+    parser.add_argument("--load_path", type=str, default="")
+    parser.add_argument("--coactivation_path", type=str, default="")
+    parser.add_argument("--trace_path", type=str, default="")
+    parser.add_argument("--output_path", type=str, default="")
+    parser.add_argument("--num_redundancy_expert", type=int, default=0)
+    parser.add_argument("--num_devices", type=int, default=32)
+    parser.add_argument("--num_groups", type=int, default=8)
+    parser.add_argument("--num_nodes", type=int, default=4)
+    parser.add_argument("--imbalance_tolerance", type=float, default=0.05)
+    parser.add_argument("--hidden_size", type=int, default=7168)
+    args = parser.parse_args()
+    os.makedirs(args.output_path, exist_ok=True)
+    num_experts = args.num_original_expert
+    num_physical_experts = num_experts + args.num_redundancy_expert
+    assert num_physical_experts % args.num_devices == 0
+    num_local_experts = num_physical_experts // args.num_devices
+
+    trace = None
+    if args.trace_path:
+        trace = torch.load(args.trace_path, map_location="cpu")
+    if args.coactivation_path:
+        coactivation = torch.load(args.coactivation_path, map_location="cpu")
+    else:
+        assert trace is not None, \
+            "--coactivation_path or --trace_path is required"
+        coactivation = compute_coactivation(trace, num_experts)
+    if args.load_path:
+        workload = torch.load(args.load_path, map_location="cpu")
+    else:
+        # The diagonal of the co-activation is the expert load.
+        workload = coactivation.diagonal(dim1=-2, dim2=-1)
+
+    deployment = rebalance_experts_topology_aware(workload, coactivation,
+                                                  args.num_devices,
+                                                  num_local_experts,
+                                                  args.num_nodes,
+                                                  args.imbalance_tolerance)
+    file_name = os.path.join(
+        args.output_path, f"{args.exp_name}_{args.num_devices}_"
+        f"{args.num_redundancy_expert}_topology.json")
+    save_expert_map(deployment, file_name)
+    print(f"Saved expert map to {file_name}")
+
+    if trace is not None:
+        num_layers = workload.shape[0]
+        default = torch.arange(num_physical_experts) % num_experts
+        placements = {
+            "default":
+            default.view(1, args.num_devices, -1).expand(num_layers, -1, -1),
+            "load balanced":
+            rebalance_deployment(workload, args.num_devices, num_local_experts,
+                                 args.num_groups, args.num_nodes),
+            "topology aware":
+            deployment,
+        }
+        for name, placement in placements.items():
+            dedup_bytes = simulate_cross_node_bytes(placement, trace,
+                                                    num_experts,
+                                                    args.num_nodes,
+                                                    args.hidden_size)
+            flat_bytes = simulate_cross_node_bytes(placement,
+                                                   trace,
+                                                   num_experts,
+                                                   args.num_nodes,
+                                                   args.hidden_size,
+                                                   dedup_by_node=False)
+            node_imbalance, rank_imbalance = node_load_imbalance(
+                placement, workload, args.num_nodes)
+            print(f"{name}: cross-node MB per step "
+                  f"{dedup_bytes.sum() / 2**20:.1f} (node dedup), "
+                  f"{flat_bytes.sum() / 2**20:.1f} (per expert); "
+                  f"max/mean node load {node_imbalance.mean():.3f}, "
+                  f"max/mean rank load {rank_imbalance.mean():.3f}")
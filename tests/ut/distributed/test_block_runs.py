@@ -0,0 +1,161 @@
+import random
+import unittest
+
+import msgspec
+import numpy as np
+
+from vllm_ascend.distributed.block_runs import (align_block_runs,
+                                                block_runs_from_bytes,
+                                                block_runs_to_bytes,
+                                                build_transfer_descs,
+                                                decode_block_runs,
+                                                encode_block_runs,
+                                                get_cache_block_lens,
+                                                get_region_block_runs,
+                                                match_suffix_block_runs,
+                                                num_blocks_in_runs,
+                                                slice_block_runs)
+
+
+def _random_block_ids(rng: random.Random, num_blocks: int) -> list[int]:
+    # Mostly consecutive blocks, like a freshly allocated request.
+    block_ids = []
+    next_id = rng.randrange(1000)
+    for _ in range(num_blocks):
+        if rng.random() < 0.2:
+            next_id = rng.randrange(1000)
+        block_ids.append(next_id)
+        next_id += 1
+    return block_ids
+
+
+def _group_contiguous(src: list[int], dst: list[int]):
+    groups: list[list[int]] = []
+    for i, (src_id, dst_id) in enumerate(zip(src, dst)):
+        if i and src_id == src[i - 1] + 1 and dst_id == dst[i - 1] + 1:
+            groups[-1][2] += 1
+        else:
+            groups.append([src_id, dst_id, 1])
+    return groups
+
+
+class TestBlockRuns(unittest.TestCase):
+
+    def test_encode(self):
+        runs = encode_block_runs([3, 4, 5, 9, 10, 2])
+        self.assertEqual(runs.dtype, np.int64)
+        self.assertEqual(runs.tolist(), [[3, 3], [9, 2], [2, 1]])
+        self.assertEqual(num_blocks_in_runs(runs), 6)
+
+    def test_empty(self):
+        runs = encode_block_runs([])
+        self.assertEqual(runs.shape, (0, 2))
+        self.assertEqual(num_blocks_in_runs(runs), 0)
+        self.assertEqual(decode_block_runs(runs).tolist(), [])
+        self.assertEqual(slice_block_runs(runs, 0, 4).shape, (0, 2))
+        for array in align_block_runs(runs, runs):
+            self.assertEqual(array.tolist(), [])
+
+    def test_round_trip(self):
+        rng = random.Random(0)
+        for num_blocks in (1, 2, 17, 512):
+            block_ids = _random_block_ids(rng, num_blocks)
+            runs = encode_block_runs(block_ids)
+            self.assertEqual(decode_block_runs(runs).tolist(), block_ids)
+            data = msgspec.msgpack.encode(block_runs_to_bytes(runs))
+            decoded = block_runs_from_bytes(msgspec.msgpack.decode(data))
+            np.testing.assert_array_equal(decoded, runs)
+
+    def test_slice(self):
+        rng = random.Random(1)
+        block_ids = _random_block_ids(rng, 64)
+        runs = encode_block_runs(block_ids)
+        for start, stop in ((0, 64), (0, 10), (5, 37), (63, 64), (20, 20),
+                            (40, 100)):
+            self.assertEqual(
+                decode_block_runs(slice_block_runs(runs, start,
+                                                   stop)).tolist(),
+                block_ids[start:stop])
+
+    def test_align(self):
+        rng = random.Random(2)
+        for num_blocks in (1, 3, 50, 300):
+            src = _random_block_ids(rng, num_blocks)
+            dst = _random_block_ids(rng, num_blocks)
+            src_starts, dst_starts, lengths = align_block_runs(
+                encode_block_runs(src), encode_block_runs(dst))
+            self.assertEqual(
+                np.stack((src_starts, dst_starts, lengths), axis=1).tolist(),
+                _group_contiguous(src, dst))
+
+    def test_match_suffix(self):
+        local = encode_block_runs([7, 8, 20])
+        remote = encode_block_runs([1, 2, 3, 4, 5])
+        for num_cached_blocks, expected_local, expected_remote in (
+            (0, [7, 8, 20], [1, 2, 3]),
+            (2, [7, 8, 20], [3, 4, 5]),
+            (3, [7, 8], [4, 5]),  # The last local block has no remote one.
+            (5, [], []),
+            (6, [], [])):
+            matched_local, matched_remote = match_suffix_block_runs(
+                local, remote, num_cached_blocks)
+            self.assertEqual(
+                decode_block_runs(matched_local).tolist(), expected_local)
+            self.assertEqual(
+                decode_block_runs(matched_remote).tolist(), expected_remote)
+
+    def test_align_different_sizes(self):
+        with self.assertRaises(AssertionError):
+            align_block_runs(encode_block_runs([1, 2]),
+                             encode_block_runs([1]))
+
+    def test_cache_block_lens(self):
+        self.assertEqual(get_cache_block_lens([64], 4, False).tolist(),
+                         [64, 64, 64, 64])
+        self.assertEqual(get_cache_block_lens([64, 8], 4, True).tolist(),
+                         [64, 8, 64, 8])
+
+    def test_build_transfer_descs(self):
+        rng = random.Random(3)
+        src = _random_block_ids(rng, 40)
+        dst = _random_block_ids(rng, 40)
+        local_base_addrs = [0x12c000000000 + i * 0x10000000 for i in range(6)]
+        remote_base_addrs = [0x13c000000000 + i * 0x10000000 for i in range(6)]
+        block_lens = get_cache_block_lens([4096, 512], 6, True)
+        descs = build_transfer_descs(
+            local_base_addrs, remote_base_addrs, block_lens,
+            *align_block_runs(encode_block_runs(src), encode_block_runs(dst)))
+
+        groups = _group_contiguous(src, dst)
+        self.assertEqual(descs.shape, (3, 6, len(groups)))
+        expected = [[], [], []]
+        for k, block_len in enumerate(block_lens.tolist()):
+            for src_start, dst_start, length in groups:
+                expected[0].append(local_base_addrs[k] + src_start * block_len)
+                expected[1].append(remote_base_addrs[k] +
+                                   dst_start * block_len)
+                expected[2].append(length * block_len)
+        self.assertEqual(descs.reshape(3, -1).tolist(), expected)
+
+    def test_region_block_runs(self):
+        rng = random.Random(4)
+        src = _random_block_ids(rng, 40)
+        dst = _random_block_ids(rng, 40)
+        # Not in address order, like the caches of some models.
+        local_base_addrs = [0x12c000000000 + i * 0x10000000 for i in range(6)]
+        local_base_addrs.reverse()
+        remote_base_addrs = [0x13c000000000 + i * 0x10000000 for i in range(6)]
+        block_lens = get_cache_block_lens([4096, 512], 6, True)
+        descs = build_transfer_descs(
+            local_base_addrs, remote_base_addrs, block_lens,
+            *align_block_runs(encode_block_runs(src), encode_block_runs(dst)))
+
+        for caches in (slice(0, 6), slice(1, 2), slice(4, 6)):
+            runs = get_region_block_runs(descs[0, caches].ravel(),
+                                         descs[2, caches].ravel(),
+                                         local_base_addrs, block_lens)
+            self.assertEqual(
+                decode_block_runs(runs).tolist(), sorted(set(src)))
+        self.assertEqual(
+            get_region_block_runs([], [], local_base_addrs,
+                                  block_lens).shape, (0, 2))
@@ -0,0 +1,197 @@
+import socket
+from types import SimpleNamespace
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from tests.ut.base import TestBase
+from vllm_ascend.distributed.moe_comm_method import NativeAllGatherCommImpl
+from vllm_ascend.distributed.moe_comm_reference import (
+    ReferenceAllGatherCommImpl, ReferenceAllToAllCommImpl,
+    dense_moe_reference, grouped_expert_mlp)
+
+HIDDEN_SIZE = 16
+TOP_K = 4
+NUM_LOCAL_EXPERTS = 4
+
+
+def _get_open_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _worker(rank, world_size, port, fn, args):
+    dist.init_process_group("gloo",
+                            init_method=f"tcp://127.0.0.1:{port}",
+                            rank=rank,
+                            world_size=world_size)
+    try:
+        fn(rank, world_size, *args)
+    finally:
+        dist.destroy_process_group()
+
+
+def _run_distributed(fn, world_size, *args):
+    mp.start_processes(_worker,
+                       args=(world_size, _get_open_port(), fn, args),
+                       nprocs=world_size,
+                       start_method="fork")
+
+
+def _make_inputs(rank, world_size):
+    num_global_experts = NUM_LOCAL_EXPERTS * world_size
+    torch.manual_seed(0)
+    expert_weights = torch.randn(num_global_experts, HIDDEN_SIZE,
+                                 HIDDEN_SIZE) / HIDDEN_SIZE**0.5
+    torch.manual_seed(rank + 1)
+    # Ranks hold different numbers of tokens.
+    num_tokens = 24 + 8 * rank
+    hidden_states = torch.randn(num_tokens, HIDDEN_SIZE)
+    scores = torch.randn(num_tokens, num_global_experts)
+    # Skew the routing so that capacity matters.
+    scores[:, 0] += 2
+    topk_weights, topk_ids = scores.softmax(-1).topk(TOP_K)
+    expert_map = torch.full((num_global_experts, ), -1, dtype=torch.int32)
+    expert_map[rank * NUM_LOCAL_EXPERTS:(rank + 1) * NUM_LOCAL_EXPERTS] = \
+        torch.arange(NUM_LOCAL_EXPERTS, dtype=torch.int32)
+    local_weights = expert_weights[rank * NUM_LOCAL_EXPERTS:(rank + 1) *
+                                   NUM_LOCAL_EXPERTS]
+    return (hidden_states, topk_ids.to(torch.int32), topk_weights, expert_map,
+            expert_weights, local_weights)
+
+
+def _hf_config(world_size):
+    return SimpleNamespace(num_experts_per_tok=TOP_K,
+                           n_routed_experts=NUM_LOCAL_EXPERTS * world_size)
+
+
+def _run_comm(comm, hidden_states, topk_ids, topk_weights, expert_map,
+              local_weights):
+    permuted, expert_tokens, group_list_type = comm._pre_process(
+        hidden_states, topk_ids, topk_weights, expert_map, NUM_LOCAL_EXPERTS)
+    mlp_output = grouped_expert_mlp(permuted, expert_tokens, group_list_type,
+                                    local_weights)
+    output = torch.empty_like(hidden_states)
+    comm._post_process(mlp_output, output)
+    return output, expert_tokens
+
+
+def _check_dropless(rank, world_size, comm_cls):
+    (hidden_states, topk_ids, topk_weights, expert_map, expert_weights,
+     local_weights) = _make_inputs(rank, world_size)
+    comm = comm_cls(torch.device("cpu"), torch.float32,
+                    _hf_config(world_size), dist.group.WORLD)
+    output, expert_tokens = _run_comm(comm, hidden_states, topk_ids,
+                                      topk_weights, expert_map, local_weights)
+    expected = dense_moe_reference(hidden_states, topk_ids, topk_weights,
+                                   expert_weights)
+    torch.testing.assert_close(output, expected)
+    assert comm.num_dropped_tokens == 0
+    assert comm.num_padded_tokens == 0
+    # Every routed token reaches its expert exactly once.
+    total = expert_tokens.sum().clone()
+    dist.all_reduce(total)
+    num_tokens = torch.tensor([hidden_states.shape[0]])
+    dist.all_reduce(num_tokens)
+    assert int(total) == int(num_tokens) * TOP_K
+
+
+def _check_capacity(rank, world_size):
+    (hidden_states, topk_ids, topk_weights, expert_map, expert_weights,
+     local_weights) = _make_inputs(rank, world_size)
+    outputs = []
+    for comm_cls in (ReferenceAllGatherCommImpl, ReferenceAllToAllCommImpl):
+        for pad_to_capacity in (False, True):
+            comm = comm_cls(torch.device("cpu"),
+                            torch.float32,
+                            _hf_config(world_size),
+                            dist.group.WORLD,
+                            capacity_factor=1.0,
+                            pad_to_capacity=pad_to_capacity)
+            output, expert_tokens = _run_comm(comm, hidden_states, topk_ids,
+                                              topk_weights, expert_map,
+                                              local_weights)
+            assert comm.num_dropped_tokens > 0
+            if pad_to_capacity:
+                assert comm.num_padded_tokens > 0
+                assert len(set(expert_tokens.tolist())) == 1
+            outputs.append(output)
+    # Both strategies drop the same tokens, padding changes nothing.
+    for output in outputs[1:]:
+        torch.testing.assert_close(output, outputs[0])
+    dense = dense_moe_reference(hidden_states, topk_ids, topk_weights,
+                                expert_weights)
+    assert not torch.allclose(outputs[0], dense)
+
+
+def _check_large_capacity(rank, world_size):
+    (hidden_states, topk_ids, topk_weights, expert_map, expert_weights,
+     local_weights) = _make_inputs(rank, world_size)
+    comm = ReferenceAllToAllCommImpl(torch.device("cpu"),
+                                     torch.float32,
+                                     _hf_config(world_size),
+                                     dist.group.WORLD,
+                                     capacity_factor=float(world_size *
+                                                           NUM_LOCAL_EXPERTS),
+                                     pad_to_capacity=True)
+    output, _ = _run_comm(comm, hidden_states, topk_ids, topk_weights,
+                          expert_map, local_weights)
+    expected = dense_moe_reference(hidden_states, topk_ids, topk_weights,
+                                   expert_weights)
+    assert comm.num_dropped_tokens == 0
+    torch.testing.assert_close(output, expected)
+
+
+def _check_native(rank, world_size):
+    (hidden_states, topk_ids, topk_weights, expert_map, _,
+     local_weights) = _make_inputs(rank, world_size)
+    reference = ReferenceAllGatherCommImpl(torch.device("cpu"), torch.float32,
+                                           _hf_config(world_size),
+                                           dist.group.WORLD)
+    native = NativeAllGatherCommImpl(torch.device("cpu"), torch.float32,
+                                     _hf_config(world_size))
+    output, expert_tokens = _run_comm(reference, hidden_states, topk_ids,
+                                      topk_weights, expert_map, local_weights)
+    native_output, native_expert_tokens = _run_comm(native, hidden_states,
+                                                    topk_ids, topk_weights,
+                                                    expert_map, local_weights)
+    assert torch.equal(expert_tokens, native_expert_tokens)
+    torch.testing.assert_close(output, native_output)
+
+
+class TestMoECommReference(TestBase):
+
+    def test_all_gather_dropless(self):
+        _run_distributed(_check_dropless, 2, ReferenceAllGatherCommImpl)
+
+    def test_all_to_all_dropless(self):
+        _run_distributed(_check_dropless, 2, ReferenceAllToAllCommImpl)
+
+    def test_capacity_and_padding(self):
+        _run_distributed(_check_capacity, 2)
+
+    def test_padding_without_drop(self):
+        _run_distributed(_check_large_capacity, 2)
+
+    def test_matches_native_all_gather(self):
+        _run_distributed(_check_native, 1)
+
+    def test_pad_requires_capacity(self):
+        with self.assertRaises(ValueError):
+            ReferenceAllToAllCommImpl(torch.device("cpu"),
+                                      torch.float32,
+                                      _hf_config(1),
+                                      group=None,
+                                      pad_to_capacity=True)
+
+    def test_grouped_expert_mlp_cumsum(self):
+        hidden_states = torch.randn(5, HIDDEN_SIZE)
+        weights = torch.randn(2, HIDDEN_SIZE, HIDDEN_SIZE)
+        count = grouped_expert_mlp(hidden_states, torch.tensor([2, 3]), 1,
+                                   weights)
+        cumsum = grouped_expert_mlp(hidden_states, torch.tensor([2, 5]), 0,
+                                    weights)
+        torch.testing.assert_close(count, cumsum)
+        torch.testing.assert_close(count[:2], hidden_states[:2] @ weights[0])
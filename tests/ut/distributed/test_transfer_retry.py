@@ -0,0 +1,111 @@
+import math
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from vllm_ascend.distributed import transfer_retry
+from vllm_ascend.distributed.block_runs import encode_block_runs
+from vllm_ascend.distributed.transfer_retry import (KVLoadErrors,
+                                                    TransferRetryPolicy,
+                                                    call_with_retries)
+
+
+class TestTransferRetryPolicy(unittest.TestCase):
+
+    def test_from_config(self):
+        self.assertEqual(TransferRetryPolicy.from_config(None),
+                         TransferRetryPolicy())
+        policy = TransferRetryPolicy.from_config({
+            "max_retries": 3,
+            "timeout": 10
+        })
+        self.assertEqual(policy.max_retries, 3)
+        self.assertEqual(policy.timeout, 10.0)
+        self.assertEqual(policy.backoff, 0.1)
+
+    def test_no_retries_by_default(self):
+        self.assertIsNone(TransferRetryPolicy().get_retry_delay(1, math.inf))
+
+    def test_exponential_backoff(self):
+        policy = TransferRetryPolicy(max_retries=5,
+                                     backoff=0.5,
+                                     max_backoff=3)
+        delays = [policy.get_retry_delay(n, math.inf) for n in range(1, 7)]
+        self.assertEqual(delays, [0.5, 1.0, 2.0, 3.0, 3.0, None])
+
+    def test_deadline(self):
+        policy = TransferRetryPolicy(max_retries=5, timeout=10, backoff=1)
+        self.assertEqual(TransferRetryPolicy().get_deadline(100.0), math.inf)
+        self.assertEqual(policy.get_deadline(100.0), 110.0)
+        with patch.object(transfer_retry.time, "monotonic",
+                          return_value=108.5):
+            self.assertEqual(policy.get_retry_delay(1, 110.0), 1)
+            # The retry would start past the deadline.
+            self.assertIsNone(policy.get_retry_delay(2, 110.0))
+
+
+class TestCallWithRetries(unittest.TestCase):
+
+    def test_retried_until_success(self):
+        fn = MagicMock(side_effect=[RuntimeError("a"), RuntimeError("b"), 1])
+        on_error = MagicMock()
+        policy = TransferRetryPolicy(max_retries=2, backoff=0.01)
+        with patch.object(transfer_retry, "logger"):
+            self.assertEqual(
+                call_with_retries(fn, policy, math.inf, "pull", on_error), 1)
+        self.assertEqual(fn.call_count, 3)
+        self.assertEqual([str(call.args[0]) for call in on_error.mock_calls],
+                         ["a", "b"])
+
+    def test_last_error_raised(self):
+        fn = MagicMock(side_effect=[RuntimeError("a"), RuntimeError("b")])
+        policy = TransferRetryPolicy(max_retries=1, backoff=0.01)
+        with patch.object(transfer_retry, "logger"), \
+                self.assertRaisesRegex(RuntimeError, "b"):
+            call_with_retries(fn, policy, math.inf, "pull")
+
+    def test_deadline_stops_retries(self):
+        fn = MagicMock(side_effect=RuntimeError("timeout"))
+        policy = TransferRetryPolicy(max_retries=100, backoff=0.05)
+        start = time.monotonic()
+        with patch.object(transfer_retry, "logger"), \
+                self.assertRaises(RuntimeError):
+            call_with_retries(fn, policy, start + 0.3, "pull")
+        self.assertLess(time.monotonic() - start, 0.3)
+        self.assertLess(fn.call_count, 100)
+
+
+class TestKVLoadErrors(unittest.TestCase):
+
+    def test_add_and_pop(self):
+        errors = KVLoadErrors()
+        errors.add(encode_block_runs([3, 4, 9]))
+        errors.add(encode_block_runs([4, 5]))
+        self.assertEqual(errors.pop(), {3, 4, 5, 9})
+        self.assertEqual(errors.pop(), set())
+
+    def test_expected_blocks(self):
+        errors = KVLoadErrors()
+        errors.expect("req1", encode_block_runs([1, 2]))
+        errors.expect("req2", encode_block_runs([7]))
+        errors.resolve("req1", failed=False)
+        errors.resolve("req2", failed=True)
+        # Resolved twice, the blocks are only reported once.
+        errors.resolve("req2", failed=True)
+        self.assertEqual(errors.pop(), {7})
+        self.assertEqual(errors.expected, {})
+
+    def test_concurrent_add(self):
+        errors = KVLoadErrors()
+        threads = [
+            threading.Thread(target=errors.add,
+                             args=(encode_block_runs(range(i * 10,
+                                                           i * 10 + 10)), ))
+            for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors.pop(), set(range(80)))
@@ -0,0 +1,126 @@
+import os
+import unittest
+from unittest.mock import patch
+
+import zmq
+
+from vllm_ascend.distributed import zmq_connection
+from vllm_ascend.distributed.zmq_connection import (
+    ZmqConnectionManager, get_zmq_connection_manager)
+
+PATH_A = "tcp://127.0.0.1:15555"
+PATH_B = "tcp://127.0.0.1:15556"
+
+
+class TestZmqConnectionManager(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = ZmqConnectionManager(max_idle_per_peer=2,
+                                            max_idle_sockets=3)
+
+    def tearDown(self):
+        self.manager.close()
+        self.manager.ctx.term()
+
+    def test_reuse_socket(self):
+        sock = self.manager.acquire(PATH_A)
+        self.manager.release(sock, PATH_A)
+        self.assertIs(self.manager.acquire(PATH_A), sock)
+        self.assertEqual(self.manager.num_created, 1)
+        self.assertEqual(sock.getsockopt(zmq.LINGER), 0)  # type: ignore
+        self.assertEqual(
+            sock.getsockopt(zmq.RECONNECT_IVL_MAX),  # type: ignore
+            self.manager.reconnect_ivl_max_ms)
+        sock.close()
+
+    def test_pool_per_peer_and_type(self):
+        sock = self.manager.acquire(PATH_A)
+        self.manager.release(sock, PATH_A)
+        other_peer = self.manager.acquire(PATH_B)
+        other_type = self.manager.acquire(PATH_A, zmq.DEALER)  # type: ignore
+        self.assertIsNot(other_peer, sock)
+        self.assertIsNot(other_type, sock)
+        self.assertEqual(self.manager.num_created, 3)
+        other_peer.close()
+        other_type.close()
+
+    def test_unhealthy_socket_is_closed(self):
+        sock = self.manager.acquire(PATH_A)
+        self.manager.release(sock, PATH_A, healthy=False)
+        self.assertTrue(sock.closed)
+        self.assertEqual(self.manager.num_idle, 0)
+        new_sock = self.manager.acquire(PATH_A)
+        self.assertIsNot(new_sock, sock)
+        new_sock.close()
+
+    def test_bounded_per_peer(self):
+        sockets = [self.manager.acquire(PATH_A) for _ in range(3)]
+        for sock in sockets:
+            self.manager.release(sock, PATH_A)
+        self.assertEqual(self.manager.num_idle, 2)
+        self.assertTrue(sockets[2].closed)
+
+    def test_bounded_in_total(self):
+        sockets_a = [self.manager.acquire(PATH_A) for _ in range(2)]
+        sockets_b = [self.manager.acquire(PATH_B) for _ in range(2)]
+        for sock in sockets_a:
+            self.manager.release(sock, PATH_A)
+        for sock in sockets_b:
+            self.manager.release(sock, PATH_B)
+        # The least recently used peer loses its oldest socket.
+        self.assertEqual(self.manager.num_idle, 3)
+        self.assertTrue(sockets_a[0].closed)
+        self.assertFalse(sockets_b[1].closed)
+
+    def test_idle_socket_expires(self):
+        sock = self.manager.acquire(PATH_A)
+        with patch.object(zmq_connection.time, "monotonic",
+                          return_value=100.0):
+            self.manager.release(sock, PATH_A)
+        with patch.object(zmq_connection.time,
+                          "monotonic",
+                          return_value=100.0 + self.manager.max_idle_time +
+                          1):
+            new_sock = self.manager.acquire(PATH_A)
+        self.assertIsNot(new_sock, sock)
+        self.assertTrue(sock.closed)
+        new_sock.close()
+
+    def test_connection_closes_socket_on_error(self):
+        with self.manager.connection(PATH_A) as sock:
+            pass
+        self.assertEqual(self.manager.num_idle, 1)
+        with self.assertRaises(RuntimeError):
+            with self.manager.connection(PATH_A) as reused:
+                self.assertIs(reused, sock)
+                raise RuntimeError("timeout")
+        self.assertTrue(sock.closed)
+        self.assertEqual(self.manager.num_idle, 0)
+
+    def test_request_reply(self):
+        router = self.manager.ctx.socket(zmq.ROUTER)  # type: ignore
+        port = router.bind_to_random_port("tcp://127.0.0.1")
+        path = f"tcp://127.0.0.1:{port}"
+        try:
+            for i in range(3):
+                with self.manager.connection(path) as sock:
+                    sock.send(b"ping")
+                    identity, _, msg = router.recv_multipart()
+                    router.send_multipart((identity, b"", msg + b"%d" % i))
+                    self.assertEqual(sock.recv(), b"ping%d" % i)
+            self.assertEqual(self.manager.num_created, 1)
+        finally:
+            router.close(linger=0)
+
+
+class TestGetZmqConnectionManager(unittest.TestCase):
+
+    @patch.object(zmq_connection, "_manager", None)
+    @patch.object(zmq_connection, "_manager_pid", None)
+    def test_one_manager_per_process(self):
+        manager = get_zmq_connection_manager()
+        self.assertIs(get_zmq_connection_manager(), manager)
+        with patch.object(zmq_connection.os,
+                          "getpid",
+                          return_value=os.getpid() + 1):
+            self.assertIsNot(get_zmq_connection_manager(), manager)
@@ -0,0 +1,290 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+from collections import defaultdict, deque
+from unittest import mock
+
+import torch
+
+from tests.ut.base import TestBase
+from vllm_ascend.eplb.eplb_updator import (EplbUpdator, ExpertWeightTransport,
+                                           align_deployment,
+                                           create_eplb_updator,
+                                           default_deployment,
+                                           plan_expert_transfers)
+from vllm_ascend.eplb.policy import rebalance_deployment
+from vllm_ascend.quantization.w8a8_dynamic import \
+    AscendW8A8DynamicFusedMoEMethod
+
+
+class SimulatedEPGroup:
+    """In-process EP group: ranks exchange tensors through FIFO mailboxes."""
+
+    def __init__(self):
+        self.mailboxes = defaultdict(deque)
+
+    def transport(self, rank):
+        group = self
+
+        class _Transport(ExpertWeightTransport):
+
+            def exchange(self, sends, recvs):
+                for dst, tensor in sends:
+                    group.mailboxes[(rank, dst)].append(tensor.clone())
+
+                def wait():
+                    for src, tensor in recvs:
+                        tensor.copy_(group.mailboxes[(src, rank)].popleft())
+
+                return wait
+
+        return _Transport()
+
+
+class FakeMoELayer(torch.nn.Module):
+    """Expert slot ``i`` holds weights filled with its logical expert id."""
+
+    def __init__(self, deployment_row, expert_map, log2phy):
+        super().__init__()
+        local = deployment_row.float()
+        self.w13_weight = torch.nn.Parameter(local.view(-1, 1, 1).repeat(
+            1, 2, 3),
+                                             requires_grad=False)
+        self.w2_weight_scale = torch.nn.Parameter(local.view(-1, 1).clone(),
+                                                  requires_grad=False)
+        self.expert_map = expert_map
+        self.log2phy = log2phy
+
+
+class FakeW8A8MoELayer(torch.nn.Module):
+    """Like ``FakeMoELayer`` with the params of w8a8 dynamic quantization,
+    processed after loading."""
+
+    def __init__(self, deployment_row, expert_map, log2phy):
+        super().__init__()
+        num_local_experts = deployment_row.numel()
+        method = AscendW8A8DynamicFusedMoEMethod()
+        params = {
+            **method.get_weight(num_local_experts, 2, 3, torch.float16),
+            **method.get_dynamic_quant_param(num_local_experts, 2, 3,
+                                             torch.float16)
+        }
+        for name, param in params.items():
+            param.copy_(
+                deployment_row.view(-1, *[1] * (param.dim() - 1)).expand_as(
+                    param))
+            self.register_parameter(
+                name, torch.nn.Parameter(param, requires_grad=False))
+        method.process_weights_after_loading(self)
+        self.expert_map = expert_map
+        self.log2phy = log2phy
+
+
+class TestEplbPlanning(TestBase):
+
+    def test_align_deployment_keeps_slots(self):
+        old = torch.tensor([[0, 1, 2], [3, 4, 5]])
+        new = torch.tensor([[2, 5, 0], [4, 1, 3]])
+        aligned = align_deployment(old, new)
+        self.assertEqual(aligned.tolist(), [[0, 5, 2], [3, 4, 1]])
+
+    def test_plan_expert_transfers(self):
+        old = torch.tensor([[0, 1, 2], [3, 4, 5]])
+        new = torch.tensor([[0, 5, 2], [3, 4, 0]])
+        transfers = plan_expert_transfers(old, new)
+        self.assertEqual(transfers, [(0, 1, 1, 2), (1, 2, 0, 0)])
+        # Local replicas are copied without communication.
+        new = torch.tensor([[0, 1, 1], [3, 4, 5]])
+        self.assertEqual(plan_expert_transfers(old, new), [(0, 2, 0, 1)])
+
+    def test_rebalance_deployment(self):
+        expert_load = torch.tensor([[100, 1, 1, 1, 1, 1, 1, 1]])
+        deployment = rebalance_deployment(expert_load, 4, 3, 1, 1)
+        self.assertEqual(deployment.shape, (1, 4, 3))
+        self.assertEqual(set(deployment.flatten().tolist()), set(range(8)))
+        # The hot expert gets a replica on every rank, but not two on one.
+        self.assertEqual((deployment == 0).sum().item(), 4)
+        self.assertTrue(torch.all((deployment == 0).sum(-1) == 1))
+
+    def test_default_deployment(self):
+        deployment = default_deployment(2, 4, 8)
+        self.assertEqual(deployment[1].tolist(),
+                         [[0, 1], [2, 3], [4, 5], [6, 7]])
+        with self.assertRaises(ValueError):
+            default_deployment(2, 3, 8)
+
+    def test_transport_is_abstract(self):
+        with self.assertRaises(TypeError):
+            ExpertWeightTransport()  # type: ignore[abstract]
+
+
+class TestCreateEplbUpdator(TestBase):
+
+    @mock.patch("vllm.distributed.parallel_state.get_ep_group")
+    @mock.patch("vllm_ascend.ascend_config.get_ascend_config")
+    def test_dynamic_eplb_needs_expert_parallel(self, mock_get_ascend_config,
+                                                mock_get_ep_group):
+        mock_get_ascend_config.return_value.eplb_config.dynamic_eplb = True
+        mock_get_ep_group.return_value.world_size = 1
+        layer = FakeMoELayer(torch.arange(4), None, None)
+        layer.moe_instance_id = 0
+        layer.quant_method = mock.MagicMock()
+        model = torch.nn.ModuleList([layer])
+        with mock.patch("vllm_ascend.ops.fused_moe.AscendFusedMoE",
+                        FakeMoELayer), \
+                self.assertRaisesRegex(RuntimeError, "expert parallel"):
+            create_eplb_updator(model)
+
+
+class TestEplbUpdator(TestBase):
+
+    layer_cls: type = FakeMoELayer
+    num_ranks = 4
+    num_experts = 8
+    num_layers = 3
+    log2phy_policy = "random"
+    log2phy_shape: tuple = (num_experts, )
+
+    def setUp(self):
+        # 3 slots per rank, 4 redundant experts.
+        deployment = torch.tensor([[0, 1, 2], [3, 4, 5], [6, 7, 0],
+                                   [1, 2, 3]]).expand(self.num_layers, -1,
+                                                      -1).clone()
+        self.expert_load = torch.zeros(self.num_layers, self.num_experts)
+        group = SimulatedEPGroup()
+        self.updators = []
+        for rank in range(self.num_ranks):
+            layers = []
+            for layer_id in range(self.num_layers):
+                layers.append(
+                    self.layer_cls(
+                        deployment[layer_id, rank],
+                        torch.empty(self.num_experts, dtype=torch.int32),
+                        torch.empty(self.log2phy_shape, dtype=torch.int32)))
+            updator = EplbUpdator(layers,
+                                  deployment,
+                                  rank,
+                                  group.transport(rank),
+                                  lambda: self.expert_load,
+                                  rebalance_interval=2,
+                                  num_migration_layers_per_step=2,
+                                  num_nodes=2,
+                                  log2phy_policy=self.log2phy_policy,
+                                  log2phy_table_width=4)
+            for layer_id, layer in enumerate(layers):
+                expert_map, log2phy = updator.generate_expert_maps(
+                    deployment[layer_id])
+                layer.expert_map.copy_(expert_map)
+                layer.log2phy.copy_(log2phy)
+            self.updators.append(updator)
+
+    def _step_all(self):
+        for updator in self.updators:
+            updator.step()
+
+    def _check_consistent(self):
+        for rank, updator in enumerate(self.updators):
+            for layer_id, layer in enumerate(updator.layers):
+                deployment = updator.deployment[layer_id]
+                physical = deployment.flatten()
+                local = deployment[rank].float()
+                self.assertTrue(
+                    torch.equal(layer.w13_weight[:, 0, 0].float(), local))
+                self.assertTrue(
+                    torch.equal(layer.w2_weight_scale[:, 0].float(), local))
+                for expert in range(self.num_experts):
+                    slot = layer.expert_map[expert].item()
+                    if slot != -1:
+                        self.assertEqual(deployment[rank, slot].item(),
+                                         expert)
+                    for physical_id in layer.log2phy[expert].flatten():
+                        self.assertEqual(physical[physical_id].item(), expert)
+
+    def test_no_rebalance_without_load(self):
+        for _ in range(4):
+            self._step_all()
+        self.assertFalse(any(u.migrating for u in self.updators))
+        self._check_consistent()
+
+    def test_staged_migration(self):
+        self.expert_load[:, 5] = 1000
+        self.expert_load[:, 6] = 500
+        self.expert_load += 1
+        old_deployment = self.updators[0].deployment.clone()
+
+        # Step 2 plans and stages layers 0-1, step 3 commits them and stages
+        # layer 2, step 4 commits layer 2.
+        self._step_all()
+        self._step_all()
+        self.assertTrue(all(u.migrating for u in self.updators))
+        self.assertTrue(
+            torch.equal(self.updators[0].deployment, old_deployment))
+        self._step_all()
+        self.assertFalse(
+            torch.equal(self.updators[0].deployment[:2], old_deployment[:2]))
+        self.assertTrue(
+            torch.equal(self.updators[0].deployment[2], old_deployment[2]))
+        self._check_consistent()
+        self._step_all()
+        self.assertFalse(any(u.migrating for u in self.updators))
+        self._check_consistent()
+
+        # All ranks agree on the placement, and the hot experts are spread.
+        for updator in self.updators[1:]:
+            self.assertTrue(
+                torch.equal(updator.deployment, self.updators[0].deployment))
+        deployment = self.updators[0].deployment
+        self.assertGreaterEqual((deployment[0] == 5).sum().item(), 2)
+        rank_load = (self.expert_load[0] /
+                     torch.bincount(deployment[0].flatten(),
+                                    minlength=self.num_experts))
+        new_max = rank_load[deployment[0]].sum(-1).max()
+        old_max = (self.expert_load[0] /
+                   torch.bincount(old_deployment[0].flatten(),
+                                  minlength=self.num_experts)
+                   )[old_deployment[0]].sum(-1).max()
+        self.assertLess(new_max, old_max)
+
+        # The next plan only looks at the load seen since this one.
+        self._step_all()
+        self._step_all()
+        self.assertFalse(any(u.migrating for u in self.updators))
+
+
+class TestEplbUpdatorLoadWeighted(TestEplbUpdator):
+
+    log2phy_policy = "load_weighted"
+    log2phy_shape = (TestEplbUpdator.num_experts, 4)
+
+
+class TestEplbUpdatorW8A8Dynamic(TestEplbUpdator):
+
+    layer_cls = FakeW8A8MoELayer
+
+    @mock.patch("vllm_ascend.quantization.w8a8_dynamic.get_mc2_group",
+                side_effect=AttributeError)
+    @mock.patch("vllm_ascend.quantization.w8a8_dynamic.get_ascend_config")
+    @mock.patch("vllm_ascend.quantization.w8a8_dynamic.get_ep_group")
+    def setUp(self, mock_get_ep_group, mock_get_ascend_config,
+              mock_get_mc2_group):
+        super().setUp()
+
+    def _check_consistent(self):
+        super()._check_consistent()
+        # The float32 scales used by MC2 follow the moved experts.
+        for rank, updator in enumerate(self.updators):
+            for layer_id, layer in enumerate(updator.layers):
+                local = updator.deployment[layer_id, rank].float()
+                self.assertTrue(
+                    torch.equal(layer.w13_weight_scale_fp32[:, 0], local))
@@ -0,0 +1,123 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+import os
+import tempfile
+from unittest.mock import MagicMock
+
+import torch
+
+from tests.ut.base import TestBase
+from vllm_ascend.eplb.expert_load_collector import (ExpertLoadCollector,
+                                                    record_expert_load)
+
+
+class TestExpertLoadCollector(TestBase):
+
+    def setUp(self):
+        # Two EP ranks that routed the same tokens.
+        self.ep_group = MagicMock(rank_in_group=0)
+        self.ep_group.all_reduce.side_effect = lambda t: t * 2
+        self.collector = ExpertLoadCollector(reduce_interval=2,
+                                             ep_group=self.ep_group)
+        for layer_id in range(2):
+            self.collector.register_layer(layer_id, 4, torch.device("cpu"))
+
+    def test_register_layer_out_of_order(self):
+        with self.assertRaises(AssertionError):
+            self.collector.register_layer(3, 4, torch.device("cpu"))
+
+    def test_record_and_reduce_on_interval(self):
+        self.collector.record(0, torch.tensor([[0, 1], [1, 3]]))
+        self.collector.record(1, torch.tensor([[2, 2]]))
+        self.collector.step()
+        self.ep_group.all_reduce.assert_not_called()
+        self.assertIsNone(self.collector.expert_load)
+
+        self.collector.record(0, torch.tensor([[0, 0]]))
+        self.collector.step()
+        self.ep_group.all_reduce.assert_called_once()
+        expected = torch.tensor([[6, 4, 0, 2], [0, 0, 4, 0]])
+        self.assertTrue(torch.equal(self.collector.expert_load, expected))
+
+        # The local counters restart after every reduction.
+        self.collector.record(1, torch.tensor([[3, 3]]))
+        self.collector.step()
+        self.collector.step()
+        expected[1, 3] += 4
+        self.assertTrue(torch.equal(self.collector.expert_load, expected))
+
+    def test_dump(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dump_path = os.path.join(tmp_dir, "expert_load.pt")
+            self.collector.dump_path = dump_path
+            self.collector.record(0, torch.tensor([[1, 2]]))
+            self.collector.reduce()
+            workload = torch.load(dump_path)
+        self.assertEqual(workload.shape, (2, 4))
+        self.assertTrue(
+            torch.equal(workload, torch.tensor([[0, 2, 2, 0], [0, 0, 0,
+                                                               0]])))
+
+    def test_reset(self):
+        self.collector.record(0, torch.tensor([[1]]))
+        self.collector.reduce()
+        self.collector.record(0, torch.tensor([[1]]))
+        self.collector.reset()
+        self.assertIsNone(self.collector.expert_load)
+        self.assertTrue(torch.equal(self.collector.reduce(),
+                                    torch.zeros(2, 4, dtype=torch.int64)))
+
+    def test_coactivation(self):
+        collector = ExpertLoadCollector(reduce_interval=1,
+                                        ep_group=self.ep_group,
+                                        collect_coactivation=True)
+        for layer_id in range(2):
+            collector.register_layer(layer_id, 4, torch.device("cpu"))
+        collector.record(0, torch.tensor([[0, 1], [1, 3]]))
+        collector.step()
+        coactivation = collector.expert_coactivation
+        self.assertEqual(coactivation.shape, (2, 4, 4))
+        expected = torch.zeros(4, 4, dtype=torch.int64)
+        for i, j in [(0, 1), (1, 3)]:
+            expected[i, j] = expected[j, i] = 2
+            expected[i, i] += 2
+            expected[j, j] += 2
+        self.assertTrue(torch.equal(coactivation[0], expected))
+        # The diagonal is the expert load.
+        self.assertTrue(
+            torch.equal(coactivation.diagonal(dim1=-2, dim2=-1),
+                        collector.expert_load))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dump_path = os.path.join(tmp_dir, "coactivation.pt")
+            collector.coactivation_dump_path = dump_path
+            collector.record(1, torch.tensor([[2, 2]]))
+            collector.step()
+            dumped = torch.load(dump_path)
+        self.assertEqual(dumped[1, 2, 2].item(), 8)
+        collector.reset()
+        self.assertIsNone(collector.expert_coactivation)
+
+    def test_record_expert_load(self):
+        layer = MagicMock(moe_instance_id=1,
+                          expert_load_collector=self.collector)
+        record_expert_load(layer, torch.tensor([[0, 3]]))
+        self.assertTrue(
+            torch.equal(self.collector.reduce()[1],
+                        torch.tensor([2, 0, 0, 2])))
+
+        # Layers without a collector are skipped.
+        record_expert_load(MagicMock(expert_load_collector=None),
+                           torch.tensor([[0]]))
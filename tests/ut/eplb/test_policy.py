@@ -0,0 +1,121 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+import torch
+
+from tests.ut.base import TestBase
+from vllm_ascend.eplb.policy import (balanced_packing, rebalance_deployment,
+                                     rebalance_experts, replicate_experts,
+                                     spread_replicas)
+
+
+def balanced_packing_reference(weight, num_packs):
+    # Sequential greedy packing, one layer and one item at a time.
+    num_layers, num_items = weight.shape
+    items_per_pack = num_items // num_packs
+    indices = weight.float().sort(-1, descending=True).indices
+    pack_index = torch.full_like(indices, -1)
+    rank_in_pack = torch.full_like(indices, -1)
+    for i in range(num_layers):
+        pack_weights = [0.0] * num_packs
+        pack_items = [0] * num_packs
+        for item in indices[i].tolist():
+            pack = min((p for p in range(num_packs)
+                        if pack_items[p] < items_per_pack),
+                       key=pack_weights.__getitem__)
+            pack_index[i, item] = pack
+            rank_in_pack[i, item] = pack_items[pack]
+            pack_weights[pack] += weight[i, item].item()
+            pack_items[pack] += 1
+    return pack_index, rank_in_pack
+
+
+class TestEplbPolicy(TestBase):
+
+    def test_balanced_packing_matches_greedy(self):
+        torch.manual_seed(0)
+        # Integer loads keep the float sums exact, so ties break the same.
+        weight = torch.randint(0, 1000, (5, 24)).float()
+        for num_packs in (2, 4, 6):
+            pack_index, rank_in_pack = balanced_packing(weight, num_packs)
+            ref_pack_index, ref_rank_in_pack = balanced_packing_reference(
+                weight, num_packs)
+            self.assertTrue(torch.equal(pack_index, ref_pack_index))
+            self.assertTrue(torch.equal(rank_in_pack, ref_rank_in_pack))
+
+    def test_balanced_packing_fills_packs(self):
+        weight = torch.tensor([[5.0, 5.0, 5.0, 5.0, 1.0, 1.0]])
+        pack_index, rank_in_pack = balanced_packing(weight, 3)
+        self.assertEqual(torch.bincount(pack_index[0]).tolist(), [2, 2, 2])
+        self.assertEqual(sorted(rank_in_pack[0].tolist()), [0, 0, 0, 1, 1, 1])
+
+    def test_balanced_packing_one_item_per_pack(self):
+        weight = torch.rand(2, 4)
+        pack_index, rank_in_pack = balanced_packing(weight, 4)
+        self.assertEqual(pack_index.tolist(), [[0, 1, 2, 3]] * 2)
+        self.assertTrue(torch.all(rank_in_pack == 0))
+
+    def test_replicate_experts(self):
+        weight = torch.tensor([[90.0, 30.0, 10.0], [10.0, 10.0, 40.0]])
+        phy2log, rank, logcnt = replicate_experts(weight, 6)
+        self.assertEqual(logcnt.tolist(), [[4, 1, 1], [1, 1, 4]])
+        self.assertEqual(phy2log[0].tolist(), [0, 1, 2, 0, 0, 0])
+        self.assertEqual(rank[0].tolist(), [0, 0, 0, 1, 2, 3])
+        self.assertEqual(phy2log[1].tolist(), [0, 1, 2, 2, 2, 2])
+
+    def test_replicate_experts_max_replicas(self):
+        weight = torch.tensor([[90.0, 30.0, 10.0]])
+        phy2log, rank, logcnt = replicate_experts(weight, 6, max_replicas=2)
+        self.assertEqual(logcnt.tolist(), [[2, 2, 2]])
+        self.assertEqual(rank[0].tolist(), [0, 0, 0, 1, 1, 1])
+
+    def test_spread_replicas(self):
+        # 2 nodes of 2 GPUs; GPU 0 holds expert 0 twice.
+        phy2log = torch.tensor([[0, 0, 1, 2, 3, 4, 5, 6]])
+        replica_weight = torch.tensor([[4.0, 4.0, 5.0, 1.0, 4.0, 1.0, 1.0,
+                                        1.0]])
+        perm = spread_replicas(phy2log, replica_weight, 4, 2)
+        # The duplicate swaps with the replica of its node with the closest
+        # weight.
+        self.assertEqual(phy2log.gather(-1, perm).tolist(),
+                         [[0, 1, 0, 2, 3, 4, 5, 6]])
+
+    def test_rebalance_experts(self):
+        torch.manual_seed(0)
+        weight = torch.randint(1, 100, (3, 16)).float()
+        phy2log, log2phy, logcnt = rebalance_experts(weight, 24, 4, 2, 4)
+        self.assertEqual(phy2log.shape, (3, 24))
+        self.assertTrue(torch.all(logcnt >= 1))
+        self.assertTrue(torch.all(logcnt.sum(-1) == 24))
+        for layer in range(3):
+            for expert in range(16):
+                replicas = log2phy[layer, expert]
+                replicas = replicas[replicas != -1]
+                self.assertEqual(len(replicas), logcnt[layer, expert])
+                self.assertTrue(torch.all(phy2log[layer, replicas] == expert))
+
+    def test_no_duplicate_experts_on_a_rank(self):
+        torch.manual_seed(0)
+        # A few hot experts would get more replicas than there are ranks.
+        weight = torch.rand(4, 16)
+        weight[:, :2] *= 1000
+        for num_groups, num_nodes in ((4, 2), (1, 1), (3, 2)):
+            deployment = rebalance_deployment(weight, 4, 8, num_groups,
+                                              num_nodes)
+            for layer in deployment:
+                self.assertEqual(set(layer.flatten().tolist()),
+                                 set(range(16)))
+                for rank_experts in layer.tolist():
+                    self.assertEqual(len(set(rank_experts)),
+                                     len(rank_experts))
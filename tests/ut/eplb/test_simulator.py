@@ -0,0 +1,86 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+import torch
+
+from tests.ut.base import TestBase
+from vllm_ascend.eplb.simulator import (expert_nodes, replica_load_variance,
+                                        simulate_cross_node_bytes,
+                                        simulate_replica_load)
+from vllm_ascend.ops.expert_load_balancer import (build_expert_placement_map,
+                                                  build_log2phy_table)
+
+
+class TestSimulator(TestBase):
+
+    def setUp(self):
+        # 2 nodes of 1 rank; expert 3 is replicated on both nodes.
+        self.deployment = torch.tensor([[[0, 1, 3], [2, 3, 3]]])
+
+    def test_expert_nodes(self):
+        has_expert = expert_nodes(self.deployment, 4, 2)
+        self.assertEqual(has_expert[0].tolist(),
+                         [[True, False], [True, False], [False, True],
+                          [True, True]])
+
+    def test_simulate_cross_node_bytes(self):
+        # Token 0 is on node 0, token 1 on node 1.
+        topk_ids = torch.tensor([[[2, 3], [0, 1]]])
+        bytes_per_token = 2 * 4 * 2
+        # Token 0 sends to node 1 for expert 2 only, token 1 reaches node 0
+        # once for both experts.
+        self.assertEqual(
+            simulate_cross_node_bytes(self.deployment, topk_ids, 4, 2,
+                                      4).tolist(), [2 * bytes_per_token])
+        self.assertEqual(
+            simulate_cross_node_bytes(self.deployment,
+                                      topk_ids,
+                                      4,
+                                      2,
+                                      4,
+                                      dedup_by_node=False).tolist(),
+            [3 * bytes_per_token])
+
+    def test_remote_replica_reused(self):
+        # 3 nodes; a token on node 0 needs experts 1 and 2, expert 1 lives on
+        # nodes 1 and 2 and expert 2 only on node 2.
+        deployment = torch.tensor([[[0, 0], [1, 1], [1, 2]]])
+        topk_ids = torch.tensor([[[2, 1]]])
+        self.assertEqual(
+            simulate_cross_node_bytes(deployment, topk_ids, 3, 3,
+                                      1).tolist(), [4])
+
+    def test_replica_load_variance(self):
+        # Expert 0 is replicated on ranks 0 and 1, rank 2 sends it 8 tokens.
+        deployment = torch.tensor([[0, 1], [0, 2], [3, 4]])
+        placement = build_expert_placement_map(deployment, 5)
+        topk_ids = torch.zeros(3, 8, 1, dtype=torch.int64)
+        topk_ids[:2] = 3
+        static = build_log2phy_table(deployment, placement, 5, "nearest")
+        table = build_log2phy_table(deployment,
+                                    placement,
+                                    5,
+                                    "round_robin",
+                                    width=2)
+        static_load = simulate_replica_load(static, topk_ids, 6)
+        self.assertEqual(static_load.tolist(), [0, 0, 8, 0, 16, 0])
+        table_load = simulate_replica_load(table, topk_ids, 6)
+        self.assertEqual(table_load.tolist(), [4, 0, 4, 0, 16, 0])
+
+        expert_variance, rank_variance = replica_load_variance(
+            deployment, static_load)
+        self.assertEqual(expert_variance.tolist(), [16.0, 0, 0, 0, 0])
+        expert_variance, _ = replica_load_variance(deployment, table_load)
+        self.assertEqual(expert_variance[0].item(), 0)
+        self.assertAlmostEqual(rank_variance.item(), 128 / 3)
@@ -0,0 +1,79 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+import torch
+
+from tests.ut.base import TestBase
+from vllm_ascend.eplb.policy import rebalance_deployment
+from vllm_ascend.eplb.simulator import simulate_cross_node_bytes
+from vllm_ascend.eplb.topology_policy import (compute_coactivation,
+                                              node_load_imbalance,
+                                              rebalance_experts_topology_aware)
+
+
+def clustered_trace(num_layers, num_tokens, num_experts, top_k,
+                    num_clusters):
+    # Each token mostly picks experts of one cluster; expert ids of a
+    # cluster are strided so that the default placement splits clusters.
+    topk_ids = []
+    for _ in range(num_layers):
+        cluster = torch.randint(0, num_clusters, (num_tokens, 1))
+        in_cluster = torch.arange(num_experts) % num_clusters == cluster
+        probs = torch.where(in_cluster, 1.0, 0.02)
+        topk_ids.append(torch.multinomial(probs, top_k))
+    return torch.stack(topk_ids)
+
+
+class TestTopologyPolicy(TestBase):
+
+    def test_compute_coactivation(self):
+        topk_ids = torch.tensor([[[0, 1], [1, 2]]])
+        coactivation = compute_coactivation(topk_ids, 3)
+        self.assertEqual(coactivation[0].tolist(),
+                         [[1, 1, 0], [1, 2, 1], [0, 1, 1]])
+
+    def test_rebalance_experts_topology_aware(self):
+        torch.manual_seed(0)
+        num_layers, num_experts, num_nodes = 2, 32, 4
+        num_ranks, num_local_experts = 8, 5
+        trace = clustered_trace(num_layers, 2048, num_experts, 4, num_nodes)
+        expert_load = torch.zeros(num_layers, num_experts).scatter_add_(
+            -1, trace.view(num_layers, -1),
+            torch.ones(num_layers, trace[0].numel()))
+        coactivation = compute_coactivation(trace, num_experts)
+
+        deployment = rebalance_experts_topology_aware(expert_load,
+                                                      coactivation, num_ranks,
+                                                      num_local_experts,
+                                                      num_nodes)
+        self.assertEqual(deployment.shape,
+                         (num_layers, num_ranks, num_local_experts))
+        for layer in range(num_layers):
+            self.assertEqual(set(deployment[layer].flatten().tolist()),
+                             set(range(num_experts)))
+        node_imbalance, _ = node_load_imbalance(deployment, expert_load,
+                                                num_nodes)
+        self.assertTrue(torch.all(node_imbalance <= 1.05 + 1e-4))
+
+        balanced = rebalance_deployment(expert_load, num_ranks,
+                                        num_local_experts, 1, 1)
+        test_trace = clustered_trace(num_layers, 2048, num_experts, 4,
+                                     num_nodes)
+        topology_bytes = simulate_cross_node_bytes(deployment, test_trace,
+                                                   num_experts, num_nodes,
+                                                   128)
+        balanced_bytes = simulate_cross_node_bytes(balanced, test_trace,
+                                                   num_experts, num_nodes,
+                                                   128)
+        self.assertLess(topology_bytes.sum(), 0.8 * balanced_bytes.sum())
@@ -3,12 +3,23 @@
 # Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
 
 import os
+import threading
+import time
 import types
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import pytest
 
 from tests.ut.kv_connector.utils import (create_request, create_scheduler,
                                          create_vllm_config)
+from vllm_ascend.distributed.block_runs import encode_block_runs
 from vllm_ascend.distributed.llmdatadist_c_mgr_connector import (
-    LLMDataDistCMgrConnectorMetadata, LLMDataDistCMgrConnectorWorker, LLMRole)
+    KVPullEngine, LLMDataDistCMgrConnectorMetadata,
+    LLMDataDistCMgrConnectorScheduler, LLMDataDistCMgrConnectorWorker,
+    LLMException, LLMRole)
+from vllm_ascend.distributed.transfer_retry import (KVLoadErrors,
+                                                    TransferRetryPolicy)
 
 
 def test_basic_inferface():
@@ -44,6 +55,264 @@ def test_basic_inferface():
             single_type_managers[0].req_to_blocks[request_id]):
         assert block_id == block.block_id
 
+    # The workers connect to the remote agent ahead of later requests.
+    assert kv_connector_metadata.remote_agents_to_prefetch == {("my-host",
+                                                                1234, 1)}
+
+
+def test_remote_cluster_id_cache():
+    worker = types.SimpleNamespace(remote_cluster_ids={},
+                                   handshake_ttl=10,
+                                   remote_agent_lock=threading.Lock())
+    worker.connect_to_remote_agent = MagicMock(side_effect=[1, 2])
+
+    def get_remote_cluster_id(host, port):
+        return LLMDataDistCMgrConnectorWorker._get_remote_cluster_id(
+            worker, host, port)
+
+    assert get_remote_cluster_id("my-host", 1234) == 1
+    assert get_remote_cluster_id("my-host", 1234) == 1
+    worker.connect_to_remote_agent.assert_called_once_with("my-host", 1234)
+
+    # Expired entries are queried again.
+    cluster_id, handshake_time = worker.remote_cluster_ids[("my-host", 1234)]
+    worker.remote_cluster_ids[("my-host", 1234)] = (cluster_id,
+                                                   handshake_time - 11)
+    assert get_remote_cluster_id("my-host", 1234) == 2
+    assert worker.connect_to_remote_agent.call_count == 2
+
+
+class BlockingPulls:
+    """Pulls that wait until released, recording how many run at once."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+        self.running: list[str] = []
+        self.started: list[str] = []
+        self.max_running = 0
+
+    def pull(self, name):
+
+        def fn():
+            with self.lock:
+                self.running.append(name)
+                self.started.append(name)
+                self.max_running = max(self.max_running, len(self.running))
+            self.release.wait(5)
+            with self.lock:
+                self.running.remove(name)
+            return name
+
+        return fn
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_pull_engine_concurrent_remotes():
+    engine = KVPullEngine(max_concurrent_pulls=2)
+    pulls = BlockingPulls()
+    futures = [
+        engine.submit("p0", 0, pulls.pull("p0-a")),
+        engine.submit("p0", 0, pulls.pull("p0-b")),
+        engine.submit("p1", 0, pulls.pull("p1-a")),
+    ]
+    # One pull per remote, the two remotes at the same time.
+    assert _wait_until(lambda: len(pulls.running) == 2)
+    assert sorted(pulls.running) == ["p0-a", "p1-a"]
+    pulls.release.set()
+    assert [future.result(5) for future in futures] == ["p0-a", "p0-b", "p1-a"]
+    assert pulls.max_running == 2
+    assert pulls.started.index("p0-b") > pulls.started.index("p0-a")
+    assert engine.num_inflight == 0
+    assert not engine.queues
+
+
+def test_pull_engine_global_limit_round_robin():
+    engine = KVPullEngine(max_concurrent_pulls=1, max_pulls_per_remote=4)
+    pulls = BlockingPulls()
+    pulls.release.set()
+    blocker = threading.Event()
+    first = engine.submit("p0", 0, lambda: blocker.wait(5))
+    futures = [
+        engine.submit(remote, 0, pulls.pull(f"{remote}-{i}"))
+        for i in range(2) for remote in ("p0", "p0", "p1")
+    ]
+    blocker.set()
+    first.result(5)
+    for future in futures:
+        future.result(5)
+    assert pulls.max_running == 1
+    # The remotes take turns.
+    assert [name[:2] for name in pulls.started[:4]] == ["p0", "p1", "p0", "p1"]
+
+
+def test_pull_engine_error():
+    engine = KVPullEngine(max_concurrent_pulls=2)
+
+    def fail():
+        raise RuntimeError("pull failed")
+
+    future = engine.submit("p0", 0, fail)
+    with pytest.raises(RuntimeError, match="pull failed"):
+        future.result(5)
+    # The remote is free again.
+    assert engine.submit("p0", 0, lambda: 1).result(5) == 1
+
+
+def test_pull_engine_bandwidth_limit():
+    engine = KVPullEngine(max_concurrent_pulls=4, max_bandwidth=1)
+    sleeps: list[float] = []
+    with patch("vllm_ascend.distributed.llmdatadist_c_mgr_connector.time."
+               "sleep", side_effect=sleeps.append):
+        futures = [
+            engine.submit(f"p{i}", int(0.5e9), lambda: None)
+            for i in range(3)
+        ]
+        for future in futures:
+            future.result(5)
+    # 0.5 GB each at 1 GB/s, the later pulls start 0.5 s and 1 s later.
+    assert len(sleeps) == 2
+    assert sorted(sleeps) == pytest.approx([0.5, 1.0], abs=0.05)
+
+
+def test_mla_sub_caches_pulled_concurrently():
+    # Both pulls must be running at once to pass the barrier.
+    barrier = threading.Barrier(2, timeout=5)
+    worker = types.SimpleNamespace(
+        tp_rank=0,
+        use_mla=True,
+        cache=("k_normed", "k_pe"),
+        cache_manager=MagicMock(),
+        sub_cache_executor=ThreadPoolExecutor(2),
+        thread_lock=threading.Lock(),
+        finished_reqs=set(),
+        retry_policy=TransferRetryPolicy(),
+        load_errors=KVLoadErrors(),
+        send_finish_to_remote=MagicMock(),
+        _get_remote_cluster_id=MagicMock(return_value=1))
+    worker.cache_manager.pull_blocks.side_effect = \
+        lambda *args: barrier.wait()
+    LLMDataDistCMgrConnectorWorker._read_blocks(
+        worker,
+        local_block_runs=encode_block_runs([4, 5]),
+        remote_block_runs=encode_block_runs([1, 2, 3]),
+        remote_ip="my-host",
+        remote_port=1234,
+        remote_engine_id="prefill",
+        request_id="req1",
+        remote_tp_size="1",
+        num_cached_blocks=1)
+    caches = [
+        call.args[1] for call in worker.cache_manager.pull_blocks.mock_calls
+    ]
+    assert sorted(caches) == ["k_normed", "k_pe"]
+    # The remote blocks after the prefix cache hit are pulled.
+    assert worker.cache_manager.pull_blocks.mock_calls[0].args[2:] == ([2, 3],
+                                                                       [4, 5])
+    worker.send_finish_to_remote.assert_called_once_with(
+        "my-host", 1234, "req1")
+    assert worker.finished_reqs == {"req1"}
+
+
+def _make_pulling_worker(retry_policy):
+    worker = types.SimpleNamespace(
+        tp_rank=0,
+        use_mla=False,
+        cache="cache",
+        cache_manager=MagicMock(),
+        thread_lock=threading.Lock(),
+        finished_reqs=set(),
+        retry_policy=retry_policy,
+        load_errors=KVLoadErrors(),
+        remote_cluster_ids={("my-host", 1234): (1, time.monotonic())},
+        send_finish_to_remote=MagicMock())
+    worker._get_remote_cluster_id = MagicMock(
+        side_effect=lambda host, port: worker.remote_cluster_ids.setdefault(
+            (host, port), (2, time.monotonic()))[0])
+    return worker
+
+
+def _read_blocks(worker):
+    LLMDataDistCMgrConnectorWorker._read_blocks(
+        worker,
+        local_block_runs=encode_block_runs([4, 5]),
+        remote_block_runs=encode_block_runs([1, 2]),
+        remote_ip="my-host",
+        remote_port=1234,
+        remote_engine_id="prefill",
+        request_id="req1",
+        remote_tp_size="1")
+
+
+def test_failed_pull_retried():
+    worker = _make_pulling_worker(
+        TransferRetryPolicy(max_retries=2, backoff=0.01))
+    worker.cache_manager.pull_blocks.side_effect = [
+        LLMException("timeout"), None
+    ]
+    _read_blocks(worker)
+    assert worker.cache_manager.pull_blocks.call_count == 2
+    # The remote agent is queried again before the retry.
+    assert worker._get_remote_cluster_id.call_count == 2
+    assert worker.remote_cluster_ids[("my-host", 1234)][0] == 2
+    assert worker.finished_reqs == {"req1"}
+    assert worker.load_errors.pop() == set()
+
+
+def test_failed_pull_reports_blocks():
+    worker = _make_pulling_worker(
+        TransferRetryPolicy(max_retries=1, backoff=0.01))
+    worker.cache_manager.pull_blocks.side_effect = LLMException("timeout")
+    _read_blocks(worker)
+    assert worker.cache_manager.pull_blocks.call_count == 2
+    # The request finishes, its blocks are recomputed.
+    worker.send_finish_to_remote.assert_called_once_with(
+        "my-host", 1234, "req1")
+    assert worker.finished_reqs == {"req1"}
+    assert worker.load_errors.pop() == {4, 5}
+
+
+def test_prefix_cache_hit_not_pulled():
+    vllm_config = MagicMock()
+    vllm_config.cache_config.block_size = 16
+    vllm_config.parallel_config.data_parallel_rank_local = 0
+    vllm_config.parallel_config.tensor_parallel_size = 1
+    scheduler = LLMDataDistCMgrConnectorScheduler(vllm_config, "decode")
+    request = types.SimpleNamespace(request_id="req1",
+                                    prompt_token_ids=list(range(40)),
+                                    kv_transfer_params={
+                                        "do_remote_prefill": True,
+                                        "remote_block_ids": [1, 2, 3],
+                                        "remote_engine_id": "prefill",
+                                        "remote_host": "my-host",
+                                        "remote_port": 1234,
+                                        "remote_tp_size": 1,
+                                    })
+
+    # The first block is a local prefix cache hit.
+    assert scheduler.get_num_new_matched_tokens(request, 16) == (24, True)
+    blocks = MagicMock()
+    blocks.get_block_ids.return_value = ([9, 4, 5], )
+    blocks.get_unhashed_block_ids.return_value = [4, 5]
+    scheduler.update_state_after_alloc(request, blocks, 24)
+    req_meta = scheduler.build_connector_meta(MagicMock()).requests["req1"]
+    assert req_meta.local_block_ids == [4, 5]
+    assert req_meta.remote_block_ids == [1, 2, 3]
+    assert req_meta.num_cached_blocks == 1
+
+    # Only the tokens the remote blocks hold are loaded.
+    request.kv_transfer_params.update(do_remote_prefill=True,
+                                      remote_block_ids=[1, 2])
+    assert scheduler.get_num_new_matched_tokens(request, 16) == (16, True)
+
 
 def test_read_agent_metadata():
     rank_table = {
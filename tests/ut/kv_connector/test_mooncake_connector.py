@@ -6,12 +6,14 @@ import threading
 import time
 import types
 import unittest
-from collections import defaultdict, deque
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import MagicMock, patch
 
 import msgspec
 import zmq
 from vllm.utils import make_zmq_path
+from vllm.v1.request import RequestStatus
 from zmq import Context  # type: ignore
 
 fake_engine = types.ModuleType("mooncake.engine")
@@ -19,11 +21,16 @@ fake_engine.TransferEngine = MagicMock()  # type: ignore[attr-defined]
 sys.modules["mooncake.engine"] = fake_engine
 
 from vllm_ascend.distributed.mooncake_connector import (  # noqa: E402
-    KVCacheRecvingThread, KVCacheSendingThread, KVCacheTaskTracker,
-    KVConnectorRole, MooncakeAgentMetadata, MooncakeConnector,
-    MooncakeConnectorMetadata, MooncakeConnectorScheduler,
-    MooncakeConnectorWorker, ReqMeta, ensure_zmq_recv, ensure_zmq_send,
-    group_concurrent_contiguous, string_to_int64_hash, zmq_ctx)
+    KVCacheDoneRecvingNotifier, KVCacheRecvingThread, KVCacheSendingThread,
+    KVCacheTaskTracker, KVCacheTransferPipeline, KVConnectorRole,
+    MooncakeAgentMetadata, MooncakeConnector, MooncakeConnectorMetadata,
+    MooncakeConnectorScheduler, MooncakeConnectorWorker, ReqMeta,
+    TransferChunk, TransferChunksError, ensure_zmq_recv, ensure_zmq_send,
+    group_concurrent_contiguous, split_transfer_chunks, string_to_int64_hash,
+    zmq_ctx)
+from vllm_ascend.distributed.block_runs import encode_block_runs  # noqa: E402
+from vllm_ascend.distributed.transfer_retry import \
+    TransferRetryPolicy  # noqa: E402
 
 GET_META_MSG = b"get_meta_msg"
 DONE_RECVING_MSG = b"done_recving_msg"
@@ -421,6 +428,356 @@ class TestKVCacheSendingThread(unittest.TestCase):
         context.term()
 
 
+class FakeTransferEngine:
+    """Transfer engine over one bytearray, addresses are offsets into it."""
+
+    def __init__(self, size):
+        self.memory = bytearray(size)
+        self.writes = []
+
+    def batch_transfer_sync_write(self, session_id, src_list, dst_list,
+                                  length_list):
+        for src, dst, length in zip(src_list, dst_list, length_list):
+            self.memory[dst:dst + length] = self.memory[src:src + length]
+        self.writes.append((session_id, src_list, dst_list, length_list))
+        return 0
+
+
+class FakeEvent:
+
+    def __init__(self):
+        self.synchronized = False
+
+    def synchronize(self):
+        self.synchronized = True
+
+
+def _get_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('', 0))
+        return s.getsockname()[1]
+
+
+def _wait_until(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestLayerwiseStreaming(unittest.TestCase):
+
+    BLOCK_LEN = 4
+    NUM_BLOCKS = 4
+    NUM_LAYERS = 2
+
+    def setUp(self):
+        # Key and value caches of 2 layers on each side.
+        region_len = self.BLOCK_LEN * self.NUM_BLOCKS
+        num_caches = 2 * self.NUM_LAYERS
+        self.engine = FakeTransferEngine(2 * num_caches * region_len)
+        self.prefill_addrs = [i * region_len for i in range(num_caches)]
+        self.decode_addrs = [(num_caches + i) * region_len
+                             for i in range(num_caches)]
+        self.engine.memory[:num_caches * region_len] = bytes(
+            range(1, num_caches * region_len + 1))
+        self.host = "127.0.0.1"
+        self.prefill_port = _get_free_port()
+        self.decode_port = _get_free_port()
+        suffix = str(self.prefill_port)
+
+        send_ready = threading.Event()
+        self.sending_thread = KVCacheSendingThread(
+            tp_rank=0,
+            decode_tp_size=1,
+            local_engine_id="prefill_" + suffix,
+            side_channel_host=self.host,
+            side_channel_port=self.prefill_port,
+            metadata=MooncakeAgentMetadata(
+                engine_id="prefill_" + suffix,
+                te_rpc_port=9090,
+                kv_caches_base_addr=self.prefill_addrs,
+                num_blocks=self.NUM_BLOCKS),
+            ready_event=send_ready,
+            engine=self.engine,
+            block_len=[self.BLOCK_LEN],
+            num_layers=self.NUM_LAYERS)
+        self.sending_thread.start()
+        recv_ready = threading.Event()
+        self.recving_thread = KVCacheRecvingThread(
+            tp_rank=0,
+            tp_size=1,
+            engine=self.engine,
+            local_engine_id="decode_" + suffix,
+            local_handshake_port=self.decode_port,
+            local_kv_caches_base_addr=self.decode_addrs,
+            block_len=[self.BLOCK_LEN],
+            ready_event=recv_ready,
+            layerwise=True,
+            local_host=self.host,
+            te_rpc_port=9191)
+        self.recving_thread.start()
+        self.assertTrue(send_ready.wait(timeout=3))
+        self.assertTrue(recv_ready.wait(timeout=3))
+
+    def _block(self, addr, block_id):
+        start = addr + block_id * self.BLOCK_LEN
+        return self.engine.memory[start:start + self.BLOCK_LEN]
+
+    def _recving_finished(self):
+        return "req1" in self.recving_thread.task_tracker.finished_requests
+
+    def test_layers_streamed_as_computed(self):
+        prefill_block_ids, decode_block_ids = [1, 2, 3], [2, 0]
+        self.sending_thread.add_request("req1",
+                                        encode_block_runs(prefill_block_ids),
+                                        0)
+        layer0_event = FakeEvent()
+        # Layer 0 is computed before the decoder says hello.
+        self.sending_thread.mark_layers_ready(["req1"], [0], layer0_event)
+        self.recving_thread.add_request(
+            request_id="req1",
+            local_block_runs=encode_block_runs(decode_block_ids),
+            remote_block_runs=encode_block_runs([]),
+            remote_engine_id="prefill",
+            remote_host=self.host,
+            remote_handshake_port=self.prefill_port)
+
+        self.assertTrue(_wait_until(lambda: len(self.engine.writes) == 1))
+        self.assertTrue(layer0_event.synchronized)
+        session_id, _, _, length_list = self.engine.writes[0]
+        self.assertEqual(session_id, f"{self.host}:9191")
+        # Keys and values of layer 0, the decoder holds 2 blocks.
+        self.assertEqual(sum(length_list), 2 * 2 * self.BLOCK_LEN)
+        time.sleep(0.1)
+        self.assertFalse(self._recving_finished())
+
+        # The last layer lands, then the decoder is told.
+        self.sending_thread.mark_layers_ready(["req1"], [0, 1], FakeEvent())
+        self.assertTrue(_wait_until(self._recving_finished))
+        self.assertEqual(len(self.engine.writes), 2)
+        for prefill_addr, decode_addr in zip(self.prefill_addrs,
+                                             self.decode_addrs):
+            for src, dst in zip(prefill_block_ids, decode_block_ids):
+                self.assertEqual(self._block(decode_addr, dst),
+                                 self._block(prefill_addr, src))
+        self.assertEqual(self.sending_thread.get_and_clear_finished_requests(),
+                         {"req1"})
+        self.assertEqual(self.sending_thread.prefiller_meta, {})
+        self.assertEqual(self.sending_thread.decoder_meta, {})
+
+    def test_prefix_cache_hit_not_streamed(self):
+        prefill_block_ids, decode_block_ids = [1, 2, 3], [2, 0]
+        self.sending_thread.add_request("req1",
+                                        encode_block_runs(prefill_block_ids),
+                                        0)
+        # The decoder holds the first block in its prefix cache.
+        self.recving_thread.add_request(
+            request_id="req1",
+            local_block_runs=encode_block_runs(decode_block_ids),
+            remote_block_runs=encode_block_runs([]),
+            remote_engine_id="prefill",
+            remote_host=self.host,
+            remote_handshake_port=self.prefill_port,
+            num_cached_blocks=1)
+        self.assertTrue(
+            _wait_until(lambda: "req1" in self.sending_thread.decoder_meta))
+        self.sending_thread.mark_layers_ready(["req1"], [0, 1], FakeEvent())
+
+        self.assertTrue(_wait_until(self._recving_finished))
+        for _, _, _, length_list in self.engine.writes:
+            self.assertEqual(sum(length_list), 2 * 2 * self.BLOCK_LEN)
+        for prefill_addr, decode_addr in zip(self.prefill_addrs,
+                                             self.decode_addrs):
+            for src, dst in zip(prefill_block_ids[1:], decode_block_ids):
+                self.assertEqual(self._block(decode_addr, dst),
+                                 self._block(prefill_addr, src))
+
+    def test_hello_failure_does_not_hang(self):
+        self.recving_thread.timeout = 0.1
+        with patch('vllm_ascend.distributed.mooncake_connector.logger'):
+            self.recving_thread.add_request(
+                request_id="req1",
+                local_block_runs=encode_block_runs([0]),
+                remote_block_runs=encode_block_runs([]),
+                remote_engine_id="prefill",
+                remote_host=self.host,
+                remote_handshake_port=_get_free_port())
+            self.assertTrue(_wait_until(self._recving_finished, timeout=5))
+        # No layer arrived, the block is recomputed.
+        self.assertEqual(self.recving_thread.load_errors.pop(), {0})
+
+    def test_failed_layer_reported(self):
+        self.sending_thread.add_request("req1", encode_block_runs([1, 2, 3]),
+                                        0)
+        self.recving_thread.add_request(
+            request_id="req1",
+            local_block_runs=encode_block_runs([2, 0]),
+            remote_block_runs=encode_block_runs([]),
+            remote_engine_id="prefill",
+            remote_host=self.host,
+            remote_handshake_port=self.prefill_port)
+        self.assertTrue(
+            _wait_until(lambda: "req1" in self.sending_thread.decoder_meta))
+        with patch.object(self.engine,
+                          "batch_transfer_sync_write",
+                          return_value=-1), \
+                patch('vllm_ascend.distributed.mooncake_connector.logger'):
+            self.sending_thread.mark_layers_ready(["req1"], [0, 1],
+                                                  FakeEvent())
+            self.assertTrue(_wait_until(self._recving_finished))
+        self.assertEqual(self.recving_thread.load_errors.pop(), {0, 2})
+        self.assertEqual(self.recving_thread.load_errors.expected, {})
+
+    def test_request_without_decoder_expires(self):
+        self.sending_thread.layerwise_timeout = 0.2
+        self.sending_thread.add_request("req1", encode_block_runs([1, 2, 3]),
+                                        0)
+        self.sending_thread.mark_layers_ready(["req1"], [0, 1], FakeEvent())
+        with patch('vllm_ascend.distributed.mooncake_connector.logger'):
+            # No DECODER_HELLO comes, the blocks are released.
+            self.assertTrue(
+                _wait_until(lambda: "req1" in self.sending_thread.task_tracker.
+                            finished_requests))
+        self.assertEqual(self.sending_thread.prefiller_meta, {})
+        self.assertEqual(self.engine.writes, [])
+
+    def test_decoder_without_request_expires(self):
+        self.sending_thread.layerwise_timeout = 0.2
+        with patch('vllm_ascend.distributed.mooncake_connector.logger'):
+            # The request never reaches its last prefill step here.
+            self.recving_thread.add_request(
+                request_id="req1",
+                local_block_runs=encode_block_runs([2, 0]),
+                remote_block_runs=encode_block_runs([]),
+                remote_engine_id="prefill",
+                remote_host=self.host,
+                remote_handshake_port=self.prefill_port)
+            self.assertTrue(_wait_until(self._recving_finished))
+        self.assertEqual(self.sending_thread.decoder_meta, {})
+        # The decoder recomputes its blocks, the prefiller holds none.
+        self.assertEqual(self.recving_thread.load_errors.pop(), {0, 2})
+        time.sleep(0.1)
+        self.assertEqual(self.sending_thread.get_and_clear_finished_requests(),
+                         set())
+
+
+class TestDoneRecvingNotifier(unittest.TestCase):
+
+    def setUp(self):
+        self.host = "127.0.0.1"
+        self.port = _get_free_port()
+
+    def _start_sending_thread(self):
+        ready_event = threading.Event()
+        sending_thread = KVCacheSendingThread(
+            tp_rank=0,
+            decode_tp_size=1,
+            local_engine_id=f"prefill_{self.port}",
+            side_channel_host=self.host,
+            side_channel_port=self.port,
+            metadata=MooncakeAgentMetadata(engine_id=f"prefill_{self.port}",
+                                           te_rpc_port=9090,
+                                           kv_caches_base_addr=[0x1000],
+                                           num_blocks=1),
+            ready_event=ready_event)
+        sending_thread.start()
+        self.assertTrue(ready_event.wait(timeout=3))
+        return sending_thread
+
+    def _wait_finished(self, sending_thread, request_ids):
+        finished = set()
+
+        def all_finished():
+            finished.update(sending_thread.get_and_clear_finished_requests())
+            return finished == request_ids
+
+        return _wait_until(all_finished, timeout=5)
+
+    def test_signals_batched(self):
+        sending_thread = self._start_sending_thread()
+        notifier = KVCacheDoneRecvingNotifier(tp_rank=0, window=0.05)
+        request_ids = {f"req{i}" for i in range(5)}
+        for request_id in sorted(request_ids):
+            notifier.notify(request_id, self.host, self.port)
+        notifier.start()
+        self.assertTrue(self._wait_finished(sending_thread, request_ids))
+        self.assertTrue(_wait_until(lambda: not notifier.unacked))
+        self.assertEqual(notifier.num_sent_batches, 1)
+
+    def test_max_batch_size(self):
+        sending_thread = self._start_sending_thread()
+        notifier = KVCacheDoneRecvingNotifier(tp_rank=0,
+                                              window=10,
+                                              max_batch_size=2)
+        notifier.start()
+        for request_id in ["req0", "req1", "req2", "req3"]:
+            notifier.notify(request_id, self.host, self.port)
+        # Full batches do not wait for the window.
+        self.assertTrue(
+            self._wait_finished(sending_thread,
+                                {"req0", "req1", "req2", "req3"}))
+        self.assertEqual(notifier.num_sent_batches, 2)
+
+    def test_late_remote(self):
+        notifier = KVCacheDoneRecvingNotifier(tp_rank=0,
+                                              window=0,
+                                              ack_timeout=0.2)
+        notifier.start()
+        with patch('vllm_ascend.distributed.mooncake_connector.logger'):
+            notifier.notify("req0", self.host, self.port)
+            time.sleep(0.3)
+            sending_thread = self._start_sending_thread()
+            self.assertTrue(self._wait_finished(sending_thread, {"req0"}))
+            self.assertTrue(_wait_until(lambda: not notifier.unacked))
+
+    def test_retries_exhausted(self):
+        notifier = KVCacheDoneRecvingNotifier(tp_rank=0,
+                                              window=0,
+                                              ack_timeout=0.05,
+                                              max_retries=2)
+        notifier.start()
+        with patch('vllm_ascend.distributed.mooncake_connector.logger'
+                   ) as mock_logger:
+            notifier.notify("req0", self.host, self.port)
+            self.assertTrue(
+                _wait_until(lambda: mock_logger.error.called, timeout=3))
+        self.assertEqual(notifier.num_sent_batches, 3)
+        self.assertEqual(notifier.unacked, {})
+
+    def test_recving_thread_uses_notifier(self):
+        thread = KVCacheRecvingThread(
+            tp_rank=0,
+            tp_size=1,
+            engine=MagicMock(),
+            local_engine_id="local_engine",
+            local_handshake_port=5555,
+            local_kv_caches_base_addr=[0x1000, 0x2000],
+            block_len=[1024],
+            ready_event=threading.Event(),
+            done_signal_batch_config={
+                "window_ms": 2,
+                "max_batch_size": 8
+            })
+        self.assertEqual(thread.done_recving_notifier.window, 0.002)
+        self.assertEqual(thread.done_recving_notifier.max_batch_size, 8)
+        thread.task_tracker = MagicMock()
+        thread.done_recving_notifier = MagicMock()
+        with patch.object(thread, '_send_done_recv_signal') as mock_send:
+            thread._finish_request({
+                "request_id": "req0",
+                "remote_host": "localhost",
+                "remote_handshake_port": 6666
+            })
+        mock_send.assert_not_called()
+        thread.done_recving_notifier.notify.assert_called_once_with(
+            "req0", "localhost", 6666)
+        thread.task_tracker.update_done_task_count.assert_called_once_with(
+            "req0", 0)
+
+
 class TestKVCacheRecvingThreadBasic(unittest.TestCase):
 
     def setUp(self):
@@ -439,8 +796,8 @@ class TestKVCacheRecvingThreadBasic(unittest.TestCase):
     def test_add_request(self):
         test_req = {
             "request_id": "req1",
-            "local_block_ids": [1, 2],
-            "remote_block_ids": [3, 4],
+            "local_block_runs": encode_block_runs([1, 2]),
+            "remote_block_runs": encode_block_runs([3, 4]),
             "remote_engine_id": "remote_engine",
             "remote_host": "localhost",
             "remote_handshake_port": 6666,
@@ -471,27 +828,22 @@ class TestSocketManagement(unittest.TestCase):
             local_kv_caches_base_addr=[0x1000, 0x2000],
             block_len=[1024, 2048],
             ready_event=self.ready_event)
-        self.thread.remote_sockets = defaultdict(deque)
-        self.thread.remote_poller = MagicMock()
+        self.thread.zmq_connections = MagicMock()
 
-    @patch('vllm_ascend.distributed.mooncake_connector.zmq.Context')
-    @patch('vllm_ascend.distributed.mooncake_connector.make_zmq_socket')
-    def test_get_remote_socket(self, mock_make_socket, mock_context):
+    def test_get_remote_socket(self):
         mock_sock = MagicMock()
-        mock_make_socket.return_value = mock_sock
+        self.thread.zmq_connections.acquire.return_value = mock_sock
         test_host = "test_host"
         test_port = 12345
 
         sock = self.thread._get_remote_socket(test_host, test_port)
 
         self.assertEqual(sock, mock_sock)
-        mock_make_socket.assert_called_once()
-        args, kwargs = mock_make_socket.call_args
-        self.assertEqual(kwargs.get('path'), 'tcp://test_host:12345')
-        self.assertEqual(kwargs.get('socket_type'), zmq.REQ)  # type: ignore
-        self.assertFalse(kwargs.get('bind', True))
-        self.thread.remote_poller.register.assert_called_with(
-            mock_sock, zmq.POLLIN)  # type: ignore
+        self.thread.zmq_connections.acquire.assert_called_once_with(
+            'tcp://test_host:12345')
+        mock_sock.setsockopt.assert_called_once_with(
+            zmq.SNDTIMEO,  # type: ignore
+            1000)
 
     def test_return_socket_to_pool(self):
         mock_sock = MagicMock()
@@ -501,9 +853,27 @@ class TestSocketManagement(unittest.TestCase):
 
         self.thread._return_remote_socket(mock_sock, test_host, test_port)
 
-        self.assertEqual(len(self.thread.remote_sockets[test_path]), 1)
-        self.assertEqual(self.thread.remote_sockets[test_path][0], mock_sock)
-        self.thread.remote_poller.register.assert_not_called()
+        self.thread.zmq_connections.release.assert_called_once_with(
+            mock_sock, test_path, healthy=True)
+
+    def test_close_socket_after_failure(self):
+        mock_sock = MagicMock()
+        test_path = make_zmq_path("tcp", "test_host", 12345)
+
+        with patch.object(self.thread, '_get_remote_socket',
+                          return_value=mock_sock), \
+                patch('vllm_ascend.distributed.mooncake_connector.'
+                      'ensure_zmq_send'), \
+                patch('vllm_ascend.distributed.mooncake_connector.'
+                      'ensure_zmq_recv',
+                      side_effect=RuntimeError("timeout")):
+            with self.assertRaises(RuntimeError):
+                self.thread._send_done_recv_signal("req1", "test_host",
+                                                   12345)
+
+        # A REQ socket that timed out must not be reused.
+        self.thread.zmq_connections.release.assert_called_once_with(
+            mock_sock, test_path, healthy=False)
 
 
 class TestCoreFunctionality(unittest.TestCase):
@@ -524,8 +894,8 @@ class TestCoreFunctionality(unittest.TestCase):
         self.thread.request_queue = self.mock_queue
         self.test_req = {
             "request_id": "req1",
-            "local_block_ids": [1, 2],
-            "remote_block_ids": [3, 4],
+            "local_block_runs": encode_block_runs([1, 2]),
+            "remote_block_runs": encode_block_runs([3, 4]),
             "remote_engine_id": "remote_engine",
             "remote_host": "localhost",
             "remote_handshake_port": 6666,
@@ -572,6 +942,86 @@ class TestCoreFunctionality(unittest.TestCase):
         with self.assertRaises(RuntimeError):
             self.thread._transfer_kv_cache(self.test_req)
 
+    def test_transfer_kv_cache_skips_cached_blocks(self):
+        self.thread.kv_caches_base_addr["remote_engine"] = {
+            6666: [0x3000, 0x4000]
+        }
+        # The first remote block is a local prefix cache hit, the last one
+        # holds the token recomputed locally.
+        req = dict(self.test_req,
+                   local_block_runs=encode_block_runs([7, 8]),
+                   remote_block_runs=encode_block_runs([1, 2, 3, 4]),
+                   num_cached_blocks=1)
+
+        self.thread._transfer_kv_cache(req)
+
+        _, src_list, dst_list, length_list = \
+            self.engine.batch_transfer_sync_read.call_args[0]
+        self.assertEqual(src_list, [0x1000 + 7 * 1024, 0x2000 + 7 * 2048])
+        self.assertEqual(dst_list, [0x3000 + 2 * 1024, 0x4000 + 2 * 2048])
+        self.assertEqual(length_list, [2 * 1024, 2 * 2048])
+
+    def test_transfer_kv_cache_all_blocks_cached(self):
+        self.thread.kv_caches_base_addr["remote_engine"] = {
+            6666: [0x3000, 0x4000]
+        }
+        req = dict(self.test_req, num_cached_blocks=2)
+        self.thread._transfer_kv_cache(req)
+        self.engine.batch_transfer_sync_read.assert_not_called()
+
+    def _restore_remote_metadata(self, remote_host, remote_handshake_port):
+        self.thread.kv_caches_base_addr["remote_engine"][6666] = [
+            0x3000, 0x4000
+        ]
+        self.thread.remote_te_port["remote_engine"][6666] = 7777
+
+    @patch.object(KVCacheRecvingThread, '_send_done_recv_signal')
+    def test_failed_transfer_retried(self, mock_send):
+        self.thread.retry_policy = TransferRetryPolicy(max_retries=1,
+                                                       backoff=0.01)
+        self._restore_remote_metadata("localhost", 6666)
+        self.engine.batch_transfer_sync_read.side_effect = [-1, 0]
+        req = dict(self.test_req,
+                   deadline=self.thread.retry_policy.get_deadline(
+                       time.monotonic()))
+        with patch('vllm_ascend.distributed.mooncake_connector.logger'):
+            self.thread._handle_request(req)
+        self.thread.task_tracker.update_done_task_count.assert_not_called()
+        # Queued again after the backoff.
+        self.assertTrue(_wait_until(lambda: self.mock_queue.put.called))
+        retry_req = self.mock_queue.put.call_args[0][0]
+        self.assertEqual(retry_req["num_attempts"], 1)
+
+        with patch.object(KVCacheRecvingThread,
+                          '_get_remote_metadata',
+                          side_effect=self._restore_remote_metadata
+                          ) as mock_get_meta:
+            self.thread._handle_request(retry_req)
+        # The metadata of the remote was fetched again.
+        mock_get_meta.assert_called_once_with("localhost", 6666)
+        self.assertEqual(self.engine.batch_transfer_sync_read.call_count, 2)
+        self.thread.task_tracker.update_done_task_count.assert_called_once_with(
+            "req1", self.thread.tp_rank)
+        self.assertEqual(self.thread.load_errors.pop(), set())
+
+    @patch.object(KVCacheRecvingThread, '_send_done_recv_signal')
+    def test_failed_transfer_reports_blocks(self, mock_send):
+        self._restore_remote_metadata("localhost", 6666)
+        self.engine.batch_transfer_sync_read.return_value = -1
+        req = dict(self.test_req,
+                   local_block_runs=encode_block_runs([7, 8, 9]),
+                   remote_block_runs=encode_block_runs([1, 2, 3, 4]),
+                   num_cached_blocks=1)
+        with patch('vllm_ascend.distributed.mooncake_connector.logger'):
+            self.thread._handle_request(req)
+        self.mock_queue.put.assert_not_called()
+        # The request finishes, its blocks are recomputed.
+        mock_send.assert_called_once_with("req1", "localhost", 6666)
+        self.thread.task_tracker.update_done_task_count.assert_called_once_with(
+            "req1", self.thread.tp_rank)
+        self.assertEqual(self.thread.load_errors.pop(), {7, 8, 9})
+        self.assertEqual(self.thread.load_errors.pop(), set())
+
 
 class TestMetadataHandling(unittest.TestCase):
 
@@ -607,11 +1057,10 @@ class TestMetadataHandling(unittest.TestCase):
 
             mock_get_socket.assert_called_once_with("host1", 5555)
             mock_return_socket.assert_called_once_with(mock_socket, "host1",
-                                                       5555)
+                                                       5555, True)
             mock_send.assert_called_once_with(
                 mock_socket, self.thread.encoder.encode((GET_META_MSG, "")))
-            mock_recv.assert_called_once_with(mock_socket,
-                                              self.thread.remote_poller)
+            mock_recv.assert_called_once_with(mock_socket)
             self.assertEqual(
                 self.thread.kv_caches_base_addr["remote_engine"][5555],
                 [0x3000, 0x4000])
@@ -629,7 +1078,120 @@ class TestMetadataHandling(unittest.TestCase):
                 self.thread._get_remote_metadata("host1", 5555)
 
             self.assertEqual(str(context.exception), "Network error")
-            mock_return_socket.assert_called_once()
+            mock_return_socket.assert_called_once_with(mock_socket, "host1",
+                                                       5555, False)
+
+
+class TestRemoteMetadataCache(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = MagicMock()
+        self.engine.batch_transfer_sync_read.return_value = 0
+        self.thread = KVCacheRecvingThread(
+            tp_rank=0,
+            tp_size=1,
+            engine=self.engine,
+            local_engine_id="local_engine",
+            local_handshake_port=5555,
+            local_kv_caches_base_addr=[0x1000, 0x2000],
+            block_len=[1024],
+            ready_event=threading.Event(),
+            handshake_ttl=10)
+        self.thread.request_queue = MagicMock()
+        self.thread.task_tracker = MagicMock()
+        self.req_meta = {
+            "request_id": "req1",
+            "local_block_runs": encode_block_runs([1, 2]),
+            "remote_block_runs": encode_block_runs([3, 4]),
+            "remote_engine_id": "remote_engine",
+            "remote_host": "localhost",
+            "remote_handshake_port": 6666,
+        }
+
+        def get_remote_metadata(remote_host, remote_handshake_port):
+            self.thread.kv_caches_base_addr["remote_engine"][
+                remote_handshake_port] = [0x3000, 0x4000]
+            self.thread.remote_te_port["remote_engine"][
+                remote_handshake_port] = 7777
+            self.thread.remote_metadata_time[(
+                remote_host, remote_handshake_port)] = time.monotonic()
+
+        self.get_meta_patch = patch.object(self.thread,
+                                           "_get_remote_metadata",
+                                           side_effect=get_remote_metadata)
+        self.mock_get_meta = self.get_meta_patch.start()
+
+    def tearDown(self):
+        self.get_meta_patch.stop()
+
+    def _prefetch(self, remote_host, remote_handshake_port):
+        self.thread.prefetch_remote_metadata(remote_host,
+                                             remote_handshake_port)
+        # The handshake executor runs one prefetch at a time.
+        self.thread.handshake_executor.submit(lambda: None).result()
+
+    def test_prefetch_skips_cached(self):
+        self._prefetch("localhost", 6666)
+        self._prefetch("localhost", 6666)
+        self.mock_get_meta.assert_called_once_with("localhost", 6666)
+        self.thread.request_queue.put.assert_not_called()
+
+        # The prefetched metadata serves the first request.
+        self.thread._transfer_kv_cache(self.req_meta)
+        self.mock_get_meta.assert_called_once()
+        self.engine.batch_transfer_sync_read.assert_called_once()
+
+    def test_request_waits_for_prefetch_in_flight(self):
+        started, release = threading.Event(), threading.Event()
+        get_remote_metadata = self.mock_get_meta.side_effect
+
+        def slow_get_remote_metadata(*args):
+            started.set()
+            release.wait(timeout=3)
+            get_remote_metadata(*args)
+
+        self.mock_get_meta.side_effect = slow_get_remote_metadata
+        self.thread.prefetch_remote_metadata("localhost", 6666)
+        self.assertTrue(started.wait(timeout=3))
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(self.thread._transfer_kv_cache,
+                                     self.req_meta)
+            time.sleep(0.1)
+            self.assertFalse(future.done())
+            release.set()
+            future.result(timeout=3)
+        # The request used the prefetched metadata, no handshake of its own.
+        self.mock_get_meta.assert_called_once_with("localhost", 6666)
+        self.engine.batch_transfer_sync_read.assert_called_once()
+
+    def test_prefetch_failure(self):
+        self.mock_get_meta.side_effect = RuntimeError("timeout")
+        with patch('vllm_ascend.distributed.mooncake_connector.logger'):
+            self._prefetch("localhost", 6666)
+        self.assertEqual(self.thread.remote_metadata_time, {})
+
+    def test_expired_metadata_fetched_again(self):
+        self.thread._transfer_kv_cache(self.req_meta)
+        self.thread._transfer_kv_cache(self.req_meta)
+        self.assertEqual(self.mock_get_meta.call_count, 1)
+
+        self.thread.remote_metadata_time[("localhost", 6666)] -= 11
+        self.thread._transfer_kv_cache(self.req_meta)
+        self.assertEqual(self.mock_get_meta.call_count, 2)
+
+    @patch.object(KVCacheRecvingThread, '_send_done_recv_signal')
+    def test_failure_invalidates_metadata(self, mock_send):
+        self.engine.batch_transfer_sync_read.return_value = -1
+        with patch('vllm_ascend.distributed.mooncake_connector.logger'):
+            self.thread._handle_request(self.req_meta)
+        mock_send.assert_called_once_with("req1", "localhost", 6666)
+        self.assertNotIn(6666,
+                         self.thread.kv_caches_base_addr["remote_engine"])
+        self.assertEqual(self.thread.remote_metadata_time, {})
+
+        self.engine.batch_transfer_sync_read.return_value = 0
+        self.thread._transfer_kv_cache(self.req_meta)
+        self.assertEqual(self.mock_get_meta.call_count, 2)
 
 
 class TestMainThreadLoop(unittest.TestCase):
@@ -652,8 +1214,8 @@ class TestMainThreadLoop(unittest.TestCase):
     def test_run_loop_normal(self, mock_handle):
         test_request = {
             "request_id": "req1",
-            "local_block_ids": [1, 2],
-            "remote_block_ids": [3, 4],
+            "local_block_runs": encode_block_runs([1, 2]),
+            "remote_block_runs": encode_block_runs([3, 4]),
             "remote_engine_id": "remote_engine",
             "remote_host": "localhost",
             "remote_handshake_port": 6666,
@@ -672,6 +1234,280 @@ class TestMainThreadLoop(unittest.TestCase):
         self.assertTrue(self.thread.request_queue.empty())
 
 
+class TestSplitTransferChunks(unittest.TestCase):
+
+    def setUp(self):
+        # Two layers, a region of 3 blocks and a region of 1 block of 100
+        # bytes in each.
+        self.layer_descs = [[(0, 1000, 300, 100), (500, 1500, 100, 100)],
+                            [(2000, 3000, 300, 100), (2500, 3500, 100, 100)]]
+
+    def test_split_by_layer(self):
+        chunks = split_transfer_chunks(self.layer_descs, 0)
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(chunks[0].src_list, [0, 500])
+        self.assertEqual(chunks[1].dst_list, [3000, 3500])
+        self.assertEqual([c.num_bytes for c in chunks], [400, 400])
+
+    def test_split_by_size(self):
+        chunks = split_transfer_chunks(self.layer_descs, 250)
+        self.assertEqual([c.num_bytes for c in chunks], [200, 200, 200, 200])
+        self.assertEqual(chunks[0].src_list, [0])
+        self.assertEqual(chunks[1].src_list, [200, 500])
+        self.assertEqual(chunks[1].dst_list, [1200, 1500])
+        self.assertEqual(chunks[1].length_list, [100, 100])
+        for chunk in chunks:
+            self.assertTrue(all(length % 100 == 0
+                                for length in chunk.length_list))
+        self.assertEqual(sum(c.num_bytes for c in chunks), 800)
+
+    def test_block_larger_than_chunk(self):
+        chunks = split_transfer_chunks(self.layer_descs, 50)
+        self.assertEqual(len(chunks), 8)
+        self.assertTrue(all(c.num_bytes == 100 for c in chunks))
+
+
+class RecordingTransferEngine:
+
+    def __init__(self, latency=0.01, fail_src=None, num_failures=None):
+        self.latency = latency
+        self.fail_src = fail_src
+        # The pulls of fail_src fail num_failures times, forever if None.
+        self.num_failures = num_failures
+        self.lock = threading.Lock()
+        self.calls = []
+        self.dsts = []
+        self.inflight = defaultdict(int)
+        self.max_inflight = defaultdict(int)
+
+    def batch_transfer_sync_read(self, session_id, src_list, dst_list,
+                                 length_list):
+        with self.lock:
+            self.calls.append((session_id, src_list[0]))
+            self.dsts.append(dst_list[0])
+            self.inflight[session_id] += 1
+            self.max_inflight[session_id] = max(
+                self.max_inflight[session_id], self.inflight[session_id])
+        time.sleep(self.latency)
+        with self.lock:
+            self.inflight[session_id] -= 1
+            if src_list[0] != self.fail_src or self.num_failures == 0:
+                return 0
+            if self.num_failures is not None:
+                self.num_failures -= 1
+            return -1
+
+
+def _make_chunks(srcs):
+    chunks = []
+    for src in srcs:
+        chunk = TransferChunk()
+        chunk.append(src, src, 100)
+        chunks.append(chunk)
+    return chunks
+
+
+class TestKVCacheTransferPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=8)
+        self.results = {}
+        self.done = threading.Event()
+
+    def tearDown(self):
+        self.executor.shutdown(wait=True)
+
+    def _callback(self, request_id, num_requests):
+
+        def callback(error):
+            self.results[request_id] = error
+            if len(self.results) == num_requests:
+                self.done.set()
+
+        return callback
+
+    def test_bounded_inflight_per_remote(self):
+        engine = RecordingTransferEngine()
+        pipeline = KVCacheTransferPipeline(engine,
+                                           self.executor,
+                                           max_inflight_per_remote=2)
+        for i, session_id in enumerate(["p0:1", "p0:1", "p1:1"]):
+            pipeline.submit(f"req{i}", session_id,
+                            _make_chunks(range(i * 10, i * 10 + 5)),
+                            self._callback(f"req{i}", 3))
+        self.assertTrue(self.done.wait(timeout=5))
+        self.assertEqual(self.results, {
+            "req0": None,
+            "req1": None,
+            "req2": None
+        })
+        self.assertEqual(len(engine.calls), 15)
+        self.assertEqual(engine.max_inflight["p0:1"], 2)
+        self.assertLessEqual(engine.max_inflight["p1:1"], 2)
+        metrics = pipeline.metrics.snapshot()
+        self.assertEqual(metrics["num_chunks"], 15)
+        self.assertEqual(metrics["num_bytes"], 1500)
+        self.assertEqual(metrics["num_requests"], 3)
+        self.assertGreater(metrics["max_chunk_time_ms"], 0)
+
+    def test_small_request_not_stuck_behind_large(self):
+        engine = RecordingTransferEngine()
+        pipeline = KVCacheTransferPipeline(engine,
+                                           self.executor,
+                                           max_inflight_per_remote=1)
+        pipeline.submit("large", "p0:1", _make_chunks(range(100, 120)),
+                        self._callback("large", 2))
+        pipeline.submit("small", "p0:1", _make_chunks([0]),
+                        self._callback("small", 2))
+        self.assertTrue(self.done.wait(timeout=5))
+        srcs = [src for _, src in engine.calls]
+        self.assertLessEqual(srcs.index(0), 2)
+
+    def test_failure_stops_request(self):
+        engine = RecordingTransferEngine(fail_src=101)
+        pipeline = KVCacheTransferPipeline(engine,
+                                           self.executor,
+                                           max_inflight_per_remote=1)
+        pipeline.submit("req0", "p0:1", _make_chunks(range(100, 110)),
+                        self._callback("req0", 1))
+        self.assertTrue(self.done.wait(timeout=5))
+        self.assertIsInstance(self.results["req0"], RuntimeError)
+        self.assertEqual(len(engine.calls), 2)
+        self.assertEqual(pipeline.transfers, {})
+        # The failed chunk and the ones never sent are left to pull.
+        error = self.results["req0"]
+        self.assertIsInstance(error, TransferChunksError)
+        self.assertEqual([chunk.src_list[0] for chunk in error.chunks],
+                         list(range(101, 110)))
+
+    def test_empty_request(self):
+        pipeline = KVCacheTransferPipeline(RecordingTransferEngine(),
+                                           self.executor)
+        pipeline.submit("req0", "p0:1", [], self._callback("req0", 1))
+        self.assertEqual(self.results, {"req0": None})
+
+
+class TestPipelinedRecvingThread(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = RecordingTransferEngine(latency=0)
+        self.thread = KVCacheRecvingThread(
+            tp_rank=0,
+            tp_size=1,
+            engine=self.engine,  # type: ignore
+            local_engine_id="local_engine",
+            local_handshake_port=5555,
+            local_kv_caches_base_addr=[0x1000, 0x2000, 0x3000, 0x4000],
+            block_len=[16],
+            ready_event=threading.Event(),
+            num_layers=2,
+            pipelined_transfer_config={"max_inflight_per_remote": 1})
+        self.thread.task_tracker = MagicMock()
+        self.remote_kv_caches_base_addr = [0x5000, 0x6000, 0x7000, 0x8000]
+        self.remote_te_port = 7777
+        self._get_remote_metadata("localhost", 6666)
+        # A retry does the handshake again.
+        patcher = patch.object(self.thread,
+                               '_get_remote_metadata',
+                               side_effect=self._get_remote_metadata)
+        self.mock_get_meta = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get_remote_metadata(self, remote_host, remote_handshake_port):
+        self.thread.kv_caches_base_addr["remote_engine"][
+            remote_handshake_port] = self.remote_kv_caches_base_addr
+        self.thread.remote_te_port["remote_engine"][
+            remote_handshake_port] = self.remote_te_port
+
+    @patch.object(KVCacheRecvingThread, '_send_done_recv_signal')
+    def test_pull_by_layer(self, mock_send):
+        self.thread.start()
+        self.thread.add_request(request_id="req1",
+                                local_block_runs=encode_block_runs([1, 2,
+                                                                    5]),
+                                remote_block_runs=encode_block_runs([3, 4,
+                                                                     5]),
+                                remote_engine_id="remote_engine",
+                                remote_host="localhost",
+                                remote_handshake_port=6666)
+        self.assertTrue(_wait_until(lambda: mock_send.called, timeout=5))
+        mock_send.assert_called_once_with("req1", "localhost", 6666)
+        self.thread.task_tracker.update_done_task_count.assert_called_once_with(
+            "req1", 0)
+        # One chunk per layer, with the two groups of its two caches.
+        self.assertEqual(self.engine.calls, [("localhost:7777", 0x1010),
+                                             ("localhost:7777", 0x3010)])
+        metrics = self.thread.transfer_pipeline.metrics.snapshot(
+        )  # type: ignore[union-attr]
+        self.assertEqual(metrics["num_chunks"], 2)
+        self.assertEqual(metrics["num_bytes"], 4 * 3 * 16)
+
+    def _add_request(self):
+        self.thread.add_request(request_id="req1",
+                                local_block_runs=encode_block_runs([1, 2,
+                                                                    5]),
+                                remote_block_runs=encode_block_runs([3, 4,
+                                                                     5]),
+                                remote_engine_id="remote_engine",
+                                remote_host="localhost",
+                                remote_handshake_port=6666)
+
+    @patch.object(KVCacheRecvingThread, '_send_done_recv_signal')
+    def test_failed_chunks_pulled_again(self, mock_send):
+        self.engine.fail_src = 0x3010
+        self.engine.num_failures = 1
+        self.thread.retry_policy = TransferRetryPolicy(max_retries=2,
+                                                       backoff=0.01)
+        self.thread.start()
+        with patch('vllm_ascend.distributed.mooncake_connector.logger'):
+            self._add_request()
+            self.assertTrue(_wait_until(lambda: mock_send.called, timeout=5))
+        # Only the chunk of the second layer is pulled again.
+        self.assertEqual(self.engine.calls, [("localhost:7777", 0x1010),
+                                             ("localhost:7777", 0x3010),
+                                             ("localhost:7777", 0x3010)])
+        self.thread.task_tracker.update_done_task_count.assert_called_once_with(
+            "req1", 0)
+        self.assertEqual(self.thread.load_errors.pop(), set())
+
+    @patch.object(KVCacheRecvingThread, '_send_done_recv_signal')
+    def test_retry_uses_new_remote_metadata(self, mock_send):
+        self.engine.fail_src = 0x3010
+        self.engine.num_failures = 1
+        self.thread.retry_policy = TransferRetryPolicy(max_retries=2,
+                                                       backoff=0.01)
+        # The remote restarts, the handshake of the retry sees the change.
+        self.remote_kv_caches_base_addr = [0x9000, 0xa000, 0xb000, 0xc000]
+        self.remote_te_port = 8888
+        self.thread.start()
+        with patch('vllm_ascend.distributed.mooncake_connector.logger'):
+            self._add_request()
+            self.assertTrue(_wait_until(lambda: mock_send.called, timeout=5))
+        self.mock_get_meta.assert_called_once_with("localhost", 6666)
+        # The failed chunk is pulled again from the new session and caches.
+        self.assertEqual(self.engine.calls, [("localhost:7777", 0x1010),
+                                             ("localhost:7777", 0x3010),
+                                             ("localhost:8888", 0x3010)])
+        self.assertEqual(self.engine.dsts, [0x5030, 0x7030, 0xb030])
+        self.assertEqual(self.thread.load_errors.pop(), set())
+
+    @patch.object(KVCacheRecvingThread, '_send_done_recv_signal')
+    def test_failed_chunks_reported(self, mock_send):
+        self.engine.fail_src = 0x1010
+        self.thread.retry_policy = TransferRetryPolicy(max_retries=1,
+                                                       backoff=0.01)
+        self.thread.start()
+        with patch('vllm_ascend.distributed.mooncake_connector.logger'):
+            self._add_request()
+            self.assertTrue(_wait_until(lambda: mock_send.called, timeout=5))
+        # The second layer is not pulled once the first one failed.
+        self.assertEqual(self.engine.calls, [("localhost:7777", 0x1010),
+                                             ("localhost:7777", 0x1010)])
+        self.thread.task_tracker.update_done_task_count.assert_called_once_with(
+            "req1", 0)
+        self.assertEqual(self.thread.load_errors.pop(), {1, 2, 5})
+
+
 class MockVllmConfig:
 
     def __init__(self):
@@ -740,6 +1576,28 @@ class TestKVCacheTaskTracker(unittest.TestCase):
         finished = self.tracker.get_and_clear_finished_requests()
         self.assertEqual(finished, {"req1"})
 
+    def test_resend_after_finished(self):
+        self.tracker.update_done_task_count("req1", 0)
+        self.tracker.update_done_task_count("req1", 1)
+        self.assertEqual(self.tracker.get_and_clear_finished_requests(),
+                         {"req1"})
+        # A batch whose ACK was lost is sent again.
+        self.tracker.update_done_task_count("req1", 1)
+        self.tracker.update_done_task_count("req1", 0)
+        self.assertEqual(self.tracker.get_and_clear_finished_requests(),
+                         set())
+        self.assertEqual(len(self.tracker.done_task_counts), 0)
+
+    def test_finished_request_forgotten_after_ttl(self):
+        self.tracker.update_done_task_count("req1", 0)
+        self.tracker.update_done_task_count("req1", 1)
+        with patch("vllm_ascend.distributed.mooncake_connector.time."
+                   "monotonic",
+                   return_value=time.monotonic() +
+                   KVCacheTaskTracker.FINISHED_REQUEST_TTL + 1):
+            self.tracker.update_done_task_count("req2", 0)
+        self.assertNotIn("req1", self.tracker.recently_finished)
+
 
 class TestMooncakeConnectorMetadata(unittest.TestCase):
 
@@ -787,7 +1645,7 @@ class TestMooncakeConnectorSchedulerMatchedTokens(unittest.TestCase):
         request = MockRequest("req1")
         blocks_mock = MagicMock()
         blocks_mock.get_unhashed_block_ids.return_value = [4, 5, 6]
-        self.scheduler._reqs_need_recv["req1"] = (request, [4, 5, 6])
+        self.scheduler._reqs_need_recv["req1"] = (request, [4, 5, 6], 1)
         request.kv_transfer_params = {
             "remote_block_ids": [1, 2, 3],
             "remote_engine_id": "remote",
@@ -797,10 +1655,135 @@ class TestMooncakeConnectorSchedulerMatchedTokens(unittest.TestCase):
 
         meta = self.scheduler.build_connector_meta(MagicMock())
         self.assertIsInstance(meta, MooncakeConnectorMetadata)
-        self.assertEqual(len(meta.requests), 1)
-        self.assertEqual(meta.requests["req1"].local_block_ids, [4, 5, 6])
-        self.assertEqual(meta.requests["req1"].remote_block_ids, [1, 2, 3])
+        self.assertEqual(len(meta.decoding_requests), 1)
+        self.assertEqual(meta.decoding_requests["req1"].local_block_ids,
+                         [4, 5, 6])
+        self.assertEqual(meta.decoding_requests["req1"].remote_block_ids,
+                         [1, 2, 3])
+        self.assertEqual(meta.decoding_requests["req1"].num_cached_blocks, 1)
         self.assertEqual(len(self.scheduler._reqs_need_recv), 0)
+        self.assertEqual(meta.prefilling_requests, {})
+
+    def test_remotes_to_prefetch(self):
+        for i, port in enumerate([5000, 5000, 6000]):
+            request = MockRequest(f"req{i}")
+            request.kv_transfer_params = {
+                "do_remote_prefill": True,
+                "remote_host": "localhost",
+                "remote_port": port
+            }
+            self.scheduler.get_num_new_matched_tokens(request, 0)
+
+        meta = self.scheduler.build_connector_meta(MagicMock())
+        self.assertEqual(meta.remotes_to_prefetch, {("localhost", 5000),
+                                                    ("localhost", 6000)})
+        meta = self.scheduler.build_connector_meta(MagicMock())
+        self.assertEqual(meta.remotes_to_prefetch, set())
+
+
+class TestMooncakeConnectorSchedulerLayerwise(unittest.TestCase):
+
+    def setUp(self):
+        config = MockVllmConfig()
+        get_from_extra_config = config.kv_transfer_config.get_from_extra_config
+        config.kv_transfer_config.get_from_extra_config = MagicMock(
+            side_effect=lambda k, d: True
+            if k == "use_layerwise" else get_from_extra_config(k, d))
+        self.scheduler = MooncakeConnectorScheduler(config, "test_engine")
+
+    def _scheduler_output(self,
+                          num_scheduled_tokens,
+                          cached_req_ids=(),
+                          new_block_ids=(),
+                          finished_req_ids=()):
+        return types.SimpleNamespace(
+            num_scheduled_tokens=num_scheduled_tokens,
+            finished_req_ids=set(finished_req_ids),
+            scheduled_cached_reqs=types.SimpleNamespace(
+                req_ids=list(cached_req_ids),
+                new_block_ids=list(new_block_ids),
+                resumed_from_preemption=[False] * len(cached_req_ids)))
+
+    def test_chunked_prefill_sent_in_last_step(self):
+        request = MockRequest("req1",
+                              kv_transfer_params={"do_remote_decode": True})
+        request.num_prompt_tokens = 40
+        request.num_computed_tokens = 0
+        blocks = MagicMock()
+        blocks.get_block_ids.return_value = ([1, 2], )
+        self.scheduler.update_state_after_alloc(request, blocks, 0)
+
+        meta = self.scheduler.build_connector_meta(
+            self._scheduler_output({"req1": 32}))
+        self.assertEqual(meta.prefilling_requests, {})
+
+        request.num_computed_tokens = 32
+        meta = self.scheduler.build_connector_meta(
+            self._scheduler_output({"req1": 8}, ["req1"], [([3], )]))
+        self.assertEqual(list(meta.prefilling_requests), ["req1"])
+        self.assertEqual(
+            meta.prefilling_requests["req1"].tolist(),  # (start, length)
+            [[1, 3]])
+        self.assertEqual(self.scheduler._reqs_need_send, {})
+
+    def test_finished_request_dropped(self):
+        request = MockRequest("req1",
+                              kv_transfer_params={"do_remote_decode": True})
+        blocks = MagicMock()
+        blocks.get_block_ids.return_value = ([1], )
+        self.scheduler.update_state_after_alloc(request, blocks, 0)
+        meta = self.scheduler.build_connector_meta(
+            self._scheduler_output({}, finished_req_ids=["req1"]))
+        self.assertEqual(meta.prefilling_requests, {})
+        self.assertEqual(self.scheduler._reqs_need_send, {})
+
+    def test_streamed_request_frees_blocks_after_transfer(self):
+        request = MockRequest("req1",
+                              kv_transfer_params={"do_remote_decode": True})
+        request.num_prompt_tokens = 4
+        request.num_computed_tokens = 0
+        blocks = MagicMock()
+        blocks.get_block_ids.return_value = ([1], )
+        self.scheduler.update_state_after_alloc(request, blocks, 0)
+        self.scheduler.build_connector_meta(self._scheduler_output({"req1":
+                                                                    4}))
+        # Stopped with EOS while its layers are still read by the decoder.
+        request.status = RequestStatus.FINISHED_STOPPED
+        delay_free, _ = self.scheduler.request_finished(request, [1])
+        self.assertTrue(delay_free)
+        self.assertEqual(self.scheduler._reqs_streaming, set())
+
+    def test_unstreamed_request_frees_blocks(self):
+        request = MockRequest("req1",
+                              kv_transfer_params={"do_remote_decode": True},
+                              status=RequestStatus.FINISHED_ABORTED)
+        request.num_prompt_tokens = 40
+        request.num_computed_tokens = 0
+        blocks = MagicMock()
+        blocks.get_block_ids.return_value = ([1], )
+        self.scheduler.update_state_after_alloc(request, blocks, 0)
+        self.scheduler.build_connector_meta(self._scheduler_output({"req1":
+                                                                    32}))
+        # Aborted before its last prefill step, nothing was streamed.
+        self.assertEqual(self.scheduler.request_finished(request, [1]),
+                         (False, None))
+
+    def test_decoder_needs_no_remote_blocks(self):
+        request = MockRequest("req1",
+                              kv_transfer_params={
+                                  "do_remote_prefill": True,
+                                  "remote_engine_id": "remote",
+                                  "remote_host": "localhost",
+                                  "remote_port": 5000
+                              })
+        blocks = MagicMock()
+        blocks.get_block_ids.return_value = ([4, 5], )
+        blocks.get_unhashed_block_ids.return_value = [4, 5]
+        self.scheduler.update_state_after_alloc(request, blocks, 3)
+        meta = self.scheduler.build_connector_meta(self._scheduler_output({}))
+        self.assertEqual(meta.decoding_requests["req1"].local_block_ids,
+                         [4, 5])
+        self.assertEqual(meta.decoding_requests["req1"].remote_block_ids, [])
 
 
 class TestHelperFunctions(unittest.TestCase):
@@ -852,6 +1835,9 @@ class TestMooncakeConnectorForScheduler(unittest.TestCase):
 
 class MockKVCacheBlocks:
 
+    def get_block_ids(self):
+        return ([4, 5, 6], )
+
     def get_unhashed_block_ids(self):
         return [4, 5, 6]
 
@@ -946,6 +1932,43 @@ class TestMooncakeConnectorScheduler(unittest.TestCase):
         self.assertEqual(len(self.scheduler._reqs_need_recv), 1)
         self.assertEqual(self.scheduler._reqs_need_recv["req1"][0], request)
         self.assertEqual(self.scheduler._reqs_need_recv["req1"][1], [4, 5, 6])
+        self.assertEqual(self.scheduler._reqs_need_recv["req1"][2], 0)
+
+    def test_get_num_new_matched_tokens_prefix_cache_hit(self):
+        request = MockRequest("req1",
+                              prompt_token_ids=list(range(40)),
+                              kv_transfer_params={"do_remote_prefill": True})
+        # The last token is recomputed, the first block is a local hit.
+        self.assertEqual(
+            self.scheduler.get_num_new_matched_tokens(request, 16), (23, True))
+        # The remote holds 2 blocks, the rest is computed locally.
+        request.kv_transfer_params["remote_block_ids"] = [7, 8]
+        self.assertEqual(
+            self.scheduler.get_num_new_matched_tokens(request, 16), (16, True))
+        # Everything the remote holds is cached.
+        self.assertEqual(
+            self.scheduler.get_num_new_matched_tokens(request, 32), (0, False))
+
+    def test_update_state_after_alloc_prefix_cache_hit(self):
+        request = MockRequest("req1",
+                              kv_transfer_params={
+                                  "do_remote_prefill": True,
+                                  "remote_block_ids": [1, 2, 3],
+                                  "remote_engine_id": "remote",
+                                  "remote_host": "localhost",
+                                  "remote_port": 5000
+                              })
+        blocks = MagicMock()
+        # Block 9 is a prefix cache hit, the others are allocated for the
+        # remote KV cache.
+        blocks.get_block_ids.return_value = ([9, 4, 5], )
+        blocks.get_unhashed_block_ids.return_value = [4, 5]
+        self.scheduler.update_state_after_alloc(request, blocks, 32)
+        meta = self.scheduler.build_connector_meta(MagicMock())
+        req_meta = meta.decoding_requests["req1"]
+        self.assertEqual(req_meta.local_block_ids, [4, 5])
+        self.assertEqual(req_meta.remote_block_ids, [1, 2, 3])
+        self.assertEqual(req_meta.num_cached_blocks, 1)
 
     def test_request_finished_no_remote_decode(self):
         request = MockRequest("req1")
@@ -1015,6 +2038,16 @@ class TestUtils(unittest.TestCase):
         data = ensure_zmq_recv(mock_socket, mock_poller)
         self.assertEqual(data, b"response")
 
+    @patch("vllm_ascend.distributed.mooncake_connector.logger")
+    def test_ensure_zmq_recv_without_poller(self, mock_logger):
+        mock_socket = MagicMock()
+        mock_socket.recv.return_value = b"response"
+        mock_socket.poll.return_value = zmq.POLLIN  # type: ignore
+        data = ensure_zmq_recv(mock_socket, timeout=0.5)
+        self.assertEqual(data, b"response")
+        mock_socket.poll.assert_called_once_with(500,
+                                                 zmq.POLLIN)  # type: ignore
+
     @patch("vllm_ascend.distributed.mooncake_connector.logger")
     def test_ensure_zmq_recv_timeout_and_fail(self, mock_logger):
         mock_socket = MagicMock()
@@ -1179,6 +2212,25 @@ class TestMooncakeConnectorWorker(unittest.TestCase):
         self.assertIsNone(worker.kv_send_thread)
         self.assertIsNotNone(worker.kv_recv_thread)
 
+    def test_prefetch_remote_metadata(self):
+        self.vllm_config.kv_transfer_config.kv_role = 'kv_consumer'
+        get_from_extra_config = \
+            self.vllm_config.kv_transfer_config.get_from_extra_config
+        self.vllm_config.kv_transfer_config.get_from_extra_config = MagicMock(
+            side_effect=lambda k, d: [{
+                "host": "prefill0",
+                "port": 7000
+            }] if k == "handshake_peers" else get_from_extra_config(k, d))
+        worker = MooncakeConnectorWorker(self.vllm_config, self.engine_id)
+        worker.register_kv_caches(self.kv_caches)
+        prefetch = worker.kv_recv_thread.prefetch_remote_metadata
+        prefetch.assert_called_once_with("prefill0", 7000 + worker.tp_rank)
+
+        metadata = MooncakeConnectorMetadata()
+        metadata.remotes_to_prefetch = {("prefill1", 8000)}
+        worker.start_load_kv(metadata)
+        prefetch.assert_called_with("prefill1", 8000 + worker.tp_rank)
+
     def test_register_kv_caches_mla_case(self):
         mla_cache1 = MagicMock()
         mla_cache1.size.return_value = (10, 16, 1, 16)
@@ -1191,6 +2243,34 @@ class TestMooncakeConnectorWorker(unittest.TestCase):
         self.assertTrue(worker.use_mla)
         self.assertEqual(len(worker.block_len), 2)
 
+    def test_save_kv_layer_layerwise(self):
+        get_from_extra_config = \
+            self.vllm_config.kv_transfer_config.get_from_extra_config
+        self.vllm_config.kv_transfer_config.get_from_extra_config = MagicMock(
+            side_effect=lambda k, d: True
+            if k == "use_layerwise" else get_from_extra_config(k, d))
+        worker = MooncakeConnectorWorker(self.vllm_config, self.engine_id)
+        worker.register_kv_caches({
+            "layer0": (MagicMock(), MagicMock()),
+            "layer1": (MagicMock(), MagicMock())
+        })
+        metadata = MooncakeConnectorMetadata()
+        worker.save_kv_layer("layer1", metadata)
+        worker.kv_send_thread.mark_layers_ready.assert_not_called()
+
+        metadata.add_new_prefilling_req("req1", [1, 2])
+        with patch("torch.npu", create=True) as mock_npu:
+            worker.save_kv_layer("layer1", metadata)
+            worker.kv_send_thread.mark_layers_ready.assert_called_once_with(
+                metadata.prefilling_requests, [1],
+                mock_npu.Event.return_value)
+            mock_npu.Event.return_value.record.assert_called_once()
+
+            worker.wait_for_save(metadata)
+            _, layers, _ = \
+                worker.kv_send_thread.mark_layers_ready.call_args[0]
+            self.assertEqual(list(layers), [0, 1])
+
 
 if __name__ == '__main__':
     unittest.main()
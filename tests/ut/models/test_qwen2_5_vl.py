@@ -1,3 +1,5 @@
+from types import SimpleNamespace
+
 import pytest
 import torch
 import torch.nn.functional as F
@@ -7,7 +9,8 @@ from tests.ut.base import PytestBase
 from vllm_ascend.models.qwen2_5_vl import (
     AscendQwen2_5_VisionAttention, AscendQwen2_5_VisionBlock,
     AscendQwen2_5_VisionPatchEmbed, AscendQwen2_5_VisionRotaryEmbedding,
-    AscendQwen2_5_VisionTransformer, AscendQwen2_5_VLForConditionalGeneration)
+    AscendQwen2_5_VisionTransformer, AscendQwen2_5_VLForConditionalGeneration,
+    _get_rot_pos_ids)
 
 
 class TestAscendQwen2_5_VisionAttention(PytestBase):
@@ -341,6 +344,30 @@ class TestAscendQwen2_5_VisionTransformer(PytestBase):
         cos_new, _ = vision_transformer.cal_cos_sin(self.input_data)
         assert cos_new.shape == (1, 32, 1, 2)
 
+    def test_rot_pos_ids_cached(self):
+        pos_ids = _get_rot_pos_ids(2, 2, 4, 2)
+        assert pos_ids.shape == (16, 2)
+        assert pos_ids[:8].tolist() == [[0, 0], [0, 1], [1, 0], [1, 1],
+                                        [0, 2], [0, 3], [1, 2], [1, 3]]
+        assert torch.equal(pos_ids[:8], pos_ids[8:])
+        assert _get_rot_pos_ids(2, 2, 4, 2) is pos_ids
+
+    def test_get_window_index(self):
+        vision_transformer = SimpleNamespace(window_size=8,
+                                             spatial_merge_size=2,
+                                             patch_size=2,
+                                             spatial_merge_unit=4)
+        grid_thw = torch.tensor([[1, 4, 6], [1, 4, 6]])
+        window_index, cu_window_seqlens = \
+            AscendQwen2_5_VisionTransformer.get_window_index(
+                vision_transformer, grid_thw)
+        assert window_index.tolist() == [
+            0, 1, 3, 4, 2, 5, 6, 7, 9, 10, 8, 11
+        ]
+        assert cu_window_seqlens.tolist() == [
+            0, 16, 24, 24, 24, 40, 48, 48, 48
+        ]
+
     def test_forward(self, mocker: MockerFixture):
         vision_transformer = self.init_vision_transformer(mocker)
         mocker.patch("torch.nn.Module.__setattr__")
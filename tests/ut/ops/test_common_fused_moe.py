@@ -0,0 +1,118 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+from unittest.mock import MagicMock, patch
+
+import torch
+
+from tests.ut.base import TestBase
+from vllm_ascend.ops.common_fused_moe import forward_oot
+from vllm_ascend.ops.fused_moe import unified_fused_experts
+
+
+class TestForwardOot(TestBase):
+
+    def setUp(self):
+        self.method = MagicMock()
+        self.layer = MagicMock()
+        self.x = torch.randn(4, 8)
+        self.router_logits = torch.randn(4, 8)
+        self.shared_experts = MagicMock(return_value=torch.randn(4, 8))
+
+    def _forward(self, top_k):
+        return forward_oot(self.method,
+                           self.layer,
+                           self.x,
+                           use_grouped_topk=False,
+                           top_k=top_k,
+                           router_logits=self.router_logits,
+                           renormalize=True,
+                           global_num_experts=8,
+                           shared_experts=self.shared_experts)
+
+    @patch("vllm_ascend.ops.common_fused_moe.is_310p", return_value=False)
+    @patch("vllm_ascend.ops.common_fused_moe.get_forward_context")
+    @patch("vllm_ascend.ops.common_fused_moe.unified_fused_experts")
+    @patch("vllm_ascend.ops.common_fused_moe.select_experts")
+    def test_shared_experts_passed_to_comm_method_path(
+            self, mock_select_experts, mock_unified_fused_experts,
+            mock_get_forward_context, mock_is_310p):
+        mock_select_experts.return_value = (torch.rand(4, 2),
+                                            torch.randint(0, 8, (4, 2)))
+        result = self._forward(top_k=2)
+
+        self.assertIs(result, mock_unified_fused_experts.return_value)
+        kwargs = mock_unified_fused_experts.call_args.kwargs
+        self.assertIs(kwargs["shared_experts"], self.shared_experts)
+        self.assertIs(kwargs["shared_expert_overlap"],
+                      self.method.shared_expert_overlap)
+        self.assertIs(kwargs["moe_comm_method"],
+                      mock_get_forward_context.return_value.moe_comm_method)
+
+    @patch("vllm_ascend.ops.common_fused_moe.is_310p", return_value=False)
+    @patch("vllm_ascend.ops.common_fused_moe.fused_experts_moge")
+    @patch("vllm_ascend.ops.common_fused_moe.select_experts")
+    def test_shared_experts_on_moge_path(self, mock_select_experts,
+                                         mock_fused_experts_moge,
+                                         mock_is_310p):
+        # Fewer selected experts than top_k falls back to MoGE.
+        mock_select_experts.return_value = (torch.rand(4, 2),
+                                            torch.randint(0, 8, (4, 2)))
+        hidden_states, shared_hidden_states = self._forward(top_k=3)
+
+        self.assertIs(hidden_states, mock_fused_experts_moge.return_value)
+        self.shared_experts.assert_called_once_with(self.x)
+        self.assertIs(shared_hidden_states, self.shared_experts.return_value)
+
+
+class TestUnifiedFusedExperts(TestBase):
+
+    @patch("vllm_ascend.ops.fused_moe.apply_mlp")
+    def test_shared_expert_overlap(self, mock_apply_mlp):
+        hidden_states = torch.randn(4, 8)
+        w1 = torch.randn(2, 16, 8)
+        w2 = torch.randn(2, 8, 8)
+        topk_weights = torch.rand(4, 2)
+        topk_ids = torch.randint(0, 2, (4, 2))
+        shared_experts = MagicMock()
+        overlap = MagicMock()
+        shared_output = torch.randn(4, 8)
+        overlap.merge.return_value = shared_output
+
+        # Record the order of the overlap and the routed-expert steps.
+        calls = MagicMock()
+        calls.attach_mock(overlap.launch, "launch")
+        calls.attach_mock(overlap.merge, "merge")
+        calls.pre_process.return_value = (torch.randn(8, 8),
+                                          torch.tensor([4, 4]), 1)
+        with patch.object(torch.ops.vllm, "moe_comm_pre_process",
+                          calls.pre_process), \
+                patch.object(torch.ops.vllm, "moe_comm_post_process",
+                             calls.post_process):
+            output = unified_fused_experts(hidden_states,
+                                           w1,
+                                           w2,
+                                           topk_weights,
+                                           topk_ids,
+                                           moe_comm_method=MagicMock(),
+                                           shared_experts=shared_experts,
+                                           shared_expert_overlap=overlap)
+
+        shared_experts.assert_not_called()
+        self.assertEqual(
+            [name for name, _, _ in calls.mock_calls],
+            ["launch", "pre_process", "merge", "post_process"])
+        overlap.launch.assert_called_once_with(shared_experts, hidden_states)
+        self.assertIs(output[0], hidden_states)
+        self.assertIs(output[1], shared_output)
@@ -15,13 +15,17 @@
 
 import json
 import os
+import tempfile
 from typing import List, TypedDict
 from unittest import mock
 
 import torch
 
 from tests.ut.base import TestBase
-from vllm_ascend.ops.expert_load_balancer import ExpertLoadBalancer
+from vllm_ascend.ops.expert_load_balancer import (
+    ExpertLoadBalancer, build_expert_placement_map, build_log2phy_table,
+    clear_expert_load_balancer_cache, generate_force_balance_topk_ids,
+    get_expert_load_balancer, map_logical_to_physical, save_expert_map)
 
 
 class Device(TypedDict):
@@ -60,24 +64,6 @@ class TestExpertLoadBalancer(TestBase):
         self.assertEqual(self.expert_load_balancer.ranks_num,
                          self.expert_map["layer_list"][0]["device_count"])
 
-    def test_generate_index_dicts(self):
-        tensor_2d = torch.tensor([[7, 2, 0, 3, 5], [6, 1, 4, 7, 2]])
-        result = self.expert_load_balancer.generate_index_dicts(tensor_2d)
-        expected_result = [{
-            7: 0,
-            2: 1,
-            0: 2,
-            3: 3,
-            5: 4
-        }, {
-            6: 5,
-            1: 6,
-            4: 7,
-            7: 8,
-            2: 9
-        }]
-        self.assertEqual(result, expected_result)
-
     def test_generate_expert_placement_map(self):
         expert_placement_map = self.expert_load_balancer.generate_expert_placement_map(
         )
@@ -86,6 +72,10 @@ class TestExpertLoadBalancer(TestBase):
                           self.expert_load_balancer.ranks_num, 8))
         self.assertTrue(torch.all(expert_placement_map >= -1))
 
+    def test_expert_placement_map_rejects_duplicates(self):
+        with self.assertRaises(ValueError):
+            build_expert_placement_map(torch.tensor([[0, 0], [1, 2]]), 3)
+
     def test_generate_log2phy_expert_map(self):
         layer_id = 0
         log2phy_map = self.expert_load_balancer.generate_log2phy_expert_map(
@@ -139,3 +129,162 @@ class TestExpertLoadBalancer(TestBase):
         expected_redundant_expert_num = len(self.expert_map["layer_list"][0]["device_list"][0]["device_expert"]) * \
                                         self.expert_map["layer_list"][0]["device_count"] - 8
         self.assertEqual(redundant_expert_num, expected_redundant_expert_num)
+
+    def test_generate_log2phy_expert_map_replicas(self):
+        # Every logical expert maps to a physical slot holding that expert,
+        # and to the rank's own slot whenever the rank holds a copy.
+        placement_map = self.expert_load_balancer.generate_expert_placement_map(
+        )
+        physical_experts = self.expert_load_balancer.expert_map_tensor[
+            0].flatten()
+        log2phy_map = self.expert_load_balancer.generate_log2phy_expert_map(0)
+        local_num = physical_experts.numel(
+        ) // self.expert_load_balancer.ranks_num
+        for rank_id in range(self.expert_load_balancer.ranks_num):
+            for expert_id in range(8):
+                physical_id = log2phy_map[rank_id, expert_id].item()
+                self.assertEqual(physical_experts[physical_id].item(),
+                                 expert_id)
+                local_id = placement_map[0, rank_id, expert_id].item()
+                if local_id != -1:
+                    self.assertEqual(physical_id,
+                                     rank_id * local_num + local_id)
+
+    def test_generate_log2phy_expert_map_cached(self):
+        first = self.expert_load_balancer.generate_log2phy_expert_map(0)
+        second = self.expert_load_balancer.generate_log2phy_expert_map(0)
+        self.assertTrue(first.equal(second))
+
+    def test_get_expert_load_balancer_cached(self):
+        clear_expert_load_balancer_cache()
+        json_file = os.path.dirname(__file__) + "/expert_map.json"
+        balancer = get_expert_load_balancer(json_file, 8)
+        self.assertIs(get_expert_load_balancer(json_file, 8), balancer)
+        self.assertIsNot(get_expert_load_balancer(json_file, 16), balancer)
+        clear_expert_load_balancer_cache()
+        self.assertIsNot(get_expert_load_balancer(json_file, 8), balancer)
+        clear_expert_load_balancer_cache()
+
+    def test_save_expert_map(self):
+        expert_map_tensor = self.expert_load_balancer.expert_map_tensor
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_file = os.path.join(tmp_dir, "expert_map.json")
+            save_expert_map(expert_map_tensor, json_file)
+            with open(json_file, 'r') as f:
+                self.assertEqual(json.load(f), self.expert_map)
+            balancer = ExpertLoadBalancer(json_file, global_expert_num=8)
+        self.assertTrue(balancer.expert_map_tensor.equal(expert_map_tensor))
+
+
+class TestLog2phyTable(TestBase):
+
+    def setUp(self):
+        # 2 nodes of 2 ranks. Expert 0 lives on every rank of node 0 and on
+        # rank 3, expert 1 on ranks 1 and 2, expert 2 only on rank 3.
+        self.deployment = torch.tensor([[0, 3], [0, 1], [1, 3], [0, 2]])
+        self.placement = build_expert_placement_map(self.deployment, 4)
+
+    def _table(self, policy, **kwargs):
+        return build_log2phy_table(self.deployment, self.placement, 4,
+                                   policy, **kwargs)
+
+    def test_replicas_of_expert(self):
+        physical_experts = self.deployment.flatten()
+        for policy in ("nearest", "round_robin", "load_weighted"):
+            table = self._table(policy, num_nodes=2, width=4)
+            for expert in range(4):
+                self.assertTrue(
+                    torch.all(physical_experts[table[:, expert].long()] ==
+                              expert))
+            # Local copies are always used.
+            self.assertTrue(torch.all(table[0, 0] == 0))
+            self.assertTrue(torch.all(table[3, 2] == 7))
+
+    def test_same_node_preferred(self):
+        table = self._table("round_robin", num_nodes=2, width=4)
+        # Rank 1 holds no copy of expert 3, the only one on its node is on
+        # rank 0; rank 0 has expert 1 only on rank 1 of its node.
+        self.assertEqual(set(table[1, 3].tolist()), {1})
+        self.assertEqual(set(table[0, 1].tolist()), {3})
+        # Without topology, both replicas of expert 3 are used.
+        table = self._table("round_robin", width=4)
+        self.assertEqual(set(table[1, 3].tolist()), {1, 5})
+
+    def test_nearest_spreads_ranks(self):
+        table = self._table("nearest")
+        self.assertEqual(table.shape, (4, 4))
+        # Ranks 0 and 1 reach expert 2 only through rank 3.
+        self.assertEqual(table[:2, 2].tolist(), [7, 7])
+        # Ranks 1 and 3 hold no copy of expert 3, so they pick different
+        # replicas among ranks 0 and 2.
+        self.assertEqual(table[[1, 3], 3].tolist(), [1, 5])
+
+    def test_round_robin_cycles(self):
+        table = self._table("round_robin", width=4)
+        # Expert 1 alternates between ranks 1 and 2 for ranks 0 and 3.
+        self.assertEqual(table[0, 1].tolist(), [3, 4, 3, 4])
+        self.assertEqual(table[3, 1].tolist(), [4, 3, 4, 3])
+
+    def test_load_weighted(self):
+        # Rank 0 gets most of the load, so remote ranks avoid its replicas.
+        expert_load = torch.tensor([30.0, 1.0, 1.0, 100.0])
+        table = self._table("load_weighted",
+                            width=12,
+                            expert_load=expert_load)
+        shares = torch.bincount(table[1, 3].long(), minlength=8)
+        self.assertGreater(shares[5], shares[1])
+        self.assertEqual(shares.sum().item(), 12)
+
+    def test_map_logical_to_physical(self):
+        topk_ids = torch.tensor([[1, 3], [1, 2], [1, 0]])
+        static = self._table("nearest")[0]
+        self.assertTrue(
+            torch.equal(map_logical_to_physical(topk_ids, static),
+                        static[topk_ids]))
+        table = self._table("round_robin", width=2)[0]
+        physical_ids = map_logical_to_physical(topk_ids, table)
+        # Consecutive tokens alternate between the replicas of expert 1.
+        self.assertEqual(physical_ids[:, 0].tolist(), [3, 4, 3])
+        self.assertEqual(physical_ids[:, 1].tolist(), [1, 7, 0])
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            self._table("fastest")
+
+
+class TestForceBalanceTopkIds(TestBase):
+
+    def test_deterministic(self):
+        topk_ids = torch.zeros(5, 4, dtype=torch.int32)
+        ids = generate_force_balance_topk_ids(topk_ids, 16, 1, 2)
+        self.assertEqual(ids.shape, topk_ids.shape)
+        self.assertEqual(ids.dtype, torch.int32)
+        self.assertTrue(
+            torch.equal(ids, generate_force_balance_topk_ids(
+                topk_ids, 16, 1, 2)))
+        # Token 0 of rank 1 follows token 0 of rank 0.
+        self.assertEqual(ids[0].tolist(), [4, 5, 6, 7])
+
+    def test_distinct_experts_per_token(self):
+        topk_ids = torch.zeros(7, 8, dtype=torch.int64)
+        ids = generate_force_balance_topk_ids(topk_ids, 12, 3, 4)
+        for token_ids in ids.tolist():
+            self.assertEqual(len(set(token_ids)), 8)
+
+    def test_balanced_over_physical_experts(self):
+        # 16 logical and 4 redundant experts on 4 ranks.
+        num_physical_experts, ep_size, num_tokens, top_k = 20, 4, 9, 8
+        topk_ids = torch.zeros(num_tokens, top_k, dtype=torch.int32)
+        ids = torch.cat([
+            generate_force_balance_topk_ids(topk_ids, num_physical_experts,
+                                            rank, ep_size)
+            for rank in range(ep_size)
+        ])
+        load = torch.bincount(ids.flatten().long(),
+                              minlength=num_physical_experts)
+        self.assertEqual(load.numel(), num_physical_experts)
+        self.assertLessEqual(int(load.max() - load.min()), 1)
+        # Ranks hold 5 physical experts each, their loads differ by at most
+        # one token per expert.
+        rank_load = load.view(ep_size, -1).sum(-1)
+        self.assertLessEqual(int(rank_load.max() - rank_load.min()), 5)
@@ -73,7 +73,9 @@ def mock_dist_env(mocker: MockerFixture):
          patch('vllm_ascend.ops.fused_moe.get_ascend_config',
                return_value=MagicMock(
                    torchair_graph_config=MagicMock(enabled=False, enable_multistream_moe=False),
-                   expert_map_path=None
+                   eplb_config=MagicMock(collect_expert_load=False),
+                   expert_map_path=None,
+                   enable_shared_expert_overlap=False
                )), \
          patch('vllm_ascend.ops.fused_moe.determine_expert_map',
                return_value=(3, torch.tensor([0, 1, 2, -1, -1, -1, -1, -1]))), \
@@ -286,6 +288,34 @@ class TestAscendFusedMoe:
         else:
             assert output.shape == (num_tokens, 32)
 
+    def test_forward_with_shared_expert_overlap(self, mock_dist_env,
+                                                default_moe_config):
+        inputs = torch.randn(5, 32)
+        router_logits = torch.randn(5, 8)
+        moe = AscendFusedMoE(**default_moe_config)
+        moe.quant_method = MockQuantMethod(None, 5)
+        moe.shared_expert_overlap = MagicMock(launched=True)
+        shared_output = torch.randn(5, 10)
+        moe.shared_expert_overlap.merge.return_value = shared_output
+        shared_experts = MagicMock()
+
+        forward_context = MagicMock(mc2_mask=torch.zeros(5, dtype=torch.bool),
+                                    padded_num_tokens=5)
+        with patch("vllm_ascend.ops.fused_moe.get_forward_context",
+                   return_value=forward_context):
+            output = moe.forward(inputs,
+                                 router_logits,
+                                 is_prefill=False,
+                                 shared_experts=shared_experts)
+
+        # The shared experts run on the secondary stream only.
+        shared_experts.assert_not_called()
+        moe.shared_expert_overlap.launch.assert_called_once_with(
+            shared_experts, inputs)
+        moe.shared_expert_overlap.merge.assert_called_once()
+        assert output[0].shape == (5, 32)
+        assert output[1] is shared_output
+
     def test_forward_ms_fused_moe_comp(self, mock_dist_env,
                                        default_moe_config):
         inputs = torch.randn(5, 32)
@@ -4,7 +4,9 @@ from unittest.mock import MagicMock, patch
 import torch
 
 from tests.ut.base import TestBase
-from vllm_ascend.ops.rotary_embedding import (custom_rotary_embedding_enabled,
+from vllm_ascend.ops.rotary_embedding import (_set_cos_sin_cache,
+                                              clear_cos_sin_cache_registry,
+                                              custom_rotary_embedding_enabled,
                                               native_rope_deepseek_forward,
                                               rope_forward_oot, rotate_half,
                                               yarn_find_correction_dim,
@@ -261,6 +263,84 @@ class TestNativeRopeDeepseekForward(TestBase):
         assert k_pe.shape == key.shape
 
 
+class MockYarnRopeModule(torch.nn.Module):
+
+    def __init__(self, rotary_dim=64, mscale=1.0):
+        super().__init__()
+        self.rotary_dim = rotary_dim
+        self.base = 10000
+        self.scaling_factor = 4.0
+        self.beta_fast = 32
+        self.beta_slow = 1
+        self.mscale = mscale
+        self.max_position_embeddings = 512
+
+
+class TestCosSinCacheRegistry(TestBase):
+
+    def setUp(self):
+        clear_cos_sin_cache_registry()
+
+    def tearDown(self):
+        clear_cos_sin_cache_registry()
+
+    def test_identical_params_share_cache(self):
+        layer0 = MockYarnRopeModule()
+        layer1 = MockYarnRopeModule()
+        _set_cos_sin_cache(layer0, 512, "cpu", torch.float32)
+        _set_cos_sin_cache(layer1, 512, "cpu", torch.float32)
+
+        self.assertIs(layer0.cos_sin_cache, layer1.cos_sin_cache)
+        self.assertIs(layer0.cos_cached, layer1.cos_cached)
+        self.assertIs(layer0.sin_cached, layer1.sin_cached)
+        self.assertEqual(layer0.cos_sin_cache.shape, (512 * 4, 64))
+
+    def test_different_params_do_not_share_cache(self):
+        layer0 = MockYarnRopeModule(mscale=1.0)
+        layer1 = MockYarnRopeModule(mscale=0.5)
+        _set_cos_sin_cache(layer0, 512, "cpu", torch.float32)
+        _set_cos_sin_cache(layer1, 512, "cpu", torch.float32)
+
+        self.assertIsNot(layer0.cos_sin_cache, layer1.cos_sin_cache)
+        self.assertTrue(
+            torch.allclose(layer0.cos_cached * 0.5, layer1.cos_cached))
+
+    def test_growing_seq_len_rebuilds_cache(self):
+        layer0 = MockYarnRopeModule()
+        layer1 = MockYarnRopeModule()
+        _set_cos_sin_cache(layer0, 512, "cpu", torch.float32)
+        _set_cos_sin_cache(layer1, 1024, "cpu", torch.float32)
+
+        self.assertEqual(layer1.max_seq_len_cached, 1024)
+        self.assertEqual(layer1.cos_sin_cache.shape, (1024 * 4, 64))
+        self.assertTrue(
+            torch.equal(layer0.cos_sin_cache,
+                        layer1.cos_sin_cache[:512 * 4]))
+
+    def test_shorter_seq_len_slices_cache(self):
+        layer0 = MockYarnRopeModule()
+        layer1 = MockYarnRopeModule()
+        _set_cos_sin_cache(layer0, 1024, "cpu", torch.float32)
+        with patch('vllm_ascend.ops.rotary_embedding._build_yarn_cos_sin_cache'
+                   ) as mock_build:
+            _set_cos_sin_cache(layer1, 512, "cpu", torch.float32)
+            _set_cos_sin_cache(layer1, 1024, "cpu", torch.float32)
+            _set_cos_sin_cache(layer1, 512, "cpu", torch.float32)
+        mock_build.assert_not_called()
+
+        self.assertEqual(layer1.max_seq_len_cached, 512)
+        self.assertEqual(layer1.cos_sin_cache.shape, (512 * 4, 64))
+        self.assertEqual(layer1.cos_cached.shape, (512 * 4, 64))
+        self.assertEqual(layer1.cos_sin_cache.data_ptr(),
+                         layer0.cos_sin_cache.data_ptr())
+        expected = MockYarnRopeModule()
+        clear_cos_sin_cache_registry()
+        _set_cos_sin_cache(expected, 512, "cpu", torch.float32)
+        self.assertTrue(
+            torch.equal(layer1.cos_sin_cache, expected.cos_sin_cache))
+        self.assertTrue(torch.equal(layer1.sin_cached, expected.sin_cached))
+
+
 class TestRotateHalf(TestBase):
 
     def test_rotate_half_even_dim(self):
@@ -0,0 +1,100 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+from unittest.mock import MagicMock, call, patch
+
+import torch
+
+from tests.ut.base import TestBase
+from vllm_ascend.ops.moe_dispatcher.shared_expert_overlap import (
+    SharedExpertOverlap, create_shared_expert_overlap)
+
+
+class TestSharedExpertOverlap(TestBase):
+
+    def setUp(self):
+        self.secondary_stream = MagicMock()
+        self.current_stream = MagicMock()
+        self.patches = [
+            patch("torch.npu.Stream", return_value=self.secondary_stream),
+            patch("torch.npu.Event", side_effect=lambda: MagicMock()),
+            patch("torch.npu.stream"),
+            patch("torch.npu.current_stream",
+                  return_value=self.current_stream),
+            patch.object(torch.Tensor, "record_stream"),
+        ]
+        for p in self.patches:
+            p.start()
+        SharedExpertOverlap.stream = None
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        SharedExpertOverlap.stream = None
+
+    def test_stream_is_shared(self):
+        first = SharedExpertOverlap()
+        second = SharedExpertOverlap()
+        self.assertIs(first.stream, self.secondary_stream)
+        self.assertIs(second.stream, first.stream)
+        self.assertIsNot(first.done_event, second.done_event)
+
+    def test_launch_and_merge(self):
+        overlap = SharedExpertOverlap()
+        hidden_states = torch.randn(4, 8)
+        shared_output = torch.randn(4, 8)
+        shared_experts = MagicMock(return_value=shared_output)
+
+        overlap.launch(shared_experts, hidden_states)
+        shared_experts.assert_called_once_with(hidden_states)
+        self.assertTrue(overlap.launched)
+        overlap.input_ready_event.record.assert_called_once_with()
+        overlap.input_ready_event.wait.assert_called_once_with()
+        overlap.done_event.record.assert_called_once_with()
+        torch.npu.stream.assert_called_once_with(self.secondary_stream)
+
+        output = overlap.merge()
+        self.assertIs(output, shared_output)
+        self.assertFalse(overlap.launched)
+        self.assertIsNone(overlap.output)
+        overlap.done_event.wait.assert_called_once_with(self.current_stream)
+        # The input is kept for the secondary stream, the output for the
+        # current stream.
+        torch.Tensor.record_stream.assert_has_calls(
+            [call(self.secondary_stream),
+             call(self.current_stream)])
+
+    def test_merge_requires_launch(self):
+        overlap = SharedExpertOverlap()
+        with self.assertRaises(AssertionError):
+            overlap.merge()
+
+    def test_launch_twice(self):
+        overlap = SharedExpertOverlap()
+        overlap.launch(MagicMock(), torch.randn(2, 2))
+        with self.assertRaises(AssertionError):
+            overlap.launch(MagicMock(), torch.randn(2, 2))
+
+    @patch(
+        "vllm_ascend.ops.moe_dispatcher.shared_expert_overlap."
+        "get_tensor_model_parallel_world_size",
+        return_value=1)
+    def test_create_shared_expert_overlap(self, mock_tp_size):
+        self.assertIsNone(create_shared_expert_overlap(False))
+        self.assertIsInstance(create_shared_expert_overlap(True),
+                              SharedExpertOverlap)
+        # The TP all-reduce of the shared experts must stay on the current
+        # stream.
+        mock_tp_size.return_value = 2
+        self.assertIsNone(create_shared_expert_overlap(True))
@@ -70,6 +70,124 @@ class TestMoEAlltoAllSeqOverLapDispatcher(PytestBase):
         assert dispatcher.overlap_stream is not None
 
 
+class TestMoEAlltoAllSeqOverLapDispatcherCapacity(PytestBase):
+
+    def build_dispatcher(self,
+                         mocker: MockerFixture,
+                         capacity_factor=1.0,
+                         drop_policy="probs",
+                         reroute=False,
+                         pad=True):
+        config = MoEDispatcherConfig().set_num_local_experts(
+            4).set_num_moe_experts(4).set_moe_router_topk(
+                2).set_moe_expert_capacity_factor(
+                    capacity_factor).set_moe_pad_expert_input_to_capacity(
+                        pad).set_moe_token_drop_policy(
+                            drop_policy).set_moe_reroute_dropped_tokens(
+                                reroute).build()
+        mock_group = mocker.MagicMock()
+        mock_group.rank_in_group = 0
+        mock_group.world_size = 1
+        mocker.patch(
+            "vllm_ascend.ops.moe_dispatcher.token_dispatcher.get_ep_group",
+            return_value=mock_group)
+        mocker.patch("torch.npu.current_device", return_value="cpu")
+        mocker.patch("torch.npu.Stream", return_value=mocker.MagicMock)
+        # A single EP rank, the AlltoAll returns its input.
+        mocker.patch(
+            "vllm_ascend.ops.moe_dispatcher.token_dispatcher.async_all_to_all",
+            side_effect=lambda input_, *args:
+            (input_, input_.clone(), mocker.MagicMock()))
+        return MoEAlltoAllSeqOverLapDispatcher(config)
+
+    @staticmethod
+    def run_experts(dispatcher, hidden_states, probs, topk_ids):
+        """Expert e scales its tokens by e + 1."""
+        _, global_input_tokens, tokens_per_expert = \
+            dispatcher.token_permutation(hidden_states, probs, topk_ids)
+        scale = torch.repeat_interleave(
+            torch.arange(1, tokens_per_expert.numel() + 1,
+                         dtype=hidden_states.dtype), tokens_per_expert)
+        output, _ = dispatcher.token_unpermutation(
+            global_input_tokens * scale.unsqueeze(-1))
+        return output, global_input_tokens, tokens_per_expert
+
+    def test_static_shapes_and_dropless(self, mocker: MockerFixture):
+        dispatcher = self.build_dispatcher(mocker, capacity_factor=4.0)
+        hidden_states = torch.randn(6, 8)
+        probs, topk_ids = torch.rand(6, 4).softmax(-1).topk(2)
+        output, global_input_tokens, tokens_per_expert = self.run_experts(
+            dispatcher, hidden_states, probs, topk_ids)
+        # capacity = ceil(6 * 2 / 4 * 4.0)
+        assert dispatcher.capacity == 12
+        assert tokens_per_expert.tolist() == [12] * 4
+        assert global_input_tokens.shape == (48, 8)
+        expected = (probs * (topk_ids + 1)).sum(-1, keepdim=True) * \
+            hidden_states
+        torch.testing.assert_close(output, expected)
+
+    def test_capacity_agreed_across_ranks(self, mocker: MockerFixture):
+        # Two EP ranks with uneven batches size the AlltoAll by the largest.
+        outputs = []
+        for num_tokens in (6, 3):
+            dispatcher = self.build_dispatcher(mocker, capacity_factor=4.0)
+            hidden_states = torch.randn(num_tokens, 8)
+            probs, topk_ids = torch.rand(num_tokens, 4).softmax(-1).topk(2)
+            _, global_input_tokens, tokens_per_expert = \
+                dispatcher.token_permutation(hidden_states, probs, topk_ids,
+                                             max_num_tokens=6)
+            output, _ = dispatcher.token_unpermutation(global_input_tokens)
+            torch.testing.assert_close(
+                output,
+                probs.sum(-1, keepdim=True) * hidden_states)
+            outputs.append((dispatcher.capacity, tokens_per_expert.tolist(),
+                            global_input_tokens.shape))
+        assert outputs[0] == outputs[1] == (12, [12] * 4, (48, 8))
+
+    def test_drop_lowest_probs(self, mocker: MockerFixture):
+        dispatcher = self.build_dispatcher(mocker)
+        hidden_states = torch.randn(4, 8)
+        # All tokens select expert 0, which has a capacity of 2.
+        topk_ids = torch.tensor([[0, 1], [0, 2], [0, 3], [0, 1]])
+        probs = torch.tensor([[0.6, 0.4], [0.9, 0.1], [0.7, 0.3],
+                              [0.5, 0.5]])
+        output, _, _ = self.run_experts(dispatcher, hidden_states, probs,
+                                        topk_ids)
+        kept = torch.tensor([[0.0, 0.4], [0.9, 0.1], [0.7, 0.3], [0.0, 0.5]])
+        torch.testing.assert_close(dispatcher.capacity_probs, kept)
+        expected = (kept * (topk_ids + 1)).sum(-1, keepdim=True) * \
+            hidden_states
+        torch.testing.assert_close(output, expected)
+
+    def test_drop_by_position(self, mocker: MockerFixture):
+        dispatcher = self.build_dispatcher(mocker, drop_policy="position")
+        topk_ids = torch.tensor([[0, 1], [0, 2], [0, 3], [0, 1]])
+        probs = torch.tensor([[0.6, 0.4], [0.9, 0.1], [0.7, 0.3],
+                              [0.5, 0.5]])
+        self.run_experts(dispatcher, torch.randn(4, 8), probs, topk_ids)
+        assert dispatcher.capacity_probs[:, 0].tolist() == pytest.approx(
+            [0.6, 0.9, 0.0, 0.0])
+
+    def test_reroute_dropped_tokens(self, mocker: MockerFixture):
+        dispatcher = self.build_dispatcher(mocker, reroute=True)
+        topk_ids = torch.tensor([[0, 1], [0, 2], [0, 3], [0, 1]])
+        probs = torch.tensor([[0.6, 0.4], [0.9, 0.1], [0.7, 0.3],
+                              [0.5, 0.5]])
+        self.run_experts(dispatcher, torch.randn(4, 8), probs, topk_ids)
+        # Dropped tokens move their share to their second expert.
+        torch.testing.assert_close(
+            dispatcher.capacity_probs,
+            torch.tensor([[0.0, 1.0], [0.9, 0.1], [0.7, 0.3], [0.0, 1.0]]))
+
+    def test_invalid_config(self, mocker: MockerFixture):
+        with pytest.raises(ValueError):
+            self.build_dispatcher(mocker, capacity_factor=None)
+        with pytest.raises(ValueError):
+            self.build_dispatcher(mocker, pad=False)
+        with pytest.raises(ValueError):
+            self.build_dispatcher(mocker, drop_policy="random")
+
+
 class TestTokenDispatcherWithMC2(unittest.TestCase):
 
     def setUp(self):
@@ -201,3 +201,105 @@ class TestAscendRejectionSampler(TestBase):
             IS_NGRAM=False,
         )
         assert output_token_ids[0].item() == 0
+
+    def test_rejection_greedy_sample_pytorch_bonus_and_non_greedy(self):
+        """Fully accepted greedy requests get the bonus token, non-greedy
+        requests are left untouched"""
+        batch_size = 3
+        max_spec_len = 3
+        output_token_ids = torch.full((batch_size, max_spec_len + 1),
+                                      PLACEHOLDER_TOKEN_ID,
+                                      dtype=torch.int32)
+
+        cu_num_draft_tokens = torch.tensor([3, 4, 6])
+        num_draft_tokens = [3, 1, 2]
+        draft_token_ids = torch.tensor([1, 2, 3, 4, 5, 6])
+        target_argmax = torch.tensor([1, 2, 3, 9, 5, 6])
+        bonus_token_ids = torch.tensor([[100], [200], [300]],
+                                       dtype=torch.int32)
+        is_greedy = torch.tensor([True, True, False])
+
+        rejection_greedy_sample_pytorch(
+            output_token_ids,
+            cu_num_draft_tokens,
+            draft_token_ids,
+            target_argmax,
+            bonus_token_ids,
+            num_draft_tokens,
+            max_spec_len,
+            is_greedy,
+        )
+
+        assert output_token_ids.tolist() == [[1, 2, 3, 100], [9, -1, -1, -1],
+                                             [-1, -1, -1, -1]]
+
+    def test_rejection_random_sample_pytorch_ngram(self):
+        """N-gram drafts are accepted when the target probability reaches the
+        uniform sample, and stop at the first rejection"""
+        batch_size = 2
+        max_spec_len = 3
+        output_token_ids = torch.full((batch_size, max_spec_len + 1),
+                                      PLACEHOLDER_TOKEN_ID,
+                                      dtype=torch.int32)
+
+        cu_num_draft_tokens = torch.tensor([3, 5])
+        draft_token_ids = torch.tensor([0, 1, 2, 3, 0])
+        target_probs = torch.tensor([
+            [0.9, 0.1, 0.0, 0.0],
+            [0.1, 0.2, 0.3, 0.4],
+            [0.0, 0.0, 1.0, 0.0],
+            [0.0, 0.0, 0.0, 1.0],
+            [0.5, 0.5, 0.0, 0.0],
+        ])
+        bonus_token_ids = torch.tensor([[100], [200]], dtype=torch.int32)
+        recovered_token_ids = torch.tensor([7, 8, 9, 10, 11])
+        uniform_probs = torch.tensor([0.5, 0.5, 0.5, 0.5, 0.4])
+        is_greedy = torch.tensor([False, False])
+
+        rejection_random_sample_pytorch(
+            output_token_ids,
+            cu_num_draft_tokens,
+            draft_token_ids,
+            None,
+            target_probs,
+            bonus_token_ids,
+            recovered_token_ids,
+            uniform_probs,
+            is_greedy,
+            max_spec_len,
+            4,
+            IS_NGRAM=True,
+        )
+
+        assert output_token_ids.tolist() == [[0, 8, -1, -1], [3, 0, 200, -1]]
+
+    def test_sample_recovered_tokens_pytorch_batched(self):
+        """Recovered tokens use the distribution of their own request and
+        leave target_probs unchanged"""
+        output_token_ids = torch.empty(3, dtype=torch.int64)
+        cu_num_draft_tokens = torch.tensor([2, 3])
+        draft_token_ids = torch.tensor([0, 1, 2])
+        target_probs = torch.tensor([
+            [0.4, 0.3, 0.3],
+            [0.3, 0.4, 0.3],
+            [0.3, 0.3, 0.4],
+        ])
+        original_target_probs = target_probs.clone()
+        q = torch.tensor([
+            [1.0, 1.0, 0.1],
+            [0.1, 1.0, 1.0],
+        ])
+
+        sample_recovered_tokens_pytorch(
+            output_token_ids,
+            cu_num_draft_tokens,
+            draft_token_ids,
+            None,
+            target_probs,
+            q,
+            3,
+            IS_NGRAM=True,
+        )
+
+        assert output_token_ids.tolist() == [2, 2, 0]
+        assert torch.equal(target_probs, original_target_probs)
@@ -3,7 +3,10 @@ from unittest import mock
 import torch
 
 from tests.ut.base import TestBase
-from vllm_ascend.sample.sampler import AscendSampler, AscendTopKTopPSampler
+from vllm_ascend.sample.sampler import (TOP_K_TOP_P_PARTIAL_K, AscendSampler,
+                                        AscendTopKTopPSampler,
+                                        apply_top_k_top_p_by_sort,
+                                        apply_top_k_top_p_sort_free)
 
 
 class TestAscendSampler(TestBase):
@@ -30,3 +33,79 @@ class TestAscendTopKTopPSampler(TestBase):
 
         sampler.forward_native(logits, generators, k, p)
         mock_npu_op.assert_called_once_with(logits, p, k)
+
+    def test_sort_free_matches_sort(self):
+        torch.manual_seed(0)
+        vocab_size = 4096
+        logits = torch.randn(8, vocab_size) * 4
+        # Integer logits produce ties at the cutoffs.
+        logits[4:] = logits[4:].round()
+        k = torch.tensor([1, 5, 50, vocab_size, 2000, 3, vocab_size, 100])
+        p = torch.tensor([0.9, 0.5, 0.99, 0.8, 0.3, 1.0, 0.95, 0.7])
+
+        for k_, p_ in ((k, None), (None, p), (k, p)):
+            # A small partial_k forces the radix select fallback as well.
+            for partial_k in (TOP_K_TOP_P_PARTIAL_K, 16):
+                expected = apply_top_k_top_p_by_sort(logits.clone(), k_, p_)
+                actual = apply_top_k_top_p_sort_free(logits.clone(), k_, p_,
+                                                     partial_k)
+                self.assertTrue(
+                    torch.equal(torch.isinf(expected), torch.isinf(actual)))
+
+    def test_sort_free_low_precision(self):
+        torch.manual_seed(0)
+        vocab_size = 4096
+        k = torch.tensor([1, 5, 50, vocab_size, 2000, 3, vocab_size, 100])
+        p = torch.tensor([0.9, 0.5, 0.99, 0.8, 0.3, 1.0, 0.95, 0.7])
+        for dtype in (torch.float16, torch.bfloat16):
+            logits = (torch.randn(8, vocab_size) * 4).to(dtype)
+            # The probabilities are those of the sort path.
+            expected = apply_top_k_top_p_by_sort(logits.clone(), k, None)
+            actual = apply_top_k_top_p_sort_free(logits.clone(), k, None, 16)
+            self.assertTrue(
+                torch.equal(torch.isinf(expected), torch.isinf(actual)))
+
+            # The top-p mass is summed in float32, a cutoff may move by one
+            # distinct probability from the low precision cumsum.
+            expected = ~torch.isinf(
+                apply_top_k_top_p_by_sort(logits.clone(), None, p))
+            actual = ~torch.isinf(
+                apply_top_k_top_p_sort_free(logits.clone(), None, p, 16))
+            probs = logits.softmax(dim=-1)
+            for row in range(logits.shape[0]):
+                diff = expected[row] ^ actual[row]
+                self.assertLessEqual(probs[row][diff].unique().numel(), 1)
+
+    def test_sort_free_does_not_sync(self):
+        torch.manual_seed(0)
+        logits = torch.randn(4, 256)
+        k = torch.tensor([3, 200, 256, 40])
+        p = torch.tensor([0.5, 0.9, 0.99, 1.0])
+        expected = apply_top_k_top_p_by_sort(logits.clone(), k, p)
+        topk = torch.Tensor.topk
+        topk_sizes = []
+
+        def recording_topk(tensor, size, *args, **kwargs):
+            topk_sizes.append(size)
+            return topk(tensor, size, *args, **kwargs)
+
+        with mock.patch.object(torch.Tensor, "__bool__",
+                               side_effect=AssertionError("host sync")), \
+                mock.patch.object(torch.Tensor, "item",
+                                  side_effect=AssertionError("host sync")), \
+                mock.patch.object(torch.Tensor, "topk", recording_topk):
+            actual = apply_top_k_top_p_sort_free(logits.clone(), k, p, 16)
+        # The candidates do not depend on k.
+        self.assertEqual(topk_sizes, [16])
+        self.assertTrue(
+            torch.equal(torch.isinf(expected), torch.isinf(actual)))
+
+    @mock.patch("vllm_ascend.sample.sampler.is_310p", return_value=True)
+    def test_310p_uses_sort_free_path(self, mock_is_310p):
+        sampler = AscendTopKTopPSampler()
+        logits = torch.tensor([[1.0, 2.0, 3.0, 4.0]])
+        k = torch.tensor([2])
+
+        result = sampler._apply_top_k_top_p(logits, k, None)
+        self.assertTrue(torch.isinf(result[0, :2]).all())
+        self.assertFalse(torch.isinf(result[0, 2:]).any())
@@ -43,6 +43,7 @@ class TestAscendConfig(TestBase):
         # No additional config given, check the default value here.
         ascend_config = init_ascend_config(test_vllm_config)
         self.assertIsNone(ascend_config.expert_map_path)
+        self.assertFalse(ascend_config.enable_shared_expert_overlap)
 
         torchair_graph_config = ascend_config.torchair_graph_config
         self.assertFalse(torchair_graph_config.enabled)
@@ -57,6 +58,27 @@ class TestAscendConfig(TestBase):
         ascend_scheduler_config = ascend_config.ascend_scheduler_config
         self.assertFalse(ascend_scheduler_config.enabled)
 
+        eplb_config = ascend_config.eplb_config
+        self.assertFalse(eplb_config.collect_expert_load)
+        self.assertEqual(eplb_config.expert_load_reduce_interval, 1000)
+        self.assertIsNone(eplb_config.expert_load_dump_path)
+        self.assertFalse(eplb_config.dynamic_eplb)
+        self.assertEqual(eplb_config.rebalance_interval, 3000)
+        self.assertEqual(eplb_config.num_migration_layers_per_step, 1)
+        self.assertEqual(eplb_config.num_nodes, 1)
+        self.assertFalse(eplb_config.collect_expert_coactivation)
+        self.assertIsNone(eplb_config.expert_coactivation_dump_path)
+        self.assertEqual(eplb_config.log2phy_policy, "random")
+        self.assertEqual(eplb_config.log2phy_table_width, 12)
+
+        adaptive_spec_decode_config = ascend_config.adaptive_spec_decode_config
+        self.assertFalse(adaptive_spec_decode_config.enabled)
+        self.assertEqual(adaptive_spec_decode_config.ewma_decay, 0.8)
+        self.assertEqual(adaptive_spec_decode_config.initial_acceptance_rate,
+                         0.8)
+        self.assertEqual(adaptive_spec_decode_config.draft_token_cost, 0.1)
+        self.assertEqual(adaptive_spec_decode_config.probe_interval, 16)
+
     @_clean_up_ascend_config
     def test_init_ascend_config_with_additional_config(self):
         test_vllm_config = VllmConfig()
@@ -304,3 +326,178 @@ class TestAscendConfig(TestBase):
                 "refresh": True
             }
             init_ascend_config(test_vllm_config)
+
+    @_clean_up_ascend_config
+    def test_adaptive_spec_decode_config(self):
+        test_vllm_config = VllmConfig()
+        test_vllm_config.additional_config = {
+            "adaptive_spec_decode_config": {
+                "enabled": True,
+                "ewma_decay": 0.5,
+                "draft_token_cost": 0.2,
+                "probe_interval": 4,
+            },
+            "refresh": True
+        }
+        ascend_config = init_ascend_config(test_vllm_config)
+        adaptive_spec_decode_config = ascend_config.adaptive_spec_decode_config
+        self.assertTrue(adaptive_spec_decode_config.enabled)
+        self.assertEqual(adaptive_spec_decode_config.ewma_decay, 0.5)
+        self.assertEqual(adaptive_spec_decode_config.draft_token_cost, 0.2)
+        self.assertEqual(adaptive_spec_decode_config.probe_interval, 4)
+
+        # adaptive draft length is disabled in torchair graph mode
+        test_vllm_config.additional_config = {
+            "torchair_graph_config": {
+                "enabled": True,
+            },
+            "adaptive_spec_decode_config": {
+                "enabled": True,
+            },
+            "refresh": True
+        }
+        ascend_config = init_ascend_config(test_vllm_config)
+        self.assertFalse(ascend_config.adaptive_spec_decode_config.enabled)
+
+        with self.assertRaises(ValueError):
+            test_vllm_config.additional_config = {
+                "adaptive_spec_decode_config": {
+                    "ewma_decay": 1.0,
+                },
+                "refresh": True
+            }
+            init_ascend_config(test_vllm_config)
+
+        with self.assertRaises(TypeError):
+            test_vllm_config.additional_config = {
+                "adaptive_spec_decode_config": {
+                    "probe_interval": 1.5,
+                },
+                "refresh": True
+            }
+            init_ascend_config(test_vllm_config)
+
+    @_clean_up_ascend_config
+    def test_enable_shared_expert_overlap(self):
+        test_vllm_config = VllmConfig()
+        test_vllm_config.additional_config = {
+            "enable_shared_expert_overlap": True,
+            "refresh": True
+        }
+        ascend_config = init_ascend_config(test_vllm_config)
+        self.assertTrue(ascend_config.enable_shared_expert_overlap)
+
+        # torchair graph mode uses enable_multistream_moe instead
+        test_vllm_config.additional_config = {
+            "torchair_graph_config": {
+                "enabled": True,
+            },
+            "enable_shared_expert_overlap": True,
+            "refresh": True
+        }
+        ascend_config = init_ascend_config(test_vllm_config)
+        self.assertFalse(ascend_config.enable_shared_expert_overlap)
+
+    @_clean_up_ascend_config
+    def test_eplb_config(self):
+        test_vllm_config = VllmConfig()
+        test_vllm_config.additional_config = {
+            "eplb_config": {
+                "collect_expert_load": True,
+                "expert_load_reduce_interval": 10,
+                "expert_load_dump_path": "/tmp/expert_load.pt",
+            },
+            "refresh": True
+        }
+        ascend_config = init_ascend_config(test_vllm_config)
+        eplb_config = ascend_config.eplb_config
+        self.assertTrue(eplb_config.collect_expert_load)
+        self.assertEqual(eplb_config.expert_load_reduce_interval, 10)
+        self.assertEqual(eplb_config.expert_load_dump_path,
+                         "/tmp/expert_load.pt")
+
+        with self.assertRaises(TypeError):
+            test_vllm_config.additional_config = {
+                "eplb_config": {
+                    "expert_load_reduce_interval": 0,
+                },
+                "refresh": True
+            }
+            init_ascend_config(test_vllm_config)
+
+        # dynamic_eplb should not be enabled without collect_expert_load
+        with self.assertRaises(RuntimeError):
+            test_vllm_config.additional_config = {
+                "eplb_config": {
+                    "dynamic_eplb": True,
+                },
+                "refresh": True
+            }
+            init_ascend_config(test_vllm_config)
+
+        # rebalance_interval must be a multiple of the reduce interval
+        with self.assertRaises(ValueError):
+            test_vllm_config.additional_config = {
+                "eplb_config": {
+                    "collect_expert_load": True,
+                    "dynamic_eplb": True,
+                    "expert_load_reduce_interval": 100,
+                    "rebalance_interval": 150,
+                },
+                "refresh": True
+            }
+            init_ascend_config(test_vllm_config)
+
+        # Collecting the load alone does not rebalance, any interval is fine.
+        for expert_load_reduce_interval in (700, 5000):
+            test_vllm_config.additional_config = {
+                "eplb_config": {
+                    "collect_expert_load": True,
+                    "expert_load_reduce_interval":
+                    expert_load_reduce_interval,
+                },
+                "refresh": True
+            }
+            eplb_config = init_ascend_config(test_vllm_config).eplb_config
+            self.assertEqual(eplb_config.expert_load_reduce_interval,
+                             expert_load_reduce_interval)
+
+        with self.assertRaises(ValueError):
+            test_vllm_config.additional_config = {
+                "eplb_config": {
+                    "log2phy_policy": "fastest",
+                },
+                "refresh": True
+            }
+            init_ascend_config(test_vllm_config)
+
+        # collect_expert_coactivation needs collect_expert_load
+        with self.assertRaises(RuntimeError):
+            test_vllm_config.additional_config = {
+                "eplb_config": {
+                    "collect_expert_coactivation": True,
+                },
+                "refresh": True
+            }
+            init_ascend_config(test_vllm_config)
+
+        # expert_coactivation_dump_path needs collect_expert_coactivation
+        with self.assertRaises(RuntimeError):
+            test_vllm_config.additional_config = {
+                "eplb_config": {
+                    "collect_expert_load": True,
+                    "expert_coactivation_dump_path": "/tmp/coactivation.pt",
+                },
+                "refresh": True
+            }
+            init_ascend_config(test_vllm_config)
+
+        # expert_load_dump_path should not be set without collect_expert_load
+        with self.assertRaises(RuntimeError):
+            test_vllm_config.additional_config = {
+                "eplb_config": {
+                    "expert_load_dump_path": "/tmp/expert_load.pt",
+                },
+                "refresh": True
+            }
+            init_ascend_config(test_vllm_config)
@@ -41,6 +41,8 @@ class TestEnvVariables(TestBase):
                         test_vals = ["123", "456"]
                     elif 'bool(int(' in handler_source:
                         test_vals = ["0", "1"]
+                    elif 'float(' in handler_source:
+                        test_vals = ["1.0", "1.25"]
                     else:
                         test_vals = [f"test_{var_name}", f"custom_{var_name}"]
 
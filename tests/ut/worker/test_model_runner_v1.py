@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+from typing import Optional
+from unittest.mock import MagicMock, patch
+
+from tests.ut.base import TestBase
+from vllm_ascend.worker.model_runner_v1 import NPUModelRunner
+
+
+@dataclass
+class KVConnectorOutputWithInvalidBlocks:
+    finished_sending: Optional[set[str]] = None
+    finished_recving: Optional[set[str]] = None
+    invalid_block_ids: Optional[set[int]] = None
+
+
+@dataclass
+class KVConnectorOutputWithoutInvalidBlocks:
+    finished_sending: Optional[set[str]] = None
+    finished_recving: Optional[set[str]] = None
+
+
+class TestGetKVLoadErrorKwargs(TestBase):
+
+    def setUp(self):
+        self.kv_connector = MagicMock()
+        self.kv_connector.get_block_ids_with_load_errors.return_value = {3, 4}
+        patchers = [
+            patch("vllm_ascend.worker.model_runner_v1.has_kv_transfer_group",
+                  return_value=True),
+            patch("vllm_ascend.worker.model_runner_v1.get_kv_transfer_group",
+                  return_value=self.kv_connector),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch("vllm_ascend.worker.model_runner_v1.KVConnectorOutput",
+           KVConnectorOutputWithInvalidBlocks)
+    def test_reports_invalid_block_ids(self):
+        self.assertEqual(NPUModelRunner.get_kv_load_error_kwargs(),
+                         {"invalid_block_ids": {3, 4}})
+
+    @patch("vllm_ascend.worker.model_runner_v1.KVConnectorOutput",
+           KVConnectorOutputWithoutInvalidBlocks)
+    def test_no_load_errors(self):
+        self.kv_connector.get_block_ids_with_load_errors.return_value = set()
+        self.assertEqual(NPUModelRunner.get_kv_load_error_kwargs(), {})
+
+    @patch("vllm_ascend.worker.model_runner_v1.KVConnectorOutput",
+           KVConnectorOutputWithoutInvalidBlocks)
+    def test_fails_without_invalid_block_ids(self):
+        # The requests must not be decoded on a KV cache that never landed.
+        with self.assertRaises(RuntimeError):
+            NPUModelRunner.get_kv_load_error_kwargs()
@@ -0,0 +1,71 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# This file is a part of the vllm-ascend project.
+#
+from tests.ut.base import TestBase
+from vllm_ascend.worker.spec_length_controller import \
+    AdaptiveSpecLengthController
+
+
+class TestAdaptiveSpecLengthController(TestBase):
+
+    def _feed(self, controller, req_id, num_drafts, num_accepted, steps):
+        for _ in range(steps):
+            controller.update([req_id], [num_drafts],
+                              [list(range(num_accepted + 1))])
+
+    def test_high_acceptance_keeps_full_draft(self):
+        controller = AdaptiveSpecLengthController(4, draft_token_cost=0.1)
+        self._feed(controller, "req", 4, 4, steps=10)
+        self.assertGreater(controller.acceptance_rate("req"), 0.99)
+        drafts = controller.trim(["req"], [[1, 2, 3, 4]])
+        self.assertEqual(drafts, [[1, 2, 3, 4]])
+
+    def test_low_acceptance_stops_drafting(self):
+        controller = AdaptiveSpecLengthController(4,
+                                                  draft_token_cost=0.5,
+                                                  probe_interval=0)
+        self._feed(controller, "req", 4, 0, steps=20)
+        self.assertLess(controller.acceptance_rate("req"), 0.1)
+        drafts = controller.trim(["req"], [[1, 2, 3, 4]])
+        self.assertEqual(drafts, [[]])
+
+    def test_partial_acceptance_shortens_draft(self):
+        controller = AdaptiveSpecLengthController(4, draft_token_cost=0.3)
+        # One accepted token out of two judged: acceptance rate 0.5.
+        self._feed(controller, "req", 4, 1, steps=50)
+        self.assertAlmostEqual(controller.acceptance_rate("req"), 0.5, 2)
+        drafts = controller.trim(["req"], [[1, 2, 3, 4]])
+        self.assertEqual(drafts, [[1]])
+
+    def test_probe_after_idle_steps(self):
+        controller = AdaptiveSpecLengthController(2,
+                                                  draft_token_cost=1.0,
+                                                  initial_acceptance_rate=0.0,
+                                                  probe_interval=3)
+        results = [controller.trim(["req"], [[7, 8]])[0] for _ in range(3)]
+        self.assertEqual(results, [[], [], [7]])
+
+    def test_skip_requests_without_drafts_or_outputs(self):
+        controller = AdaptiveSpecLengthController(2)
+        controller.update(["a", "b"], [0, 2], [[1], []])
+        self.assertIsNone(controller.acceptance_rate("a"))
+        self.assertIsNone(controller.acceptance_rate("b"))
+        self.assertEqual(controller.trim(["a"], [[]]), [[]])
+
+    def test_remove_request(self):
+        controller = AdaptiveSpecLengthController(2)
+        self._feed(controller, "req", 2, 1, steps=1)
+        self.assertIsNotNone(controller.acceptance_rate("req"))
+        controller.remove_request("req")
+        self.assertIsNone(controller.acceptance_rate("req"))
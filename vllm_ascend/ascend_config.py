@@ -50,6 +50,33 @@ class AscendConfig:
         self.enable_shared_expert_dp = additional_config.get(
             "enable_shared_expert_dp", False
         ) and not self.torchair_graph_config.enabled and vllm_config.parallel_config.enable_expert_parallel
+        self.enable_shared_expert_overlap = additional_config.get(
+            "enable_shared_expert_overlap", False)
+        if (self.enable_shared_expert_overlap
+                and self.torchair_graph_config.enabled):
+            # Torchair graph mode overlaps shared experts with
+            # enable_multistream_moe instead.
+            logger.warning(
+                "enable_shared_expert_overlap is not supported for torchair "
+                "graph mode, use torchair_graph_config.enable_multistream_moe "
+                "instead. It has been disabled automatically.")
+            self.enable_shared_expert_overlap = False
+
+        eplb_config = additional_config.get("eplb_config", {})
+        self.eplb_config = EplbConfig(eplb_config)
+
+        adaptive_spec_decode_config = additional_config.get(
+            "adaptive_spec_decode_config", {})
+        self.adaptive_spec_decode_config = AdaptiveSpecDecodeConfig(
+            adaptive_spec_decode_config)
+        if (self.adaptive_spec_decode_config.enabled
+                and self.torchair_graph_config.enabled):
+            # Torchair graphs are captured for a fixed number of tokens per
+            # request, so the draft length can not vary between requests.
+            logger.warning(
+                "adaptive_spec_decode_config is not supported for torchair "
+                "graph mode currently, it has been disabled automatically.")
+            self.adaptive_spec_decode_config.enabled = False
 
 
 class TorchairGraphConfig:
@@ -120,6 +147,98 @@ class AscendSchedulerConfig:
                 setattr(self, k, v)
 
 
+class AdaptiveSpecDecodeConfig:
+    """
+    Configuration Object for adaptive_spec_decode_config from additional_config
+    """
+
+    def __init__(self, adaptive_spec_decode_config: dict):
+        self.enabled = adaptive_spec_decode_config.get("enabled", False)
+        self.ewma_decay = adaptive_spec_decode_config.get("ewma_decay", 0.8)
+        self.initial_acceptance_rate = adaptive_spec_decode_config.get(
+            "initial_acceptance_rate", 0.8)
+        self.draft_token_cost = adaptive_spec_decode_config.get(
+            "draft_token_cost", 0.1)
+        self.probe_interval = adaptive_spec_decode_config.get(
+            "probe_interval", 16)
+
+        if not 0.0 <= self.ewma_decay < 1.0:
+            raise ValueError("ewma_decay must be in [0, 1)")
+        if not 0.0 <= self.initial_acceptance_rate <= 1.0:
+            raise ValueError("initial_acceptance_rate must be in [0, 1]")
+        if self.draft_token_cost < 0:
+            raise ValueError("draft_token_cost must be non-negative")
+        if not isinstance(self.probe_interval,
+                          int) or self.probe_interval < 0:
+            raise TypeError("probe_interval must be a non-negative int")
+
+
+class EplbConfig:
+    """
+    Configuration Object for eplb_config from additional_config
+    """
+
+    def __init__(self, eplb_config: dict):
+        self.collect_expert_load = eplb_config.get("collect_expert_load",
+                                                  False)
+        self.expert_load_reduce_interval = eplb_config.get(
+            "expert_load_reduce_interval", 1000)
+        self.expert_load_dump_path = eplb_config.get("expert_load_dump_path",
+                                                    None)
+        self.collect_expert_coactivation = eplb_config.get(
+            "collect_expert_coactivation", False)
+        self.expert_coactivation_dump_path = eplb_config.get(
+            "expert_coactivation_dump_path", None)
+        self.dynamic_eplb = eplb_config.get("dynamic_eplb", False)
+        self.rebalance_interval = eplb_config.get("rebalance_interval", 3000)
+        self.num_migration_layers_per_step = eplb_config.get(
+            "num_migration_layers_per_step", 1)
+        self.num_nodes = eplb_config.get("num_nodes", 1)
+        self.log2phy_policy = eplb_config.get("log2phy_policy", "random")
+        self.log2phy_table_width = eplb_config.get("log2phy_table_width", 12)
+
+        if not isinstance(self.expert_load_reduce_interval,
+                          int) or self.expert_load_reduce_interval <= 0:
+            raise TypeError(
+                "expert_load_reduce_interval must be a positive int")
+        if self.expert_load_dump_path and not self.collect_expert_load:
+            raise RuntimeError(
+                "expert_load_dump_path is valid only when collect_expert_load is enabled"
+            )
+        if self.collect_expert_coactivation and not self.collect_expert_load:
+            raise RuntimeError(
+                "collect_expert_coactivation is valid only when collect_expert_load is enabled"
+            )
+        if (self.expert_coactivation_dump_path
+                and not self.collect_expert_coactivation):
+            raise RuntimeError(
+                "expert_coactivation_dump_path is valid only when collect_expert_coactivation is enabled"
+            )
+        if self.dynamic_eplb and not self.collect_expert_load:
+            raise RuntimeError(
+                "dynamic_eplb is valid only when collect_expert_load is enabled"
+            )
+        for name in ("num_nodes", "log2phy_table_width"):
+            value = getattr(self, name)
+            if not isinstance(value, int) or value <= 0:
+                raise TypeError(f"{name} must be a positive int")
+        if self.log2phy_policy not in ("random", "nearest", "round_robin",
+                                       "load_weighted"):
+            raise ValueError(
+                f"Unknown log2phy_policy {self.log2phy_policy}, expected one "
+                "of random, nearest, round_robin and load_weighted")
+        if self.dynamic_eplb:
+            for name in ("rebalance_interval",
+                         "num_migration_layers_per_step"):
+                value = getattr(self, name)
+                if not isinstance(value, int) or value <= 0:
+                    raise TypeError(f"{name} must be a positive int")
+            if self.rebalance_interval % self.expert_load_reduce_interval != 0:
+                raise ValueError(
+                    "rebalance_interval must be a multiple of expert_load_reduce_interval"
+                )
+
+
 _ASCEND_CONFIG: Optional[AscendConfig] = None
 
 
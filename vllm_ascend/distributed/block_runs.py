@@ -0,0 +1,186 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Run-length encoding of the block ids of a request, used by the KV connectors
+to carry blocks from the scheduler to the workers and to the remote engine.
+
+The runs of a list of block ids are an int64 array of shape ``(n, 2)``, with
+the first block id and the number of blocks of each maximal range of
+consecutive ids. A request holding mostly consecutive blocks then takes a
+few runs, however long its prompt is. The address lists of a transfer are
+computed from the runs with NumPy, without a Python loop over blocks.
+"""
+from collections.abc import Sequence
+from typing import Union
+
+import numpy as np
+import numpy.typing as npt
+
+BlockRuns = npt.NDArray[np.int64]
+
+
+def encode_block_runs(
+        block_ids: Union[Sequence[int], npt.NDArray[np.int64]]) -> BlockRuns:
+    """Returns the ``(start, length)`` runs of consecutive block ids."""
+    ids = np.asarray(block_ids, dtype=np.int64)
+    if ids.size == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(ids) != 1) + 1
+    run_starts = np.concatenate(([0], breaks))
+    run_ends = np.concatenate((breaks, [ids.size]))
+    return np.stack((ids[run_starts], run_ends - run_starts), axis=1)
+
+
+def decode_block_runs(runs: BlockRuns) -> npt.NDArray[np.int64]:
+    """Returns the block ids of runs."""
+    if len(runs) == 0:
+        return np.empty(0, dtype=np.int64)
+    lengths = runs[:, 1]
+    # Every block is its run start plus its offset in the run.
+    offsets = np.arange(lengths.sum()) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(runs[:, 0], lengths) + offsets
+
+
+def num_blocks_in_runs(runs: BlockRuns) -> int:
+    return int(runs[:, 1].sum()) if len(runs) else 0
+
+
+def slice_block_runs(runs: BlockRuns, start: int, stop: int) -> BlockRuns:
+    """Returns the runs of the blocks ``[start, stop)`` of runs, by their
+    position, like ``block_ids[start:stop]`` for non-negative bounds."""
+    if len(runs) == 0:
+        return runs
+    ends = np.cumsum(runs[:, 1])
+    begins = ends - runs[:, 1]
+    lo = np.maximum(begins, start)
+    hi = np.minimum(ends, stop)
+    keep = hi > lo
+    return np.stack((runs[keep, 0] + (lo - begins)[keep], (hi - lo)[keep]),
+                    axis=1)
+
+
+def match_suffix_block_runs(
+        local_runs: BlockRuns, remote_runs: BlockRuns,
+        num_cached_blocks: int) -> tuple[BlockRuns, BlockRuns]:
+    """
+    Pairs the blocks a request misses locally with the remote blocks holding
+    their KV cache.
+
+    The first `num_cached_blocks` blocks of the request are local prefix
+    cache hits, `local_runs` are the blocks allocated after them and
+    `remote_runs` all the blocks of the request on the remote. The remote
+    blocks of the hits are skipped, and the local blocks past the last remote
+    one are left out, both returned runs have the same number of blocks.
+    """
+    num_blocks = max(
+        min(num_blocks_in_runs(local_runs),
+            num_blocks_in_runs(remote_runs) - num_cached_blocks), 0)
+    return (slice_block_runs(local_runs, 0, num_blocks),
+            slice_block_runs(remote_runs, num_cached_blocks,
+                             num_cached_blocks + num_blocks))
+
+
+def align_block_runs(
+    src_runs: BlockRuns, dst_runs: BlockRuns
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64],
+           npt.NDArray[np.int64]]:
+    """Splits two lists of blocks of the same size into the ranges that are
+    consecutive in both, the same as `group_concurrent_contiguous`.
+
+    Returns the first source block, the first destination block and the
+    number of blocks of every range.
+    """
+    num_blocks = num_blocks_in_runs(src_runs)
+    assert num_blocks == num_blocks_in_runs(dst_runs), (
+        f"Cannot align {num_blocks} blocks with "
+        f"{num_blocks_in_runs(dst_runs)} blocks.")
+    if num_blocks == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    src_begins = np.cumsum(src_runs[:, 1]) - src_runs[:, 1]
+    dst_begins = np.cumsum(dst_runs[:, 1]) - dst_runs[:, 1]
+    # A range ends wherever a run of either side ends.
+    begins = np.union1d(src_begins, dst_begins)
+    lengths = np.diff(np.append(begins, num_blocks))
+    src_idx = np.searchsorted(src_begins, begins, side="right") - 1
+    dst_idx = np.searchsorted(dst_begins, begins, side="right") - 1
+    src_starts = src_runs[src_idx, 0] + begins - src_begins[src_idx]
+    dst_starts = dst_runs[dst_idx, 0] + begins - dst_begins[dst_idx]
+    return src_starts, dst_starts, lengths
+
+
+def get_cache_block_lens(block_len: list[int], num_caches: int,
+                         use_mla: bool) -> npt.NDArray[np.int64]:
+    """Returns the block size in bytes of every cache, MLA alternates the
+    normed and the rope caches."""
+    if use_mla:
+        return np.asarray(block_len, dtype=np.int64)[np.arange(num_caches) %
+                                                     2]
+    return np.full(num_caches, block_len[0], dtype=np.int64)
+
+
+def build_transfer_descs(
+        local_base_addrs: npt.ArrayLike, remote_base_addrs: npt.ArrayLike,
+        block_lens: npt.NDArray[np.int64], local_starts: npt.NDArray[np.int64],
+        remote_starts: npt.NDArray[np.int64],
+        group_lengths: npt.NDArray[np.int64]) -> npt.NDArray[np.int64]:
+    """
+    Returns the local address, the remote address and the length of every
+    group of blocks in every cache, as an array of shape
+    ``(3, num_caches, num_groups)``.
+
+    The groups come from `align_block_runs`, the addresses of all the caches
+    are computed at once from their base addresses.
+    """
+    num_caches, num_groups = len(block_lens), len(group_lengths)
+    descs = np.empty((3, num_caches, num_groups), dtype=np.int64)
+    block_lens = block_lens[:, None]
+    np.multiply(local_starts, block_lens, out=descs[0])
+    descs[0] += np.asarray(local_base_addrs, dtype=np.int64)[:, None]
+    np.multiply(remote_starts, block_lens, out=descs[1])
+    descs[1] += np.asarray(remote_base_addrs, dtype=np.int64)[:, None]
+    np.multiply(group_lengths, block_lens, out=descs[2])
+    return descs
+
+
+def get_region_block_runs(addrs: npt.ArrayLike, lengths: npt.ArrayLike,
+                          base_addrs: npt.ArrayLike,
+                          block_lens: npt.NDArray[np.int64]) -> BlockRuns:
+    """Returns the runs of the blocks covered by regions of the caches at
+    ``base_addrs``, the reverse of `build_transfer_descs`."""
+    addrs = np.asarray(addrs, dtype=np.int64)
+    if addrs.size == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    base_addrs = np.asarray(base_addrs, dtype=np.int64)
+    order = np.argsort(base_addrs)
+    caches = order[np.searchsorted(base_addrs[order], addrs, side="right") -
+                   1]
+    starts = (addrs - base_addrs[caches]) // block_lens[caches]
+    counts = np.asarray(lengths, dtype=np.int64) // block_lens[caches]
+    return encode_block_runs(
+        np.unique(decode_block_runs(np.stack((starts, counts), axis=1))))
+
+
+def block_runs_to_bytes(runs: BlockRuns) -> bytes:
+    """Returns the buffer of runs, to send them in a msgpack message."""
+    return np.ascontiguousarray(runs, dtype="<i8").tobytes()
+
+
+def block_runs_from_bytes(data: bytes) -> BlockRuns:
+    """Reads runs from `block_runs_to_bytes` without copying them."""
+    return np.frombuffer(data, dtype="<i8").reshape(-1, 2)
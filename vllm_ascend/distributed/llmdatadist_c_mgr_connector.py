@@ -1,12 +1,13 @@
 import contextlib
+import functools
 import json
 import math
 import os
 import threading
 import time
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
 from collections.abc import Iterator
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from enum import Enum
 from typing import Any, Callable, Optional, Tuple
@@ -28,6 +29,14 @@ from vllm.v1.core.sched.output import SchedulerOutput
 from vllm.v1.request import Request, RequestStatus
 
 import vllm_ascend.envs as envs_ascend
+from vllm_ascend.distributed.block_runs import (BlockRuns, decode_block_runs,
+                                                encode_block_runs,
+                                                match_suffix_block_runs,
+                                                num_blocks_in_runs)
+from vllm_ascend.distributed.transfer_retry import (KVLoadErrors,
+                                                    TransferRetryPolicy,
+                                                    call_with_retries)
+from vllm_ascend.distributed.zmq_connection import get_zmq_connection_manager
 from vllm_ascend.utils import AscendSocVersion, get_ascend_soc_version
 
 TORCH_DTYPE_TO_NPU_DTYPE = {
@@ -56,30 +65,136 @@ class LLMDataDistCMgrAgentMetadata(msgspec.Struct):
     cluster_id: int
 
 
+class KVPullEngine:
+    """
+    Runs the block pulls of a decode worker, with a queue per remote agent.
+
+    Pulls from different remote agents run concurrently, at most
+    `max_concurrent_pulls` at once and `max_pulls_per_remote` per agent,
+    started round robin across the agents so that a busy prefill node does
+    not hold back the others. With `max_bandwidth` set, in GB/s, the pulls
+    are paced so that their bytes do not start faster than that.
+    """
+
+    def __init__(self,
+                 max_concurrent_pulls: int = 1,
+                 max_pulls_per_remote: int = 1,
+                 max_bandwidth: float = 0.0):
+        self.max_concurrent_pulls = max(max_concurrent_pulls, 1)
+        self.max_pulls_per_remote = max(max_pulls_per_remote, 1)
+        self.max_bytes_per_s = max_bandwidth * 1e9
+        self.executor = ThreadPoolExecutor(self.max_concurrent_pulls,
+                                           thread_name_prefix="kv_pull")
+        self.lock = threading.Lock()
+        # Remote agent -> pulls waiting for it, in the order they came.
+        self.queues: OrderedDict[Any, deque[tuple[Future, int, Callable[
+            [], Any]]]] = OrderedDict()
+        self.inflight: defaultdict[Any, int] = defaultdict(int)
+        self.num_inflight = 0
+        # When the next pull may start under the bandwidth limit.
+        self.next_start_time = 0.0
+
+    def submit(self, remote: Any, num_bytes: int,
+               fn: Callable[[], Any]) -> Future:
+        """Queues ``fn``, a pull of ``num_bytes`` from ``remote``, and
+        returns its future."""
+        future: Future = Future()
+        with self.lock:
+            self.queues.setdefault(remote, deque()).append(
+                (future, num_bytes, fn))
+            self._schedule()
+        return future
+
+    def _schedule(self):
+        """Starts the queued pulls allowed by the limits. Called with the
+        lock held."""
+        while self.num_inflight < self.max_concurrent_pulls:
+            remote = next((remote for remote in self.queues
+                           if self.inflight[remote] <
+                           self.max_pulls_per_remote), None)
+            if remote is None:
+                return
+            queue = self.queues.pop(remote)
+            task = queue.popleft()
+            if queue:
+                # The next pull from this agent waits for the others.
+                self.queues[remote] = queue
+            self.inflight[remote] += 1
+            self.num_inflight += 1
+            self.executor.submit(self._run, remote, *task)
+
+    def _run(self, remote: Any, future: Future, num_bytes: int,
+             fn: Callable[[], Any]):
+        try:
+            if future.set_running_or_notify_cancel():
+                self._throttle(num_bytes)
+                future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                self.inflight[remote] -= 1
+                if self.inflight[remote] == 0:
+                    del self.inflight[remote]
+                self.num_inflight -= 1
+                self._schedule()
+
+    def _throttle(self, num_bytes: int):
+        if self.max_bytes_per_s <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start_time = max(now, self.next_start_time)
+            self.next_start_time = start_time + \
+                num_bytes / self.max_bytes_per_s
+        if start_time > now:
+            time.sleep(start_time - now)
+
+
 @dataclass
 class ReqMeta:
-    local_block_ids: list[int]
-    remote_block_ids: list[int]
+    # Run-length encoded block ids, see block_runs.
+    local_block_runs: BlockRuns
+    remote_block_runs: BlockRuns
     remote_host: str
     remote_port: str
     engine_id: str
     remote_tp_size: str
+    # Leading blocks of the request hit in the local prefix cache, which are
+    # not pulled.
+    num_cached_blocks: int = 0
+
+    @property
+    def local_block_ids(self) -> list[int]:
+        return decode_block_runs(self.local_block_runs).tolist()
+
+    @property
+    def remote_block_ids(self) -> list[int]:
+        return decode_block_runs(self.remote_block_runs).tolist()
 
 
 class LLMDataDistCMgrConnectorMetadata(KVConnectorMetadata):
 
     def __init__(self):
         self.requests: dict[str, ReqMeta] = {}
-
-    def add_new_req(self, request_id: str, local_block_ids: list[int],
-                    kv_transfer_params: dict[str, Any]):
+        # (host, port, tp_size) of the remote agents of the requests waiting
+        # for their blocks, which the workers connect to ahead.
+        self.remote_agents_to_prefetch: set[tuple[str, int, int]] = set()
+
+    def add_new_req(self,
+                    request_id: str,
+                    local_block_ids: list[int],
+                    kv_transfer_params: dict[str, Any],
+                    num_cached_blocks: int = 0):
         self.requests[request_id] = ReqMeta(
-            local_block_ids=local_block_ids,
-            remote_block_ids=kv_transfer_params["remote_block_ids"],
+            local_block_runs=encode_block_runs(local_block_ids),
+            remote_block_runs=encode_block_runs(
+                kv_transfer_params["remote_block_ids"]),
             engine_id=kv_transfer_params["remote_engine_id"],
             remote_host=kv_transfer_params["remote_host"],
             remote_port=kv_transfer_params["remote_port"],
             remote_tp_size=kv_transfer_params["remote_tp_size"],
+            num_cached_blocks=num_cached_blocks,
         )
 
 
@@ -147,6 +262,12 @@ class LLMDataDistCMgrConnector(KVConnectorBase_V1):
         assert self.connector_worker is not None
         return self.connector_worker.get_finished(finished_req_ids)
 
+    def get_block_ids_with_load_errors(self) -> set[int]:
+        """Get the local blocks whose KV cache failed to load for good, for
+        the scheduler to recompute them."""
+        assert self.connector_worker is not None
+        return self.connector_worker.get_block_ids_with_load_errors()
+
     def start_load_kv(self, forward_context: "ForwardContext",
                       **kwargs) -> None:
         assert self.connector_worker is not None
@@ -183,7 +304,9 @@ class LLMDataDistCMgrConnectorScheduler():
 
         self.port = dp_rank_local * tp_size + envs_ascend.VLLM_ASCEND_LLMDD_RPC_PORT if dp_rank_local is not None else tp_size + envs_ascend.VLLM_ASCEND_LLMDD_RPC_PORT
 
-        self._reqs_need_recv: dict[str, tuple[Request, list[int]]] = {}
+        self._reqs_need_recv: dict[str, tuple[Request, list[int], int]] = {}
+        # Remote agents seen since the last step.
+        self._remote_agents_to_prefetch: set[tuple[str, int, int]] = set()
 
     def get_num_new_matched_tokens(
             self, request: "Request",
@@ -209,10 +332,22 @@ class LLMDataDistCMgrConnectorScheduler():
         )
 
         if params is not None and params.get("do_remote_prefill"):
-            # Remote prefill: get all prompt blocks from remote.
+            # Remote prefill: get the prompt blocks after the prefix cache
+            # hits from remote, the hits are whole blocks.
             assert num_computed_tokens % self.block_size == 0
-            # Note: We use the full token count as transmit data here.
-            count = max(len(request.prompt_token_ids) - num_computed_tokens, 0)
+            if all(p in params
+                   for p in ("remote_host", "remote_port", "remote_tp_size")):
+                self._remote_agents_to_prefetch.add(
+                    (params["remote_host"], int(params["remote_port"]),
+                     int(params["remote_tp_size"])))
+            # Note: We use the full token count as transmit data here, but
+            # for what the remote blocks do not hold.
+            num_external_tokens = len(request.prompt_token_ids)
+            if params.get("remote_block_ids"):
+                num_external_tokens = min(
+                    num_external_tokens,
+                    len(params["remote_block_ids"]) * self.block_size)
+            count = max(num_external_tokens - num_computed_tokens, 0)
             return count, count > 0
 
         # No remote prefill for this request.
@@ -228,8 +363,12 @@ class LLMDataDistCMgrConnectorScheduler():
             if params.get("remote_block_ids"):
                 if all(p in params for p in ("remote_engine_id", "remote_host",
                                              "remote_port", "remote_tp_size")):
+                    # The hashed blocks are prefix cache hits.
+                    unhashed_block_ids = blocks.get_unhashed_block_ids()
                     self._reqs_need_recv[request.request_id] = (
-                        request, blocks.get_unhashed_block_ids())
+                        request, unhashed_block_ids,
+                        len(blocks.get_block_ids()[0]) -
+                        len(unhashed_block_ids))
                 else:
                     logger.warning("" \
                     f"Invalid KVTransferParams {params}, This request will be discard")
@@ -243,12 +382,16 @@ class LLMDataDistCMgrConnectorScheduler():
     ) -> KVConnectorMetadata:
         meta = LLMDataDistCMgrConnectorMetadata()
 
-        for req_id, (req, block_ids) in self._reqs_need_recv.items():
+        for req_id, (req, block_ids,
+                     num_cached_blocks) in self._reqs_need_recv.items():
             assert req.kv_transfer_params is not None
             meta.add_new_req(request_id=req_id,
                              local_block_ids=block_ids,
-                             kv_transfer_params=req.kv_transfer_params)
+                             kv_transfer_params=req.kv_transfer_params,
+                             num_cached_blocks=num_cached_blocks)
         self._reqs_need_recv.clear()
+        meta.remote_agents_to_prefetch = self._remote_agents_to_prefetch
+        self._remote_agents_to_prefetch = set()
 
         return meta
 
@@ -341,6 +484,47 @@ class LLMDataDistCMgrConnectorWorker():
         os.environ["HCCL_DETERMINISTIC"] = "true"
         self.done_receiving_counts: defaultdict[str,
                                                 set[int]] = defaultdict(set)
+        # Cluster ids of the remote agents by (host, port), with the time of
+        # their handshake. An agent is queried again once its entry is older
+        # than handshake_ttl seconds, or after a failed pull from it, a
+        # non-positive ttl keeps it until a failure.
+        self.remote_cluster_ids: dict[tuple[str, int], tuple[int, float]] = {}
+        self.handshake_ttl = float(
+            self.kv_transfer_config.get_from_extra_config("handshake_ttl", 0))
+        # [{"host": ..., "port": ..., "tp_size": ...}] with the remote_host,
+        # remote_port and remote_tp_size of their requests, connected to at
+        # startup.
+        self.handshake_peers: list[dict[
+            str, Any]] = self.kv_transfer_config.get_from_extra_config(
+                "handshake_peers", [])
+        # Handshakes with remote agents run one at a time, the pulls may call
+        # them from several threads.
+        self.remote_agent_lock = threading.Lock()
+        # Concurrent pulls from different prefill nodes, see KVPullEngine.
+        # Without the config the pulls run one by one, as before.
+        concurrent_pulls: dict[
+            str, Any] = self.kv_transfer_config.get_from_extra_config(
+                "concurrent_pulls", {})
+        self.pull_engine = KVPullEngine(
+            max_concurrent_pulls=int(
+                concurrent_pulls.get("max_concurrent_pulls",
+                                     4 if concurrent_pulls else 1)),
+            max_pulls_per_remote=int(
+                concurrent_pulls.get("max_pulls_per_remote", 1)),
+            max_bandwidth=float(concurrent_pulls.get("max_bandwidth", 0)))
+        # Pulls the k_normed and k_pe caches of MLA at the same time.
+        self.sub_cache_executor: Optional[ThreadPoolExecutor] = None
+        if concurrent_pulls.get("parallel_sub_caches", True) and \
+                concurrent_pulls:
+            self.sub_cache_executor = ThreadPoolExecutor(
+                2 * self.pull_engine.max_concurrent_pulls,
+                thread_name_prefix="kv_pull_sub_cache")
+        # Failed pulls are retried following the transfer_retry config, the
+        # blocks of the ones that failed for good are recomputed.
+        self.retry_policy = TransferRetryPolicy.from_config(
+            self.kv_transfer_config.get_from_extra_config(
+                "transfer_retry", None))
+        self.load_errors = KVLoadErrors()
 
     def listen_for_agent_metadata_req(self, event: threading.Event):
         assert self.local_agent_metadata is not None
@@ -510,6 +694,11 @@ class LLMDataDistCMgrConnectorWorker():
         block_shape = first_kv_cache.shape[-block_rank:]
 
         self.block_len = math.prod(block_shape)
+        # Bytes of a block in all the caches, to pace the pulls.
+        self.block_bytes = sum(
+            cache.numel() * cache.element_size()
+            for cache_or_caches in kv_caches.values()
+            for cache in cache_or_caches) // self.num_blocks
         self.cache_addr: list[int] = []
         alignment = 2 * 1024 * 1024
         if self.use_mla:
@@ -582,21 +771,34 @@ class LLMDataDistCMgrConnectorWorker():
             name="metadata_agent_listener")
         self.metadata_agent_listener_t.start()
         self.ready_event.wait()
+        if self.llm_datadist_role == LLMRole.DECODER:
+            for peer in self.handshake_peers:
+                self.prefetch_remote_agent(peer["host"], int(peer["port"]),
+                                           int(peer["tp_size"]))
 
     def start_load_kv(self, metadata: LLMDataDistCMgrConnectorMetadata):
         futures = []
         for req_id, meta in metadata.requests.items():
             logger.debug(f"Start to transmit {req_id}")
-            future = self.executor.submit(
-                self._read_blocks,
-                local_block_ids=meta.local_block_ids,
-                remote_block_ids=meta.remote_block_ids,
-                remote_ip=meta.remote_host,
-                remote_port=int(meta.remote_port),
-                remote_engine_id=meta.engine_id,
-                request_id=req_id,
-                remote_tp_size=meta.remote_tp_size,
-            )
+            remote_port = int(meta.remote_port)
+            # Queued per remote agent, the one serving this tp rank.
+            remote_agent = (meta.remote_host, remote_port +
+                            self.tp_rank % int(meta.remote_tp_size))
+            future = self.pull_engine.submit(
+                remote_agent,
+                num_blocks_in_runs(meta.local_block_runs) * self.block_bytes,
+                functools.partial(
+                    self._read_blocks,
+                    local_block_runs=meta.local_block_runs,
+                    remote_block_runs=meta.remote_block_runs,
+                    remote_ip=meta.remote_host,
+                    remote_port=remote_port,
+                    remote_engine_id=meta.engine_id,
+                    request_id=req_id,
+                    remote_tp_size=meta.remote_tp_size,
+                    num_cached_blocks=meta.num_cached_blocks,
+                    deadline=self.retry_policy.get_deadline(time.monotonic()),
+                ))
             futures.append(future)
 
         def handle_exception(future):
@@ -606,6 +808,52 @@ class LLMDataDistCMgrConnectorWorker():
         for future in futures:
             future.add_done_callback(handle_exception)
 
+        # Queued after the requests, which connect themselves if needed.
+        for host, port, remote_tp_size in metadata.remote_agents_to_prefetch:
+            self.prefetch_remote_agent(host, port, remote_tp_size)
+
+    def prefetch_remote_agent(self, host: str, port: int,
+                              remote_tp_size: int):
+        """Connects to the remote agent serving this tp rank ahead of its
+        requests, off the pull threads."""
+
+        def prefetch():
+            remote_port = port + self.tp_rank % remote_tp_size
+            try:
+                self._get_remote_cluster_id(host, remote_port)
+            except Exception as e:
+                # The first request from the agent retries the handshake.
+                logger.warning(
+                    f"Failed to connect to remote agent {host}:{remote_port} ahead: {e}"
+                )
+
+        self.executor.submit(prefetch)
+
+    def _get_remote_cluster_id(self, host: str, port: int) -> int:
+        """Returns the cluster id of a remote agent, from the cache unless it
+        expired."""
+        def get_cached() -> Optional[int]:
+            cached = self.remote_cluster_ids.get((host, port))
+            if cached is not None:
+                cluster_id, handshake_time = cached
+                if self.handshake_ttl <= 0 or time.monotonic(
+                ) - handshake_time <= self.handshake_ttl:
+                    return cluster_id
+            return None
+
+        cluster_id = get_cached()
+        if cluster_id is not None:
+            return cluster_id
+        with self.remote_agent_lock:
+            # Another pull may have connected meanwhile.
+            cluster_id = get_cached()
+            if cluster_id is None:
+                cluster_id = self.connect_to_remote_agent(host, port)
+                self.remote_cluster_ids[(host,
+                                         port)] = (cluster_id,
+                                                   time.monotonic())
+        return cluster_id
+
     def add_remote_agent(self, metadata: LLMDataDistCMgrAgentMetadata) -> int:
         assert self.local_agent_metadata is not None
         remote_cluster_id = metadata.cluster_id
@@ -756,15 +1004,15 @@ class LLMDataDistCMgrConnectorWorker():
         msg_encoder = msgspec.msgpack.Encoder()
         msg_send = msg_encoder.encode(
             [LLMDataDistCMgrEvent.ReqForMetadata, self.local_agent_metadata])
-        with zmq_ctx(zmq.REQ, url) as sock:  # type: ignore[attr-defined]
+        with get_zmq_connection_manager().connection(url) as sock:
             logger.info("Try request remote metadata from socket......")
             sock.send(msg_send)
             metadata_bytes = sock.recv()
-            decoder = msgspec.msgpack.Decoder()
-            metadata = decoder.decode(metadata_bytes)
-            metadata = LLMDataDistCMgrAgentMetadata(**metadata)
-            logger.info(f"recving metadata: {metadata}")
-            cluster_id = self.add_remote_agent(metadata)
+        decoder = msgspec.msgpack.Decoder()
+        metadata = decoder.decode(metadata_bytes)
+        metadata = LLMDataDistCMgrAgentMetadata(**metadata)
+        logger.info(f"recving metadata: {metadata}")
+        cluster_id = self.add_remote_agent(metadata)
         return cluster_id
 
     def send_finish_to_remote(self, host: str, port: int, request_id):
@@ -775,82 +1023,115 @@ class LLMDataDistCMgrConnectorWorker():
             LLMDataDistCMgrEvent.ReqForFinished,
             [request_id, self.tp_rank, self.tp_size]
         ])
-        with zmq_ctx(zmq.REQ, url) as sock:  # type: ignore[attr-defined]
-            try:
+        try:
+            with get_zmq_connection_manager().connection(url) as sock:
                 sock.send(msg_send)
                 logger.debug(
                     f"Request id {request_id} finished message send to remote {url}"
                 )
                 _ = sock.recv()
-            except Exception as e:
-                logger.error(
-                    f"Failed to send reqest_id {request_id} to prefill: {e}")
+        except Exception as e:
+            logger.error(
+                f"Failed to send reqest_id {request_id} to prefill: {e}")
 
     def _read_blocks(
         self,
-        local_block_ids: list[int],
-        remote_block_ids: list[int],
+        local_block_runs: BlockRuns,
+        remote_block_runs: BlockRuns,
         remote_ip: str,
         remote_port: int,
         remote_engine_id: str,
         request_id: str,
         remote_tp_size: str,
+        num_cached_blocks: int = 0,
+        deadline: float = math.inf,
     ):
-        # if remote_ip not in self.linked_cluster:
         tp_offset = self.tp_rank % int(remote_tp_size)
-        remote_cluster_id = self.connect_to_remote_agent(
-            remote_ip, remote_port + tp_offset)
-        num_local_blocks = len(local_block_ids)
-        if num_local_blocks == 0:
+        # Only the blocks after the local prefix cache hits are pulled.
+        local_block_runs, remote_block_runs = match_suffix_block_runs(
+            local_block_runs, remote_block_runs, num_cached_blocks)
+        if len(local_block_runs) == 0:
             return
-        num_remote_blocks = len(remote_block_ids)
-        assert num_local_blocks <= num_remote_blocks
-        if num_local_blocks < num_remote_blocks:
-            remote_block_ids = remote_block_ids[-num_local_blocks:]
+        # pull_blocks takes lists of block ids.
+        local_block_ids = decode_block_runs(local_block_runs).tolist()
+        remote_block_ids = decode_block_runs(remote_block_runs).tolist()
+
+        def pull():
+            remote_cluster_id = self._get_remote_cluster_id(
+                remote_ip, remote_port + tp_offset)
+            logger.info(f"remote cluster id is: {remote_cluster_id}")
+            if self.use_mla:
+                remote_cache_key_k_normed = BlocksCacheKey(
+                    cluster_id=remote_cluster_id, model_id=0)
+                remote_cache_key_k_pe = BlocksCacheKey(
+                    cluster_id=remote_cluster_id, model_id=1)
+                logger.info("Try pull blocks from remote server")
+                sub_cache_pulls = [
+                    (remote_cache_key_k_normed,
+                     self.cache[0]),  # type: ignore[has-type]
+                    (remote_cache_key_k_pe,
+                     self.cache[1]),  # type: ignore[has-type]
+                ]
+                try:
+                    if self.sub_cache_executor is not None:
+                        futures = [
+                            self.sub_cache_executor.submit(
+                                self.cache_manager.pull_blocks,
+                                remote_cache_key, cache, remote_block_ids,
+                                local_block_ids)
+                            for remote_cache_key, cache in sub_cache_pulls
+                        ]
+                        # Both pulls end before an error of either is raised.
+                        wait(futures)
+                        for future in futures:
+                            future.result()
+                    else:
+                        for remote_cache_key, cache in sub_cache_pulls:
+                            self.cache_manager.pull_blocks(remote_cache_key,
+                                                           cache,
+                                                           remote_block_ids,
+                                                           local_block_ids)
+                except (TypeError, ValueError):
+                    raise RuntimeError(
+                        f"LLMDataDistCMgrConnectorWorker: Passing unexpected parameter to pull_blocks remote_cache_key: {remote_cache_key_k_normed} {remote_cache_key_k_pe}, cache: {self.cache}, local_block_ids: {local_block_ids}, remote_block_ids: {remote_block_ids}"  # type: ignore[has-type]
+                    )
+                except LLMException:
+                    raise RuntimeError(
+                        "LLMDataDistCMgrConnectorWorker: Timeout during pull_blocks, you can try to increase the sync_kv_timeout config or checking your connect status"
+                    )
+            else:
+                remote_cache_key = BlocksCacheKey(cluster_id=remote_cluster_id)
+                logger.info("Try pull blocks from remote server")
+                try:
+                    self.cache_manager.pull_blocks(
+                        remote_cache_key,
+                        self.cache,  # type: ignore[has-type]
+                        remote_block_ids,
+                        local_block_ids)
+                except (TypeError, ValueError):
+                    raise RuntimeError(
+                        f"LLMDataDistCMgrConnectorWorker: Passing unexpected parameter to pull_blocks remote_cache_key: {remote_cache_key}, cache: {self.cache}, local_block_ids: {local_block_ids}, remote_block_ids: {remote_block_ids}"  # type: ignore[has-type]
+                    )
+                except LLMException:
+                    raise RuntimeError(
+                        "LLMDataDistCMgrConnectorWorker: Timeout during pull_blocks, you can try to increase the sync_kv_timeout config or checking your connect status"
+                    )
 
-        logger.info(f"remote cluster id is: {remote_cluster_id}")
-        if self.use_mla:
-            remote_cache_key_k_normed = BlocksCacheKey(
-                cluster_id=remote_cluster_id, model_id=0)
-            remote_cache_key_k_pe = BlocksCacheKey(
-                cluster_id=remote_cluster_id, model_id=1)
-            logger.info("Try pull blocks from remote server")
-            try:
-                self.cache_manager.pull_blocks(
-                    remote_cache_key_k_normed,
-                    self.cache[0],  # type: ignore[has-type]
-                    remote_block_ids,
-                    local_block_ids)
-                self.cache_manager.pull_blocks(
-                    remote_cache_key_k_pe,
-                    self.cache[1],  # type: ignore[has-type]    
-                    remote_block_ids,
-                    local_block_ids)
-            except (TypeError, ValueError):
-                raise RuntimeError(
-                    f"LLMDataDistCMgrConnectorWorker: Passing unexpected parameter to pull_blocks remote_cache_key: {remote_cache_key_k_normed} {remote_cache_key_k_pe}, cache: {self.cache}, local_block_ids: {local_block_ids}, remote_block_ids: {remote_block_ids}"  # type: ignore[has-type]
-                )
-            except LLMException:
-                raise RuntimeError(
-                    "LLMDataDistCMgrConnectorWorker: Timeout during pull_blocks, you can try to increase the sync_kv_timeout config or checking your connect status"
-                )
-        else:
-            remote_cache_key = BlocksCacheKey(cluster_id=remote_cluster_id)
-            logger.info("Try pull blocks from remote server")
-            try:
-                self.cache_manager.pull_blocks(
-                    remote_cache_key,
-                    self.cache,  # type: ignore[has-type]
-                    remote_block_ids,
-                    local_block_ids)
-            except (TypeError, ValueError):
-                raise RuntimeError(
-                    f"LLMDataDistCMgrConnectorWorker: Passing unexpected parameter to pull_blocks remote_cache_key: {remote_cache_key}, cache: {self.cache}, local_block_ids: {local_block_ids}, remote_block_ids: {remote_block_ids}"  # type: ignore[has-type]
-                )
-            except LLMException:
-                raise RuntimeError(
-                    "LLMDataDistCMgrConnectorWorker: Timeout during pull_blocks, you can try to increase the sync_kv_timeout config or checking your connect status"
-                )
+        def on_error(e: Exception):
+            # The remote may have restarted, query it again next time.
+            self.remote_cluster_ids.pop((remote_ip, remote_port + tp_offset),
+                                        None)
+
+        try:
+            call_with_retries(pull, self.retry_policy, deadline,
+                              f"Pulling KV cache of request {request_id}",
+                              on_error)
+        except Exception as e:
+            # The scheduler recomputes the blocks, the request still finishes
+            # for the prefill node to free its blocks.
+            logger.error(
+                f"Failed to pull KV cache of request {request_id}: {e}")
+            self.load_errors.add(local_block_runs)
         self.send_finish_to_remote(remote_ip, remote_port, request_id)
         with self.thread_lock:
             self.finished_reqs.add(request_id)
@@ -868,16 +1149,19 @@ class LLMDataDistCMgrConnectorWorker():
         else:
             return None, req_ids_to_ret
 
+    def get_block_ids_with_load_errors(self) -> set[int]:
+        return self.load_errors.pop()
+
 
 # adopt this from  https://github.com/vllm-project/vllm/blob/main/vllm/distributed/kv_transfer/kv_connector/v1/nixl_connector.py
 @contextlib.contextmanager
 def zmq_ctx(socket_type: Any,
             addr: str) -> Iterator[zmq.Socket]:  # type: ignore[name-defined]
-    """Context manager for a ZMQ socket"""
+    """Context manager for a ZMQ socket on the shared context"""
 
-    ctx: Optional[zmq.Context] = None  # type: ignore[name-defined]
+    socket: Optional[zmq.Socket] = None  # type: ignore[name-defined]
     try:
-        ctx = zmq.Context()  # type: ignore[attr-defined]
+        ctx = get_zmq_connection_manager().ctx
 
         if socket_type == zmq.ROUTER:  # type: ignore[attr-defined]
             socket = ctx.socket(zmq.ROUTER)  # type: ignore[attr-defined]
@@ -890,5 +1174,5 @@ def zmq_ctx(socket_type: Any,
 
         yield socket
     finally:
-        if ctx is not None:
-            ctx.destroy(linger=0)
+        if socket is not None:
+            socket.close(linger=0)
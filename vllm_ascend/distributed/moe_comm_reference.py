@@ -0,0 +1,351 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Reference MoE dispatch and combine over a CPU `torch.distributed` group.
+
+The implementations follow the `MoECommMethod` contract with plain torch
+collectives, so they run over a gloo group without NPU ops or HCCL. They are
+used to validate token permutation, capacity and padding logic and to compare
+dispatch strategies on realistic routing, see
+`benchmarks/ops/ben_moe_comm_reference.py`.
+"""
+import math
+from typing import Optional
+
+import torch
+import torch.distributed as dist
+from transformers.configuration_utils import PretrainedConfig
+from vllm.distributed.parallel_state import get_ep_group
+
+from vllm_ascend.distributed.moe_comm_method import MoECommMethod
+
+
+class ReferenceCommImpl(MoECommMethod):
+    """Base class of the reference implementations.
+
+    With ``capacity_factor``, every rank sends at most
+    ``ceil(num_tokens * top_k / global_num_experts * capacity_factor)``
+    tokens to each expert and drops the lowest-weighted ones beyond, like
+    ``moe_expert_capacity_factor`` of the all2all dispatcher. With
+    ``pad_to_capacity``, each expert additionally receives exactly the
+    capacity from every rank, padding with zero tokens, so that the shapes
+    are static.
+    """
+
+    def __init__(
+        self,
+        device: torch.device,
+        dtype: torch.dtype,
+        hf_config: PretrainedConfig,
+        group: Optional[dist.ProcessGroup] = None,
+        capacity_factor: Optional[float] = None,
+        pad_to_capacity: bool = False,
+    ):
+        super().__init__(device, dtype, hf_config)
+        if pad_to_capacity and capacity_factor is None:
+            raise ValueError("pad_to_capacity requires capacity_factor.")
+        if capacity_factor is not None and capacity_factor <= 0:
+            raise ValueError(
+                f"capacity_factor must be positive, got {capacity_factor}.")
+        self.group = group if group is not None else get_ep_group().cpu_group
+        self.ep_rank = dist.get_rank(group=self.group)
+        self.ep_size = dist.get_world_size(group=self.group)
+        self.capacity_factor = capacity_factor
+        self.pad_to_capacity = pad_to_capacity
+
+        # Statistics of the last dispatch, for comparing strategies.
+        self.num_dropped_tokens = 0
+        self.num_padded_tokens = 0
+        self.num_sent_tokens = 0
+
+    def expert_capacity(self, num_tokens: int, num_global_experts: int) -> int:
+        """Tokens one rank may send to one expert."""
+        assert self.capacity_factor is not None
+        return math.ceil(num_tokens * self.top_k_num / num_global_experts *
+                         self.capacity_factor)
+
+    def _capacity_mask(self, experts: torch.Tensor, weights: torch.Tensor,
+                       num_global_experts: int) -> torch.Tensor:
+        """Returns which of the flattened token-expert pairs are kept.
+
+        Pairs with ``experts == -1`` are never kept. Within each expert, the
+        pairs with the largest weights are kept up to the capacity.
+        """
+        valid = experts >= 0
+        if self.capacity_factor is None:
+            return valid
+        num_tokens = experts.numel() // max(self.top_k_num, 1)
+        capacity = self.expert_capacity(num_tokens, num_global_experts)
+        key = torch.where(valid, experts, num_global_experts)
+        # Order by expert, then by descending weight.
+        order = torch.argsort(weights, descending=True, stable=True)
+        order = order[torch.argsort(key[order], stable=True)]
+        counts = torch.bincount(key, minlength=num_global_experts + 1)
+        starts = torch.cumsum(counts, 0) - counts
+        position = torch.empty_like(order)
+        position[order] = torch.arange(order.numel()) - starts[key[order]]
+        return valid & (position < capacity)
+
+    @staticmethod
+    def _pad_groups(counts: torch.Tensor,
+                    capacity: int) -> tuple[torch.Tensor, int]:
+        """Pads consecutive groups of rows to ``capacity`` rows each.
+
+        Returns the destination row of every source row and the padded
+        number of rows.
+        """
+        starts = torch.cumsum(counts, 0) - counts
+        group = torch.repeat_interleave(torch.arange(counts.numel()), counts)
+        rows = torch.arange(int(counts.sum())) - starts[group]
+        return group * capacity + rows, counts.numel() * capacity
+
+
+class ReferenceAllGatherCommImpl(ReferenceCommImpl):
+    """Reference of `AllGatherCommImpl` with the all-gather done explicitly.
+
+    Every rank gathers the tokens of all ranks, runs its local experts on
+    them like `NativeAllGatherCommImpl` and the partial outputs are summed
+    over the group. Ranks may hold different numbers of tokens.
+    """
+
+    def _pre_process(
+        self,
+        hidden_states: torch.Tensor,
+        topk_ids: torch.Tensor,
+        topk_weights: torch.Tensor,
+        expert_map: torch.Tensor,
+        num_experts: int,
+    ) -> tuple[torch.Tensor, torch.Tensor, int]:
+        num_tokens = hidden_states.shape[0]
+        num_global_experts = (expert_map.numel() if expert_map is not None
+                              else num_experts)
+        weights_flat = topk_weights.reshape(-1)
+        keep = self._capacity_mask(topk_ids.reshape(-1).long(), weights_flat,
+                                   num_global_experts)
+        self.num_dropped_tokens = int((~keep).sum())
+        topk_ids = torch.where(keep.view(topk_ids.shape), topk_ids, -1)
+
+        # Gather the tokens of all ranks, padded to the largest rank.
+        tokens_per_rank = [
+            torch.empty(1, dtype=torch.int64) for _ in range(self.ep_size)
+        ]
+        dist.all_gather(tokens_per_rank,
+                        torch.tensor([num_tokens]),
+                        group=self.group)
+        max_tokens = int(max(tokens_per_rank))
+        pad = max_tokens - num_tokens
+        padded = [
+            torch.nn.functional.pad(tensor, (0, 0, 0, pad), value=value)
+            for tensor, value in ((hidden_states, 0), (topk_ids, -1),
+                                  (topk_weights, 0))
+        ]
+        gathered = []
+        for tensor in padded:
+            outputs = [torch.empty_like(tensor) for _ in range(self.ep_size)]
+            dist.all_gather(outputs, tensor, group=self.group)
+            gathered.append(torch.cat(outputs))
+        global_hidden, global_ids, global_weights = gathered
+        self.num_sent_tokens = num_tokens * (self.ep_size - 1)
+        self.max_tokens = max_tokens
+
+        token_indices = torch.arange(global_hidden.shape[0]).repeat_interleave(
+            global_ids.shape[1])
+        experts_flat = global_ids.reshape(-1).long()
+        local_experts = torch.full_like(experts_flat, -1)
+        valid = experts_flat >= 0
+        if expert_map is not None:
+            local_experts[valid] = expert_map[experts_flat[valid]].long()
+        else:
+            local_experts[valid] = experts_flat[valid]
+        mask = local_experts != -1
+        local_experts = torch.where(mask, local_experts, num_experts)
+        sort_indices = torch.argsort(local_experts, stable=True)
+        num_valid = int(mask.sum())
+        sort_indices = sort_indices[:num_valid]
+        self.sorted_token_indices = token_indices[sort_indices]
+        self.sorted_weights = global_weights.reshape(-1)[sort_indices].to(
+            self.dtype)
+        expert_tokens = torch.bincount(local_experts[sort_indices],
+                                       minlength=num_experts)
+
+        if self.pad_to_capacity:
+            # Every rank may send `capacity` tokens to each expert.
+            capacity = self.ep_size * self.expert_capacity(
+                max_tokens, num_global_experts)
+            dest, num_rows = self._pad_groups(expert_tokens, capacity)
+            self.num_padded_tokens = num_rows - num_valid
+            token_indices = torch.zeros(num_rows, dtype=torch.int64)
+            weights = torch.zeros(num_rows, dtype=self.dtype)
+            token_indices[dest] = self.sorted_token_indices
+            weights[dest] = self.sorted_weights
+            permuted_hidden_states = global_hidden[token_indices]
+            permuted_hidden_states[weights == 0] = 0
+            self.sorted_token_indices = token_indices
+            self.sorted_weights = weights
+            expert_tokens = torch.full_like(expert_tokens, capacity)
+        else:
+            self.num_padded_tokens = 0
+            permuted_hidden_states = global_hidden[self.sorted_token_indices]
+
+        group_list_type = 1  # `count` mode
+
+        return permuted_hidden_states, expert_tokens, group_list_type
+
+    def _post_process(self, mlp_output: torch.Tensor,
+                      hidden_states: torch.Tensor) -> None:
+        mlp_output = mlp_output * self.sorted_weights.unsqueeze(1)
+        global_output = mlp_output.new_zeros(
+            (self.ep_size * self.max_tokens, mlp_output.shape[-1]))
+        global_output.index_add_(0, self.sorted_token_indices, mlp_output)
+        # A reduce-scatter of the partial outputs.
+        dist.all_reduce(global_output, group=self.group)
+        start = self.ep_rank * self.max_tokens
+        hidden_states[:] = global_output[start:start + hidden_states.shape[0]]
+
+
+class ReferenceAllToAllCommImpl(ReferenceCommImpl):
+    """Reference of `MC2CommImpl` and the all2all token dispatchers.
+
+    Every token is sent once per selected expert to the rank holding it and
+    returned by the reverse all-to-all. As in MC2, ``topk_ids`` are the
+    physical expert ids and rank ``r`` holds the experts
+    ``[r * num_experts, (r + 1) * num_experts)``; ``expert_map`` is not used.
+    The received tokens are grouped by local expert, then by source rank.
+    """
+
+    def _pre_process(
+        self,
+        hidden_states: torch.Tensor,
+        topk_ids: torch.Tensor,
+        topk_weights: torch.Tensor,
+        expert_map: torch.Tensor,  # noqa: F841
+        num_experts: int,
+    ) -> tuple[torch.Tensor, torch.Tensor, int]:
+        num_tokens = hidden_states.shape[0]
+        num_global_experts = num_experts * self.ep_size
+        experts_flat = topk_ids.reshape(-1).long()
+        weights_flat = topk_weights.reshape(-1)
+        keep = self._capacity_mask(experts_flat, weights_flat,
+                                   num_global_experts)
+        self.num_dropped_tokens = int((~keep).sum())
+
+        # Send the kept pairs ordered by destination rank and local expert.
+        key = torch.where(keep, experts_flat, num_global_experts)
+        order = torch.argsort(key, stable=True)[:int(keep.sum())]
+        send_tokens = torch.div(order, max(self.top_k_num, 1),
+                                rounding_mode="floor")
+        send_weights = weights_flat[order].to(self.dtype)
+        send_counts = torch.bincount(key[order], minlength=num_global_experts)
+        if self.pad_to_capacity:
+            capacity = self.expert_capacity(num_tokens, num_global_experts)
+            dest, num_rows = self._pad_groups(send_counts, capacity)
+            self.num_padded_tokens = num_rows - order.numel()
+            token_indices = torch.zeros(num_rows, dtype=torch.int64)
+            weights = torch.zeros(num_rows, dtype=self.dtype)
+            token_indices[dest] = send_tokens
+            weights[dest] = send_weights
+            send_hidden = hidden_states[token_indices]
+            send_hidden[weights == 0] = 0
+            send_tokens, send_weights = token_indices, weights
+            send_counts = torch.full_like(send_counts, capacity)
+        else:
+            self.num_padded_tokens = 0
+            send_hidden = hidden_states[send_tokens]
+        self.send_tokens = send_tokens
+        self.send_weights = send_weights
+
+        # [ep_size, num_experts], tokens every rank sends to our experts.
+        recv_counts = torch.empty_like(send_counts)
+        dist.all_to_all_single(recv_counts, send_counts, group=self.group)
+        send_counts = send_counts.view(self.ep_size, num_experts)
+        recv_counts = recv_counts.view(self.ep_size, num_experts)
+        self.input_splits = send_counts.sum(-1).tolist()
+        self.output_splits = recv_counts.sum(-1).tolist()
+        recv_hidden = send_hidden.new_empty(
+            (sum(self.output_splits), hidden_states.shape[-1]))
+        dist.all_to_all_single(recv_hidden,
+                               send_hidden,
+                               self.output_splits,
+                               self.input_splits,
+                               group=self.group)
+        self.num_sent_tokens = (sum(self.input_splits) -
+                                self.input_splits[self.ep_rank])
+
+        # Regroup the received tokens from (source, expert) to expert.
+        recv_expert = torch.arange(num_experts).repeat(
+            self.ep_size).repeat_interleave(recv_counts.flatten())
+        self.recv_order = torch.argsort(recv_expert, stable=True)
+        permuted_hidden_states = recv_hidden[self.recv_order]
+        expert_tokens = recv_counts.sum(0)
+
+        group_list_type = 1  # `count` mode
+
+        return permuted_hidden_states, expert_tokens, group_list_type
+
+    def _post_process(self, mlp_output: torch.Tensor,
+                      hidden_states: torch.Tensor) -> None:
+        recv_output = torch.empty_like(mlp_output)
+        recv_output[self.recv_order] = mlp_output
+        send_output = mlp_output.new_empty(
+            (sum(self.input_splits), mlp_output.shape[-1]))
+        dist.all_to_all_single(send_output,
+                               recv_output,
+                               self.input_splits,
+                               self.output_splits,
+                               group=self.group)
+        send_output = send_output * self.send_weights.unsqueeze(1)
+        final_hidden_states = torch.zeros_like(hidden_states)
+        final_hidden_states.index_add_(0, self.send_tokens,
+                                       send_output.to(hidden_states.dtype))
+        hidden_states[:] = final_hidden_states
+
+
+def grouped_expert_mlp(permuted_hidden_states: torch.Tensor,
+                       expert_tokens: torch.Tensor, group_list_type: int,
+                       expert_weights: torch.Tensor) -> torch.Tensor:
+    """Applies ``expert_weights[i]`` to the i-th group of rows, a stand-in
+    for `npu_grouped_matmul` in the reference dispatch.
+
+    ``expert_weights`` is ``[num_experts, hidden_size, hidden_size]``. Rows
+    after the last group are zero in the output.
+    """
+    counts = expert_tokens.long()
+    if group_list_type == 0:
+        counts = torch.diff(counts, prepend=counts.new_zeros(1))
+    output = torch.zeros_like(permuted_hidden_states)
+    start = 0
+    for expert, count in enumerate(counts.tolist()):
+        rows = slice(start, start + count)
+        output[rows] = permuted_hidden_states[rows] @ expert_weights[expert]
+        start += count
+    return output
+
+
+def dense_moe_reference(hidden_states: torch.Tensor, topk_ids: torch.Tensor,
+                        topk_weights: torch.Tensor,
+                        expert_weights: torch.Tensor) -> torch.Tensor:
+    """Output of a dropless MoE layer with `grouped_expert_mlp` experts,
+    computed without any dispatch. ``topk_ids`` of -1 are skipped."""
+    output = torch.zeros_like(hidden_states)
+    for k in range(topk_ids.shape[1]):
+        experts = topk_ids[:, k].long()
+        valid = experts >= 0
+        expert_out = torch.einsum("th,thd->td", hidden_states[valid],
+                                  expert_weights[experts[valid]])
+        output[valid] += topk_weights[valid, k].unsqueeze(1).to(
+            output.dtype) * expert_out
+    return output
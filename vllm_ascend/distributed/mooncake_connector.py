@@ -8,10 +8,10 @@ import random
 import struct
 import threading
 import time
-from collections import defaultdict, deque
-from collections.abc import Iterator
+from collections import OrderedDict, defaultdict, deque
+from collections.abc import Callable, Iterable, Iterator
 from concurrent.futures import ThreadPoolExecutor
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import TYPE_CHECKING, Any, List, Optional, Tuple
 
 import msgspec
@@ -29,6 +29,20 @@ from vllm.utils import get_ip, logger, make_zmq_path, make_zmq_socket
 from vllm.v1.core.sched.output import SchedulerOutput
 from vllm.v1.request import RequestStatus
 
+from vllm_ascend.distributed.block_runs import (BlockRuns, align_block_runs,
+                                                block_runs_from_bytes,
+                                                block_runs_to_bytes,
+                                                build_transfer_descs,
+                                                decode_block_runs,
+                                                encode_block_runs,
+                                                get_cache_block_lens,
+                                                get_region_block_runs,
+                                                match_suffix_block_runs,
+                                                num_blocks_in_runs)
+from vllm_ascend.distributed.transfer_retry import (KVLoadErrors,
+                                                    TransferRetryPolicy)
+from vllm_ascend.distributed.zmq_connection import get_zmq_connection_manager
+
 if TYPE_CHECKING:
     from vllm.attention.backends.abstract import AttentionMetadata
     from vllm.forward_context import ForwardContext
@@ -37,8 +51,11 @@ if TYPE_CHECKING:
 
 GET_META_MSG = b"get_meta_msg"
 DONE_RECVING_MSG = b"done_recving_msg"
+DONE_RECVING_BATCH_MSG = b"done_recving_batch_msg"
 DECODER_HELLO = b"decoder_hello"
 PREFILLER_BYE = b"prefiller_bye"
+# How often the prefiller checks for layerwise requests without a peer.
+LAYERWISE_EXPIRE_INTERVAL_MS = 100
 
 
 class MooncakeAgentMetadata(msgspec.Struct, omit_defaults=True, dict=True):
@@ -50,14 +67,29 @@ class MooncakeAgentMetadata(msgspec.Struct, omit_defaults=True, dict=True):
 
 @dataclass
 class ReqMeta:
-    local_block_ids: list[int]
-    remote_block_ids: list[int]
+    # Run-length encoded block ids, see block_runs.
+    local_block_runs: BlockRuns
+    remote_block_runs: BlockRuns
     remote_host: str
     remote_port: int
     remote_engine_id: str
+    # Leading blocks of the request hit in the local prefix cache, which are
+    # not pulled.
+    num_cached_blocks: int = 0
+
+    @property
+    def local_block_ids(self) -> list[int]:
+        return decode_block_runs(self.local_block_runs).tolist()
+
+    @property
+    def remote_block_ids(self) -> list[int]:
+        return decode_block_runs(self.remote_block_runs).tolist()
 
 
 class KVCacheTaskTracker:
+    # Seconds a finished request is remembered, done signals resent for it
+    # meanwhile are ignored.
+    FINISHED_REQUEST_TTL = 60.0
 
     def __init__(self, tp_rank: int, local_engine_id: str, target_count: int):
         super().__init__()
@@ -68,6 +100,8 @@ class KVCacheTaskTracker:
         self.done_task_lock = threading.Lock()
         self.done_task_counts: defaultdict[str, set[int]] = defaultdict(set)
         self.finished_requests: set[str] = set()
+        # Finished requests by the time they finished, oldest first.
+        self.recently_finished: OrderedDict[str, float] = OrderedDict()
 
         self.socket_path = \
             f"ipc:///tmp/vllm_mooncake_connector_{self.local_engine_id}.ipc"
@@ -81,7 +115,7 @@ class KVCacheTaskTracker:
         else:
             self.listener = None  # type: ignore
             self.socket = make_zmq_socket(
-                ctx=zmq.Context(),  # type: ignore
+                ctx=get_zmq_connection_manager().ctx,
                 path=self.socket_path,
                 socket_type=zmq.PUSH,  # type: ignore
                 bind=False)
@@ -90,7 +124,7 @@ class KVCacheTaskTracker:
 
     def _listen_for_completion_signals(self):
         socket = make_zmq_socket(
-            ctx=zmq.Context(),  # type: ignore
+            ctx=get_zmq_connection_manager().ctx,
             path=self.socket_path,
             socket_type=zmq.PULL,  # type: ignore
             bind=True)
@@ -114,6 +148,17 @@ class KVCacheTaskTracker:
 
     def _increment_task_count(self, request_id: str, tp_rank: int):
         with self.done_task_lock:
+            now = time.monotonic()
+            while self.recently_finished and next(
+                    iter(self.recently_finished.values())
+            ) < now - self.FINISHED_REQUEST_TTL:
+                self.recently_finished.popitem(last=False)
+            if request_id in self.recently_finished:
+                # A done signal resent after its ACK was lost.
+                logger.debug(
+                    "Received done signal for finished request %s from tp "
+                    "rank %d. Ignoring.", request_id, tp_rank)
+                return
             if tp_rank in self.done_task_counts[request_id]:
                 logger.warning(
                     f"Received duplicate done signal for request {request_id} "
@@ -124,6 +169,7 @@ class KVCacheTaskTracker:
             if len(self.done_task_counts[request_id]) == self.target_count:
                 self.finished_requests.add(request_id)
                 self.done_task_counts.pop(request_id)
+                self.recently_finished[request_id] = now
                 logger.info("All transfers completed for request: "
                             f"{request_id}. Total ranks: "
                             f"{self.target_count}.")
@@ -140,24 +186,49 @@ class KVCacheTaskTracker:
         return finished_requests
 
 
+@dataclass
 class DecoderMeta:
+    """Where a decode tp rank wants the KV cache of a request, sent to the
+    prefiller with DECODER_HELLO."""
     request_id: str
-    engine_id: str
+    tp_rank: int
     host: str
-    port: str
-    blocks: list[int]
+    handshake_port: int
+    te_rpc_port: int
+    kv_caches_base_addr: list[int]
+    num_cached_blocks: int
+    block_runs: BlockRuns
+    # Set by the prefiller once a layer failed to land, told with the bye.
+    failed: bool = False
+    arrival_time: float = field(default_factory=time.monotonic)
+
 
+@dataclass
 class PrefillerMeta:
-    blocks: list[int]
-    sent_layer_count: int
-    ready_layer_count: int
+    """Blocks of a request in its last prefill step, and its layers computed
+    so far in order, with the events recorded after them."""
+    block_runs: BlockRuns
+    # The decode tp rank whose hello this prefill tp rank gets.
+    decode_tp_rank: int
+    ready_layers: dict[int, Any] = field(default_factory=dict)
+    num_sent_layers: int = 0
+    arrival_time: float = field(default_factory=time.monotonic)
+
 
 class KVCacheSendingThread(threading.Thread):
 
-    def __init__(self, tp_rank: int, decode_tp_size: int, local_engine_id: str,
-                 side_channel_host: str, side_channel_port: int,
+    def __init__(self,
+                 tp_rank: int,
+                 decode_tp_size: int,
+                 local_engine_id: str,
+                 side_channel_host: str,
+                 side_channel_port: int,
                  metadata: MooncakeAgentMetadata,
-                 ready_event: threading.Event):
+                 ready_event: threading.Event,
+                 engine: Optional[TransferEngine] = None,
+                 block_len: Optional[list[int]] = None,
+                 num_layers: int = 0,
+                 layerwise_timeout: float = 120.0):
         super().__init__(daemon=True, name="KVCacheSendingThread")
         self.tp_rank = tp_rank
         self.decode_tp_size = decode_tp_size
@@ -170,35 +241,170 @@ class KVCacheSendingThread(threading.Thread):
         self.task_tracker = KVCacheTaskTracker(self.tp_rank,
                                                self.local_engine_id,
                                                self.decode_tp_size)
-        self.decoder_meta = dict[str, DecoderMeta]()
-        self.prefiller_meta = dict[str, PrefillerMeta]()
-        # TODO(layer-wise): count layers
-        self.layer_count = 72
-    
-    def _async_transfer(self, remote_host: str, remote_port: str, local_block_ids: list[int], 
-                           remote_block_ids: list[int], layer: int):
-        # TODO(layer-wise): transfer
-        pass
+
+        # Layer-wise streaming, the engine writes every layer of a request
+        # into the decoder's blocks as soon as it is computed.
+        self.engine = engine
+        self.block_len = block_len or []
+        # TODO(jianzs): find a better way to detect MLA.
+        self.use_mla = len(self.block_len) == 2
+        self.num_layers = num_layers
+        # The model marks layers ready and the listener registers decoders.
+        self.layerwise_lock = threading.Lock()
+        self.decoder_meta: dict[str, DecoderMeta] = {}
+        self.prefiller_meta: dict[str, PrefillerMeta] = {}
+        # A request whose decoder or last prefill step does not show up
+        # within layerwise_timeout seconds is dropped, see
+        # _expire_layerwise_requests.
+        self.layerwise_timeout = layerwise_timeout
+        # A single worker keeps the layers of a request before its bye.
+        self.layer_sending_executor = ThreadPoolExecutor(max_workers=1)
+        self.encoder = msgspec.msgpack.Encoder()
+
+    def add_request(self, request_id: str, block_runs: BlockRuns,
+                    decode_tp_rank: int):
+        """Streams a request in its last prefill step to the decoder."""
+        with self.layerwise_lock:
+            self.prefiller_meta[request_id] = PrefillerMeta(
+                block_runs=block_runs, decode_tp_rank=decode_tp_rank)
+
+    def mark_layers_ready(self, request_ids: Iterable[str],
+                          layers: Iterable[int], event: Any):
+        """Marks layers of requests computed once ``event`` completes, the
+        ones already marked are skipped."""
+        with self.layerwise_lock:
+            for request_id in request_ids:
+                prefiller_meta = self.prefiller_meta.get(request_id)
+                if prefiller_meta is None:
+                    continue
+                for layer in layers:
+                    prefiller_meta.ready_layers.setdefault(layer, event)
+                self._maybe_transfer(request_id)
 
     def _maybe_transfer(self, request_id: str):
+        """Sends the new ready layers of a request once its decoder is known.
+        Called with layerwise_lock held."""
         prefiller_meta = self.prefiller_meta.get(request_id)
         decoder_meta = self.decoder_meta.get(request_id)
         if prefiller_meta is None or decoder_meta is None:
             return
-        for i in range(prefiller_meta.sent_layer_count, prefiller_meta.ready_layer_count):
-            self._async_transfer(
-                remote_host=decoder_meta.host,
-                remote_port=decoder_meta.port,
-                local_block_ids=prefiller_meta.blocks[i],
-                remote_block_ids=decoder_meta.blocks[i],
-                layer=i
-            )
-        prefiller_meta.sent_layer_count = prefiller_meta.ready_layer_count
-        if prefiller_meta.sent_layer_count == self.layer_count:
-            self.task_tracker.mark_request_finished(request_id)
+        ready_layers = list(prefiller_meta.ready_layers.items())
+        for layer, event in ready_layers[prefiller_meta.num_sent_layers:]:
+            self.layer_sending_executor.submit(self._transfer_layer,
+                                               decoder_meta,
+                                               prefiller_meta.block_runs,
+                                               layer, event)
+        prefiller_meta.num_sent_layers = len(ready_layers)
+        if prefiller_meta.num_sent_layers == self.num_layers:
             self.prefiller_meta.pop(request_id)
             self.decoder_meta.pop(request_id)
-            # TODO(layer-wise): notify decoder
+            self.layer_sending_executor.submit(self._send_prefiller_bye,
+                                               decoder_meta)
+
+    def _expire_layerwise_requests(self):
+        """Drops the requests whose decoder did not say hello, or whose last
+        prefill step did not come, within layerwise_timeout seconds."""
+        if self.layerwise_timeout <= 0:
+            return
+        now = time.monotonic()
+        with self.layerwise_lock:
+            for request_id, prefiller_meta in list(
+                    self.prefiller_meta.items()):
+                if (request_id in self.decoder_meta or
+                        now - prefiller_meta.arrival_time
+                        <= self.layerwise_timeout):
+                    continue
+                logger.warning(
+                    "No DECODER_HELLO for request %s in %.1f seconds, "
+                    "releasing its blocks.", request_id,
+                    self.layerwise_timeout)
+                del self.prefiller_meta[request_id]
+                # Released on the sending worker, the same as with the bye.
+                self.layer_sending_executor.submit(
+                    self.task_tracker.update_done_task_count, request_id,
+                    prefiller_meta.decode_tp_rank)
+            for request_id, decoder_meta in list(self.decoder_meta.items()):
+                if (request_id in self.prefiller_meta or
+                        now - decoder_meta.arrival_time
+                        <= self.layerwise_timeout):
+                    continue
+                logger.warning(
+                    "Request %s was not prefilled in %.1f seconds after its "
+                    "DECODER_HELLO, failing it.", request_id,
+                    self.layerwise_timeout)
+                del self.decoder_meta[request_id]
+                # The decoder recomputes the request, no blocks of it are
+                # held here.
+                decoder_meta.failed = True
+                self.layer_sending_executor.submit(self._send_prefiller_bye,
+                                                   decoder_meta,
+                                                   release_blocks=False)
+
+    def _transfer_layer(self, decoder_meta: DecoderMeta,
+                        block_runs: BlockRuns, layer: int, event: Any):
+        """Writes one layer of a request into the decoder's blocks."""
+        try:
+            if event is not None:
+                # The layer is computed once the event completes.
+                event.synchronize()
+            # The decoder holds the blocks after its prefix cache hits, and
+            # recomputes its last token, it may hold fewer blocks.
+            decoder_block_runs, block_runs = match_suffix_block_runs(
+                decoder_meta.block_runs, block_runs,
+                decoder_meta.num_cached_blocks)
+            if len(block_runs) == 0:
+                return
+            local_starts, remote_starts, group_lengths = align_block_runs(
+                block_runs, decoder_block_runs)
+            num_caches = len(self.metadata.kv_caches_base_addr) // \
+                self.num_layers
+            caches = slice(layer * num_caches, (layer + 1) * num_caches)
+            block_lens = get_cache_block_lens(
+                self.block_len, len(self.metadata.kv_caches_base_addr),
+                self.use_mla)[caches]
+            descs = build_transfer_descs(
+                self.metadata.kv_caches_base_addr[caches],
+                decoder_meta.kv_caches_base_addr[caches], block_lens,
+                local_starts, remote_starts, group_lengths)
+            src_list, dst_list, length_list = descs.reshape(3, -1).tolist()
+            session_id = f"{decoder_meta.host}:{decoder_meta.te_rpc_port}"
+            ret = self.engine.batch_transfer_sync_write(  # type: ignore
+                session_id, src_list, dst_list, length_list)
+            if ret < 0:
+                raise RuntimeError(f"Mooncake transfer failed, ret: {ret}")
+        except Exception as e:
+            logger.error("Failed to send layer %d of request %s: %s", layer,
+                         decoder_meta.request_id, e)
+            decoder_meta.failed = True
+
+    def _send_prefiller_bye(self,
+                            decoder_meta: DecoderMeta,
+                            release_blocks: bool = True):
+        """Tells the decoder that the last layer of a request landed, and
+        whether any failed. The blocks of the request are released after it
+        unless ``release_blocks`` is False."""
+        request_id = decoder_meta.request_id
+        path = make_zmq_path("tcp", decoder_meta.host,
+                             decoder_meta.handshake_port)
+        try:
+            with get_zmq_connection_manager().connection(path) as sock:
+                ensure_zmq_send(sock,
+                                self.encoder.encode(
+                                    (PREFILLER_BYE, request_id,
+                                     decoder_meta.failed)))
+                resp = ensure_zmq_recv(sock)
+                if resp != b"ACK":
+                    raise RuntimeError(
+                        f"Failed to receive ACK, resp: {resp.decode('utf-8')}"
+                    )
+        except Exception as e:
+            logger.error("Failed to send PREFILLER_BYE for request %s: %s",
+                         request_id, e)
+        finally:
+            # Always release the blocks, the same as DONE_RECVING_MSG.
+            if release_blocks:
+                self.task_tracker.update_done_task_count(
+                    request_id, decoder_meta.tp_rank)
 
     def get_and_clear_finished_requests(self) -> set[str]:
         """
@@ -229,6 +435,10 @@ class KVCacheSendingThread(threading.Thread):
             decoder = msgspec.msgpack.Decoder(type=tuple)
             while True:
                 try:
+                    self._expire_layerwise_requests()
+                    # Wakes up now and then to expire layerwise requests.
+                    if not sock.poll(LAYERWISE_EXPIRE_INTERVAL_MS):
+                        continue
                     frames = sock.recv_multipart()
                     if len(frames) < 2:
                         logger.error("Invalid message format: %s", frames)
@@ -250,25 +460,31 @@ class KVCacheSendingThread(threading.Thread):
                         self.task_tracker.update_done_task_count(
                             request_id, decode_tp_rank)
                         # Acknowledge the request completion.
-                        while True:
-                            try:
-                                # Send ACK to the sender.
-                                sock.send_multipart(
-                                    (identity, b"", b"ACK"),
-                                    flags=zmq.NOBLOCK)  # type: ignore
-                                break
-                            except zmq.Again:  # type: ignore
-                                # If the socket is not ready, retry sending.
-                                logger.debug(
-                                    "Socket not ready, retrying to send ACK for "
-                                    "request %s", msg[1])
-                                time.sleep(0.01)
+                        ensure_zmq_send_ack(sock, identity, request_id)
+                    elif msg[0] == DONE_RECVING_BATCH_MSG:
+                        batch_id, request_ids, decode_tp_rank = msg[1:]
+                        logger.debug(
+                            "Got DONE_RECVING_BATCH_MSG for requests %s",
+                            request_ids)
+                        for request_id in request_ids:
+                            self.task_tracker.update_done_task_count(
+                                request_id, decode_tp_rank)
+                        # Acknowledge the batch by its id.
+                        ensure_zmq_send_ack(
+                            sock, identity, request_ids,
+                            msgspec.msgpack.encode((b"ACK", batch_id)))
                     elif msg[0] == DECODER_HELLO:
+                        decoder_meta = DecoderMeta(
+                            *msg[1:-1],
+                            block_runs=block_runs_from_bytes(msg[-1]))
                         logger.debug("Got DECODER_HELLO for request %s",
-                                     msg[1])
-                        decoder_meta = msg[2] # TODO(layer-wise): implement
-                        self.decoder_meta[decoder_meta.request_id] = decoder_meta
-                        self._maybe_transfer()
+                                     decoder_meta.request_id)
+                        with self.layerwise_lock:
+                            self.decoder_meta[
+                                decoder_meta.request_id] = decoder_meta
+                            self._maybe_transfer(decoder_meta.request_id)
+                        ensure_zmq_send_ack(sock, identity,
+                                            decoder_meta.request_id)
                     else:
                         logger.error(
                             "Connection listener got unexpected message %s",
@@ -276,44 +492,468 @@ class KVCacheSendingThread(threading.Thread):
                 except Exception as e:
                     logger.error("Connection listener got exception %s: %s",
                                  type(e), e)
-    
-    def mark_layer_ready(self, request_id: str, layer_count: int):
-        prefiller_meta = self.prefiller_meta.get(request_id)
-        if not prefiller_meta:
-            self.prefiller_meta[request_id] = PrefillerMeta(
-                request_id=request_id,
-                sent_layer_count=0,
-                ready_layer_count=layer_count
-            )
-        else:
-            prefiller_meta.ready_layer_count = layer_count
-        self._maybe_transfer(request_id)
 
-class KVCacheRecvingPrefillerByeThread(threading.Thread):
 
-    def __init__(self, port: int, finished: KVCacheTaskTracker):
+class KVCacheRecvingPrefillerByeThread(threading.Thread):
+    """Listens on the handshake port of a decode tp rank for PREFILLER_BYE,
+    which tells that the last layer of a request landed."""
+
+    def __init__(self,
+                 tp_rank: int,
+                 host: str,
+                 port: int,
+                 task_tracker: KVCacheTaskTracker,
+                 ready_event: threading.Event,
+                 load_errors: Optional[KVLoadErrors] = None):
         super().__init__(daemon=True, name="KVCacheRecvingPrefillerByeThread")
+        self.tp_rank = tp_rank
+        self.host = host
         self.port = port
-        self.finished = finished
+        self.task_tracker = task_tracker
+        self.ready_event = ready_event
+        self.load_errors = load_errors
 
     def run(self):
-        """Run the thread to handle KV cache receiving for prefiller bye messages."""
-        with zmq_ctx(zmq.ROUTER, make_zmq_path("tcp", "*", self.port)) as sock:  # type: ignore
+        """Run the thread to handle PREFILLER_BYE messages."""
+        path = make_zmq_path("tcp", self.host, self.port)
+        logger.info("Starting listening for PREFILLER_BYE on path: %s", path)
+        with zmq_ctx(zmq.ROUTER, path) as sock:  # type: ignore
+            self.ready_event.set()
+            decoder = msgspec.msgpack.Decoder(type=tuple)
             while True:
-                msg = sock.recv_multipart()
-                if msg[0] == PREFILLER_BYE:
-                    logger.debug("Received PREFILLER_BYE message")
-                    sock.send_multipart((msg[1], b"ACK"))
-                    self.finished._increment_task_count(msg[1])
-                else:
-                    logger.warning("Received unexpected message: %s", msg)
+                try:
+                    frames = sock.recv_multipart()
+                    identity = frames[0]
+                    payload = [f for f in frames[1:] if f != b""]
+                    if len(payload) != 1:
+                        logger.error("Invalid message format: %s", frames)
+                        continue
+
+                    msg = decoder.decode(payload[0])
+                    if msg[0] == PREFILLER_BYE:
+                        logger.debug("Got PREFILLER_BYE for request %s",
+                                     msg[1])
+                        failed = len(msg) > 2 and bool(msg[2])
+                        if failed:
+                            logger.error(
+                                "The prefiller failed to send layers of "
+                                "request %s", msg[1])
+                        # Recorded before the request is reported done.
+                        if self.load_errors is not None:
+                            self.load_errors.resolve(msg[1], failed)
+                        self.task_tracker.update_done_task_count(
+                            msg[1], self.tp_rank)
+                        ensure_zmq_send_ack(sock, identity, msg[1])
+                    else:
+                        logger.error(
+                            "PREFILLER_BYE listener got unexpected message %s",
+                            msg)
+                except Exception as e:
+                    logger.error("PREFILLER_BYE listener got exception %s: %s",
+                                 type(e), e)
+
+
+@dataclass
+class TransferChunk:
+    """A batch of KV cache regions pulled with one engine call."""
+    src_list: list[int] = field(default_factory=list)
+    dst_list: list[int] = field(default_factory=list)
+    length_list: list[int] = field(default_factory=list)
+    num_bytes: int = 0
+
+    def append(self, src: int, dst: int, length: int):
+        self.src_list.append(src)
+        self.dst_list.append(dst)
+        self.length_list.append(length)
+        self.num_bytes += length
+
+
+def split_transfer_chunks(
+        layer_descs: list[list[tuple[int, int, int, int]]],
+        chunk_bytes: int) -> list[TransferChunk]:
+    """
+    Splits the regions of a pull into chunks, in layer order.
+
+    ``layer_descs`` holds ``(src, dst, length, block_len)`` of every layer.
+    With ``chunk_bytes <= 0`` each layer is a chunk, otherwise a chunk holds
+    at most ``chunk_bytes``, regions are split at block boundaries and a
+    block is never split.
+    """
+    chunks: list[TransferChunk] = []
+    if chunk_bytes <= 0:
+        for descs in layer_descs:
+            chunk = TransferChunk()
+            for src, dst, length, _ in descs:
+                chunk.append(src, dst, length)
+            if chunk.num_bytes > 0:
+                chunks.append(chunk)
+        return chunks
+
+    chunk = TransferChunk()
+    for descs in layer_descs:
+        for src, dst, length, block_len in descs:
+            while length > 0:
+                room = chunk_bytes - chunk.num_bytes
+                size = min(length, max(room // block_len, 1) * block_len)
+                if chunk.num_bytes > 0 and size > room:
+                    chunks.append(chunk)
+                    chunk = TransferChunk()
+                    continue
+                chunk.append(src, dst, size)
+                src, dst, length = src + size, dst + size, length - size
+                if chunk.num_bytes >= chunk_bytes:
+                    chunks.append(chunk)
+                    chunk = TransferChunk()
+    if chunk.num_bytes > 0:
+        chunks.append(chunk)
+    return chunks
+
+
+class KVCacheTransferMetrics:
+    """Cumulative timings of the chunked KV cache pulls."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.num_chunks = 0
+        self.num_bytes = 0
+        self.chunk_time_ms = 0.0
+        self.max_chunk_time_ms = 0.0
+        self.num_requests = 0
+        self.request_time_ms = 0.0
+        self.max_request_time_ms = 0.0
+
+    def observe_chunk(self, num_bytes: int, elapsed_ms: float):
+        with self.lock:
+            self.num_chunks += 1
+            self.num_bytes += num_bytes
+            self.chunk_time_ms += elapsed_ms
+            self.max_chunk_time_ms = max(self.max_chunk_time_ms, elapsed_ms)
+
+    def observe_request(self, elapsed_ms: float):
+        with self.lock:
+            self.num_requests += 1
+            self.request_time_ms += elapsed_ms
+            self.max_request_time_ms = max(self.max_request_time_ms,
+                                           elapsed_ms)
+
+    def snapshot(self) -> dict[str, float]:
+        with self.lock:
+            return {
+                "num_chunks": self.num_chunks,
+                "num_bytes": self.num_bytes,
+                "avg_chunk_time_ms":
+                self.chunk_time_ms / max(self.num_chunks, 1),
+                "max_chunk_time_ms": self.max_chunk_time_ms,
+                "chunk_throughput_gb_per_s":
+                self.num_bytes / max(self.chunk_time_ms, 1e-6) / 1e6,
+                "num_requests": self.num_requests,
+                "avg_request_time_ms":
+                self.request_time_ms / max(self.num_requests, 1),
+                "max_request_time_ms": self.max_request_time_ms,
+            }
+
+
+@dataclass
+class PipelinedTransfer:
+    """The chunks of a request left to issue and in flight."""
+    request_id: str
+    session_id: str
+    chunks: deque[TransferChunk]
+    callback: Callable[[Optional[Exception]], None]
+    start_time: float
+    num_inflight: int = 0
+    error: Optional[Exception] = None
+    # The chunks that failed or were not issued after the first failure.
+    failed_chunks: list[TransferChunk] = field(default_factory=list)
+
+
+class TransferChunksError(RuntimeError):
+    """A pipelined pull that failed, with the chunks that did not land."""
+
+    def __init__(self, error: Exception, chunks: list[TransferChunk]):
+        super().__init__(str(error))
+        self.chunks = chunks
+
+
+class KVCacheTransferPipeline:
+    """
+    Issues the chunks of KV cache pulls on an executor, with at most
+    ``max_inflight_per_remote`` chunks in flight per remote session.
+
+    Requests take turns chunk by chunk, so a small request waits for a few
+    chunks of the large ones in front of it instead of the whole of them.
+    The callback of a request runs on the executor once its last chunk
+    landed, or after its first failure once the chunks in flight returned,
+    with a `TransferChunksError` holding the chunks to pull again.
+    """
+
+    def __init__(self,
+                 engine: TransferEngine,
+                 executor: ThreadPoolExecutor,
+                 max_inflight_per_remote: int = 2,
+                 metrics_log_interval: float = 10.0):
+        assert max_inflight_per_remote > 0
+        self.engine = engine
+        self.executor = executor
+        self.max_inflight_per_remote = max_inflight_per_remote
+        self.lock = threading.Lock()
+        # In round robin order, a request moves to the end once it issued.
+        self.transfers: OrderedDict[str, PipelinedTransfer] = OrderedDict()
+        self.inflight: defaultdict[str, int] = defaultdict(int)
+        self.metrics = KVCacheTransferMetrics()
+        self.metrics_log_interval = metrics_log_interval
+        self.last_metrics_log_time = time.perf_counter()
+
+    def submit(self, request_id: str, session_id: str,
+               chunks: list[TransferChunk],
+               callback: Callable[[Optional[Exception]], None]):
+        """Pulls ``chunks`` from ``session_id`` and calls ``callback`` with
+        the error, if any, once done."""
+        if not chunks:
+            callback(None)
+            return
+        with self.lock:
+            self.transfers[request_id] = PipelinedTransfer(
+                request_id, session_id, deque(chunks), callback,
+                time.perf_counter())
+            self._schedule()
+
+    def _schedule(self):
+        """Issues chunks until every remote with pending chunks is full.
+        Called with lock held."""
+        issued = True
+        while issued:
+            issued = False
+            for transfer in list(self.transfers.values()):
+                if not transfer.chunks or self.inflight[
+                        transfer.session_id] >= self.max_inflight_per_remote:
+                    continue
+                chunk = transfer.chunks.popleft()
+                transfer.num_inflight += 1
+                self.inflight[transfer.session_id] += 1
+                self.transfers.move_to_end(transfer.request_id)
+                self.executor.submit(self._transfer_chunk, transfer, chunk)
+                issued = True
+
+    def _transfer_chunk(self, transfer: PipelinedTransfer,
+                        chunk: TransferChunk):
+        start_time = time.perf_counter()
+        error: Optional[Exception] = None
+        try:
+            ret = self.engine.batch_transfer_sync_read(transfer.session_id,
+                                                       chunk.src_list,
+                                                       chunk.dst_list,
+                                                       chunk.length_list)
+            if ret < 0:
+                error = RuntimeError(f"Mooncake transfer failed, ret: {ret}")
+        except Exception as e:
+            error = e
+        end_time = time.perf_counter()
+        elapsed_ms = (end_time - start_time) * 1000
+        self.metrics.observe_chunk(chunk.num_bytes, elapsed_ms)
+        logger.debug("KV cache chunk of request %s took %.2f ms (%d bytes).",
+                     transfer.request_id, elapsed_ms, chunk.num_bytes)
+
+        finished = False
+        with self.lock:
+            transfer.num_inflight -= 1
+            self.inflight[transfer.session_id] -= 1
+            if error is not None:
+                transfer.failed_chunks.append(chunk)
+                if transfer.error is None:
+                    transfer.error = error
+                    # The request fails anyway, do not pull the rest now.
+                    transfer.failed_chunks.extend(transfer.chunks)
+                    transfer.chunks.clear()
+            if not transfer.chunks and transfer.num_inflight == 0:
+                self.transfers.pop(transfer.request_id)
+                finished = True
+            self._schedule()
+        if not finished:
+            return
+        self.metrics.observe_request((end_time - transfer.start_time) * 1000)
+        if end_time - self.last_metrics_log_time >= self.metrics_log_interval:
+            self.last_metrics_log_time = end_time
+            logger.info("KV cache transfer metrics: %s",
+                        self.metrics.snapshot())
+        transfer.callback(None if transfer.error is None else
+                          TransferChunksError(transfer.error,
+                                              transfer.failed_chunks))
+
+
+class KVCacheDoneRecvingNotifier(threading.Thread):
+    """
+    Sends the done signals of pulled requests to their remotes in batches.
+
+    The signals to a remote are gathered for up to ``window`` seconds or
+    ``max_batch_size`` requests and sent as one DONE_RECVING_BATCH_MSG over
+    a DEALER socket, without waiting for the reply. The remote acknowledges
+    the batch by its id. A batch that is not acknowledged within
+    ``ack_timeout`` seconds is sent again, up to ``max_retries`` times, and
+    the remote ignores the signals it already got.
+    """
+
+    def __init__(self,
+                 tp_rank: int,
+                 window: float = 0.001,
+                 max_batch_size: int = 64,
+                 ack_timeout: float = 1.0,
+                 max_retries: int = 3):
+        super().__init__(daemon=True, name="KVCacheDoneRecvingNotifier")
+        self.tp_rank = tp_rank
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.ack_timeout = ack_timeout
+        self.max_retries = max_retries
+
+        self.cond = threading.Condition()
+        # Requests to signal per remote, with the time of the first one.
+        self.pending: dict[tuple[str, int], tuple[float, list[str]]] = {}
+        # Batch id -> remote, requests, deadline of the ACK, retries left.
+        self.unacked: dict[int, tuple[tuple[str, int], list[str], float,
+                                      int]] = {}
+        self.next_batch_id = 0
+        self.num_sent_batches = 0
+
+        self.ctx = get_zmq_connection_manager().ctx
+        self.sockets: dict[tuple[str, int], zmq.Socket] = {}  # type: ignore
+        self.poller = zmq.Poller()  # type: ignore
+        self.encoder = msgspec.msgpack.Encoder()
+        self.decoder = msgspec.msgpack.Decoder(type=tuple)
+
+    def notify(self, request_id: str, remote_host: str,
+               remote_handshake_port: int):
+        """Queues the done signal of a request to its remote."""
+        remote = (remote_host, remote_handshake_port)
+        with self.cond:
+            _, request_ids = self.pending.setdefault(
+                remote, (time.monotonic(), []))
+            request_ids.append(request_id)
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            try:
+                with self.cond:
+                    while not self.pending and not self.unacked:
+                        self.cond.wait()
+                    now = time.monotonic()
+                    due = [
+                        remote
+                        for remote, (first_time, request_ids) in
+                        self.pending.items()
+                        if now - first_time >= self.window
+                        or len(request_ids) >= self.max_batch_size
+                    ]
+                    batches = [(remote, self.pending.pop(remote)[1])
+                               for remote in due]
+                for remote, request_ids in batches:
+                    for i in range(0, len(request_ids), self.max_batch_size):
+                        self._send_batch(
+                            remote, request_ids[i:i + self.max_batch_size])
+                self._resend_expired()
+                self._recv_acks(self._get_poll_timeout())
+            except Exception as e:
+                logger.error("Done recving notifier got exception %s: %s",
+                             type(e), e)
+
+    def _get_poll_timeout(self) -> float:
+        """Seconds until the next batch is due or an ACK expires."""
+        now = time.monotonic()
+        with self.cond:
+            deadlines = [
+                first_time + self.window
+                for first_time, _ in self.pending.values()
+            ]
+        deadlines.extend(deadline
+                         for _, _, deadline, _ in self.unacked.values())
+        if not deadlines:
+            return 0
+        # New signals are picked up between polls.
+        return min(max(min(deadlines) - now, 0), max(self.window, 0.001))
+
+    def _send_batch(self,
+                    remote: tuple[str, int],
+                    request_ids: list[str],
+                    batch_id: Optional[int] = None,
+                    retries_left: Optional[int] = None):
+        if batch_id is None:
+            batch_id = self.next_batch_id
+            self.next_batch_id += 1
+        if retries_left is None:
+            retries_left = self.max_retries
+        sock = self.sockets.get(remote)
+        if sock is None:
+            sock = make_zmq_socket(ctx=self.ctx,
+                                   path=make_zmq_path("tcp", *remote),
+                                   socket_type=zmq.DEALER,  # type: ignore
+                                   bind=False)
+            self.sockets[remote] = sock
+            self.poller.register(sock, zmq.POLLIN)  # type: ignore
+        logger.debug("Sending done signals of %d requests to %s:%d",
+                     len(request_ids), *remote)
+        sock.send_multipart((b"",
+                             self.encoder.encode(
+                                 (DONE_RECVING_BATCH_MSG, batch_id,
+                                  request_ids, self.tp_rank))))
+        self.num_sent_batches += 1
+        self.unacked[batch_id] = (remote, request_ids,
+                                  time.monotonic() + self.ack_timeout,
+                                  retries_left)
+
+    def _resend_expired(self):
+        now = time.monotonic()
+        expired = [
+            batch_id
+            for batch_id, (_, _, deadline, _) in self.unacked.items()
+            if deadline <= now
+        ]
+        for batch_id in expired:
+            remote, request_ids, _, retries_left = self.unacked.pop(batch_id)
+            if retries_left > 0:
+                logger.warning(
+                    "No ACK for the done signals of requests %s from %s:%d, "
+                    "retrying... (%d attempts left)", request_ids, *remote,
+                    retries_left)
+                self._send_batch(remote, request_ids, batch_id,
+                                 retries_left - 1)
+            else:
+                logger.error(
+                    "Failed to deliver the done signals of requests %s to "
+                    "%s:%d", request_ids, *remote)
+
+    def _recv_acks(self, timeout: float):
+        events = dict(self.poller.poll(int(timeout * 1000)))
+        for sock in events:
+            while True:
+                try:
+                    frames = sock.recv_multipart(
+                        flags=zmq.NOBLOCK)  # type: ignore
+                except zmq.Again:  # type: ignore
+                    break
+                payload = [f for f in frames if f != b""]
+                if len(payload) != 1:
+                    logger.error("Invalid ACK format: %s", frames)
+                    continue
+                ack, batch_id = self.decoder.decode(payload[0])
+                if ack == b"ACK":
+                    self.unacked.pop(batch_id, None)
+
 
 class KVCacheRecvingThread(threading.Thread):
 
     def __init__(self, tp_rank: int, tp_size: int, engine: TransferEngine,
                  local_engine_id: str, local_handshake_port: int,
                  local_kv_caches_base_addr: list[int], block_len: list[int],
-                 ready_event: threading.Event):
+                 ready_event: threading.Event,
+                 layerwise: bool = False,
+                 local_host: str = "",
+                 te_rpc_port: int = 0,
+                 num_layers: int = 0,
+                 pipelined_transfer_config: Optional[dict[str, Any]] = None,
+                 handshake_ttl: float = 0,
+                 done_signal_batch_config: Optional[dict[str, Any]] = None,
+                 retry_policy: Optional[TransferRetryPolicy] = None):
         super().__init__(daemon=True, name="KVCacheRecvingThread")
         self.tp_rank = tp_rank
         self.tp_size = tp_size
@@ -329,6 +969,16 @@ class KVCacheRecvingThread(threading.Thread):
             local_kv_caches_base_addr
         self.remote_te_port: dict[str, dict[int, int]] = \
             defaultdict(dict)
+        # The metadata of a remote is fetched again once it is older than
+        # handshake_ttl seconds, or after a failed transfer from it. A
+        # non-positive ttl keeps it until a failure.
+        self.handshake_ttl = handshake_ttl
+        self.remote_metadata_time: dict[tuple[str, int], float] = {}
+        # Remotes are prefetched off the request thread, one handshake at a
+        # time per remote, which a request from it waits for.
+        self.remote_metadata_locks: dict[tuple[str, int],
+                                         threading.Lock] = {}
+        self.handshake_executor = ThreadPoolExecutor(max_workers=1)
         self.block_len = block_len
         # TODO(jianzs): find a better way to detect MLA.
         self.use_mla = len(block_len) == 2
@@ -337,37 +987,86 @@ class KVCacheRecvingThread(threading.Thread):
         # TODO(jianzs): make this configurable
         self.executor = ThreadPoolExecutor(max_workers=32)
 
+        # Pipelined pulls, requests are split by layer or into chunks of at
+        # most chunk_bytes and pulled chunk by chunk, see
+        # KVCacheTransferPipeline.
+        self.num_layers = num_layers
+        self.transfer_pipeline: Optional[KVCacheTransferPipeline] = None
+        self.transfer_chunk_bytes = 0
+        if pipelined_transfer_config is not None:
+            self.transfer_chunk_bytes = int(
+                pipelined_transfer_config.get("chunk_bytes", 0))
+            self.transfer_pipeline = KVCacheTransferPipeline(
+                engine,
+                self.executor,
+                max_inflight_per_remote=int(
+                    pipelined_transfer_config.get("max_inflight_per_remote",
+                                                  2)))
+
         self.task_tracker = KVCacheTaskTracker(self.tp_rank,
                                                self.local_engine_id,
                                                self.tp_size)
+        # A failed pull is queued again following retry_policy, the blocks
+        # of a request that failed for good are reported in load_errors.
+        self.retry_policy = retry_policy or TransferRetryPolicy()
+        self.load_errors = KVLoadErrors()
 
         self.encoder = msgspec.msgpack.Encoder()
         self.decoder = msgspec.msgpack.Decoder(MooncakeAgentMetadata)
-        self.remote_sockets_lock = threading.Lock()
-        self.remote_sockets: dict[  # type: ignore
-            str, deque[zmq.Socket]] = defaultdict(  # type: ignore
-                deque)
-        self.remote_poller = zmq.Poller()  # type: ignore
+        self.zmq_connections = get_zmq_connection_manager()
         self.timeout = 1.0  # seconds
-        self.prefiller_bye_thread = KVCacheRecvingPrefillerByeThread( # TODO(layer-wise): fix port
-            port=8000,
-            finished=self.task_tracker
-        )
 
-    def add_request(self, request_id: str, local_block_ids: list[int],
-                    remote_block_ids: list[int], remote_engine_id: str,
-                    remote_host: str, remote_handshake_port: int):
+        # Batched done signals, sent without waiting for the ACK, see
+        # KVCacheDoneRecvingNotifier.
+        self.done_recving_notifier: Optional[
+            KVCacheDoneRecvingNotifier] = None
+        if done_signal_batch_config is not None:
+            self.done_recving_notifier = KVCacheDoneRecvingNotifier(
+                self.tp_rank,
+                window=float(done_signal_batch_config.get("window_ms", 1)) /
+                1000,
+                max_batch_size=int(
+                    done_signal_batch_config.get("max_batch_size", 64)),
+                ack_timeout=self.timeout)
+
+        # Layer-wise streaming, the prefiller writes the layers of a request
+        # into our blocks after our DECODER_HELLO and sends PREFILLER_BYE to
+        # our handshake port after the last one.
+        self.layerwise = layerwise
+        self.local_host = local_host
+        self.te_rpc_port = te_rpc_port
+        self.prefiller_bye_thread: Optional[
+            KVCacheRecvingPrefillerByeThread] = None
+        if layerwise:
+            self.prefiller_bye_thread = KVCacheRecvingPrefillerByeThread(
+                self.tp_rank, local_host, local_handshake_port,
+                self.task_tracker, threading.Event(), self.load_errors)
+
+    def add_request(self, request_id: str, local_block_runs: BlockRuns,
+                    remote_block_runs: BlockRuns, remote_engine_id: str,
+                    remote_host: str, remote_handshake_port: int,
+                    num_cached_blocks: int = 0):
         """Add a new request to the queue for processing."""
         logger.debug(f"Adding request {request_id} to the queue.")
         self.request_queue.put({
             "request_id": request_id,
-            "local_block_ids": local_block_ids,
-            "remote_block_ids": remote_block_ids,
+            "local_block_runs": local_block_runs,
+            "remote_block_runs": remote_block_runs,
             "remote_engine_id": remote_engine_id,
             "remote_host": remote_host,
             "remote_handshake_port": remote_handshake_port,
+            "num_cached_blocks": num_cached_blocks,
+            "deadline": self.retry_policy.get_deadline(time.monotonic()),
         })
 
+    def prefetch_remote_metadata(self, remote_host: str,
+                                 remote_handshake_port: int):
+        """Starts a handshake with a remote on the handshake executor, so
+        that the first request from it does not do one. Skipped if the
+        metadata is cached."""
+        self.handshake_executor.submit(self._prefetch_remote_metadata,
+                                       remote_host, remote_handshake_port)
+
     def get_and_clear_finished_requests(self) -> set[str]:
         """
         Get and clear the requests that have been completed.
@@ -378,6 +1077,11 @@ class KVCacheRecvingThread(threading.Thread):
 
     def run(self):
         """Run the thread to handle KV cache transfer requests."""
+        if self.prefiller_bye_thread is not None:
+            self.prefiller_bye_thread.start()
+            self.prefiller_bye_thread.ready_event.wait()
+        if self.done_recving_notifier is not None:
+            self.done_recving_notifier.start()
         self.ready_event.set()
         while True:
             try:
@@ -391,76 +1095,260 @@ class KVCacheRecvingThread(threading.Thread):
                 logger.error(f"Error in KVCacheTransferThread: {e}")
 
     def _handle_request(self, req_meta: dict[str, Any]):
-        # TODO(layer-wise): send DECODER_HELLO to prefiller to ask prefiller to send
+        if self.layerwise:
+            self._handle_layerwise_request(req_meta)
+            return
 
         request_id = req_meta["request_id"]
-        remote_host = req_meta["remote_host"]
-        remote_handshake_port = req_meta["remote_handshake_port"]
+        if "pipelined_transfer_error" in req_meta:
+            # The pipeline finished the pull of the request, the done signals
+            # are sent from this thread, which owns the sockets.
+            error = req_meta.pop("pipelined_transfer_error")
+            if error is not None:
+                if isinstance(error, TransferChunksError):
+                    # Only the chunks that did not land are pulled again.
+                    req_meta["transfer_chunks"] = error.chunks
+                if self._retry_request(req_meta, error):
+                    self.request_queue.task_done()
+                    return
+            self._finish_request(req_meta)
+            self.request_queue.task_done()
+            return
 
+        pipelined = False
+        retried = False
         try:
             logger.debug(
                 f"Starting to transfer KV cache for request {request_id}.")
-            self._transfer_kv_cache(req_meta)
-            logger.debug(
-                f"Finished transferring KV cache for request {request_id}.")
+            if self.transfer_pipeline is not None:
+                pipelined = self._submit_pipelined_transfer(req_meta)
+            else:
+                self._transfer_kv_cache(req_meta)
+                logger.debug(
+                    f"Finished transferring KV cache for request {request_id}."
+                )
         except Exception as e:
-            logger.error("Failed to transfer KV cache for request "
+            retried = self._retry_request(req_meta, e)
+        finally:
+            if not pipelined and not retried:
+                self._finish_request(req_meta)
+            self.request_queue.task_done()
+
+    def _retry_request(self, req_meta: dict[str, Any],
+                       error: Exception) -> bool:
+        """Queues the request of a failed pull again after the backoff of
+        the retry policy. Returns False once it failed for good, its blocks
+        are then reported as load errors, for the scheduler to recompute."""
+        request_id = req_meta["request_id"]
+        self._invalidate_remote_metadata(req_meta)
+        num_attempts = req_meta.get("num_attempts", 0) + 1
+        delay = self.retry_policy.get_retry_delay(
+            num_attempts, req_meta.get("deadline", math.inf))
+        if delay is None:
+            logger.error(
+                "Failed to transfer KV cache for request %s after %d "
+                "attempts: %s", request_id, num_attempts, error)
+            self.load_errors.add(self._get_pulled_block_runs(req_meta))
+            return False
+        logger.warning(
+            "Failed to transfer KV cache for request %s (attempt %d), "
+            "retrying in %.2f s: %s", request_id, num_attempts, delay, error)
+        # The thread serves the other requests in the meantime.
+        timer = threading.Timer(delay,
+                                self.request_queue.put,
+                                args=({
+                                    **req_meta, "num_attempts": num_attempts
+                                }, ))
+        timer.daemon = True
+        timer.start()
+        return True
+
+    def _get_pulled_block_runs(self, req_meta: dict[str, Any]) -> BlockRuns:
+        """Returns the local blocks a request pulls, or the ones of the
+        chunks left to pull again."""
+        if "transfer_chunks" in req_meta:
+            local_kv_caches_base_addrs = self.kv_caches_base_addr[
+                self.local_engine_id][self.local_handshake_port]
+            chunks = req_meta["transfer_chunks"]
+            return get_region_block_runs(
+                [src for chunk in chunks for src in chunk.src_list],
+                [length for chunk in chunks for length in chunk.length_list],
+                local_kv_caches_base_addrs,
+                get_cache_block_lens(self.block_len,
+                                     len(local_kv_caches_base_addrs),
+                                     self.use_mla))
+        if self.layerwise:
+            return req_meta["local_block_runs"]
+        return match_suffix_block_runs(req_meta["local_block_runs"],
+                                       req_meta["remote_block_runs"],
+                                       req_meta.get("num_cached_blocks",
+                                                    0))[0]
+
+    def _finish_request(self, req_meta: dict[str, Any]):
+        request_id = req_meta["request_id"]
+        self.task_tracker.update_done_task_count(request_id, self.tp_rank)
+        # Always send the done signal to the remote host to ensure proper
+        # resource cleanup. Failing to do so may cause a memory leak on the
+        # remote host.
+        if self.done_recving_notifier is not None:
+            self.done_recving_notifier.notify(
+                request_id, req_meta["remote_host"],
+                req_meta["remote_handshake_port"])
+            return
+        self._send_done_recv_signal(request_id, req_meta["remote_host"],
+                                    req_meta["remote_handshake_port"])
+
+    def _handle_layerwise_request(self, req_meta: dict[str, Any]):
+        request_id = req_meta["request_id"]
+        try:
+            self._send_decoder_hello(req_meta)
+        except Exception as e:
+            logger.error("Failed to send DECODER_HELLO for request "
                          f"{request_id}: {e}")
+            self.load_errors.resolve(request_id, failed=False)
+            if not self._retry_request(req_meta, e):
+                # No layer will arrive, do not keep the request waiting.
+                self.task_tracker.update_done_task_count(
+                    request_id, self.tp_rank)
         finally:
-            self.task_tracker.update_done_task_count(request_id, self.tp_rank)
-            # Always send the done signal to the remote host to ensure proper
-            # resource cleanup. Failing to do so may cause a memory leak on the
-            # remote host.
-            self._send_done_recv_signal(request_id, remote_host,
-                                        remote_handshake_port)
             self.request_queue.task_done()
 
-    def _transfer_kv_cache(self, req_meta: dict[str, Any]):
-        """Handle a KV cache transfer request."""
+    def _send_decoder_hello(self, req_meta: dict[str, Any]):
+        """Asks the prefiller to write the layers of a request into our
+        blocks, it sends PREFILLER_BYE after the last one."""
         request_id = req_meta["request_id"]
-        remote_block_ids = req_meta["remote_block_ids"]
-        local_block_ids = req_meta["local_block_ids"]
-        remote_engine_id = req_meta["remote_engine_id"]
         remote_host = req_meta["remote_host"]
         remote_handshake_port = req_meta["remote_handshake_port"]
+        logger.debug("Sending DECODER_HELLO for request %s to %s:%d",
+                     request_id, remote_host, remote_handshake_port)
+        # Registered first, the bye may come before the ACK.
+        self.load_errors.expect(request_id, req_meta["local_block_runs"])
+        sock: Optional[zmq.Socket] = None  # type: ignore
+        healthy = False
+        try:
+            sock = self._get_remote_socket(remote_host, remote_handshake_port)
+            data_bytes = self.encoder.encode(
+                (DECODER_HELLO, request_id, self.tp_rank, self.local_host,
+                 self.local_handshake_port, self.te_rpc_port,
+                 self.kv_caches_base_addr[self.local_engine_id][
+                     self.local_handshake_port],
+                 req_meta.get("num_cached_blocks", 0),
+                 block_runs_to_bytes(req_meta["local_block_runs"])))
+            ensure_zmq_send(sock, data_bytes)
+            resp = ensure_zmq_recv(sock, timeout=self.timeout)
+            if resp != b"ACK":
+                raise RuntimeError(
+                    f"Failed to receive ACK, resp: {resp.decode('utf-8')}")
+            healthy = True
+        finally:
+            if sock is not None:
+                self._return_remote_socket(sock, remote_host,
+                                           remote_handshake_port, healthy)
 
-        # Full prefix cache hit: do not need to read remote blocks, just notify
-        # P worker that we have the blocks we need.
-        if len(local_block_ids) == 0:
-            return
+    def _get_transfer_descs(
+        self, req_meta: dict[str, Any]
+    ) -> tuple[str, npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+        """Returns the session of the remote, the regions to pull from
+        `build_transfer_descs` and the block size of every cache."""
+        remote_engine_id = req_meta["remote_engine_id"]
+        remote_host = req_meta["remote_host"]
+        remote_handshake_port = req_meta["remote_handshake_port"]
 
         # Check if we have the remote metadata cached.
-        if remote_engine_id not in self.kv_caches_base_addr or \
-                remote_handshake_port not in self.kv_caches_base_addr[remote_engine_id]:
-            self._get_remote_metadata(remote_host, remote_handshake_port)
-
-        grouped_remote_block_ids, grouped_local_block_ids = \
-            group_concurrent_contiguous(remote_block_ids, local_block_ids)
+        if not self._is_remote_metadata_cached(
+                remote_host, remote_handshake_port, remote_engine_id):
+            self._fetch_remote_metadata(remote_host, remote_handshake_port,
+                                        remote_engine_id)
+
+        local_block_runs, remote_block_runs = match_suffix_block_runs(
+            req_meta["local_block_runs"], req_meta["remote_block_runs"],
+            req_meta.get("num_cached_blocks", 0))
+        remote_starts, local_starts, group_lengths = align_block_runs(
+            remote_block_runs, local_block_runs)
         remote_kv_caches_base_addrs = \
             self.kv_caches_base_addr[remote_engine_id][remote_handshake_port]
         local_kv_caches_base_addrs = \
             self.kv_caches_base_addr[self.local_engine_id][self.local_handshake_port]
 
-        req_start_time = time.perf_counter()
-        num_transfer_groups = len(grouped_remote_block_ids)
-        num_blocks = len(local_block_ids)
-
         remote_transfer_port = self.remote_te_port[remote_engine_id][
             remote_handshake_port]
         session_id = f"{remote_host}:{remote_transfer_port}"
-        src_list, dst_list, length_list = [], [], []
-        for k, (src_layer_base_addr, dst_layer_base_addr) in enumerate(
-                zip(local_kv_caches_base_addrs, remote_kv_caches_base_addrs)):
-            block_len = (self.block_len[k % 2]
-                         if self.use_mla else self.block_len[0])
-            for i, remote_block_id in enumerate(grouped_remote_block_ids):
-                local_block_ids = grouped_local_block_ids[i]
-                src = src_layer_base_addr + local_block_ids[0] * block_len
-                dst = dst_layer_base_addr + remote_block_id[0] * block_len
-                length = len(local_block_ids) * block_len
-                src_list.append(src)
-                dst_list.append(dst)
-                length_list.append(length)
+        block_lens = get_cache_block_lens(self.block_len,
+                                          len(local_kv_caches_base_addrs),
+                                          self.use_mla)
+        descs = build_transfer_descs(local_kv_caches_base_addrs,
+                                     remote_kv_caches_base_addrs, block_lens,
+                                     local_starts, remote_starts,
+                                     group_lengths)
+        return session_id, descs, block_lens
+
+    def _submit_pipelined_transfer(self, req_meta: dict[str, Any]) -> bool:
+        """Hands a request to the pipeline, returns whether it finishes the
+        request later."""
+        request_id = req_meta["request_id"]
+        # Full prefix cache hit: do not need to read remote blocks, just notify
+        # P worker that we have the blocks we need.
+        if len(req_meta["local_block_runs"]) == 0:
+            return False
+        assert self.transfer_pipeline is not None
+        # Built again on a retry: the metadata of the remote was dropped and
+        # is fetched again, it may have restarted with a new session and
+        # caches.
+        session_id, descs, block_lens = self._get_transfer_descs(req_meta)
+        if descs.shape[2] == 0:
+            return False
+        num_caches = len(block_lens)
+        num_caches_per_layer = (num_caches //
+                                self.num_layers if self.num_layers > 0 else 2)
+        # (src, dst, length, block_len) of the regions of every layer.
+        layer_descs = np.concatenate(
+            (descs,
+             np.broadcast_to(block_lens[:, None],
+                             descs.shape[1:])[None])).reshape(
+                                 4, num_caches // num_caches_per_layer,
+                                 -1).transpose(1, 2, 0).tolist()
+        chunks = split_transfer_chunks(layer_descs, self.transfer_chunk_bytes)
+        if "transfer_chunks" in req_meta:
+            # A retry, pull again the chunks that failed. The local regions
+            # and so the split are the same, only the remote ones may move.
+            failed_srcs = {
+                tuple(chunk.src_list)
+                for chunk in req_meta["transfer_chunks"]
+            }
+            chunks = [
+                chunk for chunk in chunks
+                if tuple(chunk.src_list) in failed_srcs
+            ]
+        logger.debug("Pulling KV cache of request %s in %d chunks.",
+                     request_id, len(chunks))
+
+        def callback(error: Optional[Exception]):
+            self.request_queue.put({
+                **req_meta, "pipelined_transfer_error": error
+            })
+
+        self.transfer_pipeline.submit(request_id, session_id, chunks,
+                                      callback)
+        return True
+
+    def _transfer_kv_cache(self, req_meta: dict[str, Any]):
+        """Handle a KV cache transfer request."""
+        request_id = req_meta["request_id"]
+        local_block_runs = req_meta["local_block_runs"]
+
+        # Full prefix cache hit: do not need to read remote blocks, just notify
+        # P worker that we have the blocks we need.
+        if len(local_block_runs) == 0:
+            return
+
+        session_id, descs, _ = self._get_transfer_descs(req_meta)
+        if descs.shape[2] == 0:
+            return
+        req_start_time = time.perf_counter()
+        # The engine takes lists, converted from the arrays in one go.
+        src_list, dst_list, length_list = descs.reshape(3, -1).tolist()
+        num_transfer_groups = descs.shape[2]
+        num_blocks = num_blocks_in_runs(local_block_runs)
         ret = self.engine.batch_transfer_sync_read(session_id, src_list,
                                                    dst_list, length_list)
         if ret < 0:
@@ -479,10 +1367,12 @@ class KVCacheRecvingThread(threading.Thread):
                              remote_handshake_port: int) -> None:
         """Get the metadata from the remote host."""
         sock: Optional[zmq.Socket] = None  # type: ignore
+        healthy = False
         try:
             sock = self._get_remote_socket(remote_host, remote_handshake_port)
             ensure_zmq_send(sock, self.encoder.encode((GET_META_MSG, "")))
-            metadata_bytes = ensure_zmq_recv(sock, self.remote_poller)
+            metadata_bytes = ensure_zmq_recv(sock)
+            healthy = True
             agent_meta = self.decoder.decode(metadata_bytes)
             engine_id = agent_meta.engine_id
             assert engine_id != self.local_engine_id, (
@@ -492,26 +1382,91 @@ class KVCacheRecvingThread(threading.Thread):
                 agent_meta.kv_caches_base_addr
             self.remote_te_port[engine_id][remote_handshake_port] = \
                 agent_meta.te_rpc_port
+            self.remote_metadata_time[(remote_host, remote_handshake_port)] = \
+                time.monotonic()
         finally:
             if sock is not None:
                 self._return_remote_socket(sock, remote_host,
-                                           remote_handshake_port)
+                                           remote_handshake_port, healthy)
                 logger.debug("Returned socket to pool for %s:%d", remote_host,
                              remote_handshake_port)
 
+    def _is_remote_metadata_expired(self, remote_host: str,
+                                    remote_handshake_port: int) -> bool:
+        fetch_time = self.remote_metadata_time.get(
+            (remote_host, remote_handshake_port))
+        return (self.handshake_ttl > 0 and fetch_time is not None
+                and time.monotonic() - fetch_time > self.handshake_ttl)
+
+    def _is_remote_metadata_cached(
+            self,
+            remote_host: str,
+            remote_handshake_port: int,
+            remote_engine_id: Optional[str] = None) -> bool:
+        """Whether the metadata of a remote is cached and not expired, the
+        engine id of a prefetched remote is not known yet."""
+        if remote_engine_id is None:
+            cached = (remote_host,
+                      remote_handshake_port) in self.remote_metadata_time
+        else:
+            cached = remote_handshake_port in self.kv_caches_base_addr.get(
+                remote_engine_id, {})
+        return cached and not self._is_remote_metadata_expired(
+            remote_host, remote_handshake_port)
+
+    def _fetch_remote_metadata(self,
+                               remote_host: str,
+                               remote_handshake_port: int,
+                               remote_engine_id: Optional[str] = None):
+        """Gets the metadata of a remote unless the handshake in flight to it
+        got it meanwhile."""
+        lock = self.remote_metadata_locks.setdefault(
+            (remote_host, remote_handshake_port), threading.Lock())
+        with lock:
+            if not self._is_remote_metadata_cached(
+                    remote_host, remote_handshake_port, remote_engine_id):
+                self._get_remote_metadata(remote_host, remote_handshake_port)
+
+    def _prefetch_remote_metadata(self, remote_host: str,
+                                  remote_handshake_port: int):
+        if self._is_remote_metadata_cached(remote_host,
+                                           remote_handshake_port):
+            return
+        try:
+            self._fetch_remote_metadata(remote_host, remote_handshake_port)
+            logger.debug("Prefetched metadata from %s:%d", remote_host,
+                         remote_handshake_port)
+        except Exception as e:
+            # The first request from the remote retries the handshake.
+            logger.warning("Failed to prefetch metadata from %s:%d: %s",
+                           remote_host, remote_handshake_port, e)
+
+    def _invalidate_remote_metadata(self, req_meta: dict[str, Any]):
+        """Drops the metadata of the remote of a failed request, it may have
+        restarted with new caches."""
+        remote_engine_id = req_meta["remote_engine_id"]
+        remote_host = req_meta["remote_host"]
+        remote_handshake_port = req_meta["remote_handshake_port"]
+        self.kv_caches_base_addr.get(remote_engine_id,
+                                     {}).pop(remote_handshake_port, None)
+        self.remote_te_port.get(remote_engine_id,
+                                {}).pop(remote_handshake_port, None)
+        self.remote_metadata_time.pop((remote_host, remote_handshake_port),
+                                      None)
+
     def _send_done_recv_signal(self, request_id: str, remote_host: str,
                                remote_handshake_port: int):
         logger.debug("Sending done recving signal for request %s to %s:%d",
                      request_id, remote_host, remote_handshake_port)
         sock: Optional[zmq.Socket] = None  # type: ignore
+        healthy = False
         try:
             sock = self._get_remote_socket(remote_host, remote_handshake_port)
             data_bytes = self.encoder.encode(
                 (DONE_RECVING_MSG, request_id, self.tp_rank))
             ensure_zmq_send(sock, data_bytes)
-            resp = ensure_zmq_recv(sock,
-                                   self.remote_poller,
-                                   timeout=self.timeout)
+            resp = ensure_zmq_recv(sock, timeout=self.timeout)
+            healthy = True
             logger.debug(
                 f"Received response for request {request_id}: {resp.decode('utf-8')}"
             )
@@ -523,72 +1478,65 @@ class KVCacheRecvingThread(threading.Thread):
         finally:
             if sock is not None:
                 self._return_remote_socket(sock, remote_host,
-                                           remote_handshake_port)
+                                           remote_handshake_port, healthy)
                 logger.debug("Returned socket to pool for %s:%d", remote_host,
                              remote_handshake_port)
 
     def _get_remote_socket(
             self, remote_host: str,
             remote_handshake_port: int) -> zmq.Socket:  # type: ignore
-        """Get a socket to the remote host."""
+        """Get a socket to the remote host from the shared pool."""
         remote_path = make_zmq_path("tcp", remote_host, remote_handshake_port)
-        with self.remote_sockets_lock:
-            if self.remote_sockets[remote_path]:
-                return self.remote_sockets[remote_path].popleft()
-
-            ctx = zmq.Context()  # type: ignore
-            sock = make_zmq_socket(
-                ctx=ctx,
-                path=remote_path,
-                socket_type=zmq.REQ,  # type: ignore
-                bind=False)
-            sock.setsockopt(
-                zmq.SNDTIMEO,  # type: ignore
-                int(self.timeout * 1000))
-            self.remote_poller.register(sock, zmq.POLLIN)  # type: ignore
-            return sock
+        sock = self.zmq_connections.acquire(remote_path)
+        sock.setsockopt(
+            zmq.SNDTIMEO,  # type: ignore
+            int(self.timeout * 1000))
+        return sock
 
     def _return_remote_socket(
             self,
             sock: zmq.Socket,  # type: ignore
             remote_host: str,
-            remote_handshake_port: int) -> None:
-        """Return the remote socket to the pool."""
+            remote_handshake_port: int,
+            healthy: bool = True) -> None:
+        """Return the remote socket to the pool, it is closed if the
+        exchange on it failed."""
         remote_path = make_zmq_path("tcp", remote_host, remote_handshake_port)
-        with self.remote_sockets_lock:
-            self.remote_sockets[remote_path].append(sock)
+        self.zmq_connections.release(sock, remote_path, healthy=healthy)
 
 
 class MooncakeConnectorMetadata(KVConnectorMetadata):
 
     def __init__(self):
         self.decoding_requests: dict[str, ReqMeta] = {}
-        self.prefilling_requests: dict[str, ReqMeta] = {}
+        # Requests in their last prefill step, streamed layer by layer, with
+        # their local block runs.
+        self.prefilling_requests: dict[str, BlockRuns] = {}
+        # (host, port) of the remote engines of the requests waiting for
+        # their blocks, whose metadata the workers prefetch.
+        self.remotes_to_prefetch: set[tuple[str, int]] = set()
 
     def add_new_decoding_req(
         self,
         request_id: str,
         local_block_ids: list[int],
         kv_transfer_params: dict[str, Any],
+        num_cached_blocks: int = 0,
     ):
         self.decoding_requests[request_id] = ReqMeta(
-            local_block_ids=local_block_ids,
-            remote_block_ids=kv_transfer_params["remote_block_ids"],
+            local_block_runs=encode_block_runs(local_block_ids),
+            remote_block_runs=encode_block_runs(
+                kv_transfer_params.get("remote_block_ids", [])),
             remote_engine_id=kv_transfer_params["remote_engine_id"],
             remote_host=kv_transfer_params["remote_host"],
             remote_port=kv_transfer_params["remote_port"],
+            num_cached_blocks=num_cached_blocks,
         )
 
-    def add_new_prefilling_req(self, request_id: str, remote_block_ids: list[int], 
-                               remote_engine_id: str, remote_host: str, remote_port: int):
-        # TODO(layer-wise): add local block ids
-        self.prefilling_requests[request_id] = ReqMeta(
-            local_block_ids=[],
-            remote_block_ids=remote_block_ids,
-            remote_engine_id=remote_engine_id,
-            remote_host=remote_host,
-            remote_port=remote_port
-        )
+    def add_new_prefilling_req(self, request_id: str,
+                               local_block_ids: list[int]):
+        self.prefilling_requests[request_id] = encode_block_runs(
+            local_block_ids)
 
 
 class MooncakeConnector(KVConnectorBase_V1):
@@ -605,7 +1553,6 @@ class MooncakeConnector(KVConnectorBase_V1):
             self.connector_scheduler = None
             self.connector_worker = MooncakeConnectorWorker(
                 vllm_config, str(self.engine_id))
-        self.current_layer: int = 0
 
     ############################################################
     # Scheduler Side Methods
@@ -653,27 +1600,43 @@ class MooncakeConnector(KVConnectorBase_V1):
         assert self.connector_worker is not None
         return self.connector_worker.get_finished()
 
+    def get_block_ids_with_load_errors(self) -> set[int]:
+        """Get the local blocks whose KV cache failed to load for good, for
+        the scheduler to recompute them."""
+        assert self.connector_worker is not None
+        return self.connector_worker.get_block_ids_with_load_errors()
+
     def start_load_kv(self, forward_context: "ForwardContext",
                       **kwargs) -> None:
         assert self.connector_worker is not None
         assert isinstance(self._connector_metadata, MooncakeConnectorMetadata)
         self.connector_worker.start_load_kv(self._connector_metadata)
-        self.current_layer = 0
 
     def wait_for_layer_load(self, layer_name: str) -> None:
-        """MooncakeConnector does not do layerwise saving."""
+        """MooncakeConnector does not do layerwise loading, the decoder waits
+        for whole requests."""
         pass
 
     def save_kv_layer(self, layer_name: str, kv_layer: torch.Tensor,
                       attn_metadata: "AttentionMetadata", **kwargs) -> None:
-        """MooncakeConnector does not save explicitly."""
-        requests = self._get_connector_metadata().prefill_requests
-        self.connector_worker.send_layer(layer_name, requests, kv_layer, self.current_layer)
-        self.current_layer += 1
+        """Streams a computed layer to the decoders in layerwise mode."""
+        assert self.connector_worker is not None
+        assert isinstance(self._connector_metadata, MooncakeConnectorMetadata)
+        self.connector_worker.save_kv_layer(layer_name,
+                                            self._connector_metadata)
 
     def wait_for_save(self):
-        """MooncakeConnector does not save explicitly."""
-        pass
+        """Streams the layers not saved by save_kv_layer in layerwise mode,
+        without waiting for the transfers."""
+        assert self.connector_worker is not None
+        assert isinstance(self._connector_metadata, MooncakeConnectorMetadata)
+        self.connector_worker.wait_for_save(self._connector_metadata)
+
+    def get_transfer_metrics(self) -> dict[str, float]:
+        """Cumulative timings of the pipelined KV cache pulls, empty if they
+        are disabled."""
+        assert self.connector_worker is not None
+        return self.connector_worker.get_transfer_metrics()
 
 
 class MooncakeConnectorScheduler:
@@ -698,19 +1661,34 @@ class MooncakeConnectorScheduler:
         # Requests that need to start recv.
         # New requests are added by update_state_after_alloc in
         # the scheduler. Used to make metadata passed to Worker.
-        self._reqs_need_recv: dict[str, tuple[Request, list[int]]] = {}
+        self._reqs_need_recv: dict[str, tuple[Request, list[int],
+                                              int]] = {}
+
+        # Layerwise mode: the prefiller pushes every layer of a request to
+        # the decoder in its last prefill step, the decoder asks for it with
+        # DECODER_HELLO before the prefill ends.
+        self.layerwise = vllm_config.kv_transfer_config.get_from_extra_config(
+            "use_layerwise", False)
+        # Requests being prefilled for a remote decoder, with their blocks.
+        self._reqs_need_send: dict[str, tuple[Request, list[int]]] = {}
+        # Requests whose layers were handed to the sending threads, their
+        # blocks are released by the transfer however they finish.
+        self._reqs_streaming: set[str] = set()
+        # Remote engines seen since the last step, the workers handshake
+        # with them before their requests get blocks.
+        self._remotes_to_prefetch: set[tuple[str, int]] = set()
 
     def get_num_new_matched_tokens(
             self, request: "Request",
             num_computed_tokens: int) -> tuple[int, bool]:
         """
-        For remote prefill, pull all prompt blocks from remote
-        asynchronously relative to engine execution.
+        For remote prefill, pull the prompt blocks missing from the local
+        prefix cache from remote asynchronously relative to engine execution.
 
         Args:
             request (Request): the request object.
             num_computed_tokens (int): the number of locally
-                computed tokens for this request
+                computed tokens for this request, the prefix cache hits
         Returns:
             * the number of tokens that can be loaded from the
               external KV cache beyond what is already computed.
@@ -725,11 +1703,22 @@ class MooncakeConnectorScheduler:
             num_computed_tokens, params)
 
         if params is not None and params.get("do_remote_prefill"):
-            assert num_computed_tokens == 0, "Currently only support " \
-                                             "prefill with num_computed_tokens == 0."
+            # Prefix cache hits are whole blocks, the blocks after them are
+            # pulled.
+            assert num_computed_tokens % self.block_size == 0
+            if not self.layerwise and "remote_host" in params and \
+                    "remote_port" in params:
+                self._remotes_to_prefetch.add(
+                    (params["remote_host"], params["remote_port"]))
             # Assume that the request's KV cache is already fully prefilled and
-            # can be fetched entirely from the prefill node.
-            count = max(len(request.prompt_token_ids) - 1, 0)
+            # can be fetched from the prefill node, but for the last token,
+            # which is recomputed.
+            num_external_tokens = len(request.prompt_token_ids) - 1
+            if params.get("remote_block_ids"):
+                num_external_tokens = min(
+                    num_external_tokens,
+                    len(params["remote_block_ids"]) * self.block_size)
+            count = max(num_external_tokens - num_computed_tokens, 0)
             if count > 0:
                 return count, True
 
@@ -746,15 +1735,26 @@ class MooncakeConnectorScheduler:
             "num_external_tokens=%s, kv_transfer_params=%s",
             num_external_tokens, params)
 
+        if (self.layerwise and params is not None
+                and params.get("do_remote_decode")):
+            # Blocks of later prefill chunks are added in build_connector_meta.
+            self._reqs_need_send[request.request_id] = (
+                request, list(blocks.get_block_ids()[0]))
+
         if params is not None and params.get("do_remote_prefill"):
-            if params.get("remote_block_ids"):
+            # The prefiller finds our blocks itself in layerwise mode.
+            if params.get("remote_block_ids") or self.layerwise:
                 if all(p in params for p in ("remote_engine_id", "remote_host",
                                              "remote_port")):
-                    local_block_ids = (blocks.get_unhashed_block_ids()
+                    # Get unhashed blocks to pull from remote, the hashed ones
+                    # are prefix cache hits.
+                    unhashed_block_ids = blocks.get_unhashed_block_ids()
+                    num_cached_blocks = len(blocks.get_block_ids()[0]) - \
+                        len(unhashed_block_ids)
+                    local_block_ids = (unhashed_block_ids
                                        if num_external_tokens > 0 else [])
-                    # Get unhashed blocks to pull from remote.
                     self._reqs_need_recv[request.request_id] = (
-                        request, local_block_ids)
+                        request, local_block_ids, num_cached_blocks)
                 else:
                     logger.warning(
                         "Got invalid KVTransferParams: %s. This "
@@ -771,7 +1771,8 @@ class MooncakeConnectorScheduler:
         meta = MooncakeConnectorMetadata()
 
         # Loop through scheduled reqs and convert to ReqMeta.
-        for req_id, (req, block_ids) in self._reqs_need_recv.items():
+        for req_id, (req, block_ids,
+                     num_cached_blocks) in self._reqs_need_recv.items():
             assert req.kv_transfer_params is not None
             # For the case where there are no remote blocks to pull
             # (block_ids is empty), we don't need to schedule
@@ -780,16 +1781,46 @@ class MooncakeConnectorScheduler:
                 request_id=req_id,
                 local_block_ids=block_ids,
                 kv_transfer_params=req.kv_transfer_params,
+                num_cached_blocks=num_cached_blocks,
             )
 
         # Clear the list once workers start the transfers
         self._reqs_need_recv.clear()
+        meta.remotes_to_prefetch = self._remotes_to_prefetch
+        self._remotes_to_prefetch = set()
 
-        # TODO(layer-wise): add prefilling requests to metadata
-        # TODO(layer-wise): send to metadata server
+        if self.layerwise:
+            self._add_prefilling_reqs(meta, scheduler_output)
 
         return meta
 
+    def _add_prefilling_reqs(self, meta: MooncakeConnectorMetadata,
+                             scheduler_output: SchedulerOutput):
+        """Adds the requests in their last prefill step, whose layers are
+        streamed as soon as they are computed."""
+        for req_id in scheduler_output.finished_req_ids:
+            self._reqs_need_send.pop(req_id, None)
+
+        cached_reqs = scheduler_output.scheduled_cached_reqs
+        for i, req_id in enumerate(cached_reqs.req_ids):
+            if req_id not in self._reqs_need_send:
+                continue
+            new_block_ids = cached_reqs.new_block_ids[i]
+            if cached_reqs.resumed_from_preemption[i]:
+                self._reqs_need_send[req_id][1].clear()
+            if new_block_ids is not None:
+                self._reqs_need_send[req_id][1].extend(new_block_ids[0])
+
+        for req_id, (req, block_ids) in list(self._reqs_need_send.items()):
+            num_scheduled_tokens = scheduler_output.num_scheduled_tokens.get(
+                req_id, 0)
+            if req.num_computed_tokens + num_scheduled_tokens < \
+                    req.num_prompt_tokens:
+                continue
+            meta.add_new_prefilling_req(req_id, block_ids)
+            del self._reqs_need_send[req_id]
+            self._reqs_streaming.add(req_id)
+
     def request_finished(
         self,
         request: "Request",
@@ -805,12 +1836,17 @@ class MooncakeConnectorScheduler:
             "MooncakeConnector request_finished, request_status=%s, "
             "kv_transfer_params=%s", request.status, params)
 
+        # A streamed request may finish with EOS, a stop string or an abort
+        # while its layers are still read, its blocks wait for the transfer.
+        streaming = request.request_id in self._reqs_streaming
+        self._reqs_streaming.discard(request.request_id)
         if (params is None or not params.get("do_remote_decode")
-                or request.status != RequestStatus.FINISHED_LENGTH_CAPPED):
+                or (request.status != RequestStatus.FINISHED_LENGTH_CAPPED
+                    and not streaming)):
             return False, None
 
         computed_block_ids = block_ids
-        delay_free_blocks = len(computed_block_ids) > 0
+        delay_free_blocks = len(computed_block_ids) > 0 or streaming
         if delay_free_blocks:
             logger.info("Delaying free of %d blocks for request %s",
                         len(computed_block_ids), request.request_id)
@@ -850,7 +1886,35 @@ class MooncakeConnectorWorker:
         self.side_channel_host = get_ip()
         self.max_device_id = self.tp_size * self.dp_size
         self.kv_role = vllm_config.kv_transfer_config.kv_role
-        self.layerwise = True # TODO(layer-wise): get it from config
+        self.layerwise = vllm_config.kv_transfer_config.get_from_extra_config(
+            "use_layerwise", False)
+        # Seconds a prefiller keeps a layerwise request whose decoder or last
+        # prefill step has not shown up.
+        self.layerwise_timeout = float(
+            vllm_config.kv_transfer_config.get_from_extra_config(
+                "layerwise_timeout", 120))
+        self.pipelined_transfer_config: Optional[dict[
+            str, Any]] = vllm_config.kv_transfer_config.get_from_extra_config(
+                "pipelined_transfer", None)
+        # Remote metadata is fetched again after handshake_ttl seconds, and
+        # fetched from handshake_peers, [{"host": ..., "port": ...}] with the
+        # remote_host and remote_port of their requests, at startup.
+        self.handshake_ttl = float(
+            vllm_config.kv_transfer_config.get_from_extra_config(
+                "handshake_ttl", 0))
+        self.handshake_peers: list[dict[
+            str, Any]] = vllm_config.kv_transfer_config.get_from_extra_config(
+                "handshake_peers", [])
+        # Done signals are batched per prefill rank with
+        # {"window_ms": ..., "max_batch_size": ...}.
+        self.done_signal_batch_config: Optional[dict[
+            str, Any]] = vllm_config.kv_transfer_config.get_from_extra_config(
+                "batch_done_signals", None)
+        # Failed pulls are retried with {"max_retries": ..., "timeout": ...,
+        # "backoff": ..., "max_backoff": ...}, see TransferRetryPolicy.
+        self.retry_policy = TransferRetryPolicy.from_config(
+            vllm_config.kv_transfer_config.get_from_extra_config(
+                "transfer_retry", None))
 
         # Handshake base port
         self.side_channel_port = (
@@ -956,6 +2020,11 @@ class MooncakeConnectorWorker:
                     self.use_mla, first_kv_cache.shape)
 
         self.kv_caches = kv_caches
+        # Layers are streamed in layerwise mode by their index here.
+        self.layer_ids = {
+            layer_name: i
+            for i, layer_name in enumerate(kv_caches)
+        }
         kv_caches_base_addr = []
         for cache_or_caches in kv_caches.values():
             # Normalize to always be a list of caches
@@ -984,19 +2053,39 @@ class MooncakeConnectorWorker:
 
         ready_event = threading.Event()
         if self.kv_role == 'kv_producer':
-            self.kv_send_thread = KVCacheSendingThread(self.tp_rank,
-                                                       self._decode_tp_size,
-                                                       self.engine_id,
-                                                       self.side_channel_host,
-                                                       self.side_channel_port,
-                                                       metadata, ready_event)
+            self.kv_send_thread = KVCacheSendingThread(
+                self.tp_rank,
+                self._decode_tp_size,
+                self.engine_id,
+                self.side_channel_host,
+                self.side_channel_port,
+                metadata,
+                ready_event,
+                engine=self.engine,
+                block_len=self.block_len,
+                num_layers=len(kv_caches),
+                layerwise_timeout=self.layerwise_timeout)
             self.kv_send_thread.start()
         else:
             self.kv_recv_thread = KVCacheRecvingThread(
                 self.tp_rank, self.tp_size, self.engine, self.engine_id,
-                self.handshake_port, kv_caches_base_addr, self.block_len,
-                ready_event)
+                self.handshake_port,
+                kv_caches_base_addr,
+                self.block_len,
+                ready_event,
+                layerwise=self.layerwise,
+                local_host=self.side_channel_host,
+                te_rpc_port=self.te_rpc_port,
+                num_layers=len(kv_caches),
+                pipelined_transfer_config=self.pipelined_transfer_config,
+                handshake_ttl=self.handshake_ttl,
+                done_signal_batch_config=self.done_signal_batch_config,
+                retry_policy=self.retry_policy)
             self.kv_recv_thread.start()
+            if not self.layerwise:
+                for peer in self.handshake_peers:
+                    self._prefetch_remote_metadata(peer["host"],
+                                                   int(peer["port"]))
         ready_event.wait()
 
     def _register(self, ptr, length):
@@ -1022,26 +2111,62 @@ class MooncakeConnectorWorker:
                 "requests: %d", len(done_sending), len(done_recving))
         return done_sending, done_recving
 
+    def get_block_ids_with_load_errors(self) -> set[int]:
+        if self.kv_recv_thread is None:
+            return set()
+        return self.kv_recv_thread.load_errors.pop()
+
+    def get_transfer_metrics(self) -> dict[str, float]:
+        if self.kv_recv_thread is None or \
+                self.kv_recv_thread.transfer_pipeline is None:
+            return {}
+        return self.kv_recv_thread.transfer_pipeline.metrics.snapshot()
+
     def start_load_kv(self, metadata: MooncakeConnectorMetadata):
         """Start loading KV blocks from remote engine."""
+        # Ahead of the requests, which wait for the handshakes in flight to
+        # their remotes rather than doing their own.
+        for remote_host, remote_port in metadata.remotes_to_prefetch:
+            self._prefetch_remote_metadata(remote_host, remote_port)
+
+        for req_id, block_runs in metadata.prefilling_requests.items():
+            # Only the prefill tp ranks picked by the decoder get its hello.
+            remote_tp_ranks = self._get_remote_tp_ranks_for_req(req_id)
+            if self.tp_rank in remote_tp_ranks:
+                self.kv_send_thread.add_request(  # type: ignore[union-attr]
+                    req_id, block_runs, remote_tp_ranks.index(self.tp_rank))
+
         for req_id, meta in metadata.decoding_requests.items():
             logger.debug(
                 "start_load_kv for request %s from remote engine %s. "
-                "Num local_block_ids: %s. Num remote_block_ids: %s. ", req_id,
-                meta.remote_engine_id, len(meta.local_block_ids),
-                len(meta.remote_block_ids))
+                "Num local blocks: %s. Num remote blocks: %s. ", req_id,
+                meta.remote_engine_id,
+                num_blocks_in_runs(meta.local_block_runs),
+                num_blocks_in_runs(meta.remote_block_runs))
 
             remote_handshake_port = meta.remote_port + \
                                     self._get_remote_tp_rank(req_id)
             self.kv_recv_thread.add_request(  # type: ignore[union-attr]
                 request_id=req_id,
-                local_block_ids=meta.local_block_ids,
-                remote_block_ids=meta.remote_block_ids,
+                local_block_runs=meta.local_block_runs,
+                remote_block_runs=meta.remote_block_runs,
                 remote_engine_id=meta.remote_engine_id,
                 remote_host=meta.remote_host,
                 remote_handshake_port=remote_handshake_port,
+                num_cached_blocks=meta.num_cached_blocks,
             )
 
+    def _prefetch_remote_metadata(self, remote_host: str, remote_port: int):
+        # The remote tp rank of a request is only known with the request
+        # when the tp sizes differ, prefetch them all then.
+        if self._prefill_tp_size == self._decode_tp_size:
+            remote_tp_ranks = [self.tp_rank]
+        else:
+            remote_tp_ranks = list(range(self._prefill_tp_size))
+        for remote_tp_rank in remote_tp_ranks:
+            self.kv_recv_thread.prefetch_remote_metadata(  # type: ignore[union-attr]
+                remote_host, remote_port + remote_tp_rank)
+
     def _get_remote_tp_rank(self, req_id: str) -> int:
         return self._get_remote_tp_ranks_for_req(req_id)[self.tp_rank]
 
@@ -1055,34 +2180,49 @@ class MooncakeConnectorWorker:
                                    self._decode_tp_size)
         return sampled_nums
 
-    def send_layer(self, layer_name: str, request_ids: list[str], layers: torch.Tensor, layer_index: int):
-        if self.kv_role != "kv_producer":
+    def save_kv_layer(self, layer_name: str,
+                      metadata: MooncakeConnectorMetadata):
+        """Marks a layer ready once it is computed on the device."""
+        if not self.layerwise or not metadata.prefilling_requests:
+            return
+        layer_id = self.layer_ids.get(layer_name)
+        if layer_id is None:
             return
-    
-        if not self.layerwise:
+        event = torch.npu.Event()
+        event.record()
+        self.kv_send_thread.mark_layers_ready(  # type: ignore[union-attr]
+            metadata.prefilling_requests, [layer_id], event)
+
+    def wait_for_save(self, metadata: MooncakeConnectorMetadata):
+        """Marks the layers that save_kv_layer did not see, e.g. of attention
+        backends without layerwise saving, ready after the forward."""
+        if not self.layerwise or not metadata.prefilling_requests:
             return
+        event = torch.npu.Event()
+        event.record()
+        self.kv_send_thread.mark_layers_ready(  # type: ignore[union-attr]
+            metadata.prefilling_requests, range(len(self.kv_caches)), event)
 
-        for request_id in request_ids:
-            self.kv_send_thread.mark_layer_ready(request_id, layer_index)
 
 @contextlib.contextmanager
 def zmq_ctx(socket_type: Any,
             addr: str) -> Iterator[zmq.Socket]:  # type: ignore
-    """Context manager for a ZMQ socket"""
+    """Context manager for a ZMQ socket on the shared context"""
 
     if socket_type not in (zmq.ROUTER, zmq.REQ, zmq.DEALER):  # type: ignore
         raise ValueError(f"Unexpected socket type: {socket_type}")
 
-    ctx: Optional[zmq.Context] = None  # type: ignore
+    socket: Optional[zmq.Socket] = None  # type: ignore
     try:
-        ctx = zmq.Context()  # type: ignore
-        yield make_zmq_socket(ctx=ctx,
-                              path=addr,
-                              socket_type=socket_type,
-                              bind=socket_type == zmq.ROUTER)  # type: ignore
+        socket = make_zmq_socket(
+            ctx=get_zmq_connection_manager().ctx,
+            path=addr,
+            socket_type=socket_type,
+            bind=socket_type == zmq.ROUTER)  # type: ignore
+        yield socket
     finally:
-        if ctx is not None:
-            ctx.destroy(linger=0)
+        if socket is not None:
+            socket.close(linger=0)
 
 
 def group_concurrent_contiguous(
@@ -1140,13 +2280,19 @@ def ensure_zmq_send(
 
 def ensure_zmq_recv(
         socket: zmq.Socket,  # type: ignore
-        poller: zmq.Poller,  # type: ignore
+        poller: Optional[zmq.Poller] = None,  # type: ignore
         timeout: float = 1.0,
         max_retries: int = 3) -> bytes:
     retries_left = max_retries
     while True:
         try:
-            if dict(poller.poll(int(timeout * 1000))):  # milliseconds
+            if poller is not None:
+                ready = bool(dict(poller.poll(int(timeout * 1000))))
+            else:
+                ready = bool(
+                    socket.poll(int(timeout * 1000),  # milliseconds
+                                zmq.POLLIN))  # type: ignore
+            if ready:
                 data = socket.recv()
                 return data
             else:
@@ -1162,3 +2308,18 @@ def ensure_zmq_recv(
                 raise RuntimeError(
                     f"Failed to receive data after {max_retries} "
                     f"retries: {e}")
+
+
+def ensure_zmq_send_ack(
+        socket: zmq.Socket,  # type: ignore
+        identity: bytes,
+        request_id: str,
+        ack: bytes = b"ACK"):
+    """Sends an ACK to a peer of a ROUTER socket without blocking the
+    listener, the peer retries if it is lost."""
+    try:
+        socket.send_multipart((identity, b"", ack),
+                              flags=zmq.NOBLOCK)  # type: ignore
+    except zmq.Again:  # type: ignore
+        logger.warning("Dropped the ACK for request %s, the peer is busy.",
+                       request_id)
@@ -0,0 +1,139 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Retries of the KV cache pulls of the KV connectors, and the local blocks of
+the pulls that failed for good.
+
+Those blocks are reported to the scheduler with
+``get_block_ids_with_load_errors``, which recomputes them instead of running
+the request on missing KV cache.
+"""
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, TypeVar
+
+from vllm.utils import logger
+
+from vllm_ascend.distributed.block_runs import BlockRuns, decode_block_runs
+
+T = TypeVar("T")
+
+
+@dataclass
+class TransferRetryPolicy:
+    """
+    How the KV cache pull of a request is retried.
+
+    A failed pull is tried again after ``backoff`` seconds, doubled after
+    every attempt up to ``max_backoff``, at most ``max_retries`` times and
+    not past ``timeout`` seconds after the request was queued. A
+    non-positive ``timeout`` sets no deadline. The defaults do not retry.
+    """
+    max_retries: int = 0
+    timeout: float = 0.0
+    backoff: float = 0.1
+    max_backoff: float = 2.0
+
+    @classmethod
+    def from_config(
+            cls, config: Optional[dict[str, Any]]) -> "TransferRetryPolicy":
+        """Reads the ``transfer_retry`` dict of the connector config."""
+        if not config:
+            return cls()
+        return cls(max_retries=int(config.get("max_retries", 0)),
+                   timeout=float(config.get("timeout", 0.0)),
+                   backoff=float(config.get("backoff", 0.1)),
+                   max_backoff=float(config.get("max_backoff", 2.0)))
+
+    def get_deadline(self, start_time: float) -> float:
+        """Returns the deadline, in `time.monotonic` time, of a request
+        queued at ``start_time``."""
+        return start_time + self.timeout if self.timeout > 0 else math.inf
+
+    def get_retry_delay(self, num_attempts: int,
+                        deadline: float) -> Optional[float]:
+        """Returns how long to wait before trying again after
+        ``num_attempts`` failed attempts, None to give up."""
+        if num_attempts > self.max_retries:
+            return None
+        delay = min(self.backoff * 2**(num_attempts - 1), self.max_backoff)
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+
+def call_with_retries(fn: Callable[[], T],
+                      policy: TransferRetryPolicy,
+                      deadline: float,
+                      description: str,
+                      on_error: Optional[Callable[[Exception], None]] = None
+                      ) -> T:
+    """Calls ``fn`` until it returns, following ``policy``. ``on_error`` is
+    called after every failed attempt, the last error is raised."""
+    num_attempts = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            num_attempts += 1
+            if on_error is not None:
+                on_error(e)
+            delay = policy.get_retry_delay(num_attempts, deadline)
+            if delay is None:
+                raise
+            logger.warning("%s failed (attempt %d), retrying in %.2f s: %s",
+                           description, num_attempts, delay, e)
+            time.sleep(delay)
+
+
+class KVLoadErrors:
+    """
+    Local blocks whose KV cache could not be pulled, gathered by the transfer
+    threads of a worker until the next `pop`.
+
+    The blocks of requests pulled asynchronously, like the layers a
+    prefiller streams, are registered with `expect` and failed or dropped
+    with `resolve` once the outcome is known.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.block_ids: set[int] = set()
+        self.expected: dict[str, BlockRuns] = {}
+
+    def add(self, block_runs: BlockRuns):
+        block_ids = decode_block_runs(block_runs).tolist()
+        with self.lock:
+            self.block_ids.update(block_ids)
+
+    def expect(self, request_id: str, block_runs: BlockRuns):
+        with self.lock:
+            self.expected[request_id] = block_runs
+
+    def resolve(self, request_id: str, failed: bool):
+        with self.lock:
+            block_runs = self.expected.pop(request_id, None)
+        if failed and block_runs is not None:
+            self.add(block_runs)
+
+    def pop(self) -> set[int]:
+        """Returns the failed blocks gathered since the last call."""
+        with self.lock:
+            block_ids, self.block_ids = self.block_ids, set()
+        return block_ids
@@ -0,0 +1,191 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import contextlib
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Iterator
+from typing import Optional
+
+import zmq
+from vllm.utils import logger, make_zmq_socket
+
+
+class ZmqConnectionManager:
+    """
+    One ZMQ context per process and a pool of connected sockets per peer,
+    shared by the KV connectors.
+
+    Sockets are taken with `acquire` and given back with `release`, which
+    keeps them for the next message to the same peer. A socket is released
+    as unhealthy after a failed exchange, a REQ socket that timed out waits
+    for its reply forever, so it is closed instead of pooled. Sockets idle
+    for longer than `max_idle_time` are closed when met, and the pool keeps
+    at most `max_idle_per_peer` sockets per peer and `max_idle_sockets` in
+    total, evicting the least recently used peer first.
+
+    Reconnects to a peer that went away are done by libzmq in the
+    background, backing off from `reconnect_ivl_ms` up to
+    `reconnect_ivl_max_ms`.
+    """
+
+    def __init__(self,
+                 max_idle_per_peer: int = 8,
+                 max_idle_sockets: int = 256,
+                 max_idle_time: float = 60.0,
+                 reconnect_ivl_ms: int = 100,
+                 reconnect_ivl_max_ms: int = 5000):
+        self.max_idle_per_peer = max_idle_per_peer
+        self.max_idle_sockets = max_idle_sockets
+        self.max_idle_time = max_idle_time
+        self.reconnect_ivl_ms = reconnect_ivl_ms
+        self.reconnect_ivl_max_ms = reconnect_ivl_max_ms
+
+        self.ctx = zmq.Context()  # type: ignore
+        self.lock = threading.Lock()
+        # (path, socket type) -> idle sockets with the time they were
+        # released, the most recently used peer last.
+        self.idle: OrderedDict[tuple[str, int], deque[tuple[
+            zmq.Socket, float]]] = OrderedDict()  # type: ignore
+        self.num_idle = 0
+        self.num_created = 0
+
+    def acquire(self,
+                path: str,
+                socket_type: int = zmq.REQ) -> zmq.Socket:  # type: ignore
+        """Returns a socket connected to `path`, pooled if possible."""
+        key = (path, socket_type)
+        stale: list[zmq.Socket] = []  # type: ignore
+        sock: Optional[zmq.Socket] = None  # type: ignore
+        with self.lock:
+            sockets = self.idle.get(key)
+            now = time.monotonic()
+            while sockets and sock is None:
+                candidate, idle_since = sockets.pop()
+                self.num_idle -= 1
+                if candidate.closed or \
+                        now - idle_since > self.max_idle_time:
+                    stale.append(candidate)
+                else:
+                    sock = candidate
+            if sockets is not None and not sockets:
+                del self.idle[key]
+        for candidate in stale:
+            self._close(candidate)
+        if sock is None:
+            sock = self._create(path, socket_type)
+        return sock
+
+    def release(self,
+                sock: zmq.Socket,  # type: ignore
+                path: str,
+                socket_type: int = zmq.REQ,
+                healthy: bool = True):
+        """Gives back a socket from `acquire`, it is closed instead of pooled
+        if it is not healthy or the pool is full."""
+        if not healthy or sock.closed:
+            self._close(sock)
+            return
+        key = (path, socket_type)
+        evicted: list[zmq.Socket] = []  # type: ignore
+        with self.lock:
+            sockets = self.idle.setdefault(key, deque())
+            self.idle.move_to_end(key)
+            if len(sockets) >= self.max_idle_per_peer:
+                evicted.append(sock)
+            else:
+                sockets.append((sock, time.monotonic()))
+                self.num_idle += 1
+                while self.num_idle > self.max_idle_sockets:
+                    lru_key, lru_sockets = next(iter(self.idle.items()))
+                    evicted.append(lru_sockets.popleft()[0])
+                    self.num_idle -= 1
+                    if not lru_sockets:
+                        del self.idle[lru_key]
+            if not sockets and key in self.idle:
+                del self.idle[key]
+        for evicted_sock in evicted:
+            self._close(evicted_sock)
+
+    @contextlib.contextmanager
+    def connection(
+            self,
+            path: str,
+            socket_type: int = zmq.REQ
+    ) -> Iterator[zmq.Socket]:  # type: ignore
+        """Context manager around `acquire` and `release`, the socket is
+        closed if the body raises."""
+        sock = self.acquire(path, socket_type)
+        healthy = False
+        try:
+            yield sock
+            healthy = True
+        finally:
+            self.release(sock, path, socket_type, healthy=healthy)
+
+    def close(self):
+        """Closes all the idle sockets."""
+        with self.lock:
+            sockets = [
+                sock for idle in self.idle.values() for sock, _ in idle
+            ]
+            self.idle.clear()
+            self.num_idle = 0
+        for sock in sockets:
+            self._close(sock)
+
+    def _create(self, path: str,
+                socket_type: int) -> zmq.Socket:  # type: ignore
+        sock = make_zmq_socket(ctx=self.ctx,
+                               path=path,
+                               socket_type=socket_type,
+                               bind=False,
+                               linger=0)
+        sock.setsockopt(zmq.RECONNECT_IVL,  # type: ignore
+                        self.reconnect_ivl_ms)
+        sock.setsockopt(zmq.RECONNECT_IVL_MAX,  # type: ignore
+                        self.reconnect_ivl_max_ms)
+        with self.lock:
+            self.num_created += 1
+        logger.debug("Created a ZMQ socket to %s", path)
+        return sock
+
+    @staticmethod
+    def _close(sock: zmq.Socket):  # type: ignore
+        try:
+            sock.close(linger=0)
+        except Exception as e:
+            logger.warning("Failed to close a ZMQ socket: %s", e)
+
+
+_manager: Optional[ZmqConnectionManager] = None
+_manager_pid: Optional[int] = None
+_manager_lock = threading.Lock()
+
+
+def get_zmq_connection_manager() -> ZmqConnectionManager:
+    """Returns the connection manager of this process. A forked child gets
+    its own, ZMQ contexts must not be used across a fork."""
+    global _manager, _manager_pid
+    pid = os.getpid()
+    with _manager_lock:
+        if _manager is None or _manager_pid != pid:
+            _manager = ZmqConnectionManager()
+            _manager_pid = pid
+        return _manager
+
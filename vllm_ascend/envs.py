@@ -141,6 +141,19 @@ env_variables: Dict[str, Callable[[], Any]] = {
     #   1: enable moe all2all seq.
     "VLLM_ASCEND_ENABLE_MOE_ALL2ALL_SEQ":
     lambda: bool(int(os.getenv('VLLM_ASCEND_ENABLE_MOE_ALL2ALL_SEQ', '0'))),
+    # The expert capacity factor of the moe all2all seq dispatcher. When set,
+    # every rank sends exactly ceil(num_tokens * top_k / num_experts * factor)
+    # tokens to each expert, dropping the tokens beyond and padding the rest,
+    # so that the all2all splits are static and no host sync is needed. This
+    # makes the dispatcher graph capturable. Unset by default (dropless).
+    "VLLM_ASCEND_MOE_EXPERT_CAPACITY_FACTOR":
+    lambda: float(os.environ["VLLM_ASCEND_MOE_EXPERT_CAPACITY_FACTOR"])
+    if "VLLM_ASCEND_MOE_EXPERT_CAPACITY_FACTOR" in os.environ else None,
+    # Whether the tokens dropped by VLLM_ASCEND_MOE_EXPERT_CAPACITY_FACTOR are
+    # rerouted to the other selected experts of the token, by renormalizing
+    # its routing weights over the kept experts.
+    "VLLM_ASCEND_MOE_REROUTE_DROPPED_TOKENS":
+    lambda: bool(int(os.getenv('VLLM_ASCEND_MOE_REROUTE_DROPPED_TOKENS', '0'))),
     # Whether to enable mlp optimize when tensor parallel is enabled.
     # this feature in eager mode will get better performance.
     "VLLM_ASCEND_ENABLE_MLP_OPTIMIZE":
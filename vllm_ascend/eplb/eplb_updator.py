@@ -0,0 +1,422 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Online expert placement rebalancing (dynamic EPLB).
+
+Every ``rebalance_interval`` steps the updator plans a new expert deployment
+from the expert load gathered by ``ExpertLoadCollector`` and migrates the
+MoE layers to it a few layers per step:
+
+1. stage: the expert weights that a rank gains are sent by their current
+   holders into per-slot staging buffers with asynchronous point-to-point
+   ops, which overlap with the next model step;
+2. commit: at the following step boundary the transfers are awaited, the
+   staged slots are copied into the live expert weights and the layer's
+   ``expert_map`` and ``log2phy`` are overwritten in place.
+
+All EP ranks derive the same plan from the same all-reduced expert load, so
+the plan itself needs no communication, and they stage and commit the same
+layers at the same step, so a layer is always routed consistently. Tensors
+are updated in place to keep captured graphs valid.
+"""
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import torch
+import torch.distributed as dist
+from vllm.logger import logger
+
+from vllm_ascend.eplb.policy import rebalance_deployment
+from vllm_ascend.ops.expert_load_balancer import (build_expert_placement_map,
+                                                  build_log2phy_map,
+                                                  build_log2phy_table)
+
+# Prefixes of the per-expert parameters and buffers of AscendFusedMoE, whose
+# first dimension is the local expert slot.
+EXPERT_PARAM_PREFIXES = ("w13_", "w2_")
+
+
+class ExpertWeightTransport(ABC):
+    """Point-to-point exchange of expert weights within the EP group."""
+
+    @abstractmethod
+    def exchange(
+        self, sends: List[Tuple[int, torch.Tensor]],
+        recvs: List[Tuple[int, torch.Tensor]]
+    ) -> Callable[[], None]:
+        """Starts sending and receiving tensors to/from EP ranks.
+
+        Messages between two ranks are matched in the order they are listed.
+        Returns a function that waits until all of them completed.
+        """
+        pass
+
+
+class DistributedExpertWeightTransport(ExpertWeightTransport):
+
+    def __init__(self, group: dist.ProcessGroup):
+        self.group = group
+
+    def exchange(self, sends, recvs):
+        ops = [
+            dist.P2POp(dist.isend, tensor,
+                       dist.get_global_rank(self.group, dst), self.group)
+            for dst, tensor in sends
+        ] + [
+            dist.P2POp(dist.irecv, tensor,
+                       dist.get_global_rank(self.group, src), self.group)
+            for src, tensor in recvs
+        ]
+        if not ops:
+            return lambda: None
+        reqs = dist.batch_isend_irecv(ops)
+
+        def wait():
+            for req in reqs:
+                req.wait()
+
+        return wait
+
+
+def align_deployment(old_deployment: torch.Tensor,
+                     new_deployment: torch.Tensor) -> torch.Tensor:
+    """Reorders the slots of each rank to keep as many experts in place.
+
+    Both deployments are ``[num_ranks, num_local_experts]``. Experts a rank
+    holds in both keep their old slot and the incoming experts fill the
+    freed slots, which minimizes the number of slots to migrate.
+    """
+    aligned = []
+    for old_row, new_row in zip(old_deployment.tolist(),
+                                new_deployment.tolist()):
+        remaining = Counter(new_row)
+        row = []
+        for expert in old_row:
+            if remaining[expert] > 0:
+                remaining[expert] -= 1
+                row.append(expert)
+            else:
+                row.append(-1)
+        incoming = iter(remaining.elements())
+        aligned.append(
+            [next(incoming) if expert == -1 else expert for expert in row])
+    return torch.tensor(aligned, dtype=old_deployment.dtype)
+
+
+def plan_expert_transfers(
+        old_deployment: torch.Tensor,
+        new_deployment: torch.Tensor) -> List[Tuple[int, int, int, int]]:
+    """Lists the ``(dst_rank, dst_slot, src_rank, src_slot)`` slot copies
+    that turn ``old_deployment`` into ``new_deployment``.
+
+    Local copies are preferred; remote experts are read from the holder that
+    has been assigned the fewest sends so far.
+    """
+    old_rows = old_deployment.tolist()
+    holders: Dict[int, List[Tuple[int, int]]] = {}
+    for rank, row in enumerate(old_rows):
+        for slot, expert in enumerate(row):
+            holders.setdefault(expert, []).append((rank, slot))
+    num_sends = [0] * len(old_rows)
+
+    transfers = []
+    for rank, row in enumerate(new_deployment.tolist()):
+        for slot, expert in enumerate(row):
+            if old_rows[rank][slot] == expert:
+                continue
+            if expert in old_rows[rank]:
+                src_rank, src_slot = rank, old_rows[rank].index(expert)
+            else:
+                src_rank, src_slot = min(holders[expert],
+                                         key=lambda h: num_sends[h[0]])
+                num_sends[src_rank] += 1
+            transfers.append((rank, slot, src_rank, src_slot))
+    return transfers
+
+
+@dataclass
+class _StagedLayer:
+    layer_id: int
+    deployment: torch.Tensor
+    dst_slots: torch.Tensor
+    # Staging buffer of every expert param, one row per slot in dst_slots.
+    staging: Dict[str, torch.Tensor]
+    wait: Callable[[], None]
+
+
+class EplbUpdator:
+    """Rebalances the expert placement of MoE layers at runtime."""
+
+    def __init__(self,
+                 layers: Sequence[torch.nn.Module],
+                 deployment: torch.Tensor,
+                 ep_rank: int,
+                 transport: ExpertWeightTransport,
+                 get_expert_load: Callable[[], Optional[torch.Tensor]],
+                 rebalance_interval: int,
+                 num_migration_layers_per_step: int = 1,
+                 num_expert_groups: int = 1,
+                 num_nodes: int = 1,
+                 log2phy_policy: str = "random",
+                 log2phy_table_width: int = 12):
+        """
+        Args:
+            layers: MoE layers in ``moe_instance_id`` order, each with
+                ``expert_map``, ``log2phy`` and expert params and buffers
+                named with ``EXPERT_PARAM_PREFIXES``.
+            deployment: ``[num_layers, num_ranks, num_local_experts]``, the
+                current logical expert of every physical slot.
+            get_expert_load: returns the accumulated ``[num_layers,
+                num_experts]`` expert load, identical on all EP ranks.
+            log2phy_policy: replica selection of ``log2phy``, see
+                ``build_log2phy_table``. ``random`` spreads the ranks evenly
+                over remote replicas so that all ranks agree without
+                sharing a seed.
+        """
+        assert deployment.shape[0] == len(layers)
+        self.layers = list(layers)
+        self.deployment = deployment.clone()
+        self.num_layers, self.num_ranks, self.num_local_experts = \
+            deployment.shape
+        self.num_experts = layers[0].expert_map.numel()
+        self.ep_rank = ep_rank
+        self.transport = transport
+        self.get_expert_load = get_expert_load
+        self.rebalance_interval = rebalance_interval
+        self.num_migration_layers_per_step = num_migration_layers_per_step
+        self.num_expert_groups = num_expert_groups
+        self.num_nodes = num_nodes
+        self.log2phy_policy = log2phy_policy
+        self.log2phy_table_width = log2phy_table_width
+
+        self._num_steps = 0
+        self._last_expert_load: Optional[torch.Tensor] = None
+        # Load the target deployment was planned from.
+        self._plan_expert_load: Optional[torch.Tensor] = None
+        self._target_deployment: Optional[torch.Tensor] = None
+        self._pending_layers: List[int] = []
+        self._staged: List[_StagedLayer] = []
+
+    @property
+    def migrating(self) -> bool:
+        return bool(self._pending_layers or self._staged)
+
+    def step(self) -> None:
+        """Advances the migration by one step; call between model steps."""
+        self._num_steps += 1
+        self._commit_staged()
+        if (not self.migrating
+                and self._num_steps % self.rebalance_interval == 0):
+            self.rebalance()
+        self._stage_pending()
+
+    def flush(self) -> None:
+        """Completes any in-flight migration."""
+        while self.migrating:
+            self._commit_staged()
+            self._stage_pending()
+
+    def rebalance(self) -> None:
+        """Plans a new deployment from the load seen since the last plan."""
+        expert_load = self.get_expert_load()
+        if expert_load is None:
+            return
+        window = expert_load
+        if self._last_expert_load is not None:
+            window = expert_load - self._last_expert_load
+        self._last_expert_load = expert_load.clone()
+        if window.sum() <= 0:
+            return
+        self._plan_expert_load = window
+
+        target = rebalance_deployment(window, self.num_ranks,
+                                      self.num_local_experts,
+                                      self.num_expert_groups, self.num_nodes)
+        self._target_deployment = torch.stack([
+            align_deployment(self.deployment[layer_id], target[layer_id])
+            for layer_id in range(self.num_layers)
+        ])
+        self._pending_layers = [
+            layer_id for layer_id in range(self.num_layers)
+            if not torch.equal(self._target_deployment[layer_id],
+                               self.deployment[layer_id])
+        ]
+        logger.info("EPLB: migrating %d of %d MoE layers to a new placement",
+                    len(self._pending_layers), self.num_layers)
+
+    def _stage_pending(self) -> None:
+        num_layers = min(self.num_migration_layers_per_step,
+                         len(self._pending_layers))
+        for _ in range(num_layers):
+            layer_id = self._pending_layers.pop(0)
+            self._staged.append(self._stage_layer(layer_id))
+
+    def _stage_layer(self, layer_id: int) -> _StagedLayer:
+        assert self._target_deployment is not None
+        layer = self.layers[layer_id]
+        deployment = self._target_deployment[layer_id]
+        transfers = plan_expert_transfers(self.deployment[layer_id],
+                                          deployment)
+        dst_slots = [t[1] for t in transfers if t[0] == self.ep_rank]
+        params = self._expert_params(layer)
+        staging = {
+            name: param.new_empty((len(dst_slots), *param.shape[1:]))
+            for name, param in params.items()
+        }
+
+        sends: List[Tuple[int, torch.Tensor]] = []
+        recvs: List[Tuple[int, torch.Tensor]] = []
+        num_recvs = 0
+        for dst_rank, _, src_rank, src_slot in transfers:
+            if dst_rank == self.ep_rank:
+                for name, param in params.items():
+                    if src_rank == self.ep_rank:
+                        staging[name][num_recvs].copy_(param.data[src_slot])
+                    else:
+                        recvs.append((src_rank, staging[name][num_recvs]))
+                num_recvs += 1
+            elif src_rank == self.ep_rank:
+                sends.extend((dst_rank, param.data[src_slot])
+                             for param in params.values())
+        wait = self.transport.exchange(sends, recvs)
+        return _StagedLayer(layer_id, deployment,
+                            torch.tensor(dst_slots, dtype=torch.long),
+                            staging, wait)
+
+    def _commit_staged(self) -> None:
+        for staged in self._staged:
+            staged.wait()
+            layer = self.layers[staged.layer_id]
+            for name, param in self._expert_params(layer).items():
+                param.data.index_copy_(0,
+                                       staged.dst_slots.to(param.device),
+                                       staged.staging[name])
+            assert self._plan_expert_load is not None
+            expert_map, log2phy = self.generate_expert_maps(
+                staged.deployment,
+                self._plan_expert_load[staged.layer_id])
+            layer.expert_map.copy_(expert_map)
+            layer.log2phy.copy_(log2phy)
+            self.deployment[staged.layer_id] = staged.deployment
+        self._staged = []
+
+    def generate_expert_maps(
+        self,
+        deployment: torch.Tensor,
+        expert_load: Optional[torch.Tensor] = None
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Returns this rank's ``expert_map`` and ``log2phy`` of a layer
+        deployment, ``expert_load`` weighing the replicas with the
+        ``load_weighted`` policy."""
+        placement = build_expert_placement_map(deployment, self.num_experts)
+        if self.log2phy_policy == "random":
+            replica_fraction = ((torch.arange(self.num_ranks) + 0.5) /
+                                self.num_ranks).view(-1, 1)
+            log2phy = build_log2phy_map(deployment, placement,
+                                        self.num_experts, replica_fraction)
+        else:
+            log2phy = build_log2phy_table(deployment, placement,
+                                          self.num_experts,
+                                          self.log2phy_policy,
+                                          self.num_nodes,
+                                          self.log2phy_table_width,
+                                          expert_load)
+        return placement[self.ep_rank], log2phy[self.ep_rank]
+
+    @staticmethod
+    def _expert_params(layer: torch.nn.Module) -> Dict[str, torch.Tensor]:
+        # Buffers hold tensors derived from the params at load time, such
+        # as the float32 copy of the w8a8 scales.
+        return {
+            name: param
+            for name, param in (*layer.named_parameters(recurse=False),
+                                *layer.named_buffers(recurse=False))
+            if name.startswith(EXPERT_PARAM_PREFIXES)
+        }
+
+
+def default_deployment(num_layers: int, num_ranks: int,
+                       num_experts: int) -> torch.Tensor:
+    """The deployment of ``determine_expert_map`` without expert_map_path."""
+    if num_experts % num_ranks != 0:
+        raise ValueError(
+            "Dynamic EPLB without expert_map_path requires the number of "
+            f"experts ({num_experts}) to be divisible by the EP size "
+            f"({num_ranks})")
+    return torch.arange(num_experts, dtype=torch.int32).view(
+        num_ranks, -1).expand(num_layers, -1, -1).clone()
+
+
+def create_eplb_updator(model: torch.nn.Module) -> Optional[EplbUpdator]:
+    """Creates the updator of a loaded model if dynamic EPLB is enabled."""
+    from vllm.distributed.parallel_state import get_ep_group
+
+    from vllm_ascend.ascend_config import get_ascend_config
+    from vllm_ascend.eplb.expert_load_collector import \
+        get_expert_load_collector
+    from vllm_ascend.ops.expert_load_balancer import get_expert_load_balancer
+    from vllm_ascend.ops.fused_moe import (AscendFusedMoE,
+                                           AscendUnquantizedFusedMoEMethod)
+
+    ascend_config = get_ascend_config()
+    eplb_config = ascend_config.eplb_config
+    if not eplb_config.dynamic_eplb:
+        return None
+    layers = sorted(
+        (m for m in model.modules() if isinstance(m, AscendFusedMoE)),
+        key=lambda m: m.moe_instance_id)
+    if not layers:
+        return None
+    if any(
+            isinstance(layer.quant_method, AscendUnquantizedFusedMoEMethod)
+            for layer in layers):
+        raise NotImplementedError(
+            "Dynamic EPLB relies on log2phy routing, which is only applied "
+            "by the quantized MoE methods.")
+
+    ep_group = get_ep_group()
+    if ep_group.world_size == 1 or layers[0].expert_map is None:
+        raise RuntimeError(
+            "dynamic_eplb is valid only when expert parallel is enabled")
+    num_experts = layers[0].global_num_experts
+    if ascend_config.expert_map_path:
+        deployment = get_expert_load_balancer(
+            ascend_config.expert_map_path, num_experts,
+            eplb_config.log2phy_policy, eplb_config.num_nodes,
+            eplb_config.log2phy_table_width).expert_map_tensor
+    else:
+        deployment = default_deployment(len(layers), ep_group.world_size,
+                                        num_experts)
+
+    updator = EplbUpdator(
+        layers,
+        deployment,
+        ep_group.rank_in_group,
+        DistributedExpertWeightTransport(ep_group.device_group),
+        lambda: get_expert_load_collector().expert_load,  # type: ignore
+        eplb_config.rebalance_interval,
+        eplb_config.num_migration_layers_per_step,
+        num_expert_groups=layers[0].num_expert_group or 1,
+        num_nodes=eplb_config.num_nodes,
+        log2phy_policy=eplb_config.log2phy_policy,
+        log2phy_table_width=eplb_config.log2phy_table_width)
+    for layer_id, layer in enumerate(layers):
+        if layer.log2phy is None:
+            _, log2phy = updator.generate_expert_maps(deployment[layer_id])
+            layer.log2phy = log2phy.to(layer.expert_map.device)
+    return updator
@@ -0,0 +1,194 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from typing import Any, List, Optional
+
+import torch
+from vllm.logger import logger
+
+from vllm_ascend.ascend_config import get_ascend_config
+
+
+class ExpertLoadCollector:
+    """Counts how many tokens each logical expert of each MoE layer receives.
+
+    Every MoE layer owns a static device-side counter row that is updated in
+    place from ``topk_ids`` right after expert selection, so recording adds no
+    host synchronization and is safe to capture into graphs. Every
+    ``reduce_interval`` steps the rows of all layers are summed across the EP
+    group and folded into ``expert_load``, a host tensor of shape
+    ``[layer_num, num_experts]``. That is the ``workload`` format consumed by
+    ``examples/eplb/eplb_strategy.py``, and it is written to ``dump_path`` by
+    the first EP rank when a path is given.
+
+    With ``collect_coactivation``, every layer also counts how often two
+    experts are selected by the same token, folded into
+    ``expert_coactivation`` of shape ``[layer_num, num_experts, num_experts]``
+    and written to ``coactivation_dump_path``. The diagonal holds the expert
+    load. It is the input of the topology-aware placement in
+    ``vllm_ascend.eplb.topology_policy``.
+
+    In the all-gather MoE states every EP rank routes the tokens of the whole
+    DP group, so the counts are scaled by the number of such ranks. The scale
+    is uniform across experts and does not affect load balancing.
+    """
+
+    def __init__(self,
+                 reduce_interval: int = 1000,
+                 dump_path: Optional[str] = None,
+                 ep_group: Optional[Any] = None,
+                 collect_coactivation: bool = False,
+                 coactivation_dump_path: Optional[str] = None):
+        assert reduce_interval > 0
+        self.reduce_interval = reduce_interval
+        self.dump_path = dump_path
+        self._ep_group = ep_group
+        self.collect_coactivation = collect_coactivation
+        self.coactivation_dump_path = coactivation_dump_path
+        self._layer_loads: List[torch.Tensor] = []
+        self._layer_coactivations: List[torch.Tensor] = []
+        self._num_steps = 0
+        self.expert_load: Optional[torch.Tensor] = None
+        self.expert_coactivation: Optional[torch.Tensor] = None
+
+    @property
+    def ep_group(self):
+        if self._ep_group is None:
+            from vllm.distributed.parallel_state import get_ep_group
+            self._ep_group = get_ep_group()
+        return self._ep_group
+
+    @property
+    def num_layers(self) -> int:
+        return len(self._layer_loads)
+
+    def register_layer(self, layer_id: int, num_experts: int,
+                       device: torch.device) -> torch.Tensor:
+        """Allocates the counter row of a MoE layer, returned for reference.
+
+        Layers must register in order of their ids, which is how
+        ``AscendFusedMoE`` assigns ``moe_instance_id``.
+        """
+        assert layer_id == len(self._layer_loads), (
+            f"MoE layer {layer_id} registered out of order, expected "
+            f"{len(self._layer_loads)}")
+        if self._layer_loads:
+            assert num_experts == self._layer_loads[0].numel(), (
+                "All MoE layers must have the same number of experts")
+        layer_load = torch.zeros(num_experts, dtype=torch.int64, device=device)
+        self._layer_loads.append(layer_load)
+        if self.collect_coactivation:
+            self._layer_coactivations.append(
+                torch.zeros(num_experts * num_experts,
+                            dtype=torch.int64,
+                            device=device))
+        return layer_load
+
+    def record(self, layer_id: int, topk_ids: torch.Tensor) -> None:
+        layer_load = self._layer_loads[layer_id]
+        topk_ids = topk_ids.to(torch.int64)
+        flat_ids = topk_ids.reshape(-1)
+        layer_load.index_add_(0, flat_ids, torch.ones_like(flat_ids))
+        if self.collect_coactivation:
+            # Flat index of every (expert, expert) pair selected by a token.
+            num_experts = layer_load.numel()
+            topk_ids = topk_ids.reshape(-1, topk_ids.shape[-1])
+            pairs = (topk_ids.unsqueeze(-1) * num_experts +
+                     topk_ids.unsqueeze(-2)).reshape(-1)
+            self._layer_coactivations[layer_id].index_add_(
+                0, pairs, torch.ones_like(pairs))
+
+    def step(self) -> None:
+        """Marks the end of a model step, reducing the counters if due.
+
+        Must be called by all EP ranks in lockstep since reducing is a
+        collective operation.
+        """
+        if not self._layer_loads:
+            return
+        self._num_steps += 1
+        if self._num_steps % self.reduce_interval == 0:
+            self.reduce()
+
+    def reduce(self) -> torch.Tensor:
+        local_load = torch.stack(self._layer_loads)
+        for layer_load in self._layer_loads:
+            layer_load.zero_()
+        global_load = self.ep_group.all_reduce(local_load).cpu()
+        if self.expert_load is None:
+            self.expert_load = global_load
+        else:
+            self.expert_load += global_load
+        if self.dump_path and self.ep_group.rank_in_group == 0:
+            torch.save(self.expert_load, self.dump_path)
+            logger.debug("Dumped expert load of %d steps to %s",
+                         self._num_steps, self.dump_path)
+        if self.collect_coactivation:
+            self._reduce_coactivation()
+        return self.expert_load
+
+    def _reduce_coactivation(self) -> None:
+        num_experts = self._layer_loads[0].numel()
+        local_coactivation = torch.stack(self._layer_coactivations)
+        for layer_coactivation in self._layer_coactivations:
+            layer_coactivation.zero_()
+        global_coactivation = self.ep_group.all_reduce(
+            local_coactivation).cpu().view(-1, num_experts, num_experts)
+        if self.expert_coactivation is None:
+            self.expert_coactivation = global_coactivation
+        else:
+            self.expert_coactivation += global_coactivation
+        if (self.coactivation_dump_path
+                and self.ep_group.rank_in_group == 0):
+            torch.save(self.expert_coactivation, self.coactivation_dump_path)
+
+    def reset(self) -> None:
+        for layer_load in self._layer_loads:
+            layer_load.zero_()
+        for layer_coactivation in self._layer_coactivations:
+            layer_coactivation.zero_()
+        self.expert_load = None
+        self.expert_coactivation = None
+
+
+_EXPERT_LOAD_COLLECTOR: Optional[ExpertLoadCollector] = None
+
+
+def get_expert_load_collector() -> Optional[ExpertLoadCollector]:
+    """Returns the collector of this process, or None if it is disabled."""
+    global _EXPERT_LOAD_COLLECTOR
+    if _EXPERT_LOAD_COLLECTOR is None:
+        eplb_config = get_ascend_config().eplb_config
+        if not eplb_config.collect_expert_load:
+            return None
+        _EXPERT_LOAD_COLLECTOR = ExpertLoadCollector(
+            eplb_config.expert_load_reduce_interval,
+            eplb_config.expert_load_dump_path,
+            collect_coactivation=eplb_config.collect_expert_coactivation,
+            coactivation_dump_path=eplb_config.expert_coactivation_dump_path)
+    return _EXPERT_LOAD_COLLECTOR
+
+
+def clear_expert_load_collector():
+    global _EXPERT_LOAD_COLLECTOR
+    _EXPERT_LOAD_COLLECTOR = None
+
+
+def record_expert_load(layer: torch.nn.Module, topk_ids: torch.Tensor):
+    """Records the routing of a MoE layer if expert load collection is on."""
+    collector = getattr(layer, "expert_load_collector", None)
+    if collector is not None:
+        collector.record(layer.moe_instance_id, topk_ids)
@@ -0,0 +1,313 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Expert parallelism load balancing policy.
+The rearrangement algorithm is adapted from
+[DeepSeek EPLB](https://github.com/deepseek-ai/eplb), the same one used by
+`examples/eplb/eplb_deepseek.py` for offline placement.
+"""
+from typing import Optional, Tuple
+
+import torch
+
+
+def balanced_packing(weight: torch.Tensor,
+                     num_packs: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Pack n weighted objects to m packs, such that each bin contains exactly n/m objects and the weights of all packs
+    are as balanced as possible.
+
+    Parameters:
+        weight: [X, n], the weight of each item
+        num_packs: number of packs
+    
+    Returns: 
+        pack_index: [X, n], the pack index of each item
+        rank_in_pack: [X, n], the rank of the item in the pack
+    """
+    num_layers, num_groups = weight.shape
+    assert num_groups % num_packs == 0
+    groups_per_pack = num_groups // num_packs
+
+    if groups_per_pack == 1:
+        pack_index = torch.arange(weight.size(-1),
+                                  dtype=torch.int64,
+                                  device=weight.device).expand(weight.shape)
+        rank_in_pack = torch.zeros_like(weight, dtype=torch.int64)
+        return pack_index, rank_in_pack
+
+    # Greedily assign items from heaviest to lightest to the lightest pack
+    # that is not full yet, for all layers at once. argmin returns the first
+    # minimum, which matches scanning the packs in order.
+    weight = weight.float().cpu()
+    indices = weight.sort(-1, descending=True).indices
+    sorted_weight = weight.gather(-1, indices)
+    layer_idx = torch.arange(num_layers)
+    pack_index = torch.empty(num_layers, num_groups, dtype=torch.int64)
+    rank_in_pack = torch.empty_like(pack_index)
+    pack_weights = torch.zeros(num_layers, num_packs)
+    pack_items = torch.zeros(num_layers, num_packs, dtype=torch.int64)
+    full_pack_weight = torch.tensor(float("inf"))
+    for i in range(num_groups):
+        pack = torch.where(pack_items < groups_per_pack, pack_weights,
+                           full_pack_weight).argmin(-1)
+        group = indices[:, i]
+        pack_index[layer_idx, group] = pack
+        rank_in_pack[layer_idx, group] = pack_items[layer_idx, pack]
+        pack_weights[layer_idx, pack] += sorted_weight[:, i]
+        pack_items[layer_idx, pack] += 1
+    return pack_index, rank_in_pack
+
+
+def replicate_experts(
+    weight: torch.Tensor,
+    num_phy: int,
+    max_replicas: Optional[int] = None
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Replicate `num_log` experts to `num_phy` replicas, such that the maximum load of all replicas is minimized.
+
+    Parameters:
+        weight: [X, num_log]
+        num_phy: total number of experts after replication
+        max_replicas: maximum number of replicas of an expert, e.g. the number
+            of ranks they are spread over
+    
+    Returns:
+        phy2log: [X, num_phy], logical expert id of each physical expert
+        rank: [X, num_phy], the replica rank
+        logcnt: [X, num_log], number of replicas for each logical expert
+    """
+    n, num_log = weight.shape
+    num_redundant = num_phy - num_log
+    assert num_redundant >= 0
+    if max_replicas is not None:
+        assert num_phy <= num_log * max_replicas
+    device = weight.device
+    phy2log = torch.arange(num_phy, dtype=torch.int64,
+                           device=device).repeat(n, 1)
+    rank = torch.zeros(n, num_phy, dtype=torch.int64, device=device)
+    logcnt = torch.ones(n, num_log, dtype=torch.int64, device=device)
+    arangen = torch.arange(n, dtype=torch.int64, device=device)
+    # Load per replica of each expert; only the chosen expert changes per
+    # iteration, so update that column instead of dividing the whole matrix.
+    load_per_replica = weight / logcnt
+    for i in range(num_log, num_phy):
+        redundant_indices = load_per_replica.max(dim=-1).indices
+        phy2log[:, i] = redundant_indices
+        rank[:, i] = logcnt[arangen, redundant_indices]
+        logcnt[arangen, redundant_indices] += 1
+        load_per_replica[arangen, redundant_indices] = (
+            weight[arangen, redundant_indices] /
+            logcnt[arangen, redundant_indices])
+        if max_replicas is not None:
+            load_per_replica[arangen, redundant_indices] = torch.where(
+                logcnt[arangen, redundant_indices] < max_replicas,
+                load_per_replica[arangen, redundant_indices], -float("inf"))
+    return phy2log, rank, logcnt
+
+
+def spread_replicas(phy2log: torch.Tensor, replica_weight: torch.Tensor,
+                    num_gpus: int, num_nodes: int) -> torch.Tensor:
+    """
+    Swap physical experts between GPUs until no GPU holds two replicas of the same logical expert.
+
+    A duplicate is swapped with the replica of another GPU of the same node
+    whose weight is closest, which keeps the node loads; only if there is
+    none, GPUs of other nodes are considered.
+
+    Parameters:
+        phy2log: [X, num_phy], logical expert id of each physical expert,
+            `num_phy // num_gpus` consecutive ones per GPU
+        replica_weight: [X, num_phy], the weight of each physical expert
+        num_gpus: number of GPUs, must be a multiple of `num_nodes`
+        num_nodes: number of server nodes
+
+    Returns:
+        perm: [X, num_phy], the physical expert moved to each position
+    """
+    num_layers, num_phy = phy2log.shape
+    phy_per_gpu = num_phy // num_gpus
+    gpus_per_node = num_gpus // num_nodes
+    perm = torch.arange(num_phy, dtype=torch.int64).repeat(num_layers, 1)
+    per_gpu = phy2log.view(num_layers, num_gpus, phy_per_gpu).sort(-1).values
+    has_duplicates = (per_gpu[..., 1:] == per_gpu[..., :-1]).flatten(1).any(
+        -1)
+    for layer in has_duplicates.nonzero().flatten().tolist():
+        experts = phy2log[layer].view(num_gpus, phy_per_gpu).tolist()
+        weights = replica_weight[layer].view(num_gpus, phy_per_gpu).tolist()
+        slots = perm[layer].view(num_gpus, phy_per_gpu).tolist()
+        for gpu in range(num_gpus):
+            node_start = gpu // gpus_per_node * gpus_per_node
+            node_gpus = range(node_start, node_start + gpus_per_node)
+            for slot in range(phy_per_gpu):
+                expert = experts[gpu][slot]
+                if expert not in experts[gpu][:slot]:
+                    continue
+                # Only GPUs without the expert can take it, in exchange for
+                # an expert this GPU does not hold yet.
+                for other_gpus in (node_gpus, range(num_gpus)):
+                    candidates = [
+                        (abs(weights[other][other_slot] -
+                             weights[gpu][slot]), other, other_slot)
+                        for other in other_gpus if expert not in experts[other]
+                        for other_slot in range(phy_per_gpu)
+                        if experts[other][other_slot] not in experts[gpu]
+                    ]
+                    if candidates:
+                        break
+                else:
+                    raise ValueError(
+                        f"Cannot place the replicas of expert {expert} on "
+                        "distinct GPUs")
+                _, other, other_slot = min(candidates)
+                for rows in (experts, weights, slots):
+                    rows[gpu][slot], rows[other][other_slot] = (
+                        rows[other][other_slot], rows[gpu][slot])
+        perm[layer] = torch.tensor(slots).flatten()
+    return perm
+
+
+def rebalance_experts_hierarchical(weight: torch.Tensor,
+                                   num_physical_experts: int, num_groups: int,
+                                   num_nodes: int, num_gpus: int):
+    """
+    Parameters:
+        weight: [num_moe_layers, num_logical_experts]
+        num_physical_experts: number of physical experts after replication
+        num_groups: number of expert groups
+        num_nodes: number of server nodes, where the intra-node network (e.g, NVLink) is faster
+        num_gpus: number of GPUs, must be a multiple of `num_nodes`
+
+    Returns: 
+        physical_to_logical_map: [num_moe_layers, num_physical_experts]
+        logical_to_physical_map: [num_moe_layers, num_logical_experts, X]
+        logical_count: [num_moe_layers, num_logical_experts]
+    """
+    num_layers, num_logical_experts = weight.shape
+    assert num_logical_experts % num_groups == 0
+    group_size = num_logical_experts // num_groups
+    assert num_groups % num_nodes == 0
+    groups_per_node = num_groups // num_nodes
+    assert num_gpus % num_nodes == 0
+    assert num_physical_experts % num_gpus == 0
+    phy_experts_per_gpu = num_physical_experts // num_gpus
+
+    def inverse(perm: torch.Tensor) -> torch.Tensor:
+        inv = torch.empty_like(perm)
+        inv.scatter_(
+            1, perm,
+            torch.arange(perm.size(1), dtype=torch.int64,
+                         device=perm.device).expand(perm.shape))
+        return inv
+
+    # Step 1: pack groups to nodes
+    tokens_per_group = weight.unflatten(-1, (num_groups, group_size)).sum(-1)
+    group_pack_index, group_rank_in_pack = balanced_packing(
+        tokens_per_group, num_nodes)
+    log2mlog = (((group_pack_index * groups_per_node + group_rank_in_pack) *
+                 group_size).unsqueeze(-1) +
+                torch.arange(group_size,
+                             dtype=torch.int64,
+                             device=group_pack_index.device)).flatten(-2)
+    mlog2log = inverse(log2mlog)
+
+    # Step 2: construct redundant experts within nodes
+    # [num_layers * num_nodes, num_logical_experts // num_nodes]
+    tokens_per_mlog = weight.gather(-1, mlog2log).view(
+        -1, num_logical_experts // num_nodes)
+    phy2mlog, phyrank, mlogcnt = replicate_experts(
+        tokens_per_mlog, num_physical_experts // num_nodes,
+        num_gpus // num_nodes)
+
+    # Step 3: pack physical_experts to GPUs
+    # [num_layers * num_nodes, num_physical_experts // num_nodes]
+    tokens_per_phy = (tokens_per_mlog / mlogcnt).gather(-1, phy2mlog)
+    pack_index, rank_in_pack = balanced_packing(tokens_per_phy,
+                                                num_gpus // num_nodes)
+    phy2pphy = pack_index * phy_experts_per_gpu + rank_in_pack
+    pphy2phy = inverse(phy2pphy)
+
+    pphy2mlog = phy2mlog.gather(
+        -1, pphy2phy)  # [num_layers * num_nodes, num_log_per_nodes]
+    pphy2mlog = (pphy2mlog.view(num_layers, num_nodes, -1) + torch.arange(
+        0,
+        num_logical_experts,
+        num_logical_experts // num_nodes,
+        device=group_pack_index.device).view(1, -1, 1)).flatten(-2)
+    pphy2log = mlog2log.gather(-1, pphy2mlog)
+    pphyrank = phyrank.gather(-1, pphy2phy).view(num_layers, -1)
+    logcnt = mlogcnt.view(num_layers, -1).gather(-1, log2mlog)
+
+    # Step 4: move duplicate replicas of a GPU to other GPUs of its node
+    pphy_weight = (weight / logcnt).gather(-1, pphy2log)
+    perm = spread_replicas(pphy2log, pphy_weight, num_gpus, num_nodes)
+    pphy2log = pphy2log.gather(-1, perm)
+    pphyrank = pphyrank.gather(-1, perm)
+    return pphy2log, pphyrank, logcnt
+
+
+def rebalance_experts(
+        weight: torch.Tensor, num_replicas: int, num_groups: int,
+        num_nodes: int,
+        num_gpus: int) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Entry point for expert-parallelism load balancer.
+
+    Parameters:
+        weight: [layers, num_logical_experts], the load statistics for all logical experts
+        num_replicas: number of physical experts, must be a multiple of `num_gpus`
+        num_groups: number of expert groups
+        num_nodes: number of server nodes, where the intra-node network (e.g, NVLink) is faster
+        num_gpus: number of GPUs, must be a multiple of `num_nodes`
+
+    Returns: 
+        physical_to_logical_map: [layers, num_replicas], the expert index of each replica
+        logical_to_physical_map: [layers, num_logical_experts, X], the replica indices for each expert
+        expert_count: [layers, num_logical_experts], number of physical replicas for each logical expert
+    """
+    num_layers, num_logical_experts = weight.shape
+    weight = weight.float().cpu()
+    if num_groups % num_nodes == 0:
+        # use hierarchical load-balance policy
+        phy2log, phyrank, logcnt = rebalance_experts_hierarchical(
+            weight, num_replicas, num_groups, num_nodes, num_gpus)
+    else:
+        # use global load-balance policy
+        phy2log, phyrank, logcnt = rebalance_experts_hierarchical(
+            weight, num_replicas, 1, 1, num_gpus)
+    maxlogcnt = logcnt.max().item()
+    log2phy: torch.Tensor = torch.full(
+        (num_layers, num_logical_experts, maxlogcnt),
+        -1,
+        dtype=torch.int64,
+        device=logcnt.device)
+    log2phy.view(num_layers, -1).scatter_(
+        -1, phy2log * maxlogcnt + phyrank,
+        torch.arange(num_replicas, dtype=torch.int64,
+                     device=log2phy.device).expand(num_layers, -1))
+    return phy2log, log2phy, logcnt
+
+
+def rebalance_deployment(expert_load: torch.Tensor, num_ranks: int,
+                         num_local_experts: int, num_groups: int,
+                         num_nodes: int) -> torch.Tensor:
+    """
+    Computes a new expert deployment from expert load statistics.
+
+    Parameters:
+        expert_load: [layers, num_logical_experts], the load of each logical expert
+        num_ranks: number of EP ranks
+        num_local_experts: number of physical expert slots on each rank
+        num_groups: number of expert groups
+        num_nodes: number of server nodes
+
+    Returns:
+        deployment: [layers, num_ranks, num_local_experts], the logical expert
+            held by each physical slot, in the layout of `expert_map_path`.
+            A rank never holds two replicas of the same logical expert.
+    """
+    num_layers = expert_load.shape[0]
+    phy2log, _, _ = rebalance_experts(expert_load,
+                                      num_ranks * num_local_experts,
+                                      num_groups, num_nodes, num_ranks)
+    return phy2log.view(num_layers, num_ranks, num_local_experts)
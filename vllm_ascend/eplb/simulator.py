@@ -0,0 +1,148 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""CPU models of MoE token dispatch, used to compare expert placements
+and replica routing offline without running the model."""
+from typing import Tuple
+
+import torch
+
+from vllm_ascend.ops.expert_load_balancer import map_logical_to_physical
+
+
+def expert_nodes(deployment: torch.Tensor, num_experts: int,
+                 num_nodes: int) -> torch.Tensor:
+    """Returns ``[layers, num_experts, num_nodes]``, whether a node holds a
+    replica of each logical expert.
+
+    ``deployment`` is ``[layers, num_ranks, num_local_experts]`` with
+    consecutive ranks on the same node, as in ``expert_map_path``.
+    """
+    num_layers, num_ranks, num_local_experts = deployment.shape
+    assert num_ranks % num_nodes == 0
+    node_experts = deployment.reshape(num_layers, num_nodes, -1).long()
+    has_expert = torch.zeros(num_layers,
+                             num_nodes,
+                             num_experts,
+                             dtype=torch.bool)
+    has_expert.scatter_(-1, node_experts, True)
+    return has_expert.transpose(1, 2)
+
+
+def simulate_cross_node_bytes(deployment: torch.Tensor,
+                              topk_ids: torch.Tensor,
+                              num_experts: int,
+                              num_nodes: int,
+                              hidden_size: int,
+                              dtype_bytes: int = 2,
+                              dedup_by_node: bool = True) -> torch.Tensor:
+    """Estimates the cross-node bytes of one step of MoE dispatch + combine.
+
+    Parameters:
+        deployment: [layers, num_ranks, num_local_experts], logical expert of
+            each physical slot
+        topk_ids: [layers, num_tokens, top_k], routed experts of the tokens of
+            one step
+        num_experts: number of logical experts
+        num_nodes: number of server nodes, ranks are split evenly over them
+        hidden_size: hidden size of the tokens
+        dtype_bytes: bytes per element of the dispatched tokens
+        dedup_by_node: whether a token is sent to a remote node once for all
+            its experts there, like a hierarchical dispatch, rather than once
+            per expert like MC2 and the all2all dispatch
+
+    Returns:
+        bytes: [layers], cross-node bytes of every layer, counting the token
+            going out in dispatch and coming back in combine.
+
+    Tokens are spread round-robin over ranks and are served by a replica on
+    their own node if one exists. Otherwise a node already receiving the
+    token is reused when deduplicating, else the candidate nodes are rotated
+    over tokens to spread the load. Only with deduplication does placing
+    experts that are selected together on the same node save traffic.
+    """
+    num_layers, num_ranks, _ = deployment.shape
+    _, num_tokens, top_k = topk_ids.shape
+    ranks_per_node = num_ranks // num_nodes
+    has_expert = expert_nodes(deployment, num_experts, num_nodes)
+
+    token_idx = torch.arange(num_tokens)
+    token_node = (token_idx % num_ranks) // ranks_per_node
+    # Rotated node order of each token, smallest first.
+    node_order = (torch.arange(num_nodes) - token_idx.unsqueeze(-1)) % num_nodes
+    layer_idx = torch.arange(num_layers).view(-1, 1)
+    received = torch.zeros(num_layers, num_tokens, num_nodes, dtype=torch.bool)
+    received[:, token_idx, token_node] = True
+    num_sends = torch.zeros(num_layers, dtype=torch.int64)
+    for k in range(top_k):
+        # [layers, num_tokens, num_nodes]
+        candidates = has_expert[layer_idx, topk_ids[:, :, k].long()]
+        if not dedup_by_node:
+            local = candidates[:, token_idx, token_node]
+            num_sends += (~local).sum(-1)
+            continue
+        served = (candidates & received).any(-1)
+        order = torch.where(candidates, node_order, num_nodes)
+        target = order.argmin(-1, keepdim=True)
+        new_node = torch.zeros_like(received).scatter_(-1, target, True)
+        received |= new_node & ~served.unsqueeze(-1)
+        num_sends += (~served).sum(-1)
+    return num_sends * (2 * hidden_size * dtype_bytes)
+
+
+def simulate_replica_load(log2phy: torch.Tensor, topk_ids: torch.Tensor,
+                          num_physical_experts: int) -> torch.Tensor:
+    """Counts the tokens every physical expert receives in one layer.
+
+    Parameters:
+        log2phy: [num_ranks, num_experts] or [num_ranks, num_experts, width],
+            the log2phy map or table of every rank, see
+            ``build_log2phy_table``
+        topk_ids: [num_ranks, num_tokens, top_k], routed experts of the
+            tokens of each rank
+        num_physical_experts: number of physical experts of all ranks
+
+    Returns:
+        replica_load: [num_physical_experts]
+    """
+    replica_load = torch.zeros(num_physical_experts, dtype=torch.int64)
+    for rank, rank_topk_ids in enumerate(topk_ids):
+        physical_ids = map_logical_to_physical(rank_topk_ids.long(),
+                                               log2phy[rank].long())
+        replica_load += torch.bincount(physical_ids.flatten(),
+                                       minlength=num_physical_experts)
+    return replica_load
+
+
+def replica_load_variance(
+        deployment: torch.Tensor,
+        replica_load: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Returns the variance of the load of the replicas of every logical
+    expert and the variance of the rank loads.
+
+    ``deployment`` is ``[num_ranks, num_local_experts]`` of one layer. The
+    expert variance is 0 for experts with a single replica.
+    """
+    experts = deployment.flatten().long()
+    num_experts = int(experts.max()) + 1
+    load = replica_load.double()
+    replica_num = torch.bincount(experts, minlength=num_experts)
+    mean = torch.zeros(num_experts, dtype=load.dtype).index_add_(
+        0, experts, load) / replica_num.clamp(min=1)
+    expert_variance = torch.zeros_like(mean).index_add_(
+        0, experts, (load - mean[experts])**2) / replica_num.clamp(min=1)
+    rank_load = load.view(deployment.shape).sum(-1)
+    return expert_variance, rank_load.var(unbiased=False)
@@ -0,0 +1,210 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Topology-aware expert placement.
+
+Like `vllm_ascend.eplb.policy`, experts are replicated by load and packed to
+ranks by load, but logical experts are first assigned to nodes so that
+experts selected together by the same tokens share a node, as long as the
+node loads stay balanced. A token then reaches fewer remote nodes in a
+dispatch that sends it to every node once, see
+`vllm_ascend.eplb.simulator.simulate_cross_node_bytes`.
+"""
+from typing import Tuple
+
+import torch
+
+from vllm_ascend.eplb.policy import (balanced_packing, replicate_experts,
+                                     spread_replicas)
+
+
+def compute_coactivation(topk_ids: torch.Tensor,
+                         num_experts: int) -> torch.Tensor:
+    """
+    Counts how often two experts are selected by the same token.
+
+    Parameters:
+        topk_ids: [layers, num_tokens, top_k], routed experts of each token
+        num_experts: number of logical experts
+
+    Returns:
+        coactivation: [layers, num_experts, num_experts], in the format
+            collected by `ExpertLoadCollector`; the diagonal is the load
+    """
+    num_layers = topk_ids.shape[0]
+    topk_ids = topk_ids.reshape(num_layers, -1, topk_ids.shape[-1]).long()
+    pairs = (topk_ids.unsqueeze(-1) * num_experts +
+             topk_ids.unsqueeze(-2)).reshape(num_layers, -1)
+    coactivation = torch.zeros(num_layers,
+                               num_experts * num_experts,
+                               dtype=torch.int64)
+    coactivation.scatter_add_(1, pairs, torch.ones_like(pairs))
+    return coactivation.view(num_layers, num_experts, num_experts)
+
+
+def _assign_nodes(weight: torch.Tensor, affinity: torch.Tensor,
+                  replica_expert: torch.Tensor, num_nodes: int,
+                  imbalance_tolerance: float,
+                  num_refine_steps: int) -> torch.Tensor:
+    """Assigns the physical replicas of one layer to nodes.
+
+    ``weight`` is the load of each replica, ``affinity`` the co-activation of
+    logical experts with a zero diagonal. Returns the node of every replica.
+    """
+    num_replicas = weight.numel()
+    num_experts = affinity.shape[0]
+    max_node_load = weight.sum() / num_nodes * (1 + imbalance_tolerance)
+
+    # Start from a load-balanced assignment, as in the load-only policy.
+    pack_index, _ = balanced_packing(weight.unsqueeze(0), num_nodes)
+    replica_node = pack_index[0]
+    node_load = torch.zeros(num_nodes, dtype=weight.dtype).scatter_add_(
+        0, replica_node, weight)
+    node_count = torch.zeros(num_nodes, num_experts, dtype=torch.int64)
+    node_count.index_put_((replica_node, replica_expert),
+                          torch.ones_like(replica_node),
+                          accumulate=True)
+    # Co-activation of every expert with the experts on each node.
+    node_affinity = node_count.to(affinity.dtype) @ affinity
+
+    # Refine: swap the pair of replicas on different nodes that gains the
+    # most intra-node affinity without breaking the load cap, until no swap
+    # gains anything.
+    pair_affinity = 2 * affinity[replica_expert][:, replica_expert]
+    # Load change of the node of replica u when it swaps with replica v.
+    load_delta = weight.unsqueeze(0) - weight.unsqueeze(1)
+    for _ in range(num_refine_steps):
+        # [num_replicas, num_nodes], affinity of each replica to each node.
+        gain_to = node_affinity[:, replica_expert].T
+        own = gain_to.gather(1, replica_node.unsqueeze(-1))
+        to_other = gain_to[:, replica_node] - own
+        gain = to_other + to_other.T - pair_affinity
+        valid = replica_node.unsqueeze(1) != replica_node.unsqueeze(0)
+        valid &= node_load[replica_node].unsqueeze(1) + load_delta <= \
+            torch.maximum(max_node_load, node_load[replica_node].unsqueeze(1))
+        valid &= node_load[replica_node].unsqueeze(0) + load_delta.T <= \
+            torch.maximum(max_node_load, node_load[replica_node].unsqueeze(0))
+        # Keep replicas of one expert on different nodes.
+        held = node_count[:, replica_expert] > 0
+        valid &= ~held[replica_node].T
+        valid &= ~held[replica_node]
+        gain = torch.where(valid, gain, float("-inf"))
+        best = int(gain.argmax())
+        if not gain.view(-1)[best] > 1e-6 * gain_to.abs().max():
+            break
+        u, v = divmod(best, num_replicas)
+        node_u, node_v = int(replica_node[u]), int(replica_node[v])
+        expert_u, expert_v = replica_expert[u], replica_expert[v]
+        replica_node[u], replica_node[v] = node_v, node_u
+        node_load[node_u] += weight[v] - weight[u]
+        node_load[node_v] += weight[u] - weight[v]
+        node_count[node_u, expert_u] -= 1
+        node_count[node_u, expert_v] += 1
+        node_count[node_v, expert_v] -= 1
+        node_count[node_v, expert_u] += 1
+        node_affinity[node_u] += affinity[expert_v] - affinity[expert_u]
+        node_affinity[node_v] += affinity[expert_u] - affinity[expert_v]
+    return replica_node
+
+
+def rebalance_experts_topology_aware(
+        weight: torch.Tensor,
+        coactivation: torch.Tensor,
+        num_ranks: int,
+        num_local_experts: int,
+        num_nodes: int,
+        imbalance_tolerance: float = 0.05,
+        num_refine_steps: int = 128) -> torch.Tensor:
+    """
+    Computes an expert deployment that balances load and keeps experts that
+    are selected together on the same node.
+
+    Parameters:
+        weight: [layers, num_logical_experts], the load of each logical expert
+        coactivation: [layers, num_logical_experts, num_logical_experts], how
+            often two experts are selected by the same token
+        num_ranks: number of EP ranks, consecutive ranks share a node
+        num_local_experts: number of physical expert slots on each rank
+        num_nodes: number of server nodes
+        imbalance_tolerance: how much the load of a node may exceed the
+            average to improve co-location
+        num_refine_steps: maximum number of replica swaps per layer after the
+            greedy node assignment
+
+    Returns:
+        deployment: [layers, num_ranks, num_local_experts], the logical expert
+            held by each physical slot, in the layout of `expert_map_path`
+    """
+    num_layers, num_experts = weight.shape
+    assert num_ranks % num_nodes == 0
+    num_replicas = num_ranks * num_local_experts
+    assert num_replicas >= num_experts
+    weight = weight.float().cpu()
+    affinity = coactivation.float().cpu().clone()
+    affinity.diagonal(dim1=-2, dim2=-1).zero_()
+
+    phy2log, _, logcnt = replicate_experts(weight, num_replicas, num_ranks)
+    replica_weight = (weight / logcnt).gather(-1, phy2log)
+
+    # Physical replicas grouped by node: [layers, num_nodes, per_node].
+    node_replicas = torch.empty(num_layers,
+                                num_nodes,
+                                num_replicas // num_nodes,
+                                dtype=torch.int64)
+    for layer in range(num_layers):
+        replica_node = _assign_nodes(replica_weight[layer], affinity[layer],
+                                     phy2log[layer], num_nodes,
+                                     imbalance_tolerance, num_refine_steps)
+        node_replicas[layer] = replica_node.argsort(stable=True).view(
+            num_nodes, -1)
+
+    # Pack the replicas of every node to its ranks by load.
+    node_experts = phy2log.gather(-1, node_replicas.view(num_layers, -1))
+    node_weight = replica_weight.gather(-1, node_replicas.view(
+        num_layers, -1)).view(num_layers * num_nodes, -1)
+    pack_index, rank_in_pack = balanced_packing(node_weight,
+                                                num_ranks // num_nodes)
+    slot = pack_index * num_local_experts + rank_in_pack
+    deployment = torch.empty_like(node_weight, dtype=torch.int64)
+    deployment.scatter_(-1, slot,
+                        node_experts.view(num_layers * num_nodes, -1))
+    deployment_weight = torch.empty_like(node_weight)
+    deployment_weight.scatter_(-1, slot, node_weight)
+
+    # A rank must not hold two replicas of the same expert.
+    deployment = deployment.view(num_layers, -1)
+    perm = spread_replicas(deployment,
+                           deployment_weight.view(num_layers, -1), num_ranks,
+                           num_nodes)
+    return deployment.gather(-1, perm).view(num_layers, num_ranks,
+                                            num_local_experts)
+
+
+def node_load_imbalance(deployment: torch.Tensor, weight: torch.Tensor,
+                        num_nodes: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Returns the max/mean load ratio of nodes and of ranks of every layer,
+    splitting the load of an expert evenly over its replicas."""
+    num_layers, num_ranks, _ = deployment.shape
+    weight = weight.float().cpu()
+    flat = deployment.reshape(num_layers, -1).long()
+    logcnt = torch.zeros_like(weight).scatter_add_(
+        -1, flat, torch.ones_like(flat, dtype=weight.dtype))
+    replica_weight = (weight / logcnt.clamp(min=1)).gather(-1, flat)
+    rank_load = replica_weight.view(num_layers, num_ranks, -1).sum(-1)
+    node_load = rank_load.view(num_layers, num_nodes, -1).sum(-1)
+    return (node_load.max(-1).values / node_load.mean(-1),
+            rank_load.max(-1).values / rank_load.mean(-1))
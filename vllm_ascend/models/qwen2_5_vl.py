@@ -17,7 +17,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from functools import partial
+from functools import lru_cache, partial
 from typing import Callable, Iterable, Optional, Set, Tuple, Union
 
 import torch
@@ -44,6 +44,55 @@ from vllm.multimodal import MULTIMODAL_REGISTRY
 
 MIN_PAD_SIZE = 64  # min_size to pad weight
 MAX_PAD_SIZE = 128  # max_size to pad weight
+MROPE_GRID_CACHE_SIZE = 256  # distinct (t, h, w) grids memoized
+
+
+# Image and video grids repeat heavily in production traffic, so the per-grid
+# rotary position ids and window indices are memoized on the host. Callers
+# must treat the returned tensors as read-only.
+@lru_cache(maxsize=MROPE_GRID_CACHE_SIZE)
+def _get_rot_pos_ids(t: int, h: int, w: int,
+                     spatial_merge_size: int) -> torch.Tensor:
+    hpos_ids = torch.arange(h).unsqueeze(1).expand(-1, w)
+    wpos_ids = torch.arange(w).unsqueeze(0).expand(h, -1)
+    hpos_ids = hpos_ids.reshape(
+        h // spatial_merge_size,
+        spatial_merge_size,
+        w // spatial_merge_size,
+        spatial_merge_size,
+    ).permute(0, 2, 1, 3).flatten()
+    wpos_ids = wpos_ids.reshape(
+        h // spatial_merge_size,
+        spatial_merge_size,
+        w // spatial_merge_size,
+        spatial_merge_size,
+    ).permute(0, 2, 1, 3).flatten()
+    return torch.stack([hpos_ids, wpos_ids], dim=-1).repeat(t, 1)
+
+
+@lru_cache(maxsize=MROPE_GRID_CACHE_SIZE)
+def _get_window_index(
+        grid_t: int, grid_h: int, grid_w: int, spatial_merge_size: int,
+        vit_merger_window_size: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    llm_grid_h = grid_h // spatial_merge_size
+    llm_grid_w = grid_w // spatial_merge_size
+    index = torch.arange(grid_t * llm_grid_h * llm_grid_w).reshape(
+        grid_t, llm_grid_h, llm_grid_w)
+    pad_h = vit_merger_window_size - llm_grid_h % vit_merger_window_size
+    pad_w = vit_merger_window_size - llm_grid_w % vit_merger_window_size
+    num_windows_h = (llm_grid_h + pad_h) // vit_merger_window_size
+    num_windows_w = (llm_grid_w + pad_w) // vit_merger_window_size
+    index_padded = F.pad(index, (0, pad_w, 0, pad_h), 'constant', -100)
+    index_padded = index_padded.reshape(grid_t, num_windows_h,
+                                        vit_merger_window_size, num_windows_w,
+                                        vit_merger_window_size)
+    index_padded = index_padded.permute(0, 1, 3, 2, 4).reshape(
+        grid_t, num_windows_h * num_windows_w, vit_merger_window_size,
+        vit_merger_window_size)
+    seqlens = (index_padded != -100).sum([2, 3]).reshape(-1)
+    index_padded = index_padded.reshape(-1)
+    index_new = index_padded[index_padded != -100]
+    return index_new, seqlens
 
 
 class AscendQwen2_5_VisionAttention(Qwen2_5_VisionAttention):
@@ -328,63 +377,37 @@ class AscendQwen2_5_VisionTransformer(Qwen2_5_VisionTransformer):
         return loaded_params
 
     def rot_pos_emb(self, grid_thw: torch.Tensor) -> torch.Tensor:
-        pos_ids = []
-        for t, h, w in grid_thw:
-            hpos_ids = torch.arange(h).unsqueeze(1).expand(-1, w)
-            wpos_ids = torch.arange(w).unsqueeze(0).expand(h, -1)
-            hpos_ids = hpos_ids.reshape(
-                h // self.spatial_merge_size,
-                self.spatial_merge_size,
-                w // self.spatial_merge_size,
-                self.spatial_merge_size,
-            ).permute(0, 2, 1, 3).flatten()
-            wpos_ids = wpos_ids.reshape(
-                h // self.spatial_merge_size,
-                self.spatial_merge_size,
-                w // self.spatial_merge_size,
-                self.spatial_merge_size,
-            ).permute(0, 2, 1, 3).flatten()
-            pos_ids.append(
-                torch.stack([hpos_ids, wpos_ids], dim=-1).repeat(t, 1))
-        pos_ids = torch.cat(pos_ids, dim=0)
-        max_grid_size = grid_thw[:, 1:].max()
+        # One host sync for the whole batch instead of one per image.
+        grid_thw_list = grid_thw.tolist()
+        pos_ids = torch.cat([
+            _get_rot_pos_ids(t, h, w, self.spatial_merge_size)
+            for t, h, w in grid_thw_list
+        ],
+                            dim=0)
+        max_grid_size = max(max(h, w) for _, h, w in grid_thw_list)
         rotary_pos_emb_full = self.rotary_pos_emb(max_grid_size)
         rotary_pos_emb = rotary_pos_emb_full[pos_ids].flatten(1)
         return rotary_pos_emb
 
     def get_window_index(self, grid_thw):
         window_index: list = []
-        cu_window_seqlens: list = [0]
+        window_seqlens: list = []
         window_index_id = 0
         vit_merger_window_size = (self.window_size //
                                   self.spatial_merge_size // self.patch_size)
 
-        for grid_t, grid_h, grid_w in grid_thw:
-            llm_grid_h = grid_h // self.spatial_merge_size
-            llm_grid_w = grid_w // self.spatial_merge_size
-            index = torch.arange(grid_t * llm_grid_h * llm_grid_w).reshape(
-                grid_t, llm_grid_h, llm_grid_w)
-            pad_h = vit_merger_window_size - llm_grid_h % vit_merger_window_size
-            pad_w = vit_merger_window_size - llm_grid_w % vit_merger_window_size
-            num_windows_h = (llm_grid_h + pad_h) // vit_merger_window_size
-            num_windows_w = (llm_grid_w + pad_w) // vit_merger_window_size
-            index_padded = F.pad(index, (0, pad_w, 0, pad_h), 'constant', -100)
-            index_padded = index_padded.reshape(grid_t, num_windows_h,
-                                                vit_merger_window_size,
-                                                num_windows_w,
-                                                vit_merger_window_size)
-            index_padded = index_padded.permute(0, 1, 3, 2, 4).reshape(
-                grid_t, num_windows_h * num_windows_w, vit_merger_window_size,
-                vit_merger_window_size)
-            seqlens = (index_padded != -100).sum([2, 3]).reshape(-1)
-            index_padded = index_padded.reshape(-1)
-            index_new = index_padded[index_padded != -100]
+        for grid_t, grid_h, grid_w in grid_thw.tolist():
+            index_new, seqlens = _get_window_index(grid_t, grid_h, grid_w,
+                                                   self.spatial_merge_size,
+                                                   vit_merger_window_size)
             window_index.append(index_new + window_index_id)
-            cu_seqlens_tmp = seqlens.cumsum(
-                0) * self.spatial_merge_unit + cu_window_seqlens[-1]
-            cu_window_seqlens.extend(cu_seqlens_tmp.tolist())
-            window_index_id += (grid_t * llm_grid_h * llm_grid_w).item()
+            window_seqlens.append(seqlens)
+            window_index_id += (grid_t * (grid_h // self.spatial_merge_size) *
+                                (grid_w // self.spatial_merge_size))
         window_index = torch.cat(window_index, dim=0)
+        cu_window_seqlens = F.pad(
+            torch.cat(window_seqlens, dim=0).cumsum(0) *
+            self.spatial_merge_unit, (1, 0))
         return window_index, cu_window_seqlens
 
     def forward(
@@ -405,12 +428,12 @@ class AscendQwen2_5_VisionTransformer(Qwen2_5_VisionTransformer):
 
         # windows attention
         window_index, cu_window_seqlens = self.get_window_index(grid_thw)
-        cu_window_seqlens = torch.tensor(
-            cu_window_seqlens,
-            device=x.device,
-            dtype=grid_thw.dtype if torch.jit.is_tracing() else torch.int32)
+        # Window seqlens stay on the host, which is where the attention op
+        # expects them, so no device round trip is needed.
+        cu_window_seqlens = torch.as_tensor(cu_window_seqlens,
+                                            dtype=torch.int32)
         cu_window_seqlens = torch.unique_consecutive(cu_window_seqlens)
-        cu_window_seqlens = torch.diff(cu_window_seqlens).cpu().to(torch.int32)
+        cu_window_seqlens = torch.diff(cu_window_seqlens)
         seq_len, _ = x.size()
         x = x.reshape(seq_len // self.spatial_merge_unit,
                       self.spatial_merge_unit, -1)
@@ -15,7 +15,7 @@
 # limitations under the License.
 #
 
-from typing import Callable, Optional
+from typing import Any, Callable, Optional, Tuple, Union
 
 import torch
 from vllm.config import CompilationLevel, get_current_vllm_config
@@ -26,6 +26,8 @@ from vllm.model_executor.layers.fused_moe.layer import \
 from vllm_ascend.ascend_config import get_ascend_config
 from vllm_ascend.ops.fused_moe import fused_experts_moge, unified_fused_experts
 from vllm_ascend.ops.layers.experts_selector import select_experts
+from vllm_ascend.ops.moe_dispatcher.shared_expert_overlap import \
+    create_shared_expert_overlap
 from vllm_ascend.utils import is_310p
 
 original_unquantized_fused_moe_init_func = UnquantizedFusedMoEMethod.__init__
@@ -44,6 +46,8 @@ def unquantized_fused_moe_init_func(self, *args, **kwargs):
         self.use_aclgraph = (vllm_config.compilation_config.level
                              == CompilationLevel.PIECEWISE
                              and not vllm_config.model_config.enforce_eager)
+    self.shared_expert_overlap = create_shared_expert_overlap(
+        ascend_config.enable_shared_expert_overlap)
 
 
 def forward_oot(
@@ -66,7 +70,9 @@ def forward_oot(
         enable_eplb: bool = False,
         expert_load_view: Optional[torch.Tensor] = None,
         logical_to_physical_map: Optional[torch.Tensor] = None,
-        logical_replica_count: Optional[torch.Tensor] = None) -> torch.Tensor:
+        logical_replica_count: Optional[torch.Tensor] = None,
+        shared_experts: Optional[Any] = None
+) -> Union[torch.Tensor, Tuple[torch.Tensor, Any]]:
 
     topk_weights, topk_ids = select_experts(
         hidden_states=x,
@@ -83,7 +89,7 @@ def forward_oot(
 
     if topk_ids.shape[1] < top_k or is_310p():
         assert global_num_experts is not None
-        return fused_experts_moge(
+        hidden_states = fused_experts_moge(
             hidden_states=x,
             w1=layer.w13_weight,
             w2=layer.w2_weight,
@@ -94,6 +100,9 @@ def forward_oot(
             global_num_experts=global_num_experts,
             expert_map=expert_map,
             apply_router_weight_on_input=apply_router_weight_on_input)
+        if shared_experts is not None:
+            return hidden_states, shared_experts(x)
+        return hidden_states
 
     moe_comm_method = get_forward_context().moe_comm_method
 
@@ -106,6 +115,8 @@ def forward_oot(
         global_num_experts=global_num_experts,
         expert_map=expert_map,
         moe_comm_method=moe_comm_method,
+        shared_experts=shared_experts,
+        shared_expert_overlap=self.shared_expert_overlap,
     )
 
 
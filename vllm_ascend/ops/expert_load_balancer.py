@@ -1,17 +1,29 @@
 import json
-import random
-from typing import Dict, List
+import os
+from typing import Dict, Optional, Tuple
 
 import torch
 
 
 class ExpertLoadBalancer(object):
 
-    def __init__(self, expert_map_path, global_expert_num):
+    def __init__(self,
+                 expert_map_path,
+                 global_expert_num,
+                 log2phy_policy="random",
+                 num_nodes=1,
+                 log2phy_table_width=12):
         self.expert_map_path = expert_map_path
         self.global_expert_num = global_expert_num
+        self.log2phy_policy = log2phy_policy
+        self.num_nodes = num_nodes
+        self.log2phy_table_width = log2phy_table_width
         self.expert_map_tensor, self.layers_num, self.ranks_num = (
             self._expert_file_to_tensor())
+        # Placement and log2phy tables of all layers, built on first use.
+        self._expert_placement_map: Optional[torch.Tensor] = None
+        self._local_expert_num: Optional[torch.Tensor] = None
+        self._log2phy_map: Optional[torch.Tensor] = None
 
     def _expert_file_to_tensor(self):
         with open(self.expert_map_path, "r") as f:
@@ -28,72 +40,303 @@ class ExpertLoadBalancer(object):
         expert_map_tensor = torch.tensor(tensor_data, dtype=torch.int32)
         return expert_map_tensor, layers_num, gpus_num
 
-    def generate_index_dicts(self, tensor_2d):
-        dict_list = []
-        current_idx = 0
-
-        for row in tensor_2d:
-            value_to_index = {}
-            for i in range(row.size(0)):
-                value = row[i].item()
-                value_to_index[value] = current_idx + i
-            dict_list.append(value_to_index)
-            current_idx += row.size(0)
-
-        return dict_list
-
     def generate_expert_placement_map(self):
-        expert_placement_map = torch.full(
-            (self.layers_num, self.ranks_num, self.global_expert_num),
-            -1,
-            dtype=torch.int32,
-        )
-        for layer_id in range(self.layers_num):
-            for gpu_id in range(self.ranks_num):
-                e_ids = self.expert_map_tensor[layer_id, gpu_id]
-                expert_placement_map[layer_id, gpu_id,
-                                     e_ids] = torch.arange(len(e_ids),
-                                                           dtype=torch.int32)
-        return expert_placement_map
+        if self._expert_placement_map is None:
+            self._expert_placement_map = build_expert_placement_map(
+                self.expert_map_tensor, self.global_expert_num)
+            self._local_expert_num = torch.ne(self._expert_placement_map,
+                                              -1).sum(dim=-1)
+        return self._expert_placement_map
 
     def generate_log2phy_expert_map(self, layer_id):
-        concatenated = torch.flatten(self.expert_map_tensor[layer_id])
-        rank_expert_to_global = self.generate_index_dicts(
-            self.expert_map_tensor[layer_id])
-        result_dict: Dict[int, List[int]] = {}
-        for idx, value in enumerate(concatenated):
-            key = value.item()
-            if key not in result_dict:
-                result_dict[key] = []
-            result_dict[key].append(idx)
-
-        log2phy_map = torch.full((self.ranks_num, self.global_expert_num),
-                                 -1,
-                                 dtype=torch.int32)
-        for rank in range(self.ranks_num):
-            for key in result_dict:
-                indices_in_concat = result_dict[key]
-                if key in rank_expert_to_global[rank]:
-                    log2phy_map[rank][key] = rank_expert_to_global[rank][key]
-                else:
-                    chosen_index = random.choice(indices_in_concat)
-                    log2phy_map[rank][key] = chosen_index
-        return log2phy_map
+        if self._log2phy_map is None:
+            self._log2phy_map = build_log2phy_table(
+                self.expert_map_tensor, self.generate_expert_placement_map(),
+                self.global_expert_num, self.log2phy_policy, self.num_nodes,
+                self.log2phy_table_width)
+        return self._log2phy_map[layer_id]
 
     def get_rank_placement_map(self, layer_id, rank_id):
         expert_placement_map = self.generate_expert_placement_map()
-        layer_expert_map = expert_placement_map[layer_id]
-        rank_expert_map = layer_expert_map[rank_id].to(
-            torch.npu.current_device())
-        rank_local_expert_num = torch.sum(torch.ne(rank_expert_map, -1)).item()
+        rank_expert_map = expert_placement_map[layer_id, rank_id].to(
+            torch.npu.current_device(), copy=True)
+        assert self._local_expert_num is not None
+        rank_local_expert_num = self._local_expert_num[layer_id,
+                                                       rank_id].item()
         return rank_local_expert_num, rank_expert_map
 
     def get_rank_log2phy_map(self, layer_id, rank_id):
         layer_log2phy_map = self.generate_log2phy_expert_map(layer_id)
-        return layer_log2phy_map[rank_id]
+        return layer_log2phy_map[rank_id].clone()
 
     def get_global_redundant_expert_num(self):
         global_redundant_expert_num = (
             len(self.expert_map_tensor[0][0]) * self.ranks_num -
             self.global_expert_num)
         return global_redundant_expert_num
+
+
+def build_expert_placement_map(expert_map_tensor: torch.Tensor,
+                               global_expert_num: int) -> torch.Tensor:
+    """Maps every logical expert to its local slot on each rank, or -1.
+
+    ``expert_map_tensor`` is ``[..., ranks_num, local_num]`` and holds the
+    logical expert of each physical slot; the result is
+    ``[..., ranks_num, global_expert_num]``. A rank may hold at most one
+    replica of each logical expert.
+    """
+    sorted_experts = expert_map_tensor.sort(-1).values
+    if torch.any(sorted_experts[..., 1:] == sorted_experts[..., :-1]):
+        raise ValueError(
+            "A rank holds several replicas of the same logical expert")
+    expert_placement_map = torch.full(
+        (*expert_map_tensor.shape[:-1], global_expert_num),
+        -1,
+        dtype=torch.int32,
+    )
+    local_ids = torch.arange(expert_map_tensor.shape[-1],
+                             dtype=torch.int32).expand_as(expert_map_tensor)
+    expert_placement_map.scatter_(-1, expert_map_tensor.long(), local_ids)
+    return expert_placement_map
+
+
+def build_log2phy_map(
+        expert_map_tensor: torch.Tensor,
+        expert_placement_map: torch.Tensor,
+        global_expert_num: int,
+        replica_fraction: Optional[torch.Tensor] = None) -> torch.Tensor:
+    """Maps every logical expert to a physical expert id on each rank.
+
+    A rank maps each logical expert to its own copy if it holds one,
+    otherwise to one of the physical replicas of that expert, selected by
+    ``replica_fraction`` in ``[0, 1)`` (broadcastable to
+    ``[layers_num, ranks_num, global_expert_num]``). Replicas are picked at
+    random if it is not given. Experts without any replica map to -1.
+    """
+    squeeze = expert_map_tensor.dim() == 2
+    if squeeze:
+        expert_map_tensor = expert_map_tensor.unsqueeze(0)
+        expert_placement_map = expert_placement_map.unsqueeze(0)
+    layers_num, ranks_num, local_num = expert_map_tensor.shape
+
+    # Physical replica ids of every layer, grouped by logical expert.
+    flat_experts = expert_map_tensor.reshape(layers_num, -1).long()
+    _, replicas = torch.sort(flat_experts, dim=1, stable=True)
+    replica_num = torch.zeros(layers_num, global_expert_num, dtype=torch.long)
+    replica_num.scatter_add_(1, flat_experts, torch.ones_like(flat_experts))
+    replica_offset = torch.cumsum(replica_num, dim=1) - replica_num
+
+    if replica_fraction is None:
+        replica_fraction = torch.rand(layers_num, ranks_num,
+                                      global_expert_num)
+    choice = (replica_fraction * replica_num.unsqueeze(1)).long()
+    choice = torch.minimum(choice, (replica_num - 1).clamp(min=0)
+                           .unsqueeze(1))
+    choice = (choice + replica_offset.unsqueeze(1)).clamp(
+        max=replicas.shape[1] - 1)
+    remote = replicas.gather(1, choice.reshape(layers_num, -1)).reshape(
+        layers_num, ranks_num, global_expert_num)
+
+    rank_offset = (torch.arange(ranks_num) * local_num).view(1, -1, 1)
+    local = expert_placement_map.long() + rank_offset
+    log2phy_map = torch.where(expert_placement_map != -1, local, remote)
+    log2phy_map = torch.where((replica_num == 0).unsqueeze(1),
+                              torch.full_like(log2phy_map, -1), log2phy_map)
+    log2phy_map = log2phy_map.to(torch.int32)
+    return log2phy_map.squeeze(0) if squeeze else log2phy_map
+
+
+LOG2PHY_POLICIES = ("random", "nearest", "round_robin", "load_weighted")
+
+
+def build_log2phy_table(expert_map_tensor: torch.Tensor,
+                        expert_placement_map: torch.Tensor,
+                        global_expert_num: int,
+                        policy: str = "nearest",
+                        num_nodes: int = 1,
+                        width: int = 12,
+                        expert_load: Optional[torch.Tensor] = None
+                        ) -> torch.Tensor:
+    """Maps every logical expert to physical replicas on each rank.
+
+    A rank uses its own copy of an expert if it holds one, else the replicas
+    on its node if there are any, else all replicas. Among those:
+
+    - ``random``: one replica picked at random, see ``build_log2phy_map``.
+    - ``nearest``: one replica, spreading the ranks evenly over them.
+    - ``round_robin``: a ``width``-wide row per expert that cycles through
+      the replicas, so consecutive tokens go to different replicas. Rows are
+      rotated by rank.
+    - ``load_weighted``: like ``round_robin``, but each replica gets a share
+      of the row inversely proportional to the load of its rank, estimated
+      from ``expert_load`` (``[..., global_expert_num]``, uniform if not
+      given) split evenly over the replicas of every expert.
+
+    Static policies return ``[..., ranks_num, global_expert_num]``, the
+    others ``[..., ranks_num, global_expert_num, width]``; both are applied
+    by ``map_logical_to_physical``. Experts without any replica map to -1.
+    """
+    if policy not in LOG2PHY_POLICIES:
+        raise ValueError(f"Unknown log2phy policy {policy}, expected one of "
+                         f"{LOG2PHY_POLICIES}")
+    if policy == "random":
+        return build_log2phy_map(expert_map_tensor, expert_placement_map,
+                                 global_expert_num)
+    squeeze = expert_map_tensor.dim() == 2
+    if squeeze:
+        expert_map_tensor = expert_map_tensor.unsqueeze(0)
+        if expert_load is not None:
+            expert_load = expert_load.unsqueeze(0)
+    layers_num, ranks_num, local_num = expert_map_tensor.shape
+    assert ranks_num % num_nodes == 0
+    ranks_per_node = ranks_num // num_nodes
+    physical_rank = torch.arange(ranks_num * local_num) // local_num
+    rank_ids = torch.arange(ranks_num).view(-1, 1, 1)
+    # Column j of rank r is served by preferred replica (j + r) % count.
+    columns = torch.arange(width) + rank_ids
+    if policy == "load_weighted":
+        # Evenly spaced positions in the replica weight CDF, shifted per
+        # rank and interleaved so that every replica's share of the row is
+        # spread over it.
+        golden = (torch.arange(width) * 0.6180339887).frac()
+        positions = (golden.argsort().argsort()[columns % width] +
+                     (rank_ids * 0.6180339887).frac()) / width
+
+    tables = []
+    for layer_id in range(layers_num):
+        experts = expert_map_tensor[layer_id].reshape(-1).long()
+        # [global_expert_num, physical_num]
+        is_replica = experts == torch.arange(global_expert_num).view(-1, 1)
+        local = is_replica & (physical_rank == rank_ids)
+        same_node = is_replica & (physical_rank // ranks_per_node
+                                  == rank_ids // ranks_per_node)
+        preferred = torch.where(
+            local.any(-1, keepdim=True), local,
+            torch.where(same_node.any(-1, keepdim=True), same_node,
+                        is_replica))
+        if policy == "load_weighted":
+            load = (torch.ones(global_expert_num) if expert_load is None else
+                    expert_load[layer_id].float().cpu())
+            replica_load = (load / is_replica.sum(-1).clamp(min=1))[experts]
+            rank_load = replica_load.view(ranks_num, -1).sum(-1)
+            replica_weight = 1 / rank_load.clamp(min=1e-6)[physical_rank]
+            cdf = (preferred * replica_weight).cumsum(-1)
+            cdf = cdf / cdf[..., -1:].clamp(min=1e-12)
+            table = torch.searchsorted(
+                cdf,
+                positions.expand(-1, global_expert_num, -1).contiguous(),
+                right=True)
+        else:
+            # Physical id of the k-th preferred replica.
+            count = preferred.sum(-1, keepdim=True)
+            if policy == "nearest":
+                # Deal the replicas out to the ranks that share them, in
+                # the node or in all nodes, starting at a per-expert offset.
+                has_same_node = same_node.any(-1)
+                shares_node = has_same_node & ~local.any(-1)
+                node_index = shares_node.view(num_nodes, ranks_per_node,
+                                              -1).cumsum(1).view_as(
+                                                  shares_node)
+                rank_index = torch.where(has_same_node, node_index,
+                                         (~has_same_node).cumsum(0))
+                kth = (rank_index + torch.arange(global_expert_num)
+                       ).unsqueeze(-1) % count.clamp(min=1) + 1
+            else:
+                kth = columns % count.clamp(min=1) + 1
+            table = torch.searchsorted(preferred.cumsum(-1), kth)
+        table = table.clamp(max=is_replica.shape[-1] - 1)
+        table = torch.where(
+            is_replica.any(-1).view(-1, 1), table,
+            torch.full_like(table, -1))
+        tables.append(table)
+    log2phy_table = torch.stack(tables).to(torch.int32)
+    if policy == "nearest":
+        log2phy_table = log2phy_table.squeeze(-1)
+    return log2phy_table.squeeze(0) if squeeze else log2phy_table
+
+
+def map_logical_to_physical(topk_ids: torch.Tensor,
+                            log2phy: torch.Tensor) -> torch.Tensor:
+    """Routes ``topk_ids`` [num_tokens, top_k] to physical experts with a
+    rank's log2phy map or table from ``build_log2phy_table``."""
+    if log2phy.dim() == 1:
+        return log2phy[topk_ids]
+    column = torch.arange(topk_ids.shape[0],
+                          dtype=topk_ids.dtype,
+                          device=topk_ids.device) % log2phy.shape[-1]
+    return log2phy[topk_ids, column.unsqueeze(-1)]
+
+
+def generate_force_balance_topk_ids(topk_ids: torch.Tensor,
+                                    num_experts: int,
+                                    ep_rank: int = 0,
+                                    ep_size: int = 1) -> torch.Tensor:
+    """Deterministic routing of profile and dummy runs, replacing
+    ``topk_ids`` [num_tokens, top_k].
+
+    Token t of EP rank r is routed to the ``top_k`` experts following
+    ``(t * ep_size + r) * top_k`` round robin over ``num_experts``, so the
+    tokens of all ranks cover every expert evenly and each rank receives the
+    most tokens a balanced routing gives it, run after run. Pass the number of
+    physical experts, redundant ones included, to route on physical ids when
+    the comm path would otherwise map the ids with log2phy.
+    """
+    num_tokens, top_k = topk_ids.shape
+    token_idx = torch.arange(num_tokens,
+                             dtype=torch.int64,
+                             device=topk_ids.device)
+    start = (token_idx * ep_size + ep_rank) * top_k
+    slot_idx = torch.arange(top_k, dtype=torch.int64, device=topk_ids.device)
+    return ((start.unsqueeze(1) + slot_idx) % num_experts).to(topk_ids.dtype)
+
+
+def save_expert_map(expert_map_tensor: torch.Tensor,
+                    expert_map_path: str) -> None:
+    """Writes a ``[layers_num, ranks_num, local_num]`` placement to a JSON
+    file in the ``expert_map_path`` format read by ExpertLoadBalancer."""
+    layers_num, ranks_num, _ = expert_map_tensor.shape
+    data = {
+        "moe_layer_count":
+        layers_num,
+        "layer_list": [{
+            "layer_id":
+            layer_id,
+            "device_count":
+            ranks_num,
+            "device_list": [{
+                "device_id": rank_id,
+                "device_expert": device_expert
+            } for rank_id, device_expert in enumerate(layer)]
+        } for layer_id, layer in enumerate(expert_map_tensor.tolist())]
+    }
+    with open(expert_map_path, "w") as f:
+        json.dump(data, f, indent=4)
+
+
+_EXPERT_LOAD_BALANCERS: Dict[Tuple, ExpertLoadBalancer] = {}
+
+
+def get_expert_load_balancer(expert_map_path,
+                             global_expert_num,
+                             log2phy_policy="random",
+                             num_nodes=1,
+                             log2phy_table_width=12) -> ExpertLoadBalancer:
+    """Returns the process-wide ExpertLoadBalancer of an expert map file.
+
+    Every MoE layer shares the same expert map, so the file is parsed and the
+    placement tables are built only once; each layer then reads its slice.
+    """
+    path = os.path.abspath(expert_map_path)
+    key = (path, os.path.getmtime(path), global_expert_num, log2phy_policy,
+           num_nodes, log2phy_table_width)
+    expert_load_balancer = _EXPERT_LOAD_BALANCERS.get(key)
+    if expert_load_balancer is None:
+        expert_load_balancer = ExpertLoadBalancer(path, global_expert_num,
+                                                  log2phy_policy, num_nodes,
+                                                  log2phy_table_width)
+        _EXPERT_LOAD_BALANCERS[key] = expert_load_balancer
+    return expert_load_balancer
+
+
+def clear_expert_load_balancer_cache():
+    _EXPERT_LOAD_BALANCERS.clear()
@@ -15,6 +15,7 @@
 # This file is a part of the vllm-ascend project.
 # Adapted from vllm/tests/kernels/test_moe.py
 
+import math
 import os
 from typing import Any, Callable, Optional, Tuple, Union
 
@@ -45,8 +46,13 @@ from vllm_ascend.distributed.communication_op import \
     data_parallel_reduce_scatter
 from vllm_ascend.distributed.moe_comm_method import MoECommMethod
 from vllm_ascend.distributed.parallel_state import get_mc2_group
-from vllm_ascend.ops.expert_load_balancer import ExpertLoadBalancer
+from vllm_ascend.eplb.expert_load_collector import (
+    get_expert_load_collector, record_expert_load)
+from vllm_ascend.ops.expert_load_balancer import (
+    generate_force_balance_topk_ids, get_expert_load_balancer)
 from vllm_ascend.ops.layers.experts_selector import select_experts
+from vllm_ascend.ops.moe_dispatcher.shared_expert_overlap import (
+    SharedExpertOverlap, create_shared_expert_overlap)
 from vllm_ascend.ops.moe_dispatcher.token_dispatcher import (
     MoEAlltoAllSeqOverLapDispatcher, MoEDispatcherConfig)
 from vllm_ascend.ops.sequence_parallel import MetadataForPadding
@@ -82,10 +88,11 @@ def unified_fused_experts(
     shared_experts: Optional[Any] = None,
     quantized_x_for_share: Optional[Any] = None,
     dynamic_scale_for_share: Optional[Any] = None,
+    shared_expert_overlap: Optional[SharedExpertOverlap] = None,
     # For load balance
     log2phy: torch.Tensor = None,
     global_redundant_expert_num: int = 0,
-) -> torch.Tensor:
+) -> Union[torch.Tensor, Tuple[torch.Tensor, Any]]:
     # Check constraints
     assert hidden_states.shape[1] == w1.shape[2], (
         f"Hidden size mismatch {hidden_states.shape[1]} != {w1.shape[2]}")
@@ -101,6 +108,12 @@ def unified_fused_experts(
 
     num_experts = w1.shape[0]
 
+    if shared_experts is not None:
+        if shared_expert_overlap is None:
+            shared_hidden_states = shared_experts(hidden_states)
+        else:
+            shared_expert_overlap.launch(shared_experts, hidden_states)
+
     permuted_hidden_states, expert_tokens, group_list_type = torch.ops.vllm.moe_comm_pre_process(
         hidden_states, topk_ids, topk_weights, expert_map, num_experts)
     mlp_output = apply_mlp(
@@ -110,8 +123,14 @@ def unified_fused_experts(
         expert_tokens,
         group_list_type=group_list_type,
     )
+    if shared_experts is not None and shared_expert_overlap is not None:
+        # The post process writes hidden_states in place, so the shared
+        # experts must be done reading it.
+        shared_hidden_states = shared_expert_overlap.merge()
     torch.ops.vllm.moe_comm_post_process(mlp_output, hidden_states)
 
+    if shared_experts is not None:
+        return hidden_states, shared_hidden_states
     return hidden_states
 
 
@@ -738,11 +757,12 @@ def fused_experts_with_all2allv(
     hidden_states: torch.Tensor,
     w1: torch.Tensor,
     w2: torch.Tensor,
+    max_num_tokens: Optional[int] = None,
 ):
     # Enable moe alltoallv, it's a balanced policy for precision and efficiency.
     (share_experts_output, dispatched_input,
      tokens_per_expert) = (token_dispatcher.token_permutation(
-         hidden_states, probs, routing_map))
+         hidden_states, probs, routing_map, max_num_tokens))
 
     expert_output = apply_mlp(dispatched_input, w1, w2, tokens_per_expert)
     output, mlp_bias = token_dispatcher.token_unpermutation(expert_output)
@@ -988,13 +1008,17 @@ class AscendUnquantizedFusedMoEMethod(UnquantizedFusedMoEMethod):
             e_score_correction_bias=e_score_correction_bias,
             global_num_experts=global_num_experts,
             is_unquantized=True)
+        if not enable_force_load_balance:
+            record_expert_load(layer, topk_ids)
 
         topk_weights = topk_weights.to(x.dtype)
-        # this is a naive implementation for experts load balance so as
-        # to avoid accumulating too much tokens on a single rank.
-        # currently it is only activated when doing profile runs.
+        # Balanced routing to avoid accumulating too much tokens on a single
+        # rank, only activated when doing profile runs.
         if enable_force_load_balance and not self.use_aclgraph:
-            topk_ids = torch.randint_like(topk_ids, 0, global_num_experts)
+            moe_parallel_config = self.moe.moe_parallel_config
+            topk_ids = generate_force_balance_topk_ids(
+                topk_ids, global_num_experts, moe_parallel_config.ep_rank,
+                moe_parallel_config.ep_size)
 
         fused_moe_state = get_forward_context().fused_moe_state
 
@@ -1042,6 +1066,7 @@ class AscendUnquantizedFusedMoEMethod(UnquantizedFusedMoEMethod):
                 hidden_states=x,
                 w1=layer.w13_weight,
                 w2=layer.w2_weight,
+                max_num_tokens=kwargs.get("max_num_tokens"),
             )
         else:
             return fused_experts_with_all2all(hidden_states=x,
@@ -1152,8 +1177,11 @@ class AscendFusedMoE(FusedMoE):
         expert_map_path = ascend_config.expert_map_path
         if expert_map_path and os.path.exists(expert_map_path):
             # moe expert load balance
-            expert_load_balancer = ExpertLoadBalancer(expert_map_path,
-                                                      self.global_num_experts)
+            eplb_config = ascend_config.eplb_config
+            expert_load_balancer = get_expert_load_balancer(
+                expert_map_path, self.global_num_experts,
+                eplb_config.log2phy_policy, eplb_config.num_nodes,
+                eplb_config.log2phy_table_width)
             self.local_num_experts, self.expert_map = \
                                 expert_load_balancer.get_rank_placement_map(
                                                 self.moe_instance_id,
@@ -1169,11 +1197,21 @@ class AscendFusedMoE(FusedMoE):
                 self.ep_size,
                 get_ep_group().rank_in_group, self.global_num_experts)
 
+        self.expert_load_collector = None
+        if ascend_config.eplb_config.collect_expert_load:
+            self.expert_load_collector = get_expert_load_collector()
+            assert self.expert_load_collector is not None
+            self.expert_load_collector.register_layer(
+                self.moe_instance_id, self.global_num_experts,
+                torch.npu.current_device())
+
         self.torchair_graph_enabled = ascend_config.torchair_graph_config.enabled
         self.enable_multistream_moe = \
             ascend_config.torchair_graph_config.enable_multistream_moe and \
             self.torchair_graph_enabled
         self.enable_shared_expert_dp = ascend_config.enable_shared_expert_dp
+        self.shared_expert_overlap = create_shared_expert_overlap(
+            ascend_config.enable_shared_expert_overlap)
 
         if self.scoring_func != "softmax" and not self.use_grouped_topk:
             raise ValueError("Only softmax scoring function is supported for "
@@ -1219,13 +1257,19 @@ class AscendFusedMoE(FusedMoE):
         if envs_ascend.VLLM_ASCEND_ENABLE_MOE_ALL2ALL_SEQ and isinstance(
                 self.quant_method, AscendUnquantizedFusedMoEMethod):
             self.reduce_results = False
+            capacity_factor = envs_ascend.VLLM_ASCEND_MOE_EXPERT_CAPACITY_FACTOR
             moe_dispatcher_config = (
                 MoEDispatcherConfig().set_num_moe_experts(
                     self.global_num_experts).set_num_local_experts(
                         self.local_num_experts).set_moe_router_topk(
                             top_k).set_group_topk(topk_group).
                 set_num_groups(num_expert_group).set_expert_bias(
-                    e_score_correction_bias).set_scaling_factor(1.0).build())
+                    e_score_correction_bias).set_scaling_factor(1.0).
+                set_moe_expert_capacity_factor(capacity_factor).
+                set_moe_pad_expert_input_to_capacity(
+                    capacity_factor is not None).
+                set_moe_reroute_dropped_tokens(
+                    envs_ascend.VLLM_ASCEND_MOE_REROUTE_DROPPED_TOKENS).build())
             self.token_dispatcher = MoEAlltoAllSeqOverLapDispatcher(
                 moe_dispatcher_config)
             if envs_ascend.VLLM_ASCEND_ENABLE_DBO:
@@ -1292,7 +1336,12 @@ class AscendFusedMoE(FusedMoE):
         if shared_experts:
             if not self.enable_multistream_moe or fused_moe_state != FusedMoEState.MC2:
                 # When all_reduce_merge is in progress, shared_experts does not do all_reduce in mlp, but waits until shared_experts+router_experts are completed before doing all_reduce
-                shared_hidden_states = shared_experts(hidden_states)
+                if self.shared_expert_overlap is not None:
+                    # Overlap with the routed experts, merged after them.
+                    self.shared_expert_overlap.launch(shared_experts,
+                                                      hidden_states)
+                else:
+                    shared_hidden_states = shared_experts(hidden_states)
 
         mc2_mask = forward_context.mc2_mask
 
@@ -1364,6 +1413,17 @@ class AscendFusedMoE(FusedMoE):
                     router_logits = self.naive_multicast(
                         router_logits, cu_tokens_across_dp_cpu)
 
+        max_num_tokens = None
+        if self.token_dispatcher is not None:
+            # The fixed-capacity AlltoAll needs the same buffer size on every
+            # EP rank, bound the tokens of this rank by the largest DP rank
+            # and its TP chunk.
+            max_num_tokens = forward_context.max_tokens_across_dp
+            if tp_size > 1 and (replace_allreduce
+                                or not self.enable_shared_expert_dp):
+                max_num_tokens = math.ceil(
+                    max(max_num_tokens, tp_size) / tp_size)
+
         # Matrix multiply.
         e_hidden_states = self.quant_method.apply(
             layer=self,
@@ -1387,6 +1447,7 @@ class AscendFusedMoE(FusedMoE):
             and self.enable_multistream_moe and not is_prefill else None,
             mc2_mask=mc2_mask,
             token_dispatcher=self.token_dispatcher,
+            max_num_tokens=max_num_tokens,
             quantized_x_for_share=quantized_x_for_share,
             dynamic_scale_for_share=dynamic_scale_for_share,
         )
@@ -1394,6 +1455,11 @@ class AscendFusedMoE(FusedMoE):
         if shared_experts:
             if isinstance(e_hidden_states, tuple):
                 e_hidden_states, shared_hidden_states = e_hidden_states
+            if (self.shared_expert_overlap is not None
+                    and self.shared_expert_overlap.launched):
+                # Merge before the collectives below, which may use the same
+                # communicator as the shared experts.
+                shared_hidden_states = self.shared_expert_overlap.merge()
 
         if (fused_moe_state not in [
                 FusedMoEState.AllGather, FusedMoEState.AllGatherEP,
@@ -0,0 +1,102 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from typing import Any, Callable, Optional
+
+import torch
+import torch_npu  # noqa: F401
+from vllm.distributed import get_tensor_model_parallel_world_size
+from vllm.logger import logger
+
+
+def _record_stream(output: Any, stream: torch.npu.Stream) -> None:
+    if isinstance(output, torch.Tensor):
+        output.record_stream(stream)
+    elif isinstance(output, (tuple, list)):
+        for item in output:
+            _record_stream(item, stream)
+
+
+class SharedExpertOverlap:
+    """
+    Runs the shared experts of a MoE layer on a secondary stream, so that
+    they overlap with the routed experts on the current stream: routing,
+    dispatch communication, the expert MLP and the combine.
+
+    `launch` forks the secondary stream from the current one with an event
+    and `merge` joins it back with another event, so the order is kept under
+    ACL graph capture as well. The input of the shared experts must not be
+    written in place on the current stream before `merge`, and collectives on
+    the communicator used by the shared experts must not be issued on the
+    current stream in between.
+
+    The shared experts must not issue collectives themselves: the order of
+    their TP all-reduce on the secondary stream and of the EP/DP collectives
+    of the routed experts on the current stream is not fixed, so ranks could
+    enter the two communicators in different orders and hang. Use
+    `create_shared_expert_overlap`, which only overlaps without TP.
+    """
+
+    # Shared by all MoE layers, they run one after another.
+    stream: Optional[torch.npu.Stream] = None
+
+    def __init__(self):
+        if SharedExpertOverlap.stream is None:
+            SharedExpertOverlap.stream = torch.npu.Stream()
+        self.stream = SharedExpertOverlap.stream
+        self.input_ready_event = torch.npu.Event()
+        self.done_event = torch.npu.Event()
+        self.output: Any = None
+        self.launched = False
+
+    def launch(self, shared_experts: Callable, hidden_states: torch.Tensor):
+        """Starts ``shared_experts(hidden_states)`` on the secondary stream."""
+        assert not self.launched, "The last shared experts are not merged."
+        self.input_ready_event.record()
+        with torch.npu.stream(self.stream):
+            self.input_ready_event.wait()
+            self.output = shared_experts(hidden_states)
+            self.done_event.record()
+        # Keep the input alive until the secondary stream is done with it.
+        hidden_states.record_stream(self.stream)
+        self.launched = True
+
+    def merge(self) -> Any:
+        """Waits for the shared experts on the current stream and returns
+        their output."""
+        assert self.launched, "The shared experts are not launched."
+        current_stream = torch.npu.current_stream()
+        self.done_event.wait(current_stream)
+        # The output is allocated on the secondary stream and used here.
+        _record_stream(self.output, current_stream)
+        output, self.output = self.output, None
+        self.launched = False
+        return output
+
+
+def create_shared_expert_overlap(
+        enabled: bool) -> Optional[SharedExpertOverlap]:
+    """Returns the overlap of the shared experts of a MoE layer, or None if
+    it is disabled or the shared experts all-reduce over TP ranks."""
+    if not enabled:
+        return None
+    if get_tensor_model_parallel_world_size() > 1:
+        logger.warning_once(
+            "enable_shared_expert_overlap is ignored with tensor parallel "
+            "size > 1: the TP all-reduce of the shared experts must not run "
+            "concurrently with the routed-expert collectives.")
+        return None
+    return SharedExpertOverlap()
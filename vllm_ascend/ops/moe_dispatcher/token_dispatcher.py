@@ -21,6 +21,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import math
 from abc import ABC, abstractmethod
 from typing import Any, Optional
 
@@ -47,6 +48,8 @@ class MoEDispatcherConfig:
         self.num_moe_experts: int = 0
         self.moe_pad_expert_input_to_capacity: bool = False
         self.moe_expert_capacity_factor: Optional[float] = None
+        self.moe_token_drop_policy: str = "probs"
+        self.moe_reroute_dropped_tokens: bool = False
         self.moe_router_topk: int = 2
         self.moe_grouped_gemm: bool = False
         self.group_topk: int = 0
@@ -72,6 +75,14 @@ class MoEDispatcherConfig:
         self.moe_expert_capacity_factor = moe_expert_capacity_factor
         return self
 
+    def set_moe_token_drop_policy(self, moe_token_drop_policy):
+        self.moe_token_drop_policy = moe_token_drop_policy
+        return self
+
+    def set_moe_reroute_dropped_tokens(self, moe_reroute_dropped_tokens):
+        self.moe_reroute_dropped_tokens = moe_reroute_dropped_tokens
+        return self
+
     def set_moe_router_topk(self, moe_router_topk):
         self.moe_router_topk = moe_router_topk
         return self
@@ -210,6 +221,33 @@ class MoEAlltoAllSeqOverLapDispatcher(MoEDispatcher):
         self.perm1_finish_event = None
         self.global_input_tokens_local_experts_indices = None
 
+        # Fixed-capacity mode: every rank sends exactly `capacity` tokens to
+        # each expert, so the AlltoAll splits are static and neither a host
+        # sync nor a dynamic shape is needed.
+        self.fixed_capacity = config.moe_expert_capacity_factor is not None
+        if (config.moe_pad_expert_input_to_capacity
+                and not self.fixed_capacity):
+            raise ValueError(
+                "moe_pad_expert_input_to_capacity requires "
+                "moe_expert_capacity_factor.")
+        if self.fixed_capacity:
+            if not config.moe_pad_expert_input_to_capacity:
+                raise ValueError(
+                    "Dropping tokens without padding to capacity is not "
+                    "supported, set moe_pad_expert_input_to_capacity.")
+            if config.moe_expert_capacity_factor <= 0:
+                raise ValueError(
+                    "moe_expert_capacity_factor must be positive, got "
+                    f"{config.moe_expert_capacity_factor}.")
+            if config.moe_token_drop_policy not in ("probs", "position"):
+                raise ValueError(
+                    "moe_token_drop_policy must be 'probs' or 'position', "
+                    f"got {config.moe_token_drop_policy}.")
+        self.capacity = 0
+        self.capacity_slots = None
+        self.capacity_slot_tokens = None
+        self.capacity_probs = None
+
         if MoEAlltoAllSeqOverLapDispatcher.overlap_stream is None:
             MoEAlltoAllSeqOverLapDispatcher.overlap_stream = torch.npu.Stream()
 
@@ -294,11 +332,162 @@ class MoEAlltoAllSeqOverLapDispatcher(MoEDispatcher):
 
         return num_tokens_per_local_expert
 
+    def capacity_preprocess(
+            self,
+            indices: torch.Tensor,
+            probs: torch.Tensor,
+            max_num_tokens: Optional[int] = None) -> torch.Tensor:
+        """
+        Assigns every token-expert pair a slot in a buffer of `capacity`
+        slots per expert, for the fixed-capacity mode.
+
+        Pairs beyond the capacity of their expert are dropped, the ones with
+        the lowest probs first with the "probs" drop policy, else the last
+        tokens. With `moe_reroute_dropped_tokens`, the probs of a token are
+        renormalized over its kept experts, so that its other selected
+        experts take over the share of the dropped ones. All of it runs on
+        device with static shapes.
+
+        The AlltoAll exchanges equal splits, so the capacity must be the same
+        on every EP rank. It is derived from `max_num_tokens`, the number of
+        tokens of the largest rank, rather than from the local batch.
+
+        Args:
+            indices (torch.Tensor): Experts of each token, [num_tokens, topk].
+            probs (torch.Tensor): Probs of each token, [num_tokens, topk].
+            max_num_tokens (Optional[int]): Upper bound of num_tokens across
+                the EP ranks. Defaults to the local num_tokens.
+
+        Returns:
+            torch.Tensor: Number of tokens of each local expert, including
+                padding.
+        """
+        num_tokens, topk = indices.shape
+        if max_num_tokens is None:
+            max_num_tokens = num_tokens
+        self.capacity = math.ceil(max_num_tokens * topk / self.num_experts *
+                                  self.config.moe_expert_capacity_factor)
+        num_slots = self.num_experts * self.capacity
+        experts = indices.reshape(-1).long()
+        flat_probs = probs.reshape(-1)
+        arange = torch.arange(experts.numel(), device=experts.device)
+        if self.config.moe_token_drop_policy == "probs":
+            order = torch.argsort(flat_probs.float(),
+                                  descending=True,
+                                  stable=True)
+        else:
+            order = arange
+        order = order[torch.argsort(experts[order], stable=True)]
+        counts = torch.zeros(self.num_experts,
+                             dtype=torch.int64,
+                             device=experts.device).scatter_add_(
+                                 0, experts, torch.ones_like(experts))
+        starts = torch.cumsum(counts, 0) - counts
+        position = torch.empty_like(order)
+        position[order] = arange - starts[experts[order]]
+        keep = position < self.capacity
+
+        # Dropped pairs point to the zero row after the last slot.
+        self.capacity_slots = torch.where(keep,
+                                          experts * self.capacity + position,
+                                          num_slots)
+        slot_tokens = torch.full((num_slots + 1, ),
+                                 num_tokens,
+                                 dtype=torch.int64,
+                                 device=experts.device)
+        slot_tokens.scatter_(0, self.capacity_slots,
+                             torch.div(arange, topk, rounding_mode="floor"))
+        self.capacity_slot_tokens = slot_tokens[:num_slots]
+
+        kept_probs = torch.where(keep, flat_probs,
+                                 torch.zeros_like(flat_probs)).view(
+                                     num_tokens, topk)
+        if self.config.moe_reroute_dropped_tokens:
+            kept_sum = kept_probs.sum(-1, keepdim=True)
+            scale = probs.sum(-1, keepdim=True) / torch.where(
+                kept_sum > 0, kept_sum, torch.ones_like(kept_sum))
+            kept_probs = kept_probs * scale
+        self.capacity_probs = kept_probs
+
+        return torch.full((self.num_local_experts, ),
+                          self.ep_size * self.capacity,
+                          dtype=torch.int64,
+                          device=experts.device)
+
+    def capacity_token_permutation(self,
+                                   hidden_states: torch.Tensor,
+                                   probs: torch.Tensor,
+                                   routing_map: torch.Tensor,
+                                   max_num_tokens: Optional[int] = None):
+        """
+        Dispatch tokens to local experts in fixed-capacity mode, see
+        `token_permutation`. Every expert receives `capacity` tokens from
+        each rank, the empty slots are zero tokens.
+        """
+        hidden_size = self.hidden_shape[-1]
+        hidden_states = hidden_states.view(-1, hidden_size)
+        self.hidden_shape_before_permute = hidden_states.shape
+        tokens_per_expert = self.capacity_preprocess(routing_map, probs,
+                                                     max_num_tokens)
+
+        # Row num_tokens is the zero token of the empty slots.
+        hidden_states_with_zero = torch.cat(
+            [hidden_states,
+             hidden_states.new_zeros(1, hidden_size)])
+        permutated_local_input_tokens = hidden_states_with_zero.index_select(
+            0, self.capacity_slot_tokens)
+        _, global_input_tokens, permute1_ep_all_to_all_handle = async_all_to_all(
+            permutated_local_input_tokens, None, None, self.ep_group)
+
+        # shared experts compute
+        if self.shared_experts is not None:
+            (share_experts_output), *_ = self.shared_experts(hidden_states)
+        else:
+            share_experts_output = None
+
+        permute1_ep_all_to_all_handle.wait()
+        permutated_local_input_tokens.untyped_storage().resize_(0)
+
+        # [ep_size, num_local_experts, capacity] ->
+        # [num_local_experts, ep_size, capacity]
+        global_input_tokens = global_input_tokens.view(
+            self.ep_size, self.num_local_experts, self.capacity,
+            hidden_size).transpose(0, 1).reshape(-1, hidden_size)
+
+        return share_experts_output, global_input_tokens, tokens_per_expert
+
+    def capacity_token_unpermutation(self, hidden_states: torch.Tensor):
+        """
+        Reverse `capacity_token_permutation` and combine the expert outputs
+        of every token with its probs.
+        """
+        hidden_size = hidden_states.shape[-1]
+        hidden_states = hidden_states.view(self.num_local_experts,
+                                           self.ep_size, self.capacity,
+                                           hidden_size).transpose(
+                                               0, 1).reshape(-1, hidden_size)
+        _, permutated_local_input_tokens, handle = async_all_to_all(
+            hidden_states, None, None, self.ep_group)
+        handle.wait()
+        hidden_states.untyped_storage().resize_(0)
+
+        permutated_local_input_tokens = torch.cat([
+            permutated_local_input_tokens,
+            permutated_local_input_tokens.new_zeros(1, hidden_size)
+        ])
+        num_tokens, topk = self.capacity_probs.shape
+        expert_output = permutated_local_input_tokens.index_select(
+            0, self.capacity_slots).view(num_tokens, topk, hidden_size)
+        output = (expert_output * self.capacity_probs.unsqueeze(-1).to(
+            expert_output.dtype)).sum(1)
+        return output.view(self.hidden_shape)
+
     def token_permutation(
         self,
         hidden_states: torch.Tensor,
         probs: torch.Tensor,
         routing_map: torch.Tensor,
+        max_num_tokens: Optional[int] = None,
     ):
         """
         Dispatch tokens to local experts using AlltoAllSeq communication.
@@ -309,6 +498,8 @@ class MoEAlltoAllSeqOverLapDispatcher(MoEDispatcher):
                 Shape: [num_tokens, num_experts].
             routing_map (torch.Tensor): Mapping of tokens assigned to experts.
                 Shape: [num_tokens, num_experts].
+            max_num_tokens (Optional[int]): Upper bound of num_tokens across
+                the EP ranks, sizes the buffers in fixed-capacity mode.
 
         Returns:
             Tuple[torch.Tensor, torch.Tensor]:
@@ -320,6 +511,9 @@ class MoEAlltoAllSeqOverLapDispatcher(MoEDispatcher):
         self.top_indices = routing_map
         assert probs.dim() == 2, "Expected 2D tensor for probs"
         assert routing_map.dim() == 2, "Expected 2D tensor for routing map"
+        if self.fixed_capacity:
+            return self.capacity_token_permutation(hidden_states, probs,
+                                                   routing_map, max_num_tokens)
 
         # Permutation 1: input to AlltoAll input
         def alltoall_token_permutation1(hidden_states, routing_map):
@@ -404,6 +598,9 @@ class MoEAlltoAllSeqOverLapDispatcher(MoEDispatcher):
                 - Unpermuted token embeddings in the original order.
                 - None (bias is not supported).
         """
+        if self.fixed_capacity:
+            assert bias is None, "Bias is not supported in MoEAlltoAllSeqTokenDispatcher"
+            return self.capacity_token_unpermutation(hidden_states), None
 
         def alltoall_token_unpermutation1(hidden_states):
             assert bias is None, "Bias is not supported in MoEAlltoAllSeqTokenDispatcher"
@@ -16,7 +16,7 @@
 #
 
 import math
-from typing import Optional, Tuple
+from typing import Callable, Dict, Optional, Tuple
 
 import torch
 import torch.nn.functional as F
@@ -211,8 +211,35 @@ def apply_rotary_pos_emb(q, k, cos, sin, position_ids, unsqueeze_dim=1):
     return q_embed, k_embed
 
 
-def _set_cos_sin_cache(self, seq_len, device, dtype):
-    self.max_seq_len_cached = seq_len
+# Process-wide registry of precomputed cos/sin tables. Rotary instances with
+# identical parameters (across layers, and across the main model and the
+# MTP/eagle drafter) share the same device tensors instead of each building
+# and holding its own copy. Only the largest seq_len is kept per parameter
+# set, the tables of a shorter seq_len are its leading rows, so growing the
+# cache at runtime does not leak the smaller tables.
+_COS_SIN_CACHE_REGISTRY: Dict[tuple, Tuple[int, Tuple[torch.Tensor, ...]]] = {}
+
+
+def _get_or_build_cos_sin_cache(
+    key: tuple,
+    seq_len: int,
+    builder: Callable[[], Tuple[torch.Tensor, ...]],
+) -> Tuple[torch.Tensor, ...]:
+    """Returns the tables of ``key`` built for at least ``seq_len``, the
+    caller slices them down to ``seq_len``."""
+    cached = _COS_SIN_CACHE_REGISTRY.get(key)
+    if cached is not None and cached[0] >= seq_len:
+        return cached[1]
+    tensors = builder()
+    _COS_SIN_CACHE_REGISTRY[key] = (seq_len, tensors)
+    return tensors
+
+
+def clear_cos_sin_cache_registry() -> None:
+    _COS_SIN_CACHE_REGISTRY.clear()
+
+
+def _build_yarn_cos_sin_cache(self, seq_len, device, dtype):
     dim = self.rotary_dim
 
     freq_extra = 1.0 / (self.base**(
@@ -230,7 +257,6 @@ def _set_cos_sin_cache(self, seq_len, device, dtype):
     inv_freq_mask = 1.0 - yarn_linear_ramp_mask(low, high, dim // 2).to(
         device=device, dtype=torch.float32)
     inv_freq = freq_inter * (1 - inv_freq_mask) + freq_extra * inv_freq_mask
-    self.register_buffer("inv_freq", inv_freq, persistent=False)
 
     t = torch.arange(seq_len * self.scaling_factor,
                      device=device,
@@ -244,25 +270,52 @@ def _set_cos_sin_cache(self, seq_len, device, dtype):
     cache = torch.cat([freqs.cos() * self.mscale,
                        freqs.sin() * self.mscale],
                       dim=-1).to(dtype)
+    return inv_freq, cache, cos_cached, sin_cached
+
+
+def _set_cos_sin_cache(self, seq_len, device, dtype):
+    self.max_seq_len_cached = seq_len
+    key = ("yarn", self.rotary_dim, self.base, self.scaling_factor,
+           self.beta_fast, self.beta_slow, self.mscale,
+           self.max_position_embeddings, str(device), dtype)
+    inv_freq, cache, cos_cached, sin_cached = _get_or_build_cos_sin_cache(
+        key, seq_len,
+        lambda: _build_yarn_cos_sin_cache(self, seq_len, device, dtype))
+    # The positions of the table, see _build_yarn_cos_sin_cache.
+    num_positions = math.ceil(seq_len * self.scaling_factor)
+    if cache.shape[0] > num_positions:
+        cache = cache[:num_positions]
+        cos_cached = cos_cached[:num_positions]
+        sin_cached = sin_cached[:num_positions]
+    self.register_buffer("inv_freq", inv_freq, persistent=False)
     self.register_buffer("cos_sin_cache", cache, persistent=False)
     self.register_buffer("cos_cached", cos_cached, persistent=False)
     self.register_buffer("sin_cached", sin_cached, persistent=False)
 
 
-def __set_cos_sin_cache(self, seq_len, device, dtype):
+def _build_default_cos_sin_cache(self, device, dtype):
     inv_freq = 1.0 / (self.base**(torch.arange(
         0, self.rotary_dim, 2, device=device, dtype=torch.float32) *
                                   (1 / self.rotary_dim)))
-    self.register_buffer("inv_freq", inv_freq)
 
     t = torch.arange(self.max_position_embeddings,
-                     device=self.inv_freq.device,
+                     device=inv_freq.device,
                      dtype=torch.float32)
-    freqs = torch.einsum("i,j->ij", t, self.inv_freq)
+    freqs = torch.einsum("i,j->ij", t, inv_freq)
 
     emb = torch.cat((freqs, freqs), dim=-1)
-    self.register_buffer("cos", emb.cos().to(dtype=dtype), persistent=False)
-    self.register_buffer("sin", emb.sin().to(dtype=dtype), persistent=False)
+    return inv_freq, emb.cos().to(dtype=dtype), emb.sin().to(dtype=dtype)
+
+
+def __set_cos_sin_cache(self, seq_len, device, dtype):
+    key = ("default", self.rotary_dim, self.base,
+           self.max_position_embeddings, str(device), dtype)
+    inv_freq, cos, sin = _get_or_build_cos_sin_cache(
+        key, self.max_position_embeddings,
+        lambda: _build_default_cos_sin_cache(self, device, dtype))
+    self.register_buffer("inv_freq", inv_freq)
+    self.register_buffer("cos", cos, persistent=False)
+    self.register_buffer("sin", sin, persistent=False)
     self.embed = F.embedding
 
 
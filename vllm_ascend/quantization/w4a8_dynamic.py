@@ -27,6 +27,9 @@ from vllm.forward_context import get_forward_context
 from vllm_ascend.ascend_config import get_ascend_config
 from vllm_ascend.ascend_forward_context import FusedMoEState
 from vllm_ascend.distributed.parallel_state import get_mc2_group
+from vllm_ascend.eplb.expert_load_collector import record_expert_load
+from vllm_ascend.ops.expert_load_balancer import \
+    generate_force_balance_topk_ids
 from vllm_ascend.ops.layers.experts_selector import select_experts
 from vllm_ascend.quantization.w8a8_dynamic import (fused_experts_with_all2all,
                                                    fused_experts_with_mc2)
@@ -280,6 +283,8 @@ class AscendW4A8DynamicFusedMoEMethod:
             scoring_func=scoring_func,
             e_score_correction_bias=e_score_correction_bias,
             global_num_experts=global_num_experts)
+        if not enable_force_load_balance:
+            record_expert_load(layer, topk_ids)
 
         fused_moe_state = get_forward_context().fused_moe_state
         shared_gate_up, shared_dequant_scale = None, None
@@ -291,11 +296,18 @@ class AscendW4A8DynamicFusedMoEMethod:
                 shared_gate_up, shared_dequant_scale = share_up_out[
                     0], share_up_out[1]
 
-        # this is a naive implementation for experts load balance so as
-        # to avoid accumulating too much tokens on a single rank.
-        # currently it is only activated when doing profile runs.
+        # Balanced routing to avoid accumulating too much tokens on a single
+        # rank, only activated when doing profile runs. Both comm paths route
+        # on physical ids, so redundant experts get their share and log2phy
+        # is skipped.
         if enable_force_load_balance:
-            topk_ids = torch.randint_like(topk_ids, 0, global_num_experts)
+            num_physical_experts = global_num_experts
+            if log2phy is not None:
+                num_physical_experts += global_redundant_expert_num
+                log2phy = None
+            topk_ids = generate_force_balance_topk_ids(
+                topk_ids, num_physical_experts, self.ep_group.rank_in_group,
+                self.ep_group.world_size)
 
         topk_weights = topk_weights.to(x.dtype)
         if fused_moe_state == FusedMoEState.MC2:
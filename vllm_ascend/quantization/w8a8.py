@@ -23,6 +23,7 @@ from vllm.attention.backends.abstract import AttentionType
 from vllm.distributed.parallel_state import get_ep_group
 
 from vllm_ascend.attention.attention_v1 import AscendAttentionState
+from vllm_ascend.eplb.expert_load_collector import record_expert_load
 from vllm_ascend.ops.layers.experts_selector import select_experts
 from vllm_ascend.utils import ACL_FORMAT_FRACTAL_NZ, is_310p
 
@@ -253,6 +254,8 @@ class AscendW8A8FusedMoEMethod:
             scoring_func=scoring_func,
             e_score_correction_bias=e_score_correction_bias,
             global_num_experts=global_num_experts)
+        if not enable_force_load_balance:
+            record_expert_load(layer, topk_ids)
 
         if is_310p():
             return fused_experts_310p(hidden_states=x,
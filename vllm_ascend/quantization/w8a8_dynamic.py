@@ -27,6 +27,9 @@ import vllm_ascend.envs as envs_ascend
 from vllm_ascend.ascend_config import get_ascend_config
 from vllm_ascend.ascend_forward_context import FusedMoEState
 from vllm_ascend.distributed.parallel_state import get_mc2_group
+from vllm_ascend.eplb.expert_load_collector import record_expert_load
+from vllm_ascend.ops.expert_load_balancer import (
+    generate_force_balance_topk_ids, map_logical_to_physical)
 from vllm_ascend.ops.layers.experts_selector import select_experts
 from vllm_ascend.torchair.utils import npu_stream_switch, npu_wait_tensor
 from vllm_ascend.utils import (ACL_FORMAT_FRACTAL_NZ, AscendSocVersion,
@@ -224,7 +227,7 @@ def fused_experts_with_mc2(
 ) -> Union[torch.Tensor, Tuple[torch.Tensor, torch.Tensor]]:
     assert mc2_mask is not None
     if log2phy is not None:
-        topk_ids = log2phy[topk_ids]
+        topk_ids = map_logical_to_physical(topk_ids, log2phy)
 
     quant_mode = 2
     ep_group = get_mc2_group()
@@ -407,7 +410,7 @@ def fused_experts_with_all2all(
     w2_scale_bias: torch.Tensor = None,
 ):
     if log2phy is not None:
-        topk_ids = log2phy[topk_ids]
+        topk_ids = map_logical_to_physical(topk_ids, log2phy)
     original_shape = hidden_states.shape
     if len(original_shape) == 3:
         hidden_states = hidden_states.view(-1, hidden_states.shape[-1])
@@ -915,6 +918,8 @@ class AscendW8A8DynamicFusedMoEMethod:
             scoring_func=scoring_func,
             e_score_correction_bias=e_score_correction_bias,
             global_num_experts=global_num_experts)
+        if not enable_force_load_balance:
+            record_expert_load(layer, topk_ids)
 
         fused_moe_state = get_forward_context().fused_moe_state
         shared_gate_up, shared_dequant_scale = None, None
@@ -926,11 +931,21 @@ class AscendW8A8DynamicFusedMoEMethod:
                 shared_gate_up, shared_dequant_scale = share_up_out[
                     0], share_up_out[1]
 
-        # this is a naive implementation for experts load balance so as
-        # to avoid accumulating too much tokens on a single rank.
-        # currently it is only activated when doing profile runs.
+        # Balanced routing to avoid accumulating too much tokens on a single
+        # rank, only activated when doing profile runs. The MC2 and all2all
+        # paths route on physical ids, so redundant experts get their share
+        # and log2phy is skipped.
         if enable_force_load_balance:
-            topk_ids = torch.randint_like(topk_ids, 0, global_num_experts)
+            num_physical_experts = global_num_experts
+            if log2phy is not None and fused_moe_state not in [
+                    FusedMoEState.AllGatherEP, FusedMoEState.AllGather,
+                    FusedMoEState.NaiveMulticast
+            ]:
+                num_physical_experts += global_redundant_expert_num
+                log2phy = None
+            topk_ids = generate_force_balance_topk_ids(
+                topk_ids, num_physical_experts, self.ep_group.rank_in_group,
+                self.ep_group.world_size)
 
         topk_weights = topk_weights.to(x.dtype)
         if fused_moe_state == FusedMoEState.AllGatherEP:
@@ -1005,8 +1020,10 @@ class AscendW8A8DynamicFusedMoEMethod:
             torch_npu.npu_format_cast_(layer.w2_weight, ACL_FORMAT_FRACTAL_NZ)
         layer.w13_weight_scale.data = layer.w13_weight_scale.data.view(
             layer.w13_weight_scale.data.shape[0], -1)
-        layer.w13_weight_scale_fp32 = layer.w13_weight_scale.data.to(
-            torch.float32)
+        # A buffer, so that EPLB migrates it along with the expert weights.
+        layer.register_buffer("w13_weight_scale_fp32",
+                              layer.w13_weight_scale.data.to(torch.float32),
+                              persistent=False)
         layer.w13_weight_offset.data = layer.w13_weight_offset.data.view(
             layer.w13_weight_offset.data.shape[0], -1)
         layer.w2_weight_scale.data = layer.w2_weight_scale.data.view(
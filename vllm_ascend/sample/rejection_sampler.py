@@ -308,6 +308,72 @@ def rejection_greedy_sample_spec_len_1_pytorch(
     output_token_ids[accept_req_mask, 1] = bonus_token_ids[accept_req_mask]
 
 
+# Persistent per-device position buffers shared by the sampling kernels below,
+# so no index scratch tensor is allocated per step.
+_POSITIONS_CACHE: dict[torch.device, torch.Tensor] = {}
+
+
+def _get_positions(device: torch.device) -> torch.Tensor:
+    positions = _POSITIONS_CACHE.get(device)
+    if positions is None:
+        positions = torch.arange(MAX_SPEC_LEN + 1, device=device)
+        _POSITIONS_CACHE[device] = positions
+    return positions
+
+
+def _draft_token_grid(
+        cu_num_draft_tokens,  # [batch_size]
+        num_tokens,
+        max_spec_len,
+):
+    """Lay the flattened draft tokens out on a [batch_size, max_spec_len]
+    grid without leaving the device.
+
+    Returns the number of draft tokens per request, the flat token index of
+    every grid slot (clamped to a valid index for padding slots) and the mask
+    of slots holding a real draft token.
+    """
+    device = cu_num_draft_tokens.device
+    cu_num_draft_tokens = cu_num_draft_tokens.to(torch.long)
+    num_draft_tokens = torch.diff(cu_num_draft_tokens,
+                                  prepend=cu_num_draft_tokens.new_zeros(1))
+    num_draft_tokens.clamp_(min=0)
+    start_indices = cu_num_draft_tokens - num_draft_tokens
+    positions = _get_positions(device)[:max_spec_len]
+    valid = positions < num_draft_tokens.unsqueeze(1)
+    token_indices = start_indices.unsqueeze(1) + positions
+    token_indices = torch.where(valid, token_indices, 0)
+    token_indices.clamp_(max=max(num_tokens - 1, 0))
+    return num_draft_tokens, token_indices, valid
+
+
+def _write_output_tokens(
+        output_token_ids,  # [batch_size, max_spec_len + 1]
+        tokens,  # [batch_size, max_spec_len]
+        write_mask,  # [batch_size, max_spec_len]
+        num_draft_tokens,  # [batch_size]
+        bonus_token_ids,  # [batch_size, 1]
+        needs_bonus,  # [batch_size]
+):
+    max_spec_len = tokens.size(1)
+    spec_output = output_token_ids[:, :max_spec_len]
+    spec_output.copy_(
+        torch.where(write_mask, tokens.to(output_token_ids.dtype),
+                    spec_output))
+    bonus_cols = num_draft_tokens.unsqueeze(1)
+    bonus_values = torch.where(
+        needs_bonus.unsqueeze(1),
+        bonus_token_ids.view(-1, 1).to(output_token_ids.dtype),
+        output_token_ids.gather(1, bonus_cols))
+    output_token_ids.scatter_(1, bonus_cols, bonus_values)
+
+
+def _first_rejection_mask(rejected):
+    """Mask of the grid slots up to and including the first rejection."""
+    rejected = rejected.to(torch.int32)
+    return (rejected.cumsum(dim=1) - rejected) == 0
+
+
 def rejection_greedy_sample_pytorch(
         output_token_ids,  # [batch_size, max_spec_len + 1]
         cu_num_draft_tokens,  # [batch_size]
@@ -318,64 +384,30 @@ def rejection_greedy_sample_pytorch(
         max_spec_len,
         is_greedy=None,  # [batch_size] or None
 ):
+    # NOTE: draft_tokens_per_req is derived from cu_num_draft_tokens on the
+    # device instead of copying the host list over every step.
     batch_size = output_token_ids.size(0)
     num_tokens = draft_token_ids.size(0)
     device = output_token_ids.device
-    draft_tokens_per_req = torch.tensor(draft_tokens_per_req).to(
-        device, non_blocking=True)
     if is_greedy is None:
         is_greedy = torch.ones(batch_size, dtype=torch.bool, device=device)
 
-    start_indices = cu_num_draft_tokens - draft_tokens_per_req
-    req_ids = torch.arange(batch_size, device=device)
-    token_req_ids = torch.repeat_interleave(req_ids, draft_tokens_per_req)
-    token_positions = torch.arange(
-        num_tokens, device=device) - start_indices[token_req_ids]
-
-    # Find the first mismatch position of each request.
-    mismatch_global = (draft_token_ids != target_argmax)
-    if max_spec_len == 0:
-        first_mismatch_pos_per_req = torch.zeros(batch_size,
-                                                 dtype=torch.long,
-                                                 device=device)
+    num_draft_tokens, token_indices, valid = _draft_token_grid(
+        cu_num_draft_tokens, num_tokens, max_spec_len)
+    if num_tokens == 0:
+        target_tokens = token_indices
+        mismatch = valid
     else:
-        # [bs, max_spec_len]
-        pos_matrix = torch.full((batch_size, max_spec_len),
-                                -1,
-                                dtype=torch.long,
-                                device=device)
-        pos_matrix[token_req_ids, token_positions] = token_positions
-        mismatch_matrix = torch.full((batch_size, max_spec_len),
-                                     False,
-                                     dtype=torch.bool,
-                                     device=device)
-        mismatch_matrix[token_req_ids, token_positions] = mismatch_global
-        mismatch_positions = torch.where(mismatch_matrix, pos_matrix,
-                                         max_spec_len * 2)
-        first_mismatch_pos_per_req, _ = torch.min(mismatch_positions, dim=1)
-        no_mismatch_mask = (first_mismatch_pos_per_req == max_spec_len * 2)
-        first_mismatch_pos_per_req[no_mismatch_mask] = draft_tokens_per_req[
-            no_mismatch_mask]
-
-    # Copy matched target tokens into output.
-    copy_len = torch.minimum(first_mismatch_pos_per_req + 1,
-                             draft_tokens_per_req)
-    copy_indices = torch.arange(max_spec_len + 1,
-                                device=device).expand(batch_size, -1)
-    copy_mask = copy_indices < copy_len.unsqueeze(1)
-    greedy_mask = is_greedy.unsqueeze(1)
-    final_copy_mask = copy_mask & greedy_mask
-    global_idx = start_indices.unsqueeze(1) + copy_indices
-    output_token_ids[final_copy_mask] = target_argmax[
-        global_idx[final_copy_mask]].to(output_token_ids.dtype)
-    # Fill bonus token.
-    needs_bonus = is_greedy & (first_mismatch_pos_per_req
-                               >= draft_tokens_per_req)
-    if torch.any(needs_bonus):
-        bonus_rows = torch.where(needs_bonus)[0]
-        bonus_cols = draft_tokens_per_req[bonus_rows]
-        bonus_token_ids = bonus_token_ids.squeeze(1)
-        output_token_ids[bonus_rows, bonus_cols] = bonus_token_ids[bonus_rows]
+        target_tokens = target_argmax[token_indices]
+        mismatch = valid & (draft_token_ids[token_indices] != target_tokens)
+
+    # Copy matched target tokens, plus the target token at the first
+    # mismatch, into output.
+    write_mask = (valid & _first_rejection_mask(mismatch)
+                  & is_greedy.unsqueeze(1))
+    needs_bonus = is_greedy & ~mismatch.any(dim=1)
+    _write_output_tokens(output_token_ids, target_tokens, write_mask,
+                         num_draft_tokens, bonus_token_ids, needs_bonus)
 
 
 def rejection_random_sample_pytorch(
@@ -393,44 +425,35 @@ def rejection_random_sample_pytorch(
     IS_NGRAM=False,
 ):
     batch_size = output_token_ids.shape[0]
+    num_tokens = draft_token_ids.shape[0]
+    if num_tokens == 0:
+        return
+    if is_greedy is None:
+        is_greedy = torch.zeros(batch_size,
+                                dtype=torch.bool,
+                                device=output_token_ids.device)
+
+    num_draft_tokens, token_indices, valid = _draft_token_grid(
+        cu_num_draft_tokens, num_tokens, max_spec_len)
+    draft_tokens = draft_token_ids[token_indices]
+    target_prob = target_probs[token_indices, draft_tokens]
+    uniform_prob = uniform_probs[token_indices]
+    if IS_NGRAM:
+        accepted = target_prob >= uniform_prob
+    else:
+        draft_prob = draft_probs[token_indices, draft_tokens]
+        accepted = (draft_prob > 0) & (target_prob / draft_prob
+                                       >= uniform_prob)
+    rejected = valid & ~accepted
 
-    for req_idx in range(batch_size):
-        if is_greedy[req_idx]:
-            continue
-
-        if req_idx == 0:
-            start_idx = 0
-        else:
-            start_idx = cu_num_draft_tokens[req_idx - 1].item()
-        end_idx = cu_num_draft_tokens[req_idx].item()
-        num_draft_tokens = end_idx - start_idx
-
-        rejected = False
-        for pos in range(num_draft_tokens):
-            if not rejected:
-                draft_token_id = draft_token_ids[start_idx + pos].item()
-
-                if IS_NGRAM:
-                    draft_prob = 1.0
-                else:
-                    draft_prob = draft_probs[start_idx + pos,
-                                             draft_token_id].item()
-
-                target_prob = target_probs[start_idx + pos,
-                                           draft_token_id].item()
-                uniform_prob = uniform_probs[start_idx + pos].item()
-
-                if draft_prob > 0 and target_prob / draft_prob >= uniform_prob:
-                    token_id = draft_token_id
-                else:
-                    rejected = True
-                    token_id = recovered_token_ids[start_idx + pos].item()
-
-                output_token_ids[req_idx, pos] = token_id
-
-        if not rejected:
-            bonus_token_id = bonus_token_ids[req_idx].item()
-            output_token_ids[req_idx, num_draft_tokens] = bonus_token_id
+    tokens = torch.where(accepted, draft_tokens,
+                         recovered_token_ids[token_indices])
+    is_random = ~is_greedy
+    write_mask = valid & _first_rejection_mask(rejected) & is_random.unsqueeze(
+        1)
+    needs_bonus = is_random & ~rejected.any(dim=1)
+    _write_output_tokens(output_token_ids, tokens, write_mask,
+                         num_draft_tokens, bonus_token_ids, needs_bonus)
 
 
 def expand_pytorch(
@@ -469,36 +492,30 @@ def sample_recovered_tokens_pytorch(
     IS_NGRAM=False,
 ):
     batch_size = len(cu_num_draft_tokens)
+    num_tokens = draft_token_ids.shape[0]
+    if num_tokens == 0:
+        return
+    device = target_probs.device
 
-    for req_idx in range(batch_size):
-        start_idx = 0 if req_idx == 0 else cu_num_draft_tokens[req_idx - 1]
-        end_idx = cu_num_draft_tokens[req_idx]
-        num_draft_tokens = end_idx - start_idx
-
-        for pos in range(num_draft_tokens):
-            token_idx = start_idx + pos
-
-            if IS_NGRAM:
-                draft_token_id = draft_token_ids[token_idx]
-                orig_prob = target_probs[token_idx, draft_token_id].item()
-                target_probs[token_idx, draft_token_id] = 0
-                prob = target_probs[token_idx].clone()
-            else:
-                draft_p = draft_probs[token_idx].clone()
-                target_p = target_probs[token_idx].clone()
-                prob = torch.maximum(target_p - draft_p,
-                                     torch.tensor(0.0, device=target_p.device))
-
-            q_values = torch.full((vocab_size, ),
-                                  float('-inf'),
-                                  device=q.device)
-            q_values[:vocab_size] = q[req_idx, :vocab_size]
-
-            recovered_id = torch.argmax(prob / q_values).item()
-            output_token_ids[token_idx] = recovered_id
-
-            if IS_NGRAM:
-                target_probs[token_idx, draft_token_id] = orig_prob
+    token_ids = torch.arange(num_tokens, device=device)
+    token_req_ids = torch.searchsorted(cu_num_draft_tokens.to(torch.long),
+                                       token_ids,
+                                       right=True)
+    token_req_ids.clamp_(max=batch_size - 1)
+
+    q_per_token = q[token_req_ids, :vocab_size]
+    if IS_NGRAM:
+        # Zero out the draft tokens in place instead of copying target_probs,
+        # and restore them afterwards.
+        orig_probs = target_probs[token_ids, draft_token_ids]
+        target_probs[token_ids, draft_token_ids] = 0
+        prob = target_probs / q_per_token
+        target_probs[token_ids, draft_token_ids] = orig_probs
+    else:
+        prob = (target_probs - draft_probs).clamp_(min=0.0).div_(q_per_token)
+
+    recovered_ids = torch.argmax(prob, dim=-1)
+    output_token_ids.copy_(recovered_ids.to(output_token_ids.dtype))
 
 
 rs.expand_batch_to_tokens = expand_batch_to_tokens
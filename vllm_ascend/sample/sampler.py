@@ -1,3 +1,5 @@
+from typing import Optional
+
 import torch
 import torch_npu
 from vllm.v1.sample.ops.topk_topp_sampler import TopKTopPSampler, random_sample
@@ -13,6 +15,181 @@ else:
     DEFAULT_LOGPROBS_MODE = "raw_logprobs"
 
 
+# Number of candidates kept by the partial top-k in the sort-free top-k/top-p
+# path. Rows whose cutoffs both lie below the candidates take the cutoff of a
+# radix select over the vocabulary.
+TOP_K_TOP_P_PARTIAL_K = 1024
+# Non-negative float32 values order the same way as their int32 bit patterns,
+# and every probability is <= 1.0 (0x3F800000 < 2**30), so 3 levels of 10 bits
+# of the bit patterns locate any cutoff exactly.
+_RADIX_BITS = 10
+_RADIX_LEVELS = 3
+
+
+def apply_top_k_top_p_by_sort(
+    logits: torch.Tensor,
+    k: Optional[torch.Tensor],
+    p: Optional[torch.Tensor],
+) -> torch.Tensor:
+    """Reference top-k/top-p masking that sorts the full vocabulary."""
+    probs = logits.softmax(dim=-1)
+    probs_sort, _ = probs.sort(dim=-1, descending=False)
+
+    if k is not None:
+        top_k_count = probs_sort.size(1) - k.to(torch.long)  # shape: (batch, )
+        top_k_count = top_k_count.unsqueeze(dim=1)
+        top_k_cutoff = probs_sort.gather(-1, top_k_count)
+
+        # Make sure the no top-k rows are no-op.
+        no_top_k_mask = (k == logits.shape[1]).unsqueeze(dim=1)
+        top_k_cutoff.masked_fill_(no_top_k_mask, -float("inf"))
+
+        elements_to_discard = probs < top_k_cutoff
+        logits.masked_fill_(elements_to_discard, -float("inf"))
+
+    if p is not None:
+        cumprob = torch.cumsum(probs_sort, dim=-1)
+        top_p_mask = cumprob <= 1 - p.unsqueeze(dim=1)
+        top_p_mask[:, -1] = False  # at least one
+
+        top_p_count = top_p_mask.sum(dim=-1).unsqueeze(1)
+        top_p_cutoff = probs_sort.gather(-1, top_p_count)
+        elements_to_discard = probs < top_p_cutoff
+        logits.masked_fill_(elements_to_discard, -float("inf"))
+
+    return logits
+
+
+def _select_cutoff(
+    probs: torch.Tensor,
+    k: Optional[torch.Tensor],
+    p: Optional[torch.Tensor],
+) -> torch.Tensor:
+    """Find, per row, the largest value t such that at least k elements are
+    >= t or the elements below t carry at most 1 - p of the mass, that is the
+    larger of the top-k and the top-p cutoffs.
+
+    A row is left out of either criterion with a k above the vocabulary size
+    or a p above 1. Picks the bit pattern of t from the highest digit down,
+    with a histogram of the counts and the mass of the elements sharing the
+    digits picked so far, so the returned cutoff is an element of the row,
+    exactly as a sort would give.
+    """
+    bits = probs.view(torch.int32)
+    batch_size = probs.size(0)
+    num_buckets = 1 << _RADIX_BITS
+    prefix = torch.zeros((batch_size, 1),
+                         dtype=torch.int32,
+                         device=probs.device)
+    # Number of elements above, and mass below, the range of the prefix.
+    count_above = torch.zeros((batch_size, 1),
+                              dtype=torch.float32,
+                              device=probs.device)
+    mass_below = torch.zeros_like(count_above)
+    for level in reversed(range(_RADIX_LEVELS)):
+        shift = level * _RADIX_BITS
+        in_range = (bits >> (shift + _RADIX_BITS)) == (prefix >>
+                                                      (shift + _RADIX_BITS))
+        digits = ((bits >> shift) & (num_buckets - 1)).to(torch.long)
+        counts = torch.zeros((batch_size, num_buckets),
+                             dtype=torch.float32,
+                             device=probs.device)
+        masses = torch.zeros_like(counts)
+        counts.scatter_add_(1, digits, in_range.to(torch.float32))
+        masses.scatter_add_(1, digits, probs * in_range)
+        # Elements >= and mass < the start of every bucket.
+        count_ge = count_above + counts.flip(-1).cumsum(-1).flip(-1)
+        mass_lt = mass_below + masses.cumsum(-1) - masses
+        ok = torch.zeros_like(counts, dtype=torch.bool)
+        if k is not None:
+            ok |= count_ge >= k.unsqueeze(1)
+        if p is not None:
+            ok |= mass_lt <= 1 - p.unsqueeze(1)
+        # Both criteria only get harder in higher buckets.
+        digit = (ok.sum(dim=-1, keepdim=True) - 1).clamp(min=0)
+        prefix |= digit.to(torch.int32) << shift
+        count_above = (count_ge - counts).gather(-1, digit)
+        mass_below = mass_lt.gather(-1, digit)
+    # Never go above the row maximum, so at least one token is kept.
+    prefix = torch.minimum(prefix, bits.max(dim=-1, keepdim=True).values)
+    return prefix.view(torch.float32)
+
+
+def apply_top_k_top_p_sort_free(
+    logits: torch.Tensor,
+    k: Optional[torch.Tensor],
+    p: Optional[torch.Tensor],
+    partial_k: int = TOP_K_TOP_P_PARTIAL_K,
+) -> torch.Tensor:
+    """Top-k/top-p masking that never sorts the full vocabulary.
+
+    Keeps the same tokens as `apply_top_k_top_p_by_sort`: a partial top-k of
+    `partial_k` candidates yields the cutoff of most rows, and the remaining
+    rows take the cutoff of a radix select over the vocabulary. The shapes
+    do not depend on k or p, and the choice between both is made per row on
+    the device, without synchronizing with the host. Hence the radix select
+    runs over the whole batch as soon as `partial_k` is below the vocabulary
+    size, the work saved over the sort is that of the sort itself, the three
+    histogram passes of the radix select are linear in the vocabulary.
+
+    The probabilities are computed in the logits dtype, as in the sort path,
+    and compared in float32, which holds them exactly. The top-p mass is
+    summed in float32 though, so on float16/bfloat16 logits a top-p cutoff
+    may differ from the sort path where its low precision cumsum rounds
+    across 1 - p.
+    """
+    vocab_size = logits.shape[1]
+    probs = logits.softmax(dim=-1).to(torch.float32)
+    num_candidates = min(partial_k, vocab_size)
+    top_probs = probs.topk(num_candidates, dim=-1).values
+
+    # The final cutoff is the larger of the top-k and top-p ones. Either is
+    # exact once it lies within the candidates, and then also the larger:
+    # the other one is a candidate or lies below all of them.
+    cutoff = torch.full_like(top_probs[:, :1], -float("inf"))
+    resolved = torch.zeros_like(cutoff, dtype=torch.bool)
+    unresolved = torch.zeros_like(cutoff, dtype=torch.bool)
+    select_k = select_p = None
+    if k is not None:
+        k = k.to(torch.long).unsqueeze(1)
+        # Rows with k == vocab_size have no top-k.
+        has_top_k = k < vocab_size
+        k_in_candidates = has_top_k & (k <= num_candidates)
+        top_k_cutoff = top_probs.gather(
+            -1, (k.clamp(1, num_candidates) - 1))
+        cutoff = torch.where(k_in_candidates, top_k_cutoff, cutoff)
+        resolved |= k_in_candidates
+        unresolved |= has_top_k & ~k_in_candidates
+        select_k = torch.where(has_top_k, k, vocab_size + 1).squeeze(1)
+    if p is not None:
+        # Same criterion as the sorted cumsum: keep a candidate while the
+        # mass up to and including it, from the bottom, exceeds 1 - p.
+        # The most probable candidate is always kept.
+        cumprob = top_probs.cumsum(dim=-1)
+        mass_upto = probs.sum(dim=-1, keepdim=True) - cumprob + top_probs
+        keep = mass_upto > 1 - p.unsqueeze(1)
+        keep[:, 0] = True
+        top_p_count = keep.sum(dim=-1, keepdim=True)
+        top_p_cutoff = top_probs.gather(-1, top_p_count - 1)
+        # When every candidate is kept the cutoff may lie beyond them, unless
+        # they are the whole vocabulary.
+        p_in_candidates = ~keep[:, -1:] | (num_candidates == vocab_size)
+        cutoff = torch.where(p_in_candidates,
+                             torch.maximum(cutoff, top_p_cutoff), cutoff)
+        resolved |= p_in_candidates
+        unresolved |= ~p_in_candidates
+        select_p = p
+
+    if num_candidates < vocab_size:
+        # Runs for every row to stay free of host syncs, the rows resolved
+        # above keep their cutoff.
+        selected = _select_cutoff(probs, select_k, select_p)
+        cutoff = torch.where(unresolved & ~resolved, selected, cutoff)
+
+    logits.masked_fill_(probs < cutoff, -float("inf"))
+    return logits
+
+
 class AscendSampler(Sampler):
 
     def __init__(self, logprobs_mode=DEFAULT_LOGPROBS_MODE):
@@ -37,33 +214,7 @@ class AscendTopKTopPSampler(TopKTopPSampler):
         if p is None and k is None:
             return logits
 
-        probs = logits.softmax(dim=-1)
-        probs_sort, _ = probs.sort(dim=-1, descending=False)
-
-        if k is not None:
-            top_k_count = probs_sort.size(1) - k.to(
-                torch.long)  # shape: (batch, )
-            top_k_count = top_k_count.unsqueeze(dim=1)
-            top_k_cutoff = probs_sort.gather(-1, top_k_count)
-
-            # Make sure the no top-k rows are no-op.
-            no_top_k_mask = (k == logits.shape[1]).unsqueeze(dim=1)
-            top_k_cutoff.masked_fill_(no_top_k_mask, -float("inf"))
-
-            elements_to_discard = probs < top_k_cutoff
-            logits.masked_fill_(elements_to_discard, -float("inf"))
-
-        if p is not None:
-            cumprob = torch.cumsum(probs_sort, dim=-1)
-            top_p_mask = cumprob <= 1 - p.unsqueeze(dim=1)
-            top_p_mask[:, -1] = False  # at least one
-
-            top_p_count = top_p_mask.sum(dim=-1).unsqueeze(1)
-            top_p_cutoff = probs_sort.gather(-1, top_p_count)
-            elements_to_discard = probs < top_p_cutoff
-            logits.masked_fill_(elements_to_discard, -float("inf"))
-
-        return logits
+        return apply_top_k_top_p_sort_free(logits, k, p)
 
     def forward_native(self, logits, generators, k, p):
         """Override pytorch native implementation to torch_npu"""
@@ -100,6 +100,8 @@ from vllm_ascend.utils import (ACL_FORMAT_FRACTAL_ND, ACL_FORMAT_FRACTAL_NZ,
 from vllm_ascend.worker.eagle_proposer_v1 import EagleProposer
 from vllm_ascend.worker.mtp_proposer_v1 import MtpProposer
 from vllm_ascend.worker.npu_input_batch import CachedRequestState, InputBatch
+from vllm_ascend.worker.spec_length_controller import \
+    AdaptiveSpecLengthController
 
 if not vllm_version_is("0.10.1.1"):
     from vllm.v1.outputs import DraftTokenIds
@@ -242,6 +244,8 @@ class NPUModelRunner(LoRAModelRunnerMixin):
         self.use_eagle = False
         self.drafter: Optional[Union[NgramProposer, EagleProposer,
                                      MtpProposer]] = None
+        self.spec_length_controller: Optional[
+            AdaptiveSpecLengthController] = None
         self.actual_seq_lengths_q = []
         self.decode_token_per_req = 1
         if self.speculative_config:
@@ -273,6 +277,11 @@ class NPUModelRunner(LoRAModelRunnerMixin):
                     raise ValueError("Unknown speculative decoding method: "
                                      f"{self.speculative_config.method}")
                 self.rejection_sampler = AscendRejectionSampler()
+                adaptive_config = ascend_config.adaptive_spec_decode_config
+                if adaptive_config.enabled:
+                    self.spec_length_controller = \
+                        AdaptiveSpecLengthController.from_config(
+                            spec_token_num, adaptive_config)
 
         # Persistent batch.
         self.input_ids = torch.zeros(self.max_num_tokens,
@@ -383,6 +392,8 @@ class NPUModelRunner(LoRAModelRunnerMixin):
         for req_id in scheduler_output.finished_req_ids:
             self.requests.pop(req_id, None)
             self.encoder_cache.pop(req_id, None)
+            if self.spec_length_controller is not None:
+                self.spec_length_controller.remove_request(req_id)
         # Remove the finished requests from the persistent batch.
         # NOTE(woosuk): There could be an edge case where finished_req_ids and
         # scheduled_req_ids overlap. This happens when a request is aborted and
@@ -829,6 +840,9 @@ class NPUModelRunner(LoRAModelRunnerMixin):
 
     def _calc_mrope_positions(self, scheduler_output: "SchedulerOutput"):
         mrope_pos_ptr = 0
+        completion_dst_starts: list[int] = []
+        completion_pos_starts: list[int] = []
+        completion_lens: list[int] = []
         for index, req_id in enumerate(self.input_batch.req_ids):
             req = self.requests[req_id]
             assert req.mrope_positions is not None
@@ -863,19 +877,36 @@ class NPUModelRunner(LoRAModelRunnerMixin):
                 mrope_pos_ptr += prompt_part_len
 
             if completion_part_len > 0:
-                # compute completion's mrope_positions on-the-fly
-                dst_start = mrope_pos_ptr
-                dst_end = mrope_pos_ptr + completion_part_len
-                MRotaryEmbedding.get_next_input_positions_tensor(
-                    out=self.mrope_positions_np,
-                    out_offset=dst_start,
-                    mrope_position_delta=req.mrope_position_delta,
-                    context_len=num_computed_tokens + prompt_part_len,
-                    num_new_tokens=completion_part_len,
-                )
+                # completion's mrope_positions are filled for all requests
+                # at once below
+                completion_dst_starts.append(mrope_pos_ptr)
+                completion_pos_starts.append(req.mrope_position_delta +
+                                             num_computed_tokens +
+                                             prompt_part_len)
+                completion_lens.append(completion_part_len)
 
                 mrope_pos_ptr += completion_part_len
 
+        if completion_lens:
+            self._fill_mrope_completion_positions(completion_dst_starts,
+                                                  completion_pos_starts,
+                                                  completion_lens)
+
+    def _fill_mrope_completion_positions(self, dst_starts: list[int],
+                                         pos_starts: list[int],
+                                         lens: list[int]):
+        # Vectorized equivalent of calling
+        # MRotaryEmbedding.get_next_input_positions_tensor per request:
+        # completion tokens have the same position on all three M-RoPE
+        # sections, continuing from mrope_position_delta + context_len.
+        lens_np = np.asarray(lens, dtype=np.int64)
+        seg_offsets = np.cumsum(lens_np) - lens_np
+        intra = np.arange(lens_np.sum()) - np.repeat(seg_offsets, lens_np)
+        dst = np.repeat(np.asarray(dst_starts, dtype=np.int64), lens_np) + intra
+        values = np.repeat(np.asarray(pos_starts, dtype=np.int64),
+                           lens_np) + intra
+        self.mrope_positions_np[:, dst] = values
+
     def _execute_mm_encoder(self, scheduler_output: "SchedulerOutput"):
         scheduled_encoder_inputs = scheduler_output.scheduled_encoder_inputs
         if not scheduled_encoder_inputs:
@@ -1500,6 +1531,15 @@ class NPUModelRunner(LoRAModelRunnerMixin):
                 valid_sampled_token_ids, sampling_metadata, scheduler_output,
                 spec_decode_metadata, positions, num_scheduled_tokens,
                 hidden_states, attn_metadata)
+        if (self.spec_length_controller is not None
+                and draft_token_ids is not None):
+            if spec_decode_metadata is not None:
+                self.spec_length_controller.update(
+                    self.input_batch.req_ids,
+                    spec_decode_metadata.num_draft_tokens,
+                    valid_sampled_token_ids)
+            draft_token_ids = self.spec_length_controller.trim(
+                self.input_batch.req_ids, draft_token_ids)
         return draft_token_ids
 
     def _pool(
@@ -1605,16 +1645,19 @@ class NPUModelRunner(LoRAModelRunnerMixin):
             self.maybe_wait_for_kv_save()
             finished_sending, finished_recving = self.get_finished_kv_transfer(
                 scheduler_output)
+            kv_load_error_kwargs = self.get_kv_load_error_kwargs()
 
             aux_hidden_states = None
             if self.use_aux_hidden_state_outputs:
                 hidden_states, aux_hidden_states = hidden_states
 
         kv_connector_output = None
-        if finished_sending is not None or finished_recving is not None:
+        if finished_sending is not None or finished_recving is not None \
+                or kv_load_error_kwargs:
             kv_connector_output = KVConnectorOutput(
                 finished_sending=finished_sending,
-                finished_recving=finished_recving)
+                finished_recving=finished_recving,
+                **kv_load_error_kwargs)
         else:
             kv_connector_output = None
         finished_sending = None
@@ -1830,16 +1873,19 @@ class NPUModelRunner(LoRAModelRunnerMixin):
             self.maybe_setup_kv_connector(scheduler_output)
             finished_sending, finished_recving = (
                 self.get_finished_kv_transfer(scheduler_output))
+            kv_load_error_kwargs = self.get_kv_load_error_kwargs()
             # For the case of no forward caused by receiving remote kv,
             # one round of dummy inference is necessary
             # to prevent hang over the collective calls.
-        if not finished_sending and not finished_recving:
+        if not finished_sending and not finished_recving and \
+                not kv_load_error_kwargs:
             return EMPTY_MODEL_RUNNER_OUTPUT
 
         output = copy.copy(EMPTY_MODEL_RUNNER_OUTPUT)
         output.kv_connector_output = KVConnectorOutput(
             finished_sending=finished_sending,
-            finished_recving=finished_recving)
+            finished_recving=finished_recving,
+            **kv_load_error_kwargs)
         return output
 
     @staticmethod
@@ -1868,6 +1914,31 @@ class NPUModelRunner(LoRAModelRunnerMixin):
                 scheduler_output.finished_req_ids)
         return None, None
 
+    @staticmethod
+    def get_kv_load_error_kwargs() -> dict[str, set[int]]:
+        """Returns the blocks whose KV cache failed to load, as the
+        KVConnectorOutput field the scheduler recomputes them from.
+
+        The connectors have already reported the requests of those blocks as
+        finished. A vLLM version without that field would then decode them on
+        a KV cache that never landed, so the step fails instead.
+        """
+        if not has_kv_transfer_group():
+            return {}
+        kv_connector = get_kv_transfer_group()
+        if not hasattr(kv_connector, "get_block_ids_with_load_errors"):
+            return {}
+        invalid_block_ids = kv_connector.get_block_ids_with_load_errors()
+        if not invalid_block_ids:
+            return {}
+        if "invalid_block_ids" not in KVConnectorOutput.__dataclass_fields__:
+            raise RuntimeError(
+                f"KV cache of {len(invalid_block_ids)} blocks failed to load "
+                "and this vLLM version cannot recompute them. Configure "
+                "transfer_retry in kv_connector_extra_config to retry the "
+                "failed pulls.")
+        return {"invalid_block_ids": invalid_block_ids}
+
     def _build_attention_metadata(self, with_prefill, num_reqs, skip_attn):
         if skip_attn:
             attn_metadata = None
@@ -0,0 +1,142 @@
+#
+# Copyright (c) 2025 Huawei Technologies Co., Ltd. All Rights Reserved.
+# This file is a part of the vllm-ascend project.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+
+@dataclass
+class _AcceptanceStats:
+    # EWMA of accepted draft tokens per verify step.
+    accepted: float
+    # EWMA of draft tokens that were actually judged per verify step, i.e.
+    # the accepted ones plus the first rejected one (if any).
+    judged: float
+    # Number of consecutive steps this request proposed no draft tokens.
+    idle_steps: int = 0
+
+    @property
+    def acceptance_rate(self) -> float:
+        if self.judged <= 0:
+            return 0.0
+        return min(self.accepted / self.judged, 1.0)
+
+
+class AdaptiveSpecLengthController:
+    """Chooses a per-request draft length from observed acceptance rates.
+
+    Draft tokens are accepted left to right until the first rejection, so
+    with a per-token acceptance rate ``a`` a request proposing ``k`` draft
+    tokens emits ``1 + a + ... + a^k`` tokens on average per verify step,
+    while verifying them costs ``1 + draft_token_cost * k`` relative to a
+    plain decode step. The controller keeps an EWMA estimate of ``a`` per
+    request and proposes the ``k`` in ``[0, max_num_draft_tokens]`` that
+    maximizes expected tokens per unit of cost. Requests that stopped
+    drafting propose a single token every ``probe_interval`` steps so that
+    their estimate can recover.
+    """
+
+    def __init__(self,
+                 max_num_draft_tokens: int,
+                 ewma_decay: float = 0.8,
+                 initial_acceptance_rate: float = 0.8,
+                 draft_token_cost: float = 0.1,
+                 probe_interval: int = 16):
+        assert max_num_draft_tokens > 0
+        self.max_num_draft_tokens = max_num_draft_tokens
+        self.ewma_decay = ewma_decay
+        self.initial_acceptance_rate = initial_acceptance_rate
+        self.probe_interval = probe_interval
+        self._stats: dict[str, _AcceptanceStats] = {}
+
+        num_drafts = np.arange(max_num_draft_tokens + 1, dtype=np.float64)
+        self._num_drafts = num_drafts
+        self._verify_cost = 1.0 + draft_token_cost * num_drafts
+
+    @classmethod
+    def from_config(cls, max_num_draft_tokens: int,
+                    config) -> "AdaptiveSpecLengthController":
+        return cls(max_num_draft_tokens,
+                   ewma_decay=config.ewma_decay,
+                   initial_acceptance_rate=config.initial_acceptance_rate,
+                   draft_token_cost=config.draft_token_cost,
+                   probe_interval=config.probe_interval)
+
+    def _get_stats(self, req_id: str) -> _AcceptanceStats:
+        stats = self._stats.get(req_id)
+        if stats is None:
+            stats = _AcceptanceStats(accepted=self.initial_acceptance_rate,
+                                     judged=1.0)
+            self._stats[req_id] = stats
+        return stats
+
+    def acceptance_rate(self, req_id: str) -> Optional[float]:
+        stats = self._stats.get(req_id)
+        return None if stats is None else stats.acceptance_rate
+
+    def remove_request(self, req_id: str) -> None:
+        self._stats.pop(req_id, None)
+
+    def update(self, req_ids: list[str], num_draft_tokens: list[int],
+               valid_sampled_token_ids: list[list[int]]) -> None:
+        """Folds the rejection sampler output of one step into the stats.
+
+        ``num_draft_tokens`` is ``SpecDecodeMetadata.num_draft_tokens``, so
+        all three lists are ordered like the persistent batch.
+        """
+        decay = self.ewma_decay
+        for req_id, num_drafts, sampled_ids in zip(req_ids, num_draft_tokens,
+                                                   valid_sampled_token_ids):
+            # Requests without drafts or whose sampled tokens were discarded
+            # (partial prefill) carry no acceptance information.
+            if num_drafts == 0 or not sampled_ids:
+                continue
+            num_accepted = len(sampled_ids) - 1
+            num_judged = num_accepted + int(num_accepted < num_drafts)
+            stats = self._get_stats(req_id)
+            stats.accepted = decay * stats.accepted + (1 -
+                                                       decay) * num_accepted
+            stats.judged = decay * stats.judged + (1 - decay) * num_judged
+
+    def _best_num_draft_tokens(self, acceptance_rates: np.ndarray) -> np.ndarray:
+        # expected_tokens[i, k] = sum_{j=0..k} a_i^j
+        expected_tokens = np.cumsum(np.power(acceptance_rates[:, None],
+                                             self._num_drafts[None, :]),
+                                    axis=1)
+        # argmax returns the first maximum, so ties favour shorter drafts.
+        return np.argmax(expected_tokens / self._verify_cost, axis=1)
+
+    def trim(self, req_ids: list[str],
+             draft_token_ids: list[list[int]]) -> list[list[int]]:
+        """Truncates each request's proposal to its chosen draft length."""
+        active = [i for i, draft in enumerate(draft_token_ids) if draft]
+        if not active:
+            return draft_token_ids
+        stats = [self._get_stats(req_ids[i]) for i in active]
+        num_drafts = self._best_num_draft_tokens(
+            np.array([s.acceptance_rate for s in stats], dtype=np.float64))
+        for i, s, num in zip(active, stats, num_drafts.tolist()):
+            if num == 0:
+                s.idle_steps += 1
+                if self.probe_interval and s.idle_steps >= self.probe_interval:
+                    num = 1
+            if num > 0:
+                s.idle_steps = 0
+            if num < len(draft_token_ids[i]):
+                draft_token_ids[i] = draft_token_ids[i][:num]
+        return draft_token_ids
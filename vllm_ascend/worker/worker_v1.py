@@ -44,6 +44,8 @@ from vllm.v1.worker.worker_base import WorkerBase
 from vllm_ascend.ascend_config import init_ascend_config
 from vllm_ascend.device_allocator.camem import CaMemAllocator
 from vllm_ascend.distributed.parallel_state import init_ascend_model_parallel
+from vllm_ascend.eplb.eplb_updator import EplbUpdator, create_eplb_updator
+from vllm_ascend.eplb.expert_load_collector import get_expert_load_collector
 from vllm_ascend.platform import NPUPlatform
 from vllm_ascend.utils import (init_ascend_soc_version,
                                register_ascend_customop, sleep_mode_enabled,
@@ -98,6 +100,7 @@ class NPUWorker(WorkerBase):
             init_cached_hf_modules()
 
         self.profiler = self._init_profiler()
+        self.eplb_updator: Optional[EplbUpdator] = None
 
     def sleep(self, level: int = 1) -> None:
         if not sleep_mode_enabled():
@@ -199,6 +202,7 @@ class NPUWorker(WorkerBase):
 
         output = self.model_runner.execute_model(scheduler_output,
                                                  intermediate_tensors)
+        self._step_eplb()
         parallel_config = self.vllm_config.parallel_config
         if parallel_config.distributed_executor_backend != "external_launcher" \
             and not get_pp_group().is_last_rank:
@@ -234,6 +238,7 @@ class NPUWorker(WorkerBase):
             context = nullcontext()  # type: ignore
         with context:
             self.model_runner.load_model()
+        self.eplb_updator = create_eplb_updator(self.model_runner.get_model())
 
     def compile_or_warm_up_model(self) -> None:
         # Note: need to adapt for graph mode.
@@ -249,6 +254,10 @@ class NPUWorker(WorkerBase):
             self.model_runner._dummy_run(size)
         if not self.model_config.enforce_eager:
             self.model_runner.capture_model()
+        # Drop the expert load recorded by warmup and graph capture runs.
+        collector = get_expert_load_collector()
+        if collector is not None:
+            collector.reset()
         # Reset the seed to ensure that the random state is not affected by
         # the model initialization and profiling.
         NPUPlatform.seed_everything(self.model_config.seed)
@@ -292,6 +301,14 @@ class NPUWorker(WorkerBase):
 
     def execute_dummy_batch(self) -> None:
         self.model_runner._dummy_run(1)
+        self._step_eplb()
+
+    def _step_eplb(self) -> None:
+        collector = get_expert_load_collector()
+        if collector is not None:
+            collector.step()
+        if self.eplb_updator is not None:
+            self.eplb_updator.step()
 
     def _init_worker_distributed_environment(self) -> None:
         """Initialize the distributed environment."""